@@ -0,0 +1,78 @@
+"""
+压缩工具模块
+
+提供带编码标记的字节压缩/解压函数：
+- 安装了 zstandard 时优先使用 zstd（压缩率和速度都更好）
+- 否则回退到标准库 zlib
+
+压缩结果的第一个字节记录编码方式，解压时自动识别，
+因此即使运行环境变化（装/卸 zstandard），已有数据仍可读取。
+"""
+import zlib
+
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    zstandard = None
+    ZSTD_SUPPORT = False
+
+
+# 编码标记（压缩数据的首字节）
+CODEC_RAW = b'\x00'
+CODEC_ZLIB = b'\x01'
+CODEC_ZSTD = b'\x02'
+
+
+def compress_bytes(data: bytes, level: int = 6) -> bytes:
+    """
+    压缩字节数据
+
+    Args:
+        data: 原始字节数据
+        level: 压缩级别（zlib 为 1-9，zstd 为 1-22）
+
+    Returns:
+        bytes: 带编码标记的压缩数据
+    """
+    if ZSTD_SUPPORT:
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+    return CODEC_ZLIB + zlib.compress(data, level)
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    """
+    解压由 compress_bytes 生成的数据
+
+    Args:
+        data: 带编码标记的压缩数据
+
+    Returns:
+        bytes: 原始字节数据
+
+    Raises:
+        ValueError: 未知的编码标记，或数据需要 zstandard 但未安装
+    """
+    if not data:
+        return b''
+
+    codec, payload = data[:1], data[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if not ZSTD_SUPPORT:
+            raise ValueError("数据使用 zstd 压缩，请安装 zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == CODEC_RAW:
+        return payload
+    raise ValueError(f"未知的压缩编码标记: {codec!r}")
+
+
+def compress_text(text: str, level: int = 6) -> bytes:
+    """压缩 UTF-8 文本"""
+    return compress_bytes(text.encode('utf-8'), level=level)
+
+
+def decompress_text(data: bytes) -> str:
+    """解压为 UTF-8 文本"""
+    return decompress_bytes(data).decode('utf-8')
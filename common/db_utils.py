@@ -0,0 +1,183 @@
+"""
+数据库查询工具
+大表遍历：按排序键分页（keyset pagination）流式读取，内存占用与表大小无关
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import reduce
+from itertools import chain, islice
+import operator
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+
+
+T = TypeVar('T')
+
+
+def keyset_condition(order_by: Sequence[str], values: Sequence) -> Q:
+    """
+    构造"排在上一页最后一行之后"的过滤条件
+
+    order_by 为 ('-published', '-id') 时生成:
+        published < v1 OR (published = v1 AND id < v2)
+    """
+    conditions = []
+    for i, field in enumerate(order_by):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): value for f, value in zip(order_by[:i], values[:i])}
+        conditions.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+    return reduce(operator.or_, conditions)
+
+
+def keyset_iterator(
+    queryset: QuerySet,
+    order_by: Sequence[str] = ('-pk',),
+    chunk_size: int = 500,
+    limit: Optional[int] = None
+) -> Iterator:
+    """
+    按排序键分页流式遍历查询结果
+
+    与 OFFSET 分页不同，每页都从上一页最后一行的排序键继续，查询耗时不随页数增长；
+    遍历过程中已处理的行被更新（不再满足过滤条件）也不会导致跳过或重复。
+    排序字段必须非空，且最后一个字段必须唯一（通常为主键），
+    如 ('-published', '-id')。
+
+    Args:
+        queryset: 查询集（可以带 select_related / only 等）
+        order_by: 排序字段，'-' 前缀表示降序
+        chunk_size: 每页读取的行数
+        limit: 最多返回的行数
+
+    Returns:
+        逐条返回模型实例的迭代器
+    """
+    order_by = list(order_by)
+    attnames = [field.lstrip('-') for field in order_by]
+    queryset = queryset.order_by(*order_by)
+    last_values = None
+    remaining = limit
+
+    while remaining is None or remaining > 0:
+        page = queryset
+        if last_values is not None:
+            page = page.filter(keyset_condition(order_by, last_values))
+
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = list(page[:size])
+        if not rows:
+            return
+
+        yield from rows
+
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+        last_values = [getattr(rows[-1], attname) for attname in attnames]
+
+
+def iter_batches(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """把迭代器按固定大小分组，不预先读取全部元素"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+def run_bounded(
+    items: Iterable[T],
+    func: Callable[[T], object],
+    workers: int,
+    on_error: Optional[Callable[[T, Exception], None]] = None,
+    max_pending: Optional[int] = None
+) -> int:
+    """
+    用线程池处理迭代器中的元素，同时在途的任务数有上限
+
+    与一次性 submit 全部元素不同，只在有任务完成时才从迭代器读取下一批，
+    配合 keyset_iterator 使用时内存占用恒定。
+
+    Args:
+        items: 待处理元素（可以是惰性迭代器）
+        func: 处理函数
+        workers: 线程数
+        on_error: 处理函数抛出异常时的回调 (元素, 异常)
+        max_pending: 最多同时在途的任务数，默认为线程数的 2 倍
+
+    Returns:
+        处理的元素数量
+    """
+    max_pending = max_pending or workers * 2
+    iterator = iter(items)
+    submitted = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def fill():
+            nonlocal submitted
+            for item in islice(iterator, max(0, max_pending - len(pending))):
+                pending[executor.submit(func, item)] = item
+                submitted += 1
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(item, e)
+            fill()
+
+    return submitted
+
+
+def peek(iterable: Iterable[T]):
+    """
+    读取迭代器的第一个元素而不丢失它
+
+    Returns:
+        (第一个元素, 包含全部元素的迭代器)；迭代器为空时返回 (None, None)
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        return first, chain([first], iterator)
+    return None, None
+
+
+def bulk_upsert(
+    model,
+    objs: Sequence[Model],
+    unique_fields: Sequence[str],
+    update_fields: Sequence[str],
+    batch_size: int = 500
+) -> List[Model]:
+    """
+    批量插入，主键或唯一键冲突时更新指定字段
+
+    MySQL 的 ON DUPLICATE KEY UPDATE 不能指定冲突字段，其他数据库按 unique_fields 判断冲突
+
+    Args:
+        model: 模型类
+        objs: 待写入的实例
+        unique_fields: 判断冲突的字段
+        update_fields: 冲突时更新的字段
+        batch_size: 每条 SQL 的最大行数
+    """
+    features = connections[model.objects.db].features
+    return model.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        update_fields=list(update_fields),
+        unique_fields=list(unique_fields) if features.supports_update_conflicts_with_target else None
+    )
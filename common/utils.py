@@ -17,10 +17,22 @@ from .download_utils import (
     download_pdf_from_url
 )
 
+# 从 compression_utils 导入压缩相关函数
+from .compression_utils import (
+    compress_bytes,
+    decompress_bytes,
+    compress_text,
+    decompress_text
+)
+
 # 定义公开的API
 __all__ = [
     'create_daily_folder',
     'get_daily_folder_path',
     'ensure_daily_folder_exists',
     'download_pdf_from_url',
+    'compress_bytes',
+    'decompress_bytes',
+    'compress_text',
+    'decompress_text',
 ]
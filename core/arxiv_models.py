@@ -2,9 +2,14 @@
 ArXiv论文模型
 用于存储从arXiv API获取的论文元数据
 """
-from django.db import models
+from typing import Iterable, Optional
+
+from django.db import models, transaction
 from django.utils import timezone
 
+from common.compression_utils import compress_text, decompress_text
+from common.db_utils import bulk_upsert
+
 
 class ArxivPaper(models.Model):
     """ArXiv论文模型
@@ -441,6 +446,58 @@ class ArxivPaperReference(models.Model):
         if isinstance(self.authors, list) and self.authors:
             return ', '.join(self.authors[:3]) + (' et al.' if len(self.authors) > 3 else '')
         return 'Unknown'
+    
+    # 解析结果字典中直接对应模型字段的键
+    PARSED_FIELDS = (
+        'title', 'authors', 'year', 'venue', 'venue_type', 'volume', 'issue',
+        'pages', 'doi', 'arxiv_id', 'url', 'confidence_score',
+    )
+    
+    @classmethod
+    def replace_for_paper(cls, paper, references: Iterable[dict]):
+        """
+        用解析结果替换论文已有的参考文献（在同一事务中删除后批量插入）
+        
+        Args:
+            paper: 论文对象
+            references: 参考文献解析结果字典列表
+        """
+        objects = [
+            cls(
+                paper=paper,
+                reference_number=ref_data.get('reference_number', 0),
+                raw_text=ref_data.get('raw_text', ''),
+                extraction_method=ref_data.get('extraction_method', 'llm'),
+                **{name: ref_data.get(name) for name in cls.PARSED_FIELDS},
+            )
+            for ref_data in references
+        ]
+        with transaction.atomic():
+            cls.objects.filter(paper=paper).delete()
+            cls.objects.bulk_create(objects)
+
+
+def _extract_log_blob_property(name: str, doc: str) -> property:
+    """
+    提取日志大文本字段的惰性访问器
+    
+    读取时才从 ArxivReferenceExtractBlob 查询并解压（每个字段只查询一次），
+    赋值只记录在实例上，随日志保存时写入
+    """
+    def getter(self):
+        values = self.__dict__.setdefault('_blob_values', {})
+        if name not in values:
+            values[name] = ArxivReferenceExtractBlob.load(self.pk, name)
+        return values[name]
+    
+    def setter(self, value):
+        self.__dict__.setdefault('_blob_values', {})[name] = value
+        self.__dict__.setdefault('_blob_dirty', set()).add(name)
+        if name == 'reference_raw_text':
+            # 日志表通过文本长度判断是否有原始文本，不需要读取大文本
+            self.reference_text_length = len(value) if value is not None else None
+    
+    return property(getter, setter, doc=doc)
 
 
 class ArxivReferenceExtractLog(models.Model):
@@ -522,18 +579,11 @@ class ArxivReferenceExtractLog(models.Model):
         help_text='是否找到参考文献部分'
     )
     
-    reference_raw_text = models.TextField(
-        blank=True,
-        null=True,
-        verbose_name='参考文献原始文本',
-        help_text='从PDF中提取的参考文献部分的原始文本'
-    )
-    
     reference_text_length = models.IntegerField(
         blank=True,
         null=True,
         verbose_name='参考文献文本长度',
-        help_text='参考文献原始文本的字符数'
+        help_text='参考文献原始文本的字符数（为 0 或空表示没有原始文本）'
     )
     
     llm_processed = models.BooleanField(
@@ -566,13 +616,6 @@ class ArxivReferenceExtractLog(models.Model):
         help_text='处理过程中的详细信息（JSON格式）'
     )
     
-    llm_response = models.TextField(
-        blank=True,
-        null=True,
-        verbose_name='LLM原始响应',
-        help_text='LLM返回的原始响应内容（用于调试）'
-    )
-    
     # 时间信息
     started_at = models.DateTimeField(
         default=timezone.now,
@@ -610,5 +653,393 @@ class ArxivReferenceExtractLog(models.Model):
             models.Index(fields=['-started_at']),
         ]
     
+    # 大文本字段压缩存放在 ArxivReferenceExtractBlob 中，首次读取时才查询
+    reference_raw_text = _extract_log_blob_property('reference_raw_text', '从PDF中提取的参考文献部分的原始文本')
+    llm_response = _extract_log_blob_property('llm_response', 'LLM返回的原始响应内容（用于调试）')
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ArxivReferenceExtractBlob.save_for_logs([self])
+    
     def __str__(self):
         return f"{self.paper.arxiv_id} - {self.status} - {self.started_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class ArxivReferenceExtractBlob(models.Model):
+    """ArXiv参考文献提取日志的大文本
+    
+    参考文献原始文本和 LLM 原始响应每篇论文有数十KB，
+    与日志分表并压缩存放，日志表只保留状态等小字段，状态查询和子查询不再受其拖累
+    """
+    log = models.OneToOneField(
+        ArxivReferenceExtractLog,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='blob',
+        verbose_name='提取日志'
+    )
+    
+    reference_raw_text = models.BinaryField(
+        blank=True,
+        null=True,
+        verbose_name='参考文献原始文本',
+        help_text='压缩后的参考文献原始文本（common.compression_utils 格式）'
+    )
+    
+    llm_response = models.BinaryField(
+        blank=True,
+        null=True,
+        verbose_name='LLM原始响应',
+        help_text='压缩后的LLM原始响应（common.compression_utils 格式）'
+    )
+    
+    class Meta:
+        db_table = 'arxiv_reference_extract_blob'
+        verbose_name = 'ArXiv参考文献提取日志大文本'
+        verbose_name_plural = 'ArXiv参考文献提取日志大文本'
+    
+    @classmethod
+    def load(cls, log_id: Optional[int], name: str) -> Optional[str]:
+        """读取并解压日志的一个大文本字段，不存在时返回 None"""
+        if log_id is None:
+            return None
+        data = cls.objects.filter(log_id=log_id).values_list(name, flat=True).first()
+        return decompress_text(bytes(data)) if data is not None else None
+    
+    @classmethod
+    def save_for_logs(cls, logs: Iterable['ArxivReferenceExtractLog']):
+        """
+        写入日志中被修改过的大文本字段（插入或更新，只写修改过的字段）
+        
+        Args:
+            logs: 已保存（有主键）的提取日志
+        """
+        groups = {}
+        written = []
+        for log in logs:
+            dirty = log.__dict__.get('_blob_dirty')
+            if not dirty or log.pk is None:
+                continue
+            values = log.__dict__['_blob_values']
+            blob = cls(log_id=log.pk, **{
+                name: compress_text(values[name]) if values[name] is not None else None
+                for name in dirty
+            })
+            groups.setdefault(tuple(sorted(dirty)), []).append(blob)
+            written.append(log)
+        
+        for fields, blobs in groups.items():
+            bulk_upsert(cls, blobs, unique_fields=['log'], update_fields=fields)
+        for log in written:
+            log.__dict__.pop('_blob_dirty', None)
+
+
+
+# 参考文献提取命令流式读取待处理记录时的 only() 投影：只加载处理用到的字段
+# （不加载论文摘要、作者列表，以及日志中的 LLM 原始响应和处理详情等大字段）
+PAPER_WORK_FIELDS = ('id', 'arxiv_id', 'title', 'pdf_url', 'published')
+
+EXTRACT_LOG_WORK_FIELDS = (
+    'id', 'paper', 'status', 'reference_count', 'pdf_downloaded', 'pdf_file_path', 'pdf_file_size',
+    'text_extracted', 'reference_section_found', 'reference_text_length',
+    'llm_processed', 'error_message', 'error_type', 'started_at', 'completed_at',
+    'duration_seconds', 'retry_count',
+)
+
+class ArxivReferenceBatchJob(models.Model):
+    """ArXiv参考文献批量解析任务
+    
+    记录提交到 LLM 批量（Batch）API 的参考文献解析批次，
+    进程中断后可根据批次ID继续轮询和回收结果
+    """
+    # 主键
+    id = models.AutoField(
+        primary_key=True,
+        verbose_name='主键ID',
+        help_text='自增主键'
+    )
+    
+    batch_id = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='批次ID',
+        help_text='LLM提供商返回的批次ID'
+    )
+    
+    provider = models.CharField(
+        max_length=50,
+        verbose_name='LLM提供商'
+    )
+    
+    model = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='模型名称'
+    )
+    
+    # 批次状态
+    status = models.CharField(
+        max_length=20,
+        default='in_progress',
+        choices=[
+            ('in_progress', '处理中'),
+            ('completed', '已完成'),
+            ('collected', '结果已回收'),
+            ('failed', '失败'),
+            ('expired', '已过期'),
+            ('cancelled', '已取消'),
+        ],
+        verbose_name='状态',
+        db_index=True
+    )
+    
+    request_count = models.IntegerField(
+        default=0,
+        verbose_name='请求数量',
+        help_text='批次中的请求数（一篇论文的参考文献可能分成多块）'
+    )
+    
+    succeeded_count = models.IntegerField(
+        default=0,
+        verbose_name='成功请求数'
+    )
+    
+    failed_count = models.IntegerField(
+        default=0,
+        verbose_name='失败请求数'
+    )
+    
+    log_ids = models.JSONField(
+        default=list,
+        verbose_name='提取日志ID列表',
+        help_text='批次包含的 ArxivReferenceExtractLog ID'
+    )
+    
+    options = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='解析参数',
+        help_text='提交时的解析参数（分块大小、规则解析阈值等），回收结果时按相同参数合并'
+    )
+    
+    input_file_path = models.CharField(
+        max_length=500,
+        blank=True,
+        null=True,
+        verbose_name='输入文件路径',
+        help_text='本地保存的批次输入JSONL文件'
+    )
+    
+    error_message = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name='错误信息'
+    )
+    
+    # 时间信息
+    submitted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='提交时间'
+    )
+    
+    completed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='完成时间'
+    )
+    
+    collected_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='结果回收时间'
+    )
+    
+    class Meta:
+        db_table = 'arxiv_reference_batch_job'
+        verbose_name = 'ArXiv参考文献批量解析任务'
+        verbose_name_plural = 'ArXiv参考文献批量解析任务'
+        ordering = ['-submitted_at']
+    
+    def __str__(self):
+        return f"{self.provider} - {self.batch_id} - {self.status}"
+
+
+class ArxivPaperLease(models.Model):
+    """ArXiv论文处理租约
+    
+    多台机器同时运行参考文献提取命令时，用于认领待处理的论文：
+    认领时以 SELECT ... FOR UPDATE SKIP LOCKED 锁定候选行并写入租约，
+    处理期间定期续约（心跳），处理完成后释放；持有者崩溃时租约到期后可被其他机器重新认领
+    """
+    # 主键
+    id = models.AutoField(
+        primary_key=True,
+        verbose_name='主键ID',
+        help_text='自增主键'
+    )
+    
+    paper = models.ForeignKey(
+        ArxivPaper,
+        on_delete=models.CASCADE,
+        related_name='leases',
+        verbose_name='论文'
+    )
+    
+    stage = models.CharField(
+        max_length=20,
+        choices=[
+            ('extract', '提取参考文献文本'),
+            ('process', 'LLM处理参考文献'),
+        ],
+        verbose_name='处理阶段'
+    )
+    
+    owner = models.CharField(
+        max_length=200,
+        verbose_name='持有者',
+        help_text='持有租约的进程标识（主机名:进程号:随机串）',
+        db_index=True
+    )
+    
+    claimed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='认领时间'
+    )
+    
+    heartbeat_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='最近心跳时间'
+    )
+    
+    expires_at = models.DateTimeField(
+        verbose_name='到期时间',
+        help_text='到期未续约的租约可被其他进程重新认领'
+    )
+    
+    claim_count = models.IntegerField(
+        default=1,
+        verbose_name='认领次数',
+        help_text='租约被认领的累计次数（大于1说明之前的持有者未完成处理）'
+    )
+    
+    class Meta:
+        db_table = 'arxiv_paper_lease'
+        verbose_name = 'ArXiv论文处理租约'
+        verbose_name_plural = 'ArXiv论文处理租约'
+        unique_together = [['paper', 'stage']]
+        indexes = [
+            models.Index(fields=['stage', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.paper_id} - {self.stage} - {self.owner}"
+
+
+class ArxivCitation(models.Model):
+    """ArXiv论文引用关系
+    
+    由参考文献解析结果匹配到本地论文后物化的引用边（citing 引用了 cited），
+    "谁引用了这篇论文"等查询直接走整数索引，不再在查询时按字符串关联参考文献
+    """
+    # 主键
+    id = models.AutoField(
+        primary_key=True,
+        verbose_name='主键ID',
+        help_text='自增主键'
+    )
+    
+    citing = models.ForeignKey(
+        ArxivPaper,
+        on_delete=models.CASCADE,
+        related_name='citations_made',
+        verbose_name='施引论文'
+    )
+    
+    cited = models.ForeignKey(
+        ArxivPaper,
+        on_delete=models.CASCADE,
+        related_name='citations_received',
+        verbose_name='被引论文'
+    )
+    
+    match_method = models.CharField(
+        max_length=10,
+        choices=[
+            ('arxiv_id', 'arXiv ID'),
+            ('doi', 'DOI'),
+            ('title', '标准化标题'),
+            ('fuzzy', '标题模糊匹配'),
+        ],
+        verbose_name='匹配方式',
+        help_text='参考文献匹配到本地论文的依据'
+    )
+    
+    confidence_score = models.FloatField(
+        default=1.0,
+        verbose_name='置信度',
+        help_text='匹配的置信度（0-1），精确匹配为 1，标题模糊匹配为标题相似度'
+    )
+    
+    class Meta:
+        db_table = 'arxiv_citation'
+        verbose_name = 'ArXiv论文引用关系'
+        verbose_name_plural = 'ArXiv论文引用关系'
+        unique_together = [['citing', 'cited']]
+        indexes = [
+            models.Index(fields=['cited', 'citing']),
+        ]
+    
+    def __str__(self):
+        return f"{self.citing_id} -> {self.cited_id}"
+
+
+class ArxivPaperScore(models.Model):
+    """ArXiv论文排序分数
+    
+    由 compute_paper_scores 命令根据引用图离线批量计算，
+    搜索和列表接口直接读取，不在请求时计算
+    """
+    paper = models.OneToOneField(
+        ArxivPaper,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='论文'
+    )
+    
+    citation_count = models.IntegerField(
+        default=0,
+        verbose_name='被引次数',
+        help_text='被本地论文库中的论文引用的次数'
+    )
+    
+    pagerank = models.FloatField(
+        default=0.0,
+        verbose_name='PageRank',
+        help_text='引用图上的 PageRank（全部论文之和为 1）'
+    )
+    
+    decayed_score = models.FloatField(
+        default=0.0,
+        verbose_name='时间衰减引用分',
+        help_text='按施引论文发布时间指数衰减加权的被引次数（反映近期热度）'
+    )
+    
+    computed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='计算时间'
+    )
+    
+    class Meta:
+        db_table = 'arxiv_paper_score'
+        verbose_name = 'ArXiv论文排序分数'
+        verbose_name_plural = 'ArXiv论文排序分数'
+        indexes = [
+            models.Index(fields=['-citation_count']),
+            models.Index(fields=['-pagerank']),
+            models.Index(fields=['-decayed_score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.paper_id} - {self.citation_count} - {self.pagerank:.6f}"
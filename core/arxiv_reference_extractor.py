@@ -6,7 +6,10 @@ import os
 import re
 import json
 import time
+import contextvars
 import requests
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
@@ -22,11 +25,142 @@ except ImportError:
     PDF_SUPPORT = False
 
 from core.llm.factory import LLMFactory
+from core.llm.concurrency import get_limiter
+from core.llm.telemetry import collect_llm_metrics
+from core.llm.usage import UsageCounter
+from core.pdf_text_cache import PdfTextCache, ExtractedDocument, ExtractedPage
+from core.reference_rule_parser import ReferenceRuleParser, split_reference_chunks
+
+
+# 参考文献标题上下文验证用到的正则（预编译，避免在候选位置循环中重复编译）
+_STANDALONE_REFERENCES_RE = re.compile(r'^\s*(?:\d+\.?\s+)?REFERENCES?\s*$', re.IGNORECASE)
+_REFERENCE_ENTRY_LINE_RE = re.compile(
+    r'^\[\d+\]'          # [1], [2], ...
+    r'|^\d+\.'            # 1., 2., ...
+    r'|\(\d{4}\)'         # 年份 (2020)
+    r'|(?i:et al\.)'      # et al.
+)
+
+# 启发式检测用的引用编号模式
+_CITATION_LINE_RE = re.compile(
+    r'^\s*\[\d+\]\s+'      # [1] Author...
+    r'|^\s*\d+\.\s+[A-Z]'   # 1. Author...
+    r'|^\s*\[\d+\]\s*[A-Z]'  # [1]Author...
+)
+
+# 参考文献之后可能出现的章节标题模式（只检测非常明确的标志，采用严格匹配避免误判）
+_END_SECTION_PATTERNS = [
+    # 附录 - 各种常见格式
+    r'^\s*[A-Z]\s+Appendi(x|ces)\s*$',  # A Appendix, B Appendix
+    r'^\s*Appendi(x|ces)\s+[A-Z]\s*[:\.]?\s*',  # Appendix A, Appendix A:, Appendix A.
+    r'^\s*Appendi(x|ces)\s*$',  # 只有 Appendix 的行
+    r'^\s*[A-Z]\s*\.\s*Appendi(x|ces)',  # A. Appendix
+    r'^\s*[A-Z]\.[0-9]+\s+',  # A.1 Details... (附录子标题，必须有编号)
+    # 移除过于宽泛的模式：r'^\s*[A-Z]\s+[A-Z][a-z]+\s+[A-Z]' 会误匹配普通句子
+    r'^\s*Supplementary\s+(Materials?|Information)',
+    r'^\s*Supporting\s+Information',
+
+    # 致谢 - 单独成行
+    r'^\s*Acknowledgeme?nts?\s*$',
+
+    # 作者信息 - 单独成行
+    r'^\s*Author\s+(Information|Contributions?)',
+    r'^\s*Authors?[\']?\s+Contributions?',
+    r'^\s*Competing\s+Interests?',
+    r'^\s*Conflict\s+of\s+Interests?',
+    r'^\s*Data\s+Availability',
+    r'^\s*Code\s+Availability',
+]
+_END_SECTION_RE = re.compile(
+    '|'.join(f'(?:{pattern})' for pattern in _END_SECTION_PATTERNS),
+    re.IGNORECASE
+)
+
+
+class _LineIndex:
+    """
+    文本行索引
+    
+    一次扫描记录每行的起始偏移（前缀和），之后按位置查行号为 O(log n)，
+    按行号取行为 O(1)，避免在循环中反复 split 和累加行长度
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+        starts = [0]
+        pos = text.find('\n')
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = text.find('\n', pos + 1)
+        self.starts = starts
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def line_number(self, pos: int) -> int:
+        """返回位置 pos 所在的行号"""
+        return bisect_right(self.starts, pos) - 1
+    
+    def line_end(self, line_no: int) -> int:
+        """返回第 line_no 行的结束位置（不含换行符）"""
+        if line_no + 1 < len(self.starts):
+            return self.starts[line_no + 1] - 1
+        return len(self.text)
+    
+    def line(self, line_no: int, start: int = 0, end: Optional[int] = None) -> str:
+        """返回第 line_no 行的文本，可选截取到 [start, end) 窗口内"""
+        line_start = max(self.starts[line_no], start)
+        line_end = self.line_end(line_no)
+        if end is not None:
+            line_end = min(line_end, end)
+        return self.text[line_start:line_end]
 
 
 class ArxivReferenceExtractor:
     """ArXiv 参考文献提取器"""
     
+    # 参考文献解析的LLM调用参数（使用较低的温度以获得更稳定的输出）
+    REFERENCE_LLM_PARAMS = {
+        'temperature': 0.1,
+        'max_tokens': 8000,
+    }
+    
+    # 参考文献解析的固定指令（所有请求共享的前缀）
+    REFERENCE_SYSTEM_PROMPT = """你是一个专业的学术文献解析助手，擅长从论文中提取和结构化参考文献信息。
+
+用户会提供学术论文的参考文献部分内容，请提取其中所有参考文献，并将每条参考文献转换为结构化的JSON格式。
+
+请按照以下JSON格式返回结果（返回一个JSON数组，每个元素是一条参考文献）：
+```json
+[
+  {
+    "reference_number": 1,
+    "title": "论文标题",
+    "authors": ["作者1", "作者2", "作者3"],
+    "year": 2023,
+    "venue": "发表场所（期刊名或会议名）",
+    "venue_type": "journal/conference/arxiv/book/thesis/tech_report/other",
+    "volume": "卷号（如果有）",
+    "issue": "期号（如果有）",
+    "pages": "页码范围（如果有）",
+    "doi": "DOI标识符（如果有）",
+    "arxiv_id": "arXiv标识符（如果有）",
+    "url": "在线链接（如果有）",
+    "raw_text": "原始参考文献文本"
+  }
+]
+```
+
+要求：
+1. 尽可能提取所有字段，如果某个字段不存在，设置为null
+2. reference_number 是参考文献的序号（从1开始）
+3. authors 应该是一个字符串数组
+4. year 应该是整数类型
+5. venue_type 应该从提供的选项中选择最合适的一个
+6. raw_text 保留原始的参考文献文本
+7. 只返回JSON数组，不要包含其他解释性文字
+8. 如果无法解析某条参考文献，可以跳过"""
+    
     def __init__(
         self,
         pdf_download_dir: Optional[str] = None,
@@ -34,7 +168,17 @@ class ArxivReferenceExtractor:
         llm_model: str = 'qwen3-max',
         request_timeout: int = 60,
         max_retries: int = 3,
-        llm_timeout: int = 180
+        llm_timeout: int = 180,
+        use_text_cache: bool = True,
+        text_cache_dir: Optional[str] = None,
+        page_targeted: bool = True,
+        use_rule_parser: bool = True,
+        rule_confidence_threshold: float = 0.75,
+        llm_chunk_chars: int = 8000,
+        llm_workers: int = 4,
+        llm_max_concurrency: Optional[int] = None,
+        llm_fallbacks: Optional[List[Tuple[str, Optional[str]]]] = None,
+        llm_hedge: bool = False
     ):
         """
         初始化提取器
@@ -46,6 +190,18 @@ class ArxivReferenceExtractor:
             request_timeout: HTTP请求超时时间（秒）
             max_retries: 最大重试次数
             llm_timeout: LLM API超时时间（秒），默认180秒
+            use_text_cache: 是否使用PDF文本层缓存（按PDF内容哈希缓存提取结果）
+            text_cache_dir: 文本层缓存目录，默认为 data/pdf_text_cache
+            page_targeted: 是否从PDF末尾向前按页提取，找到参考文献标题后即停止
+            use_rule_parser: 是否先用规则解析参考文献，只把低置信度条目交给LLM
+            rule_confidence_threshold: 规则解析结果的置信度阈值，低于该值的条目交给LLM
+            llm_chunk_chars: 每次LLM调用的最大字符数，更长的参考文献按条目边界分块
+            llm_workers: 并发调用LLM解析分块的最大线程数
+            llm_max_concurrency: 启用自适应并发控制时同一提供商的最大并发请求数（进程内共享，
+                                 从 llm_workers 起按延迟和限流情况自动调整）；为空时不限制
+            llm_fallbacks: 备用 LLM 提供商 [(提供商, 模型)]，模型为空时使用提供商默认模型；
+                           主提供商出错或熔断时转移到备用提供商，按近期延迟选择
+            llm_hedge: 是否发送对冲请求（请求超过近期 p95 延迟仍未返回时并发请求下一个提供商）
         """
         if not PDF_SUPPORT:
             raise ImportError("请安装 PyPDF2: pip install PyPDF2")
@@ -63,11 +219,39 @@ class ArxivReferenceExtractor:
         self.llm_model = llm_model
         self.llm_client = None
         self.llm_timeout = llm_timeout
+        self.llm_fallbacks = list(llm_fallbacks or [])
+        self.llm_hedge = llm_hedge
         
         # 请求配置
         self.request_timeout = request_timeout
         self.max_retries = max_retries
         
+        # PDF文本层缓存
+        self.text_cache = PdfTextCache(text_cache_dir) if use_text_cache else None
+        
+        # 按页定向提取（只解析文档末尾直到参考文献标题）
+        self.page_targeted = page_targeted
+        
+        # 规则解析器（格式规整的条目无需调用LLM）
+        self.rule_parser = ReferenceRuleParser() if use_rule_parser else None
+        self.rule_confidence_threshold = rule_confidence_threshold
+        
+        # 长参考文献分块并行解析
+        self.llm_chunk_chars = llm_chunk_chars
+        self.llm_workers = llm_workers
+        
+        # LLM token 用量（含提示词缓存命中）
+        self.llm_usage = UsageCounter()
+        
+        # LLM请求自适应并发控制（遇到限流/超时自动回退并重试）
+        self.llm_limiter = None
+        if llm_max_concurrency:
+            self.llm_limiter = get_limiter(
+                llm_provider,
+                initial_limit=min(llm_workers, llm_max_concurrency),
+                max_limit=llm_max_concurrency
+            )
+        
         # 参考文献部分的常见标题（更精确的匹配）
         # 要求在行首，且可能有编号或特殊格式
         # (?:\d+\.?\s+)? 表示可选的编号前缀，如 "7. "
@@ -86,37 +270,67 @@ class ArxivReferenceExtractor:
             r'^\s*(?:\d+\.?\s+)?Citations?\.?\s*$',
             r'^\s*(?:\d+\.?\s+)?References?\s+Cited\.?\s*$',
         ]
+        self._reference_header_re = self._compile_reference_header_pattern(self.reference_section_patterns)
+    
+    @staticmethod
+    def _compile_reference_header_pattern(patterns: List[str]) -> re.Pattern:
+        """
+        将多个标题模式合并为一个预编译正则，一次扫描即可找到所有候选标题
+        
+        所有模式共有的行首前缀（可选编号）只保留一份，避免正则引擎在每个位置
+        依次尝试所有分支；每个模式对应一个捕获组，match.lastindex 即为命中的模式序号（从 1 开始）
+        """
+        prefix = r'^\s*(?:\d+\.?\s+)?'
+        if all(pattern.startswith(prefix) for pattern in patterns):
+            alternatives = '|'.join(f'({pattern[len(prefix):]})' for pattern in patterns)
+            combined = f'{prefix}(?:{alternatives})'
+        else:
+            combined = '|'.join(f'({pattern})' for pattern in patterns)
+        return re.compile(combined, re.IGNORECASE | re.MULTILINE)
     
     def _get_llm_client(self):
-        """获取LLM客户端（延迟初始化）"""
+        """获取LLM客户端（延迟初始化；配置了备用提供商时返回故障转移客户端）"""
         if self.llm_client is None:
-            # 使用自定义配置创建LLM客户端，设置更长的超时时间
-            from core.llm.config import LLMConfig, LLMProviderConfig
-            import os
-            
-            # 从环境变量获取配置
-            provider_config = LLMConfig.get_provider_config(self.llm_provider)
-            api_key = os.getenv(f"{self.llm_provider.upper()}_API_KEY")
-            
-            if not api_key:
-                raise ValueError(f"未找到 {self.llm_provider.upper()}_API_KEY 环境变量")
-            
-            config = LLMProviderConfig(
-                provider=self.llm_provider,
-                api_key=api_key,
-                base_url=provider_config['base_url'],
-                model=self.llm_model,
-                max_tokens=8000,
-                temperature=0.1,
-                timeout=self.llm_timeout  # 使用更长的超时时间
-            )
-            
-            self.llm_client = LLMFactory.create(
-                provider=self.llm_provider,
-                config=config
-            )
+            primary = self._create_llm_client(self.llm_provider, self.llm_model)
+            if self.llm_fallbacks:
+                from core.llm.failover import FailoverLLMClient
+                
+                members = [(primary, self.llm_model)]
+                for provider, model in self.llm_fallbacks:
+                    client = self._create_llm_client(provider, model)
+                    members.append((client, client.model))
+                self.llm_client = FailoverLLMClient(members, routing='latency', hedge=self.llm_hedge)
+            else:
+                self.llm_client = primary
         return self.llm_client
     
+    def _create_llm_client(self, provider: str, model: Optional[str] = None):
+        """按环境变量中的API密钥创建一个提供商的客户端（设置更长的超时时间）"""
+        from core.llm.config import LLMConfig, LLMProviderConfig
+        import os
+        
+        # 从环境变量获取配置
+        provider_config = LLMConfig.get_provider_config(provider)
+        api_key = os.getenv(f"{provider.upper()}_API_KEY")
+        
+        if not api_key:
+            raise ValueError(f"未找到 {provider.upper()}_API_KEY 环境变量")
+        
+        config = LLMProviderConfig(
+            provider=provider,
+            api_key=api_key,
+            base_url=provider_config['base_url'],
+            model=model or provider_config['default_model'],
+            max_tokens=8000,
+            temperature=0.1,
+            timeout=self.llm_timeout  # 使用更长的超时时间
+        )
+        
+        return LLMFactory.create(
+            provider=provider,
+            config=config
+        )
+    
     def download_pdf(self, pdf_url: str, arxiv_id: str) -> Tuple[bool, Optional[str], Optional[str]]:
         """
         下载PDF文件
@@ -176,59 +390,251 @@ class ArxivReferenceExtractor:
         Returns:
             (成功标志, 提取的文本, 错误信息)
         """
-        # 优先使用 PyMuPDF (fitz)，它对多栏布局处理更好
+        success, document, error = self.extract_document(pdf_path)
+        if not success:
+            return False, None, error
+        return True, document.text, None
+    
+    def extract_document(
+        self,
+        pdf_path: str,
+        aliases: Tuple[str, ...] = ()
+    ) -> Tuple[bool, Optional[ExtractedDocument], Optional[str]]:
+        """
+        提取PDF的逐页文本和文本块，命中文本层缓存时不再解析PDF
+        
+        Args:
+            pdf_path: PDF文件路径
+            aliases: 缓存别名（如PDF URL），之后可通过 get_cached_document 直接命中
+            
+        Returns:
+            (成功标志, 提取结果, 错误信息)
+        """
+        try:
+            if self.text_cache is not None:
+                document = self.text_cache.get_or_extract(
+                    pdf_path,
+                    self._extract_document,
+                    aliases=aliases
+                )
+            else:
+                document = self._extract_document(pdf_path, PdfTextCache.hash_file(pdf_path))
+        except Exception as e:
+            return False, None, str(e)
+        
+        if not document.text:
+            return False, None, "无法从PDF中提取文本"
+        
+        return True, document, None
+    
+    def get_cached_document(self, pdf_url: str, allow_partial: bool = False) -> Optional[ExtractedDocument]:
+        """
+        通过PDF URL查找文本层缓存（命中时无需下载PDF）
+        
+        Args:
+            pdf_url: PDF下载链接
+            allow_partial: 是否接受只包含文档末尾若干页的缓存
+            
+        Returns:
+            ExtractedDocument，未命中时返回 None
+        """
+        if self.text_cache is None:
+            return None
+        document = self.text_cache.get_by_alias(pdf_url, allow_partial=allow_partial)
+        if document is not None and document.text:
+            return document
+        return None
+    
+    def locate_reference_text(
+        self,
+        pdf_path: str,
+        aliases: Tuple[str, ...] = ()
+    ) -> Tuple[bool, Optional[str], Optional[str], Dict[str, Any]]:
+        """
+        按页定向提取：从PDF最后一页向前逐页提取，找到参考文献标题后即停止
+        
+        参考文献几乎总在文档末尾，标题之后的内容（包括结束边界，如附录）
+        此时已全部解析完毕；只有找不到标题时才会解析到第一页，
+        此时得到的就是全文，可直接用于启发式检测。
+        
+        Args:
+            pdf_path: PDF文件路径
+            aliases: 缓存别名（如PDF URL）
+            
+        Returns:
+            (成功标志, 用于定位参考文献的文本, 错误信息, 统计信息)
+            统计信息: {'strategy': 'cache'/'tail'/'full', 'page_count': 总页数, 'pages_parsed': 本次解析的页数,
+                       'text_offset': 文本在整篇文档中的估计偏移, 'document_length': 整篇文档的估计长度（全文时为 None）}；
+            text_offset 和 document_length 应传给 find_reference_section，按整篇文档计算标题的位置评分
+        """
+        stats = {'strategy': 'full', 'page_count': 0, 'pages_parsed': 0, 'text_offset': 0, 'document_length': None}
+        
+        content_hash = PdfTextCache.hash_file(pdf_path)
+        cached = self.text_cache.get(content_hash, allow_partial=True) if self.text_cache else None
+        if cached is not None and (cached.is_complete or self._tail_has_reference_header(cached)):
+            stats.update(strategy='cache', page_count=cached.page_count, **self._text_position(cached))
+            self.text_cache.add_aliases(content_hash, aliases)
+            if not cached.text:
+                return False, None, "无法从PDF中提取文本", stats
+            return True, cached.text, None, stats
+        
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception:
+            # PyMuPDF 无法打开时回退到整篇提取（内部会尝试 PyPDF2）
+            success, document, error = self.extract_document(pdf_path, aliases=aliases)
+            if document is not None:
+                stats.update(page_count=document.page_count, pages_parsed=document.page_count)
+            return success, document.text if success else None, error, stats
+        
         try:
-            return self._extract_with_pymupdf(pdf_path)
+            page_count = len(doc)
+            pages = {page.number: page for page in cached.pages} if cached is not None else {}
+            stats['page_count'] = page_count
+            
+            tail_text = ''
+            found = False
+            for page_num in range(page_count - 1, -1, -1):
+                page = pages.get(page_num)
+                if page is None:
+                    page = self._extract_page_with_pymupdf(doc[page_num], page_num)
+                    pages[page_num] = page
+                    stats['pages_parsed'] += 1
+                
+                if not page.text:
+                    continue
+                tail_text = page.text + '\n\n' + tail_text if tail_text else page.text
+                
+                # 只在新加入的这一页中查找标题，位置评分按整篇文档的估计长度计算
+                position = self._tail_position(len(tail_text), page_count, page_count - page_num)
+                header_pos, header_score = self._find_reference_header(
+                    tail_text, search_end=len(page.text), **position
+                )
+                if header_pos >= 0 and header_score >= 2:
+                    found = True
+                    break
+        finally:
+            doc.close()
+        
+        document = ExtractedDocument(
+            content_hash=content_hash,
+            page_count=page_count,
+            extractor='pymupdf',
+            pdf_size=os.path.getsize(pdf_path),
+            pages=[pages[number] for number in sorted(pages)],
+        )
+        if self.text_cache is not None:
+            self.text_cache.put(document, aliases=aliases)
+        
+        if found and not document.is_complete:
+            stats['strategy'] = 'tail'
+            stats.update(position)
+        
+        if not tail_text:
+            return False, None, "无法从PDF中提取文本", stats
+        return True, tail_text if found else document.text, None, stats
+    
+    @staticmethod
+    def _tail_position(text_length: int, page_count: int, pages_in_text: int) -> Dict[str, Optional[int]]:
+        """按页数估计末尾若干页的文本在整篇文档中的位置（find_reference_section 的位置参数）"""
+        if pages_in_text >= page_count:
+            return {'text_offset': 0, 'document_length': None}
+        document_length = int(text_length * page_count / max(pages_in_text, 1))
+        return {'text_offset': document_length - text_length, 'document_length': document_length}
+    
+    def _text_position(self, document: ExtractedDocument) -> Dict[str, Optional[int]]:
+        """缓存文本（可能只包含末尾若干页）在整篇文档中的估计位置"""
+        if document.is_complete:
+            return {'text_offset': 0, 'document_length': None}
+        return self._tail_position(len(document.text), document.page_count, len(document.pages))
+    
+    def _tail_has_reference_header(self, document: ExtractedDocument) -> bool:
+        """检查（只包含末尾若干页的）缓存文本中是否已有可靠的参考文献标题"""
+        text = document.text
+        if not text or not document.pages:
+            return False
+        header_pos, header_score = self._find_reference_header(text, **self._text_position(document))
+        return header_pos >= 0 and header_score >= 2
+    
+    def _extract_document(self, pdf_path: str, content_hash: str) -> ExtractedDocument:
+        """优先使用 PyMuPDF 提取，失败时回退到 PyPDF2"""
+        try:
+            return self._extract_document_with_pymupdf(pdf_path, content_hash)
         except Exception as e:
             # 如果失败，回退到 PyPDF2
             try:
-                return self._extract_with_pypdf2(pdf_path)
+                return self._extract_document_with_pypdf2(pdf_path, content_hash)
             except Exception as e2:
-                return False, None, f"PDF文本提取失败 (PyMuPDF: {str(e)}, PyPDF2: {str(e2)})"
+                raise Exception(f"PDF文本提取失败 (PyMuPDF: {str(e)}, PyPDF2: {str(e2)})")
     
-    def _extract_with_pymupdf(self, pdf_path: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    def _extract_document_with_pymupdf(self, pdf_path: str, content_hash: str) -> ExtractedDocument:
         """
-        使用PyMuPDF (fitz)提取文本，智能处理多栏布局
+        使用PyMuPDF (fitz)提取逐页文本和文本块，智能处理多栏布局
         
         Args:
             pdf_path: PDF文件路径
+            content_hash: PDF内容哈希
             
         Returns:
-            (成功标志, 提取的文本, 错误信息)
+            ExtractedDocument
         """
         try:
             doc = fitz.open(pdf_path)
-            text_parts = []
+            pages = []
             
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # 使用 "blocks" 模式提取文本块
-                blocks = page.get_text("blocks")
-                
-                # 过滤掉空块
-                blocks = [b for b in blocks if len(b) >= 5 and b[4].strip()]
-                
-                if not blocks:
-                    continue
-                
-                # 智能排序：检测是否为多栏布局
-                page_text = self._sort_blocks_for_reading(blocks, page.rect.width)
-                
-                if page_text:
-                    text_parts.append('\n'.join(page_text))
+                pages.append(self._extract_page_with_pymupdf(doc[page_num], page_num))
             
+            page_count = len(doc)
             doc.close()
             
-            if not text_parts:
-                return False, None, "无法从PDF中提取文本"
-            
-            full_text = '\n\n'.join(text_parts)
-            return True, full_text, None
+            return ExtractedDocument(
+                content_hash=content_hash,
+                page_count=page_count,
+                extractor='pymupdf',
+                pages=pages,
+            )
             
         except Exception as e:
             raise Exception(f"PyMuPDF提取失败: {str(e)}")
     
+    def _extract_page_with_pymupdf(self, page, page_num: int) -> ExtractedPage:
+        """提取单页的文本块并按阅读顺序排序"""
+        # 使用 "blocks" 模式提取文本块
+        blocks = page.get_text("blocks")
+        
+        # 过滤掉空块
+        blocks = [b for b in blocks if len(b) >= 5 and b[4].strip()]
+        
+        # 保留原始块坐标（排序会原地修改列表）
+        raw_blocks = [[b[0], b[1], b[2], b[3], b[4]] for b in blocks]
+        
+        # 智能排序：检测是否为多栏布局
+        page_text = self._sort_blocks_for_reading(blocks, page.rect.width) if blocks else []
+        
+        return ExtractedPage(
+            number=page_num,
+            width=page.rect.width,
+            height=page.rect.height,
+            text='\n'.join(page_text),
+            blocks=raw_blocks,
+        )
+    
+    def _extract_with_pymupdf(self, pdf_path: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        使用PyMuPDF (fitz)提取文本，智能处理多栏布局
+        
+        Args:
+            pdf_path: PDF文件路径
+            
+        Returns:
+            (成功标志, 提取的文本, 错误信息)
+        """
+        document = self._extract_document_with_pymupdf(pdf_path, content_hash='')
+        if not document.text:
+            return False, None, "无法从PDF中提取文本"
+        return True, document.text, None
+    
     def _sort_blocks_for_reading(self, blocks: List, page_width: float) -> List[str]:
         """
         智能排序文本块，正确处理单栏和多栏布局
@@ -274,69 +680,79 @@ class ArxivReferenceExtractor:
             blocks.sort(key=lambda b: (b[1], b[0]))
             return [block[4].strip() for block in blocks]
     
-    def _extract_with_pypdf2(self, pdf_path: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    def _extract_document_with_pypdf2(self, pdf_path: str, content_hash: str) -> ExtractedDocument:
         """
-        使用PyPDF2提取文本（备选方案）
+        使用PyPDF2提取逐页文本（备选方案，不含文本块坐标）
         
         Args:
             pdf_path: PDF文件路径
+            content_hash: PDF内容哈希
             
         Returns:
-            (成功标志, 提取的文本, 错误信息)
+            ExtractedDocument
         """
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
                 # 提取所有页面的文本
-                text_parts = []
+                pages = []
                 for page_num in range(len(pdf_reader.pages)):
                     page = pdf_reader.pages[page_num]
                     text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
-                
-                if not text_parts:
-                    return False, None, "无法从PDF中提取文本"
+                    pages.append(ExtractedPage(number=page_num, text=text or ''))
                 
-                full_text = '\n\n'.join(text_parts)
-                return True, full_text, None
+                return ExtractedDocument(
+                    content_hash=content_hash,
+                    page_count=len(pdf_reader.pages),
+                    extractor='pypdf2',
+                    pages=pages,
+                )
                 
         except Exception as e:
             raise Exception(f"PyPDF2提取失败: {str(e)}")
     
-    def find_reference_section(self, text: str) -> Tuple[bool, Optional[str], int]:
+    def _extract_with_pypdf2(self, pdf_path: str) -> Tuple[bool, Optional[str], Optional[str]]:
         """
-        查找并提取参考文献部分
+        使用PyPDF2提取文本（备选方案）
         
         Args:
-            text: PDF提取的完整文本
+            pdf_path: PDF文件路径
             
         Returns:
-            (找到标志, 参考文献文本, 起始位置)
+            (成功标志, 提取的文本, 错误信息)
         """
-        best_match = None
-        best_score = -1
+        document = self._extract_document_with_pypdf2(pdf_path, content_hash='')
+        if not document.text:
+            return False, None, "无法从PDF中提取文本"
+        return True, document.text, None
+    
+    def find_reference_section(
+        self,
+        text: str,
+        text_offset: int = 0,
+        document_length: Optional[int] = None
+    ) -> Tuple[bool, Optional[str], int]:
+        """
+        查找并提取参考文献部分
         
-        # 尝试多个模式查找参考文献部分
-        for pattern in self.reference_section_patterns:
-            matches = list(re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE))
+        Args:
+            text: PDF提取的完整文本（或按页定向提取得到的文档末尾文本）
+            text_offset: text 在整篇文档中的起始偏移（用于位置评分）
+            document_length: 整篇文档的长度（估计值），默认为 len(text)
             
-            # 对每个匹配进行验证和评分
-            for match in matches:
-                start_pos = match.start()
-                
-                # 验证这是否是真正的参考文献章节开始
-                score = self._validate_reference_section_start(text, start_pos)
-                
-                # 选择得分最高的匹配
-                if score > best_score:
-                    best_score = score
-                    best_match = (start_pos, match)
+        Returns:
+            (找到标志, 参考文献文本, 起始位置)
+        """
+        best_pos, best_score = self._find_reference_header(
+            text,
+            text_offset=text_offset,
+            document_length=document_length
+        )
         
         # 如果找到了可靠的匹配（得分 >= 2）
-        if best_match and best_score >= 2:
-            start_pos, match = best_match
+        if best_pos >= 0 and best_score >= 2:
+            start_pos = best_pos
             
             # 提取从匹配位置开始的文本
             text_after_ref = text[start_pos:]
@@ -360,7 +776,7 @@ class ArxivReferenceExtractor:
             if 100 < len(reference_text) < 50000:
                 return True, reference_text, start_pos
             elif len(reference_text) >= 50000:
-                print(f"  ⚠️  参考文献文本过长 ({len(reference_text)} 字符)，将在后续截断")
+                print(f"  ℹ️  参考文献文本较长 ({len(reference_text)} 字符)，将分块交给LLM解析")
                 return True, reference_text, start_pos
         
         # 如果没有找到明确的标题，尝试启发式检测
@@ -371,13 +787,72 @@ class ArxivReferenceExtractor:
         
         return False, None, -1
     
-    def _validate_reference_section_start(self, text: str, pos: int) -> int:
+    def _find_reference_header(
+        self,
+        text: str,
+        search_end: Optional[int] = None,
+        text_offset: int = 0,
+        document_length: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        查找得分最高的参考文献标题位置
+        
+        Args:
+            text: 待搜索文本
+            search_end: 只在 text[:search_end] 范围内查找标题（上下文验证仍使用完整文本）
+            text_offset: text 在整篇文档中的起始偏移
+            document_length: 整篇文档的长度
+            
+        Returns:
+            (标题位置, 得分)，未找到时位置为 -1
+        """
+        best_pos = -1
+        best_score = -1
+        best_pattern = len(self.reference_section_patterns) + 1
+        end = len(text) if search_end is None else search_end
+        line_index = None
+        
+        # 所有标题模式合并为一个正则，只扫描一遍文本
+        for match in self._reference_header_re.finditer(text, 0, end):
+            start_pos = match.start()
+            
+            # 行索引只在出现候选标题时构建一次，供所有候选共用
+            if line_index is None:
+                line_index = _LineIndex(text)
+            
+            # 验证这是否是真正的参考文献章节开始
+            score = self._validate_reference_section_start(
+                text, start_pos,
+                text_offset=text_offset,
+                document_length=document_length,
+                line_index=line_index
+            )
+            
+            # 选择得分最高的匹配；同分时优先排在模式列表前面的标题（如 References 优先于 Citations）
+            if score > best_score or (score == best_score and match.lastindex < best_pattern):
+                best_score = score
+                best_pos = start_pos
+                best_pattern = match.lastindex
+        
+        return best_pos, best_score
+    
+    def _validate_reference_section_start(
+        self,
+        text: str,
+        pos: int,
+        text_offset: int = 0,
+        document_length: Optional[int] = None,
+        line_index: Optional[_LineIndex] = None
+    ) -> int:
         """
         验证某个位置是否是真正的参考文献章节开始
         
         Args:
             text: 完整文本
             pos: 匹配位置
+            text_offset: text 在整篇文档中的起始偏移
+            document_length: 整篇文档的长度，默认为 len(text)
+            line_index: text 的行索引，批量验证多个候选位置时传入以复用
             
         Returns:
             int: 得分，越高越可靠（范围 0-10）
@@ -385,8 +860,8 @@ class ArxivReferenceExtractor:
         score = 0
         
         # 1. 位置评分：越靠后得分越高（参考文献通常在文末）
-        text_length = len(text)
-        position_ratio = pos / text_length
+        text_length = document_length or len(text)
+        position_ratio = (text_offset + pos) / text_length
         if position_ratio > 0.8:  # 在后 20% 的位置
             score += 3
         elif position_ratio > 0.6:  # 在后 40% 的位置
@@ -394,50 +869,37 @@ class ArxivReferenceExtractor:
         elif position_ratio > 0.4:  # 在后 60% 的位置
             score += 1
         
-        # 2. 上下文验证：检查前后文本
-        # 获取匹配位置所在行以及前后几行
+        # 2. 上下文验证：检查匹配位置所在行以及后面几行（限制在 [pos-200, pos+500) 窗口内）
+        if line_index is None:
+            line_index = _LineIndex(text)
         start = max(0, pos - 200)
         end = min(len(text), pos + 500)
-        context = text[start:end]
-        lines = context.split('\n')
+        ref_line_idx = line_index.line_number(pos)
         
-        # 找到包含 'References' 的那一行
-        ref_line_idx = -1
-        for i, line in enumerate(lines):
-            if pos - start >= sum(len(l) + 1 for l in lines[:i]) and \
-               pos - start < sum(len(l) + 1 for l in lines[:i+1]):
-                ref_line_idx = i
+        # 检查该行是否相对独立（不在句子中间）
+        ref_line = line_index.line(ref_line_idx, start, end).strip()
+        
+        # 如果这一行只有 'References' 和可能的编号，得分更高
+        if _STANDALONE_REFERENCES_RE.match(ref_line):
+            score += 3
+        elif len(ref_line) < 30:  # 行很短，可能是标题
+            score += 2
+        
+        # 检查后面几行是否有典型的参考文献格式
+        reference_patterns_found = 0
+        last_line = min(ref_line_idx + 6, len(line_index))
+        for line_no in range(ref_line_idx + 1, last_line):
+            if line_index.starts[line_no] > end:
                 break
+            next_line_stripped = line_index.line(line_no, start, end).strip()
+            # 检测常见的参考文献格式：[1]、1.、年份 (2020)、et al.
+            if _REFERENCE_ENTRY_LINE_RE.search(next_line_stripped):
+                reference_patterns_found += 1
         
-        if ref_line_idx >= 0:
-            # 检查该行是否相对独立（不在句子中间）
-            ref_line = lines[ref_line_idx].strip()
-            
-            # 如果这一行只有 'References' 和可能的编号，得分更高
-            if re.match(r'^\s*(?:\d+\.?\s+)?REFERENCES?\s*$', ref_line, re.IGNORECASE):
-                score += 3
-            elif len(ref_line) < 30:  # 行很短，可能是标题
-                score += 2
-            
-            # 检查后面几行是否有典型的参考文献格式
-            next_lines = lines[ref_line_idx+1:ref_line_idx+6]
-            reference_patterns_found = 0
-            for next_line in next_lines:
-                next_line_stripped = next_line.strip()
-                # 检测常见的参考文献格式
-                if re.match(r'^\[\d+\]', next_line_stripped):  # [1], [2], ...
-                    reference_patterns_found += 1
-                elif re.match(r'^\d+\.', next_line_stripped):  # 1., 2., ...
-                    reference_patterns_found += 1
-                elif re.search(r'\(\d{4}\)', next_line_stripped):  # 年份 (2020)
-                    reference_patterns_found += 1
-                elif re.search(r'et al\.', next_line_stripped, re.IGNORECASE):  # et al.
-                    reference_patterns_found += 1
-            
-            if reference_patterns_found >= 2:
-                score += 2
-            elif reference_patterns_found >= 1:
-                score += 1
+        if reference_patterns_found >= 2:
+            score += 2
+        elif reference_patterns_found >= 1:
+            score += 1
         
         return score
     
@@ -451,31 +913,6 @@ class ArxivReferenceExtractor:
         Returns:
             int: 参考文献部分的结束位置（相对于reference_text的开始），如果找不到则返回-1
         """
-        # 定义参考文献之后可能出现的章节标题模式（只检测非常明确的标志）
-        # 采用更严格的匹配，避免误判
-        end_section_patterns = [
-            # 附录 - 各种常见格式
-            r'^\s*[A-Z]\s+Appendi(x|ces)\s*$',  # A Appendix, B Appendix
-            r'^\s*Appendi(x|ces)\s+[A-Z]\s*[:\.]?\s*',  # Appendix A, Appendix A:, Appendix A.
-            r'^\s*Appendi(x|ces)\s*$',  # 只有 Appendix 的行
-            r'^\s*[A-Z]\s*\.\s*Appendi(x|ces)',  # A. Appendix
-            r'^\s*[A-Z]\.[0-9]+\s+',  # A.1 Details... (附录子标题，必须有编号)
-            # 移除过于宽泛的模式：r'^\s*[A-Z]\s+[A-Z][a-z]+\s+[A-Z]' 会误匹配普通句子
-            r'^\s*Supplementary\s+(Materials?|Information)',
-            r'^\s*Supporting\s+Information',
-            
-            # 致谢 - 单独成行
-            r'^\s*Acknowledgeme?nts?\s*$',
-            
-            # 作者信息 - 单独成行
-            r'^\s*Author\s+(Information|Contributions?)',
-            r'^\s*Authors?[\']?\s+Contributions?',
-            r'^\s*Competing\s+Interests?',
-            r'^\s*Conflict\s+of\s+Interests?',
-            r'^\s*Data\s+Availability',
-            r'^\s*Code\s+Availability',
-        ]
-        
         # 按行分析文本
         lines = reference_text.split('\n')
         
@@ -501,12 +938,10 @@ class ArxivReferenceExtractor:
             sensitivity_threshold = 80 if last_line_was_number else 50
             
             # 只有当行长度较短且匹配特定模式时才认为是章节标题
-            if len(line_stripped) < sensitivity_threshold:
-                for pattern in end_section_patterns:
-                    if re.search(pattern, line_stripped, re.IGNORECASE):
-                        # 找到了明确的结束标志
-                        print(f"  ℹ️  检测到参考文献结束标志: {line_stripped}")
-                        return current_pos - len(line) - 1
+            if len(line_stripped) < sensitivity_threshold and _END_SECTION_RE.search(line_stripped):
+                # 找到了明确的结束标志
+                print(f"  ℹ️  检测到参考文献结束标志: {line_stripped}")
+                return current_pos - len(line) - 1
             
             # 如果当前行不是空行，重置页码标志
             if line_stripped:
@@ -515,68 +950,363 @@ class ArxivReferenceExtractor:
         # 默认不截断，使用全部文本
         return -1
     
+    def parse_references(
+        self,
+        reference_text: str,
+        arxiv_id: str,
+        max_chars: Optional[int] = None
+    ) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
+        """
+        解析参考文献：先用规则解析，只把低置信度的条目交给LLM
+        
+        每条结果的 extraction_method 标明来源（rule / llm），
+        规则解析的条目带 confidence_score；未启用规则解析时等同于 parse_references_with_llm
+        
+        Args:
+            reference_text: 参考文献部分的文本
+            arxiv_id: arXiv ID（用于日志）
+            max_chars: 每次LLM调用的最大字符数，默认为 llm_chunk_chars
+            
+        Returns:
+            (成功标志, 参考文献列表, 错误信息, LLM原始响应)
+        """
+        plan = self.plan_reference_parsing(reference_text, max_chars)
+        return self.complete_reference_parsing(plan, self._run_reference_chunks(plan['chunks']))
+    
     def parse_references_with_llm(
         self,
         reference_text: str,
         arxiv_id: str,
-        max_chars: int = 50000
+        max_chars: Optional[int] = None
     ) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
         """
         使用LLM解析参考文献
         
+        超过 max_chars 的参考文献按条目边界切分为多个块并发解析，
+        结果按块顺序合并、去重并校正编号，不再截断文本
+        
         Args:
             reference_text: 参考文献部分的文本
             arxiv_id: arXiv ID（用于日志）
-            max_chars: 最大字符数限制（默认50000，避免超时）
+            max_chars: 每次LLM调用的最大字符数，默认为 llm_chunk_chars
+            
+        Returns:
+            (成功标志, 参考文献列表, 错误信息, LLM原始响应)
+        """
+        plan = self.plan_reference_parsing(reference_text, max_chars, use_rules=False)
+        return self.complete_reference_parsing(plan, self._run_reference_chunks(plan['chunks']))
+    
+    def plan_reference_parsing(
+        self,
+        reference_text: str,
+        max_chars: Optional[int] = None,
+        use_rules: bool = True
+    ) -> Dict[str, Any]:
+        """
+        规划参考文献解析：先做规则解析，再把需要LLM处理的文本按条目边界分块
+        
+        同步解析和批量解析（core.reference_batch）共用同一规划，
+        保证两种方式的分块、编号和合并逻辑一致；规划只依赖输入文本和配置，可重复计算
+        
+        Args:
+            reference_text: 参考文献部分的文本
+            max_chars: 每次LLM调用的最大字符数，默认为 llm_chunk_chars
+            use_rules: 是否使用规则解析（未启用规则解析器时忽略）
+            
+        Returns:
+            {
+                'rule_references': 规则解析结果（未使用规则解析时为 None）,
+                'uncertain_numbers': 交给LLM的低置信度条目编号,
+                'chunks': [(块文本, 块内条目编号)]，为空表示无需调用LLM
+            }
+        """
+        max_chars = max_chars or self.llm_chunk_chars
+        plan = {'rule_references': None, 'uncertain_numbers': [], 'chunks': []}
+        llm_text = reference_text
+        
+        if use_rules and self.rule_parser is not None:
+            rule_references = self.rule_parser.parse(reference_text)
+            if rule_references and not self._rule_split_failed(rule_references):
+                uncertain = [
+                    ref for ref in rule_references
+                    if ref['confidence_score'] < self.rule_confidence_threshold
+                ]
+                print(
+                    f"  ℹ️  规则解析 {len(rule_references)} 条参考文献，"
+                    f"{len(rule_references) - len(uncertain)} 条置信度达标，{len(uncertain)} 条交给LLM"
+                )
+                plan['rule_references'] = rule_references
+                plan['uncertain_numbers'] = [ref['reference_number'] for ref in uncertain]
+                if not uncertain:
+                    return plan
+                
+                # 只把低置信度条目（保留原编号）交给LLM
+                llm_text = '\n'.join(
+                    f"[{ref['reference_number']}] {ref['raw_text']}" for ref in uncertain
+                )
+            else:
+                print("  ℹ️  规则解析未能切分参考文献条目，全部交给LLM处理")
+        
+        plan['chunks'] = split_reference_chunks(llm_text, max_chars, parser=self.rule_parser)
+        return plan
+    
+    def complete_reference_parsing(
+        self,
+        plan: Dict[str, Any],
+        chunk_results: List[Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]]
+    ) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
+        """
+        根据各文本块的LLM解析结果完成参考文献解析
+        
+        Args:
+            plan: plan_reference_parsing 的返回值
+            chunk_results: 与 plan['chunks'] 一一对应的 (成功标志, 参考文献列表, 错误信息, LLM原始响应)
             
         Returns:
             (成功标志, 参考文献列表, 错误信息, LLM原始响应)
         """
-        # 截取文本以适应LLM上下文限制
-        original_length = len(reference_text)
-        if len(reference_text) > max_chars:
-            reference_text = reference_text[:max_chars]
-            print(f"  ⚠️  参考文献文本过长 ({original_length} 字符)，已截取至 {max_chars} 字符")
+        chunks = plan['chunks']
+        rule_references = plan['rule_references']
         
-        # 构建提示词
-        prompt = self._build_reference_extraction_prompt(reference_text)
+        if not chunks:
+            return True, rule_references or [], None, None
         
+        if len(chunks) == 1:
+            llm_raw_response = chunk_results[0][3]
+            error = chunk_results[0][2]
+        else:
+            llm_raw_response = '\n\n'.join(
+                f"--- 第 {i + 1}/{len(chunks)} 块 ---\n{result[3] or ''}"
+                for i, result in enumerate(chunk_results)
+            )
+            error = '；'.join(
+                f"第 {i + 1} 块: {result[2]}"
+                for i, result in enumerate(chunk_results) if not result[0]
+            )
+        
+        if not all(result[0] for result in chunk_results):
+            # 任何一块失败都视为LLM解析失败，避免静默丢失参考文献
+            if rule_references and len(rule_references) > len(plan['uncertain_numbers']):
+                # 有置信度达标的规则解析结果时保留规则解析结果（低置信度条目也比丢失好）
+                print(f"  ⚠️  LLM处理低置信度条目失败，保留规则解析结果: {error}")
+                return True, rule_references, None, llm_raw_response
+            return False, None, error, llm_raw_response
+        
+        llm_references = self._merge_chunk_references(chunks, [result[1] for result in chunk_results])
+        if len(chunks) > 1:
+            print(f"  ℹ️  {len(chunks)} 块解析完成，合并后共 {len(llm_references)} 条参考文献")
+        
+        if rule_references is None:
+            return True, llm_references, None, llm_raw_response
+        merged = self._merge_llm_references(rule_references, plan['uncertain_numbers'], llm_references)
+        return True, merged, None, llm_raw_response
+    
+    def _merge_llm_references(
+        self,
+        rule_references: List[Dict],
+        uncertain_numbers: List[int],
+        llm_references: List[Dict]
+    ) -> List[Dict]:
+        """
+        用LLM结果替换低置信度的规则解析条目
+        
+        LLM返回的编号与送入的编号一致时按编号对应；否则条数一致时按顺序对应；
+        都无法对应时（如低置信度条目实为多条粘连）用LLM的全部结果替换低置信度条目，
+        按文档顺序重新编号
+        """
+        llm_numbers = [ref.get('reference_number') for ref in llm_references]
+        
+        replacements = {}
+        if set(llm_numbers) <= set(uncertain_numbers) and len(set(llm_numbers)) == len(llm_numbers):
+            replacements = {ref.get('reference_number'): ref for ref in llm_references}
+        elif len(llm_references) == len(uncertain_numbers):
+            replacements = dict(zip(uncertain_numbers, llm_references))
+        
+        if not replacements:
+            uncertain = set(uncertain_numbers)
+            merged = []
+            inserted = False
+            for ref in rule_references:
+                if ref['reference_number'] not in uncertain:
+                    merged.append(ref)
+                elif not inserted:
+                    # LLM结果整体放在第一条低置信度条目的位置
+                    merged.extend(self._as_llm_reference(llm_ref) for llm_ref in llm_references)
+                    inserted = True
+            for i, ref in enumerate(merged, 1):
+                ref['reference_number'] = i
+            return merged
+        
+        merged = []
+        for ref in rule_references:
+            llm_ref = replacements.get(ref['reference_number'])
+            if llm_ref is None:
+                merged.append(ref)
+                continue
+            llm_ref = self._as_llm_reference(llm_ref)
+            llm_ref['reference_number'] = ref['reference_number']
+            llm_ref['raw_text'] = llm_ref.get('raw_text') or ref['raw_text']
+            merged.append(llm_ref)
+        return merged
+    
+    @staticmethod
+    def _as_llm_reference(reference: Dict) -> Dict:
+        """复制LLM解析的条目并标记提取方式"""
+        reference = dict(reference)
+        reference['extraction_method'] = 'llm'
+        reference['confidence_score'] = None
+        return reference
+    
+    def _rule_split_failed(self, rule_references: List[Dict]) -> bool:
+        """
+        规则切分是否失败：只切出一条，或有条目超过最大长度（多条粘在一起）
+        
+        切分失败时低置信度条目与LLM返回的条目无法对应，应把整个参考文献部分交给LLM
+        """
+        if len(rule_references) <= 1:
+            return True
+        max_length = self.rule_parser.max_entry_length
+        return any(len(ref.get('raw_text') or '') > max_length for ref in rule_references)
+    
+    def _run_reference_chunks(
+        self,
+        chunks: List[Tuple[str, List[int]]]
+    ) -> List[Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]]:
+        """调用LLM解析各文本块，多块时并发调用"""
+        if not chunks:
+            return []
+        if len(chunks) == 1:
+            return [self._parse_reference_chunk(chunks[0][0])]
+        
+        print(f"  ℹ️  参考文献文本较长，按条目切分为 {len(chunks)} 块并行解析")
+        
+        try:
+            # 在主线程中初始化客户端，避免多个线程同时创建
+            self._get_llm_client()
+        except Exception as e:
+            return [(False, None, f"LLM处理失败: {str(e)}", None) for _ in chunks]
+        
+        # 每个分块带上调用方上下文的副本（LLM 遥测按论文汇总）
+        contexts = [contextvars.copy_context() for _ in chunks]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.llm_workers, len(chunks)))) as executor:
+            return list(executor.map(
+                lambda context, chunk: context.run(self._parse_reference_chunk, chunk[0]), contexts, chunks
+            ))
+    
+    def build_reference_messages(self, reference_text: str) -> List[Dict[str, str]]:
+        """
+        构建解析一块参考文献文本的对话消息（同步调用和批量请求共用）
+        
+        固定指令放在逐字节不变的系统消息中，随论文变化的参考文献文本放在最后，
+        所有请求共享同一前缀，可命中提供商的提示词缓存
+        """
+        return [
+            {
+                "role": "system",
+                "content": self.REFERENCE_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": self._build_reference_extraction_prompt(reference_text)
+            }
+        ]
+    
+    def parse_reference_chunk_response(
+        self,
+        content: str
+    ) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
+        """
+        解析一块参考文献文本的LLM响应内容
+        
+        Returns:
+            (成功标志, 参考文献列表, 错误信息, LLM原始响应)
+        """
+        references = self._parse_llm_response(content or '')
+        if references is None:
+            return False, None, "LLM返回的格式无效", content
+        return True, references, None, content
+    
+    def _parse_reference_chunk(self, reference_text: str) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
+        """
+        调用一次LLM解析一块参考文献文本
+        
+        Returns:
+            (成功标志, 参考文献列表, 错误信息, LLM原始响应)
+        """
         llm_raw_response = None  # 存储LLM原始响应
         
         try:
             llm_client = self._get_llm_client()
             
             # 调用LLM
-            response = llm_client.chat_completion(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的学术文献解析助手，擅长从论文中提取和结构化参考文献信息。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,  # 使用较低的温度以获得更稳定的输出
-                max_tokens=8000
-            )
+            messages = self.build_reference_messages(reference_text)
+            if self.llm_limiter is not None:
+                response = self.llm_limiter.call(
+                    llm_client.chat_completion, messages=messages, **self.REFERENCE_LLM_PARAMS
+                )
+            else:
+                response = llm_client.chat_completion(messages=messages, **self.REFERENCE_LLM_PARAMS)
+            
+            self.llm_usage.add(response.get('usage'))
             
             # 解析返回的JSON
             content = response.get('content', '')
             llm_raw_response = content  # 保存原始响应
             
-            references = self._parse_llm_response(content)
-            
-            if references is None:
-                return False, None, "LLM返回的格式无效", llm_raw_response
-            
-            return True, references, None, llm_raw_response
+            return self.parse_reference_chunk_response(content)
             
         except Exception as e:
             error_msg = f"LLM处理失败: {str(e)}"
             return False, None, error_msg, llm_raw_response
     
+    def _merge_chunk_references(
+        self,
+        chunks: List[Tuple[str, List[int]]],
+        chunk_references: List[List[Dict]]
+    ) -> List[Dict]:
+        """
+        按块顺序合并各块的解析结果
+        
+        - 块内编号与原文编号一致时保留，否则按块内顺序对应原文编号
+        - 按原始文本（无原始文本时按标题和年份）去重，同一条目被重复解析时只保留一条
+        - 合并后编号缺失或重复时按顺序重新编号
+        """
+        merged = []
+        seen_keys = set()
+        
+        for (_, numbers), references in zip(chunks, chunk_references):
+            returned = [ref.get('reference_number') for ref in references]
+            keep_numbers = not numbers or (
+                len(set(returned)) == len(returned) and set(returned) <= set(numbers)
+            )
+            
+            for i, ref in enumerate(references):
+                if not isinstance(ref, dict):
+                    continue
+                ref = dict(ref)
+                if not keep_numbers:
+                    ref['reference_number'] = numbers[i] if i < len(numbers) else None
+                
+                key = self._reference_dedup_key(ref)
+                if key and key in seen_keys:
+                    continue
+                if key:
+                    seen_keys.add(key)
+                merged.append(ref)
+        
+        numbers = [ref.get('reference_number') for ref in merged]
+        valid = all(isinstance(number, int) and number > 0 for number in numbers)
+        if not valid or len(set(numbers)) != len(numbers):
+            for i, ref in enumerate(merged, 1):
+                ref['reference_number'] = i
+        return merged
+    
+    def _reference_dedup_key(self, reference: Dict) -> Optional[str]:
+        """参考文献去重键：原始文本（或标题+年份）去掉标点空白后的小写形式"""
+        text = reference.get('raw_text') or f"{reference.get('title') or ''}{reference.get('year') or ''}"
+        key = re.sub(r'\W+', '', str(text).lower())
+        return key[:300] or None
+    
     def _strip_md_code_fence(self, text: str) -> str:
         """去除markdown代码块标记
         
@@ -689,45 +1419,12 @@ class ArxivReferenceExtractor:
         return ''.join(result)
     
     def _build_reference_extraction_prompt(self, reference_text: str) -> str:
-        """构建参考文献提取的提示词"""
-        return f"""请从以下学术论文的参考文献部分提取所有参考文献，并将每条参考文献转换为结构化的JSON格式。
-
-参考文献部分内容：
+        """构建参考文献提取的提示词（只包含随论文变化的参考文献文本，固定指令在系统消息中）"""
+        return f"""参考文献部分内容：
 ```
 {reference_text}
 ```
 
-请按照以下JSON格式返回结果（返回一个JSON数组，每个元素是一条参考文献）：
-```json
-[
-  {{
-    "reference_number": 1,
-    "title": "论文标题",
-    "authors": ["作者1", "作者2", "作者3"],
-    "year": 2023,
-    "venue": "发表场所（期刊名或会议名）",
-    "venue_type": "journal/conference/arxiv/book/thesis/tech_report/other",
-    "volume": "卷号（如果有）",
-    "issue": "期号（如果有）",
-    "pages": "页码范围（如果有）",
-    "doi": "DOI标识符（如果有）",
-    "arxiv_id": "arXiv标识符（如果有）",
-    "url": "在线链接（如果有）",
-    "raw_text": "原始参考文献文本"
-  }}
-]
-```
-
-要求：
-1. 尽可能提取所有字段，如果某个字段不存在，设置为null
-2. reference_number 是参考文献的序号（从1开始）
-3. authors 应该是一个字符串数组
-4. year 应该是整数类型
-5. venue_type 应该从提供的选项中选择最合适的一个
-6. raw_text 保留原始的参考文献文本
-7. 只返回JSON数组，不要包含其他解释性文字
-8. 如果无法解析某条参考文献，可以跳过
-
 请开始提取："""
     
     def _parse_llm_response(self, content: str) -> Optional[List[Dict]]:
@@ -790,6 +1487,93 @@ class ArxivReferenceExtractor:
             
             return None
     
+    def _obtain_full_text(
+        self,
+        pdf_url: str,
+        arxiv_id: str,
+        result: Dict,
+        progress_callback=None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        获取用于定位参考文献的文本：优先读取文本层缓存，未命中时下载PDF并提取
+        
+        启用按页定向提取时，返回的可能只是从参考文献标题所在页到文末的文本，
+        此时定位参考文献需要传入文本在整篇文档中的位置
+        
+        Args:
+            pdf_url: PDF下载链接
+            arxiv_id: arXiv ID
+            result: 处理结果字典（会被就地更新）
+            progress_callback: 进度回调函数
+            
+        Returns:
+            (文本, 本地PDF路径, 位置参数)，位置参数 {'text_offset', 'document_length'} 传给 find_reference_section；
+            失败时文本为 None（错误信息已写入 result）
+        """
+        cached_document = self.get_cached_document(pdf_url, allow_partial=self.page_targeted)
+        if cached_document is not None and not cached_document.is_complete:
+            # 只缓存了文档末尾：其中必须已包含参考文献标题，否则仍需下载PDF继续解析
+            if not self._tail_has_reference_header(cached_document):
+                cached_document = None
+        if cached_document is not None:
+            full_text = cached_document.text
+            result['pdf_downloaded'] = True
+            result['pdf_path'] = pdf_url
+            result['pdf_size'] = cached_document.pdf_size
+            result['text_extracted'] = True
+            if progress_callback:
+                progress_callback('text_extracted', f'命中文本层缓存，共 {len(full_text)} 字符')
+            return full_text, None, self._text_position(cached_document)
+        
+        # 步骤1: 下载PDF
+        if progress_callback:
+            progress_callback('downloading', f'正在下载PDF: {pdf_url}')
+        
+        success, local_pdf_path, error = self.download_pdf(pdf_url, arxiv_id)
+        if not success:
+            result['error_type'] = 'download_error'
+            result['error_message'] = error
+            if progress_callback:
+                progress_callback('download_failed', f'下载失败: {error}')
+            return None, None, {}
+        
+        result['pdf_downloaded'] = True
+        result['pdf_path'] = pdf_url  # 保存arXiv的PDF链接而非本地路径
+        result['pdf_size'] = os.path.getsize(local_pdf_path)
+        
+        if progress_callback:
+            progress_callback('downloaded', f'下载成功，文件大小: {result["pdf_size"] / 1024:.1f} KB')
+        
+        # 步骤2: 提取文本
+        if progress_callback:
+            progress_callback('extracting_text', '正在从PDF提取文本...')
+        
+        position = {}
+        if self.page_targeted:
+            success, full_text, error, stats = self.locate_reference_text(
+                local_pdf_path, aliases=(pdf_url,)
+            )
+            details = f'（解析 {stats["pages_parsed"]}/{stats["page_count"]} 页）'
+            position = {'text_offset': stats['text_offset'], 'document_length': stats['document_length']}
+        else:
+            success, document, error = self.extract_document(local_pdf_path, aliases=(pdf_url,))
+            full_text = document.text if success else None
+            details = ''
+        
+        if not success:
+            result['error_type'] = 'extraction_error'
+            result['error_message'] = error
+            if progress_callback:
+                progress_callback('extraction_failed', f'文本提取失败: {error}')
+            return None, local_pdf_path, {}
+        
+        result['text_extracted'] = True
+        
+        if progress_callback:
+            progress_callback('text_extracted', f'文本提取成功，共 {len(full_text)} 字符{details}')
+        
+        return full_text, local_pdf_path, position
+    
     def extract_reference_text_only(
         self,
         paper_id: int,
@@ -827,47 +1611,18 @@ class ArxivReferenceExtractor:
         local_pdf_path = None
         
         try:
-            # 步骤1: 下载PDF
-            if progress_callback:
-                progress_callback('downloading', f'正在下载PDF: {pdf_url}')
-            
-            success, local_pdf_path, error = self.download_pdf(pdf_url, arxiv_id)
-            if not success:
-                result['error_type'] = 'download_error'
-                result['error_message'] = error
-                if progress_callback:
-                    progress_callback('download_failed', f'下载失败: {error}')
-                return result
-            
-            result['pdf_downloaded'] = True
-            result['pdf_path'] = pdf_url
-            result['pdf_size'] = os.path.getsize(local_pdf_path)
-            
-            if progress_callback:
-                progress_callback('downloaded', f'下载成功，文件大小: {result["pdf_size"] / 1024:.1f} KB')
-            
-            # 步骤2: 提取文本
-            if progress_callback:
-                progress_callback('extracting_text', '正在从PDF提取文本...')
-            
-            success, full_text, error = self.extract_text_from_pdf(local_pdf_path)
-            if not success:
-                result['error_type'] = 'extraction_error'
-                result['error_message'] = error
-                if progress_callback:
-                    progress_callback('extraction_failed', f'文本提取失败: {error}')
+            # 步骤1-2: 下载PDF并提取文本（命中文本层缓存时跳过）
+            full_text, local_pdf_path, position = self._obtain_full_text(
+                pdf_url, arxiv_id, result, progress_callback
+            )
+            if full_text is None:
                 return result
             
-            result['text_extracted'] = True
-            
-            if progress_callback:
-                progress_callback('text_extracted', f'文本提取成功，共 {len(full_text)} 字符')
-            
             # 步骤3: 查找参考文献部分
             if progress_callback:
                 progress_callback('finding_references', '正在定位参考文献部分...')
             
-            success, reference_text, start_pos = self.find_reference_section(full_text)
+            success, reference_text, start_pos = self.find_reference_section(full_text, **position)
             if not success:
                 result['error_type'] = 'reference_not_found'
                 result['error_message'] = '未找到参考文献部分'
@@ -897,20 +1652,20 @@ class ArxivReferenceExtractor:
         self,
         reference_text: str,
         arxiv_id: str,
-        max_chars: int = 50000
+        max_chars: Optional[int] = None
     ) -> Tuple[bool, Optional[List[Dict]], Optional[str], Optional[str]]:
         """
-        对已提取的参考文献原始文本进行LLM处理
+        对已提取的参考文献原始文本进行解析（规则解析 + 低置信度条目交给LLM）
         
         Args:
             reference_text: 已提取的参考文献原始文本
             arxiv_id: arXiv ID（用于日志）
-            max_chars: 最大字符数限制
+            max_chars: 每次LLM调用的最大字符数，默认为 llm_chunk_chars
             
         Returns:
             (成功标志, 参考文献列表, 错误信息, LLM原始响应)
         """
-        return self.parse_references_with_llm(reference_text, arxiv_id, max_chars)
+        return self.parse_references(reference_text, arxiv_id, max_chars)
     
     def process_paper(
         self,
@@ -946,52 +1701,24 @@ class ArxivReferenceExtractor:
             'error_type': None,
             'error_message': None,
             'llm_response': None,  # LLM原始响应（用于调试）
+            'llm_metrics': None,  # LLM调用遥测（未调用LLM时为空）
         }
         
         local_pdf_path = None  # 临时本地PDF路径
         
         try:
-            # 步骤1: 下载PDF
-            if progress_callback:
-                progress_callback('downloading', f'正在下载PDF: {pdf_url}')
-            
-            success, local_pdf_path, error = self.download_pdf(pdf_url, arxiv_id)
-            if not success:
-                result['error_type'] = 'download_error'
-                result['error_message'] = error
-                if progress_callback:
-                    progress_callback('download_failed', f'下载失败: {error}')
-                return result
-            
-            result['pdf_downloaded'] = True
-            result['pdf_path'] = pdf_url  # 保存arXiv的PDF链接而非本地路径
-            result['pdf_size'] = os.path.getsize(local_pdf_path)
-            
-            if progress_callback:
-                progress_callback('downloaded', f'下载成功，文件大小: {result["pdf_size"] / 1024:.1f} KB')
-            
-            # 步骤2: 提取文本
-            if progress_callback:
-                progress_callback('extracting_text', '正在从PDF提取文本...')
-            
-            success, full_text, error = self.extract_text_from_pdf(local_pdf_path)
-            if not success:
-                result['error_type'] = 'extraction_error'
-                result['error_message'] = error
-                if progress_callback:
-                    progress_callback('extraction_failed', f'文本提取失败: {error}')
+            # 步骤1-2: 下载PDF并提取文本（命中文本层缓存时跳过）
+            full_text, local_pdf_path, position = self._obtain_full_text(
+                pdf_url, arxiv_id, result, progress_callback
+            )
+            if full_text is None:
                 return result
             
-            result['text_extracted'] = True
-            
-            if progress_callback:
-                progress_callback('text_extracted', f'文本提取成功，共 {len(full_text)} 字符')
-            
             # 步骤3: 查找参考文献部分
             if progress_callback:
                 progress_callback('finding_references', '正在定位参考文献部分...')
             
-            success, reference_text, start_pos = self.find_reference_section(full_text)
+            success, reference_text, start_pos = self.find_reference_section(full_text, **position)
             if not success:
                 result['error_type'] = 'reference_not_found'
                 result['error_message'] = '未找到参考文献部分'
@@ -1004,17 +1731,20 @@ class ArxivReferenceExtractor:
             if progress_callback:
                 progress_callback('references_found', f'找到参考文献部分，长度: {len(reference_text)} 字符')
             
-            # 步骤4: 使用LLM解析参考文献
+            # 步骤4: 解析参考文献（规则解析，低置信度条目使用LLM）
             if progress_callback:
                 progress_callback('llm_processing', f'正在调用 {self.llm_provider}/{self.llm_model} 解析参考文献...')
             
-            success, references, error, llm_response = self.parse_references_with_llm(
-                reference_text,
-                arxiv_id
-            )
+            with collect_llm_metrics() as llm_metrics:
+                success, references, error, llm_response = self.parse_references(
+                    reference_text,
+                    arxiv_id
+                )
             
-            # 保存LLM原始响应（无论成功或失败）
+            # 保存LLM原始响应（无论成功或失败）和调用遥测（耗时、token 数、费用）
             result['llm_response'] = llm_response
+            if llm_metrics.calls:
+                result['llm_metrics'] = llm_metrics.summary()
             
             if not success:
                 result['error_type'] = 'llm_error'
@@ -1029,7 +1759,11 @@ class ArxivReferenceExtractor:
             result['success'] = True
             
             if progress_callback:
-                progress_callback('llm_completed', f'LLM解析完成，提取到 {len(references)} 条参考文献')
+                rule_count = sum(1 for ref in references if ref.get('extraction_method') == 'rule')
+                progress_callback(
+                    'llm_completed',
+                    f'解析完成，提取到 {len(references)} 条参考文献（规则解析 {rule_count} 条）'
+                )
             
             return result
             
@@ -1060,25 +1794,17 @@ class ArxivReferenceExtractor:
         search_start = int(len(text) * 0.7)
         search_text = text[search_start:]
         lines = search_text.split('\n')
+        line_index = _LineIndex(search_text)
         
-        # 引用编号模式
-        citation_patterns = [
-            r'^\s*\[\d+\]\s+',  # [1] Author...
-            r'^\s*\d+\.\s+[A-Z]',  # 1. Author...
-            r'^\s*\[\d+\]\s*[A-Z]',  # [1]Author...
-        ]
-        
-        # 记录每行是否匹配引用模式
+        # 记录每行是否匹配引用编号模式（[1] Author / 1. Author / [1]Author）
         matches = []
         for i, line in enumerate(lines):
             line_stripped = line.strip()
             if len(line_stripped) < 10:  # 太短的行跳过
                 continue
-                
-            for pattern in citation_patterns:
-                if re.match(pattern, line_stripped):
-                    matches.append(i)
-                    break
+            
+            if _CITATION_LINE_RE.match(line_stripped):
+                matches.append(i)
         
         # 如果找到足够多的匹配，认为是参考文献部分
         if len(matches) >= 3:
@@ -1093,7 +1819,7 @@ class ArxivReferenceExtractor:
                     start_line -= 1
                 
                 reference_text = '\n'.join(lines[start_line:])
-                actual_start_pos = search_start + sum(len(lines[i]) + 1 for i in range(start_line))
+                actual_start_pos = search_start + line_index.starts[start_line]
                 
                 if len(reference_text) > 100:
                     print(f"  ✅ 启发式检测成功！找到 {len(matches)} 个引用模式")
@@ -1118,7 +1844,7 @@ class ArxivReferenceExtractor:
                             start_line -= 1
                         
                         reference_text = '\n'.join(lines[start_line:])
-                        actual_start_pos = search_start + sum(len(lines[i]) + 1 for i in range(start_line))
+                        actual_start_pos = search_start + line_index.starts[start_line]
                         
                         if len(reference_text) > 100:
                             print(f"  ✅ 启发式检测成功！找到 {len(matches)} 个引用模式")
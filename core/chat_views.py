@@ -2,13 +2,25 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.http import StreamingHttpResponse
 from django.utils import timezone
+from .ai_config_views import API_BASE_CONFIG
+from .arxiv_models import ArxivPaper
 from .models import AIModelConfig, ChatSession, ChatMessage
+from .llm.cache import CachedLLMClient, LLMResponseCache
+from .llm.config import LLMConfig
+from .llm.context import ContextWindow
+from .llm.failover import FailoverLLMClient, parse_provider_spec
+from .paper_index import MAX_PDF_BYTES, PaperIndexStore
+from .llm.registry import get_client
+from .translation_cache import translation_cache, replay_chunks
+import hashlib
 import json
 import os
 import requests
 import time
+from urllib.parse import urlsplit
 
 # 语言代码映射到完整语言名称
 LANGUAGE_NAMES = {
@@ -22,6 +34,17 @@ LANGUAGE_NAMES = {
     'ru': 'Русский',
 }
 
+
+def build_translation_messages(text, target_lang):
+    """构建翻译提示词（翻译接口和整篇预翻译共用，保证缓存的翻译结果一致）"""
+    target_lang_name = LANGUAGE_NAMES.get(target_lang, target_lang)
+    system_message = f"You are a professional translator. Translate the given text to {target_lang_name}. Only return the translated text, no explanations."
+    user_message = f"Translate the following text to {target_lang_name}:\n\n{text}"
+    return [
+        {'role': 'system', 'content': system_message},
+        {'role': 'user', 'content': user_message}
+    ]
+
 def get_active_ai_config(request):
     """获取用户当前激活的AI配置"""
     user = request.user if request.user.is_authenticated else None
@@ -43,186 +66,290 @@ def get_active_ai_config(request):
         return None
 
 
-def call_llm_api_stream(config, messages):
-    """调用LLM API进行流式响应"""
-    if not config:
-        raise Exception("No AI model configured")
+def normalize_api_base(api_base):
+    """标准化API地址：去掉首尾空白和末尾斜杠，协议和主机名小写"""
+    api_base = (api_base or '').strip().rstrip('/')
+    if not api_base:
+        return ''
+    parts = urlsplit(api_base)
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()).geturl()
+
+
+def translation_cache_model(config):
+    """
+    翻译缓存键中的模型标识
     
-    api_base = config.api_base
-    api_key = config.api_key
-    model = config.model_name
-    provider = config.provider.lower()
+    翻译缓存在读者之间共享，只有服务端默认地址（API_BASE_CONFIG，未填地址同样使用默认地址）
+    的翻译使用共享的 "提供商/模型名"；自定义地址的翻译附加地址摘要，并按用户的AI模型配置隔离，
+    避免把模型指向自建接口的用户污染其他读者的翻译
+    """
+    model = f"{config.provider}/{config.model_name}"
+    api_base = normalize_api_base(config.api_base)
+    if not api_base or api_base == normalize_api_base(API_BASE_CONFIG.get(config.provider)):
+        return model
+    model = f"{model}@{hashlib.sha256(api_base.encode('utf-8')).hexdigest()[:16]}"
+    return f"{model}#{config.pk}" if config.pk else model
+
+
+# 聊天配置中的提供商名称到 core.llm 提供商的映射（未列出的同名）
+CHAT_PROVIDER_MAP = {
+    'gpt': 'openai',
+    'grok': 'openai',  # xAI 接口兼容 OpenAI
+    'claude': 'anthropic',
+}
+
+# 翻译和聊天统一的调用参数
+CHAT_LLM_PARAMS = {
+    'temperature': 0.3,
+    'max_tokens': 4096,
+}
+
+# Gemini 没有 core.llm 客户端，仍直接调用 generateContent，但复用连接
+_gemini_session = requests.Session()
+
+
+_chat_response_cache = None
+_paper_index_store = None
+_chat_fallbacks = None
+
+
+def get_chat_response_cache():
+    """论文问答的LLM响应缓存（settings.CHAT_RESPONSE_CACHE 未启用时返回 None）"""
+    global _chat_response_cache
+    options = dict(getattr(settings, 'CHAT_RESPONSE_CACHE', None) or {})
+    if not options.pop('enabled', False):
+        return None
+    if _chat_response_cache is None:
+        _chat_response_cache = LLMResponseCache(**options)
+    return _chat_response_cache
+
+
+def chat_system_prompt(context_text):
+    """论文问答的系统提示词（带用户选中的原文），没有原文时返回空字符串"""
+    if not context_text:
+        return ''
+    return f"You are a helpful AI assistant. The user has selected the following text from a document:\n\n{context_text}\n\nPlease help answer questions about this text."
+
+
+def excerpts_system_prompt(excerpts):
+    """检索到的论文片段（随问题变化，放在稳定的系统提示词之后）"""
+    return f"Relevant excerpts retrieved from the paper:\n\n{excerpts}\n\nUse these excerpts when answering questions about the paper."
+
+
+def get_paper_index_store():
+    """论文检索索引缓存（延迟初始化）"""
+    global _paper_index_store
+    if _paper_index_store is None:
+        options = getattr(settings, 'CHAT_RETRIEVAL', None) or {}
+        _paper_index_store = PaperIndexStore(
+            chunk_tokens=options.get('chunk_tokens', 300),
+            max_pdf_bytes=options.get('max_pdf_bytes', MAX_PDF_BYTES)
+        )
+    return _paper_index_store
+
+
+def is_retrievable_pdf_url(pdf_url, allowed_hosts):
+    """论文URL是否允许下载检索：已收录论文的 PDF，或 allowed_hosts（含子域名）上的 https PDF"""
+    parts = urlsplit(pdf_url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme == 'https' and any(host == allowed or host.endswith(f'.{allowed}') for allowed in allowed_hosts):
+        return True
+    return ArxivPaper.objects.filter(pdf_url=pdf_url).exists()
+
+
+def retrieve_paper_excerpts(pdf_url, messages):
+    """
+    从论文检索索引中取出与最后一个问题最相关的片段
     
-    # 构建API请求
-    headers = {
-        'Content-Type': 'application/json',
-    }
+    请求中的论文URL只接受已收录论文或允许的主机；索引未缓存时在后台构建，本轮不附加片段
     
-    # 根据不同的provider设置不同的header
-    if provider in ['gpt', 'openai', 'qwen', 'deepseek', 'grok', 'doubao']:
-        headers['Authorization'] = f'Bearer {api_key}'
-    elif provider == 'claude':
-        headers['x-api-key'] = api_key
-        headers['anthropic-version'] = '2023-06-01'
-    elif provider == 'gemini':
-        pass
+    Returns:
+        (片段文本, 片段数)；settings.CHAT_RETRIEVAL 未启用、没有论文URL、URL不允许、
+        索引尚未构建或检索失败时为 ('', 0)
+    """
+    options = getattr(settings, 'CHAT_RETRIEVAL', None) or {}
+    if not pdf_url or not options.get('enabled', False) or not pdf_url.startswith(('http://', 'https://')):
+        return '', 0
+    question = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+    try:
+        if not is_retrievable_pdf_url(pdf_url, options.get('allowed_hosts', [])):
+            print(f"Paper retrieval skipped, URL not allowed: {pdf_url}")
+            return '', 0
+        hits = get_paper_index_store().retrieve(
+            pdf_url, question, k=options.get('top_k', 4), min_score=options.get('min_score', 0.05), background=True
+        )
+    except Exception as e:
+        print(f"Paper retrieval error: {e}")
+        return '', 0
+    return '\n\n'.join(f"[Page {page + 1}]\n{text}" for page, text in hits), len(hits)
+
+
+def build_chat_messages(config, messages, context_text='', pdf_url=''):
+    """
+    按 settings.CHAT_CONTEXT_WINDOW 的 token 预算构建本轮发送的消息
     
-    # 构建请求body（启用流式）
-    if provider == 'claude':
-        request_data = {
-            'model': model,
-            'messages': messages,
-            'max_tokens': 4096,
-            'stream': True,
-        }
-        endpoint = f"{api_base}/messages"
-    elif provider == 'gemini':
-        # Gemini目前不支持流式，使用普通模式
-        request_data = {
-            'contents': [
-                {
-                    'parts': [{'text': msg['content']}],
-                    'role': 'user' if msg['role'] == 'user' else 'model'
-                } for msg in messages
-            ]
-        }
-        endpoint = f"{api_base}/models/{model}:generateContent?key={api_key}"
-    else:
-        # OpenAI-compatible format
-        request_data = {
-            'model': model,
-            'messages': messages,
-            'temperature': 0.3,
-            'max_tokens': 4096,
-            'stream': True,
-        }
-        endpoint = f"{api_base}/chat/completions"
+    最近的消息原样保留，更早的消息压缩为摘要，过长的选中原文保留开头和结尾；
+    提供论文 PDF URL 时附加检索到的相关片段。选中原文的系统消息在最前面且逐轮不变，
+    可命中提供商的提示词缓存
     
-    # 发送流式请求
-    response = requests.post(endpoint, headers=headers, json=request_data, timeout=60, stream=True)
+    Returns:
+        (消息列表, 裁剪统计)
+    """
+    excerpts, retrieved = retrieve_paper_excerpts(pdf_url, messages)
+    options = getattr(settings, 'CHAT_CONTEXT_WINDOW', None) or {}
+    window = ContextWindow(model=config.model_name, **options)
+    full_messages, stats = window.build(
+        messages, context_text, chat_system_prompt, extra_system=excerpts_system_prompt(excerpts) if excerpts else ''
+    )
+    stats['retrieved_chunks'] = retrieved
+    return full_messages, stats
+
+
+def get_chat_fallbacks():
+    """
+    论文问答的备用提供商 [(客户端, 模型)]（settings.CHAT_FAILOVER，API密钥读取环境变量）
+    
+    缺少密钥或不支持的提供商跳过；解析结果在进程内复用
+    """
+    global _chat_fallbacks
+    if _chat_fallbacks is None:
+        fallbacks = []
+        for spec in (getattr(settings, 'CHAT_FAILOVER', None) or {}).get('fallbacks', []):
+            try:
+                provider, model = parse_provider_spec(spec)
+                provider_config = LLMConfig.from_env(provider, model)
+                client = get_client(provider, provider_config.api_key, base_url=provider_config.base_url, model=provider_config.model)
+                fallbacks.append((client, provider_config.model))
+            except ValueError as e:
+                print(f"Chat fallback provider error: {e}")
+        _chat_fallbacks = fallbacks
+    return _chat_fallbacks
+
+
+def get_llm_client(config, response_cache=False):
+    """
+    获取配置对应的可复用LLM客户端（同一提供商、地址和密钥共享连接池）
+    
+    配置了备用提供商（settings.CHAT_FAILOVER）时返回故障转移客户端：用户选择的模型优先，
+    限流、过载、超时、连接失败或熔断时转移到备用提供商（密钥无效、上下文过长等请求错误不转移）；response_cache 为 True 且启用了问答响应缓存时，返回带缓存的客户端
+    """
+    provider = config.provider.lower()
+    client = get_client(
+        CHAT_PROVIDER_MAP.get(provider, provider),
+        config.api_key,
+        base_url=config.api_base or None,
+        model=config.model_name
+    )
+    fallbacks = [member for member in get_chat_fallbacks() if member != (client, config.model_name)]
+    if fallbacks:
+        options = getattr(settings, 'CHAT_FAILOVER', None) or {}
+        client = FailoverLLMClient(
+            [(client, config.model_name)] + fallbacks,
+            hedge=options.get('hedge', False),
+            hedge_delay=options.get('hedge_delay', 10.0),
+            min_hedge_delay=options.get('min_hedge_delay', 1.0)
+        )
+    cache = get_chat_response_cache() if response_cache else None
+    return CachedLLMClient(client, cache=cache) if cache is not None else client
+
+
+def call_gemini_api(config, messages):
+    """调用Gemini generateContent接口（不支持流式），返回完整文本"""
+    request_data = {
+        'contents': [
+            {
+                'parts': [{'text': msg['content']}],
+                'role': 'user' if msg['role'] == 'user' else 'model'
+            } for msg in messages
+        ]
+    }
+    endpoint = f"{config.api_base}/models/{config.model_name}:generateContent"
+    response = _gemini_session.post(
+        endpoint, params={'key': config.api_key}, json=request_data, timeout=60
+    )
     
     if response.status_code != 200:
         raise Exception(f"API request failed: {response.status_code} - {response.text}")
     
-    # 流式解析
-    for line in response.iter_lines():
-        if not line:
-            continue
-        
-        line = line.decode('utf-8')
-        
-        # 跳过非数据行
-        if not line.startswith('data: '):
-            continue
-        
-        data_str = line[6:]  # 移除 "data: " 前缀
-        
-        # 检查流结束标记
-        if data_str.strip() == '[DONE]':
-            break
-        
-        try:
-            data = json.loads(data_str)
-            
-            # 解析不同provider的流式响应
-            if provider == 'claude':
-                if data.get('type') == 'content_block_delta':
-                    delta = data.get('delta', {})
-                    if delta.get('type') == 'text_delta':
-                        text = delta.get('text', '')
-                        if text:
-                            yield text
-            elif provider == 'gemini':
-                # Gemini不支持流式，直接返回完整结果
-                text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                if text:
-                    yield text
-                    break
-            else:
-                # OpenAI-compatible format
-                choices = data.get('choices', [])
-                if choices:
-                    delta = choices[0].get('delta', {})
-                    content = delta.get('content', '')
-                    if content:
-                        yield content
-        except json.JSONDecodeError:
-            continue
-
-
-def call_llm_api(config, messages):
-    """调用LLM API进行翻译（非流式）"""
-    if not config:
-        raise Exception("No AI model configured")
-    
-    api_base = config.api_base
-    api_key = config.api_key
-    model = config.model_name
+    result = response.json()
+    return result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+
+
+def _cache_kwargs(client, use_cache):
+    """带缓存的客户端才接受 use_cache 参数"""
+    return {'use_cache': use_cache} if isinstance(client, CachedLLMClient) else {}
+
+
+def message_metadata(started, first_chunk_at, llm_metrics, **extra):
+    """
+    助手消息的元数据
     
-    # 构建API请求
-    headers = {
-        'Content-Type': 'application/json',
+    ttft / latency 为服务端测得的首段输出延迟和总耗时（秒，含检索等准备工作之后的全部等待）；
+    llm 为提供商调用的遥测（token 数、输出速度、估算费用），命中缓存或不支持的提供商时为 None
+    """
+    return {
+        'ttft': round(first_chunk_at - started, 3) if first_chunk_at is not None else None,
+        'latency': round(time.monotonic() - started, 3),
+        'llm': llm_metrics or None,
+        **extra,
     }
+
+
+def _record_served_by(served_by, response):
+    """把实际返回结果的提供商写入调用方传入的字典（未配置备用提供商时 provider 为 None）"""
+    if served_by is not None and 'provider' not in served_by:
+        served_by['provider'] = response.get('provider')
+        served_by['fallback'] = response.get('fallback', False)
+
+
+def call_llm_api_stream(config, messages, response_cache=False, use_cache=True, metrics=None, served_by=None):
+    """
+    调用LLM API进行流式响应，逐段返回文本
     
-    # 根据不同的provider设置不同的header
-    provider = config.provider.lower()
-    if provider in ['gpt', 'openai', 'qwen', 'deepseek', 'grok', 'doubao']:
-        headers['Authorization'] = f'Bearer {api_key}'
-    elif provider == 'claude':
-        headers['x-api-key'] = api_key
-        headers['anthropic-version'] = '2023-06-01'
-    elif provider == 'gemini':
-        # Gemini uses API key in URL
-        pass
-    
-    # 构建请求body
-    if provider == 'claude':
-        # Claude API format
-        request_data = {
-            'model': model,
-            'messages': messages,
-            'max_tokens': 4096,
-        }
-        endpoint = f"{api_base}/messages"
-    elif provider == 'gemini':
-        # Gemini API format
-        request_data = {
-            'contents': [
-                {
-                    'parts': [{'text': msg['content']}],
-                    'role': 'user' if msg['role'] == 'user' else 'model'
-                } for msg in messages
-            ]
-        }
-        endpoint = f"{api_base}/models/{model}:generateContent?key={api_key}"
-    else:
-        # OpenAI-compatible format (GPT, Qwen, DeepSeek, Grok, Doubao)
-        request_data = {
-            'model': model,
-            'messages': messages,
-            'temperature': 0.3,
-            'max_tokens': 4096,
-        }
-        endpoint = f"{api_base}/chat/completions"
-    
-    # 发送请求
-    response = requests.post(endpoint, headers=headers, json=request_data, timeout=30)
+    response_cache: 是否使用问答响应缓存（需启用 CHAT_RESPONSE_CACHE）
+    use_cache: 为 False 时本次调用跳过缓存
+    metrics: 传入字典时，流结束后写入本次LLM调用的遥测（首 token 延迟、token 数、费用等；命中缓存时不写入）
+    served_by: 传入字典时写入实际返回结果的提供商 {'provider': ..., 'fallback': 是否为备用提供商}，
+               结果按用户模型缓存前需要检查 fallback
+    """
+    if not config:
+        raise Exception("No AI model configured")
     
-    if response.status_code != 200:
-        raise Exception(f"API request failed: {response.status_code} - {response.text}")
+    if config.provider.lower() == 'gemini':
+        # Gemini不支持流式，直接返回完整结果
+        text = call_gemini_api(config, messages)
+        if text:
+            yield text
+        return
     
-    result = response.json()
+    client = get_llm_client(config, response_cache)
+    stream = client.chat_completion_stream(
+        messages, model=config.model_name, **CHAT_LLM_PARAMS, **_cache_kwargs(client, use_cache)
+    )
+    for chunk in stream:
+        _record_served_by(served_by, chunk)
+        if chunk['content']:
+            yield chunk['content']
+        elif chunk.get('metrics') and metrics is not None:
+            metrics.update(chunk['metrics'])
+
+
+def call_llm_api(config, messages, response_cache=False, use_cache=True, metrics=None, served_by=None):
+    """调用LLM API（非流式），参数同 call_llm_api_stream"""
+    if not config:
+        raise Exception("No AI model configured")
     
-    # 解析响应
-    if provider == 'claude':
-        translated_text = result.get('content', [{}])[0].get('text', '')
-    elif provider == 'gemini':
-        translated_text = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-    else:
-        # OpenAI-compatible format
-        translated_text = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+    if config.provider.lower() == 'gemini':
+        return call_gemini_api(config, messages)
     
-    return translated_text
+    client = get_llm_client(config, response_cache)
+    response = client.chat_completion(
+        messages, model=config.model_name, **CHAT_LLM_PARAMS, **_cache_kwargs(client, use_cache)
+    )
+    if response.get('metrics') and metrics is not None:
+        metrics.update(response['metrics'])
+    _record_served_by(served_by, response)
+    return response.get('content') or ''
 
 
 @csrf_exempt
@@ -248,20 +375,20 @@ def translate_text(request):
                 'error': 'No AI model configured. Please configure an AI model first.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 获取目标语言名称
-        target_lang_name = LANGUAGE_NAMES.get(target_lang, target_lang)
-        
         # 构建翻译prompt
-        system_message = f"You are a professional translator. Translate the given text to {target_lang_name}. Only return the translated text, no explanations."
-        user_message = f"Translate the following text to {target_lang_name}:\n\n{text}"
-        
-        messages = [
-            {'role': 'system', 'content': system_message},
-            {'role': 'user', 'content': user_message}
-        ]
-        
-        # 调用LLM API
-        translated_text = call_llm_api(config, messages)
+        messages = build_translation_messages(text, target_lang)
+        
+        # 相同原文、目标语言和模型的翻译直接使用缓存
+        model_used = f"{config.provider}/{config.model_name}"
+        cache_model = translation_cache_model(config)
+        translated_text = translation_cache.get(text, target_lang, cache_model)
+        cached = translated_text is not None
+        if not cached:
+            # 调用LLM API；备用提供商的译文不按用户的模型缓存
+            served_by = {}
+            translated_text = call_llm_api(config, messages, served_by=served_by)
+            if not served_by.get('fallback'):
+                translation_cache.put(text, target_lang, cache_model, translated_text)
         
         return Response({
             'success': True,
@@ -269,7 +396,8 @@ def translate_text(request):
                 'original_text': text,
                 'translated_text': translated_text,
                 'target_lang': target_lang,
-                'model_used': f"{config.provider}/{config.model_name}"
+                'model_used': model_used,
+                'cached': cached
             }
         })
         
@@ -304,16 +432,13 @@ def chat_with_text(request):
                 'error': 'No AI model configured. Please configure an AI model first.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 如果有上下文文本，在系统消息中添加
-        if context_text:
-            system_message = f"You are a helpful AI assistant. The user has selected the following text from a document:\n\n{context_text}\n\nPlease help answer questions about this text."
-            # 在messages前面插入system message
-            full_messages = [{'role': 'system', 'content': system_message}] + messages
-        else:
-            full_messages = messages
+        # 如果有上下文文本或论文URL，在系统消息中添加原文和检索到的片段；历史消息和原文按 token 预算裁剪
+        full_messages, _ = build_chat_messages(config, messages, context_text, data.get('pdf_url', ''))
         
-        # 调用LLM API
-        response_text = call_llm_api(config, full_messages)
+        # 调用LLM API（同一上下文中的相同或近似问题可命中响应缓存，no_cache 跳过缓存）
+        response_text = call_llm_api(
+            config, full_messages, response_cache=True, use_cache=not data.get('no_cache', False)
+        )
         
         return Response({
             'success': True,
@@ -351,25 +476,38 @@ def translate_stream(request):
         if not config:
             return StreamingHttpResponse('{"error": "No AI model configured"}', status=400)
         
-        target_lang_name = LANGUAGE_NAMES.get(target_lang, target_lang)
-        system_message = f"You are a professional translator. Translate the given text to {target_lang_name}. Only return the translated text, no explanations."
-        user_message = f"Translate the following text to {target_lang_name}:\n\n{text}"
+        messages = build_translation_messages(text, target_lang)
         
-        messages = [
-            {'role': 'system', 'content': system_message},
-            {'role': 'user', 'content': user_message}
-        ]
+        model_used = f"{config.provider}/{config.model_name}"
+        cache_model = translation_cache_model(config)
+        cached_translation = translation_cache.get(text, target_lang, cache_model)
         
         def event_stream():
             full_response = ""
             try:
                 # 发送开始事件
-                yield f"data: {json.dumps({'type': 'start', 'model': f'{config.provider}/{config.model_name}'})}\n\n"
+                yield f"data: {json.dumps({'type': 'start', 'model': model_used, 'cached': cached_translation is not None})}\n\n"
                 
-                # 流式输出翻译结果
-                for chunk in call_llm_api_stream(config, messages):
+                # 流式输出翻译结果（命中缓存时一次性回放）
+                llm_metrics = {}
+                served_by = {}
+                started, first_chunk_at = time.monotonic(), None
+                if cached_translation is not None:
+                    chunks = replay_chunks(cached_translation)
+                else:
+                    chunks = call_llm_api_stream(config, messages, metrics=llm_metrics, served_by=served_by)
+                for chunk in chunks:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
                     full_response += chunk
                     yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
+                metadata = message_metadata(
+                    started, first_chunk_at, llm_metrics, cached=cached_translation is not None
+                )
+                
+                # 备用提供商的译文不按用户的模型缓存
+                if cached_translation is None and not served_by.get('fallback'):
+                    translation_cache.put(text, target_lang, cache_model, full_response)
                 
                 # 保存会话和消息
                 user = request.user if request.user.is_authenticated else None
@@ -406,7 +544,8 @@ def translate_stream(request):
                 ChatMessage.objects.create(
                     session=session,
                     role='assistant',
-                    content=full_response
+                    content=full_response,
+                    metadata=metadata
                 )
                 
                 # 更新会话统计
@@ -415,7 +554,7 @@ def translate_stream(request):
                 session.save()
                 
                 # 发送结束事件
-                yield f"data: {json.dumps({'type': 'done', 'session_id': session.id})}\n\n"
+                yield f"data: {json.dumps({'type': 'done', 'session_id': session.id, 'metrics': metadata})}\n\n"
                 
             except Exception as e:
                 yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
@@ -455,21 +594,26 @@ def chat_stream(request):
         if not config:
             return StreamingHttpResponse('{"error": "No AI model configured"}', status=400)
         
-        # 构建完整消息列表
-        if context_text:
-            system_message = f"You are a helpful AI assistant. The user has selected the following text from a document:\n\n{context_text}\n\nPlease help answer questions about this text."
-            full_messages = [{'role': 'system', 'content': system_message}] + messages
-        else:
-            full_messages = messages
+        # 构建完整消息列表（历史消息和原文按 token 预算裁剪，提示词长度不随对话轮数增长）
+        full_messages, window_stats = build_chat_messages(config, messages, context_text, data.get('pdf_url', ''))
         
         def event_stream():
             full_response = ""
             try:
-                yield f"data: {json.dumps({'type': 'start', 'model': f'{config.provider}/{config.model_name}'})}\n\n"
+                yield f"data: {json.dumps({'type': 'start', 'model': f'{config.provider}/{config.model_name}', 'context': window_stats})}\n\n"
                 
-                for chunk in call_llm_api_stream(config, full_messages):
+                llm_metrics = {}
+                started, first_chunk_at = time.monotonic(), None
+                chunks = call_llm_api_stream(
+                    config, full_messages, response_cache=True, use_cache=not data.get('no_cache', False),
+                    metrics=llm_metrics
+                )
+                for chunk in chunks:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
                     full_response += chunk
                     yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
+                metadata = message_metadata(started, first_chunk_at, llm_metrics, context=window_stats)
                 
                 # 保存会话和消息
                 user = request.user if request.user.is_authenticated else None
@@ -511,18 +655,19 @@ def chat_stream(request):
                         content=last_user_message['content']
                     )
                 
-                # 保存AI回复
+                # 保存AI回复（附带耗时、token 数和估算费用）
                 ChatMessage.objects.create(
                     session=session,
                     role='assistant',
-                    content=full_response
+                    content=full_response,
+                    metadata=metadata
                 )
                 
                 session.message_count = session.messages.count()
                 session.last_message_at = timezone.now()
                 session.save()
                 
-                yield f"data: {json.dumps({'type': 'done', 'session_id': session.id})}\n\n"
+                yield f"data: {json.dumps({'type': 'done', 'session_id': session.id, 'metrics': metadata})}\n\n"
                 
             except Exception as e:
                 yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
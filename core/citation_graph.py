@@ -0,0 +1,423 @@
+"""
+论文引用图
+1. CitationResolver：把参考文献按 arXiv ID、DOI、标准化标题（可选标题模糊匹配，见 core.title_index）
+   批量匹配到本地论文，物化为引用边表（ArxivCitation）
+2. CitationGraph：把引用边导出为 CSR 邻接文件（numpy .npy，可内存映射），
+   引用数和邻居查询都是 O(1) 的数组切片
+
+CSR 文件目录结构（节点下标即论文主键ID）：
+    out_indptr.npy   # int64，长度 num_nodes + 1
+    out_indices.npy  # int32，论文 i 引用的论文为 out_indices[out_indptr[i]:out_indptr[i+1]]
+    in_indptr.npy
+    in_indices.npy   # 引用论文 i 的论文
+    meta.json        # 节点数、边数、导出时间
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from common.db_utils import iter_batches, keyset_iterator
+from core.arxiv_models import ArxivCitation, ArxivPaper, ArxivPaperReference
+
+
+# 匹配方式按可靠程度排列，同一对论文有多条参考文献匹配时保留最可靠的
+MATCH_METHODS = ('arxiv_id', 'doi', 'title', 'fuzzy')
+
+# arXiv 为论文分配的 DOI 前缀（10.48550/arXiv.2301.12345）
+ARXIV_DOI_PREFIX = '10.48550/arxiv.'
+
+_ARXIV_ID_PATTERN = re.compile(
+    r'(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?',
+    re.IGNORECASE
+)
+_DOI_PREFIX_PATTERN = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+
+
+def normalize_arxiv_id(value: Optional[str]) -> Optional[str]:
+    """标准化 arXiv ID：去掉 arXiv: 前缀、URL 和版本号，如 'arXiv:2301.12345v2' -> '2301.12345'"""
+    if not value:
+        return None
+    match = _ARXIV_ID_PATTERN.search(value.strip())
+    return match.group(1).lower() if match else None
+
+
+def normalize_doi(value: Optional[str]) -> Optional[str]:
+    """标准化 DOI：去掉 doi.org 链接和 doi: 前缀并转为小写"""
+    if not value:
+        return None
+    doi = _DOI_PREFIX_PATTERN.sub('', value.strip()).strip().rstrip('.').lower()
+    return doi if doi.startswith('10.') else None
+
+
+def normalize_title(value: Optional[str]) -> str:
+    """标准化标题：兼容字符分解、转小写，只保留字母和数字并压缩空白"""
+    if not value:
+        return ''
+    text = unicodedata.normalize('NFKD', value)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def title_key(value: Optional[str], min_length: int = 20) -> Optional[int]:
+    """
+    标准化标题的 64 位哈希（用作内存索引的键，比保存标题字符串省内存）
+
+    Returns:
+        标题过短（容易误匹配）时返回 None
+    """
+    title = normalize_title(value)
+    if len(title) < min_length:
+        return None
+    return int.from_bytes(hashlib.blake2b(title.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class CitationResolver:
+    """把参考文献匹配到本地论文并写入 ArxivCitation"""
+
+    # 标准化标题对应多篇论文时的标记，不参与匹配
+    AMBIGUOUS = -1
+
+    def __init__(
+        self,
+        min_title_length: int = 20,
+        title_index=None,
+        fuzzy_threshold: float = 0.9,
+        log: Callable[[str], None] = print
+    ):
+        """
+        初始化匹配器
+
+        Args:
+            min_title_length: 参与标题匹配的标准化标题最短长度
+            title_index: 标题模糊匹配索引（core.title_index.TitleIndex），为空时只做精确匹配
+            fuzzy_threshold: 模糊匹配的标题相似度阈值
+            log: 输出进度信息的函数
+        """
+        self.min_title_length = min_title_length
+        self.title_index = title_index
+        self.fuzzy_threshold = fuzzy_threshold
+        self.log = log
+        self.by_arxiv_id: Dict[str, int] = {}
+        self.by_doi: Dict[str, int] = {}
+        self.by_title: Dict[int, int] = {}
+
+    def build_index(self) -> int:
+        """
+        流式读取全部本地论文，建立 arXiv ID / DOI / 标题 -> 论文ID 的内存索引
+
+        Returns:
+            索引的论文数量
+        """
+        count = 0
+        papers = keyset_iterator(ArxivPaper.objects.only('id', 'arxiv_id', 'doi', 'title'), order_by=('id',), chunk_size=2000)
+        for paper in papers:
+            count += 1
+            arxiv_id = normalize_arxiv_id(paper.arxiv_id)
+            if arxiv_id:
+                self.by_arxiv_id[arxiv_id] = paper.id
+            doi = normalize_doi(paper.doi)
+            if doi:
+                self.by_doi[doi] = paper.id
+            key = title_key(paper.title, self.min_title_length)
+            if key is not None:
+                existing = self.by_title.get(key)
+                self.by_title[key] = paper.id if existing in (None, paper.id) else self.AMBIGUOUS
+            if self.title_index is not None:
+                self.title_index.add(paper.id, paper.title)
+
+        self.log(
+            f'  ℹ️  索引 {count} 篇本地论文（arXiv ID {len(self.by_arxiv_id)}，'
+            f'DOI {len(self.by_doi)}，标题 {len(self.by_title)}'
+            + (f'，模糊标题 {len(self.title_index)}' if self.title_index is not None else '') + '）'
+        )
+        return count
+
+    def match(
+        self,
+        arxiv_id: Optional[str],
+        doi: Optional[str],
+        title: Optional[str]
+    ) -> Optional[Tuple[int, str, float]]:
+        """
+        匹配单条参考文献
+
+        Returns:
+            (论文ID, 匹配方式, 置信度)；精确匹配的置信度为 1，模糊匹配为标题相似度；未匹配时返回 None
+        """
+        normalized_id = normalize_arxiv_id(arxiv_id)
+        if normalized_id and normalized_id in self.by_arxiv_id:
+            return self.by_arxiv_id[normalized_id], 'arxiv_id', 1.0
+
+        normalized_doi = normalize_doi(doi)
+        if normalized_doi:
+            if normalized_doi.startswith(ARXIV_DOI_PREFIX):
+                paper_id = self.by_arxiv_id.get(normalize_arxiv_id(normalized_doi[len(ARXIV_DOI_PREFIX):]))
+                if paper_id is not None:
+                    return paper_id, 'arxiv_id', 1.0
+            if normalized_doi in self.by_doi:
+                return self.by_doi[normalized_doi], 'doi', 1.0
+
+        key = title_key(title, self.min_title_length)
+        paper_id = self.by_title.get(key) if key is not None else None
+        if paper_id is not None and paper_id != self.AMBIGUOUS:
+            return paper_id, 'title', 1.0
+        if paper_id is None and self.title_index is not None:
+            # 标准化标题完全相同但对应多篇论文时，模糊匹配也无法区分
+            fuzzy = self.title_index.match(title, self.fuzzy_threshold)
+            if fuzzy is not None:
+                return fuzzy[0], 'fuzzy', fuzzy[1]
+        return None
+
+    def resolve(self, paper_ids: List[int]) -> List[ArxivCitation]:
+        """
+        匹配一批施引论文的全部参考文献
+
+        Args:
+            paper_ids: 施引论文ID
+
+        Returns:
+            去重后的引用边（不含自引）
+        """
+        edges: Dict[Tuple[int, int], Tuple[str, float]] = {}
+        references = ArxivPaperReference.objects.filter(paper_id__in=paper_ids).values_list(
+            'paper_id', 'arxiv_id', 'doi', 'title'
+        )
+        for citing_id, arxiv_id, doi, title in references:
+            matched = self.match(arxiv_id, doi, title)
+            if matched is None or matched[0] == citing_id:
+                continue
+            cited_id, method, confidence = matched
+            rank = (MATCH_METHODS.index(method), -confidence)
+            previous = edges.get((citing_id, cited_id))
+            if previous is None or rank < (MATCH_METHODS.index(previous[0]), -previous[1]):
+                edges[(citing_id, cited_id)] = (method, confidence)
+
+        return [
+            ArxivCitation(citing_id=citing_id, cited_id=cited_id, match_method=method, confidence_score=confidence)
+            for (citing_id, cited_id), (method, confidence) in edges.items()
+        ]
+
+    def run(self, papers=None, batch_size: int = 500) -> Dict[str, int]:
+        """
+        重新计算施引论文的引用边（按批替换，可重复执行）
+
+        Args:
+            papers: 施引论文查询集，默认为全部有参考文献或已有引用边的论文
+                （参考文献被清空的论文也会被处理，以删除其旧引用边）
+            batch_size: 每批处理的施引论文数量
+
+        Returns:
+            统计信息 {'papers': 处理的论文数, 'edges': 写入的引用边数}
+        """
+        if not self.by_arxiv_id and not self.by_doi and not self.by_title:
+            self.build_index()
+
+        queryset = (papers if papers is not None else ArxivPaper.objects.all()).filter(
+            Exists(ArxivPaperReference.objects.filter(paper_id=OuterRef('id')))
+            | Exists(ArxivCitation.objects.filter(citing_id=OuterRef('id')))
+        )
+        stats = {'papers': 0, 'edges': 0}
+        ids = keyset_iterator(queryset.only('id'), order_by=('id',), chunk_size=batch_size)
+
+        for batch in iter_batches((paper.id for paper in ids), batch_size):
+            edges = self.resolve(batch)
+            with transaction.atomic():
+                ArxivCitation.objects.filter(citing_id__in=batch).delete()
+                ArxivCitation.objects.bulk_create(edges, batch_size=1000)
+            stats['papers'] += len(batch)
+            stats['edges'] += len(edges)
+            self.log(f'  ✅ 已处理 {stats["papers"]} 篇施引论文，引用边 {stats["edges"]} 条')
+
+        return stats
+
+
+class CitationGraph:
+    """CSR 格式的引用图（节点下标为论文主键ID）"""
+
+    ARRAYS = ('out_indptr', 'out_indices', 'in_indptr', 'in_indices')
+
+    def __init__(self, out_indptr: np.ndarray, out_indices: np.ndarray, in_indptr: np.ndarray, in_indices: np.ndarray):
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+
+    @staticmethod
+    def default_path() -> Path:
+        base_dir = getattr(settings, 'BASE_DIR', Path.cwd())
+        return Path(base_dir) / 'data' / 'citation_graph'
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.out_indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.out_indices)
+
+    @staticmethod
+    def _csr(sources: np.ndarray, targets: np.ndarray, num_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return indptr, targets[order].astype(np.int32)
+
+    @classmethod
+    def from_edges(cls, citing: np.ndarray, cited: np.ndarray, num_nodes: Optional[int] = None) -> 'CitationGraph':
+        """
+        从引用边数组构建
+
+        Args:
+            citing: 施引论文ID数组
+            cited: 被引论文ID数组
+            num_nodes: 节点数（最大论文ID + 1），默认按边中的最大ID计算
+        """
+        citing = np.asarray(citing, dtype=np.int64)
+        cited = np.asarray(cited, dtype=np.int64)
+        if num_nodes is None:
+            num_nodes = int(max(citing.max(initial=-1), cited.max(initial=-1))) + 1
+        out_indptr, out_indices = cls._csr(citing, cited, num_nodes)
+        in_indptr, in_indices = cls._csr(cited, citing, num_nodes)
+        return cls(out_indptr, out_indices, in_indptr, in_indices)
+
+    @classmethod
+    def from_database(cls, chunk_size: int = 10000) -> 'CitationGraph':
+        """从 ArxivCitation 表构建（节点数覆盖全部本地论文）"""
+        rows = ArxivCitation.objects.values_list('citing_id', 'cited_id').order_by().iterator(chunk_size=chunk_size)
+        pairs = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+        max_id = ArxivPaper.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        return cls.from_edges(pairs[:, 0], pairs[:, 1], num_nodes=max_id + 1)
+
+    def save(self, path: Optional[str] = None) -> Path:
+        """
+        保存为 .npy 文件（先写临时文件再替换，读取方不会看到写了一半的文件）
+
+        Returns:
+            保存的目录
+        """
+        path = Path(path) if path else self.default_path()
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            tmp_path = path / f'{name}.tmp.npy'
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, path / f'{name}.npy')
+
+        meta = {
+            'num_nodes': self.num_nodes,
+            'num_edges': self.num_edges,
+            'exported_at': timezone.now().isoformat(),
+        }
+        with open(path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, mmap: bool = True) -> 'CitationGraph':
+        """
+        加载 CSR 文件
+
+        Args:
+            path: 目录，默认为 data/citation_graph
+            mmap: 是否内存映射（多进程共享页缓存，加载耗时与图大小无关）
+        """
+        path = Path(path) if path else cls.default_path()
+        mmap_mode = 'r' if mmap else None
+        return cls(*(np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in cls.ARRAYS))
+
+    def _neighbors(self, indptr: np.ndarray, indices: np.ndarray, paper_id: int) -> np.ndarray:
+        if paper_id < 0 or paper_id >= self.num_nodes:
+            # 导出之后新增的论文
+            return indices[:0]
+        return indices[indptr[paper_id]:indptr[paper_id + 1]]
+
+    def references(self, paper_id: int) -> np.ndarray:
+        """论文引用的本地论文ID"""
+        return self._neighbors(self.out_indptr, self.out_indices, paper_id)
+
+    def cited_by(self, paper_id: int) -> np.ndarray:
+        """引用该论文的本地论文ID"""
+        return self._neighbors(self.in_indptr, self.in_indices, paper_id)
+
+    def citation_count(self, paper_id: int) -> int:
+        """被本地论文引用的次数"""
+        return len(self.cited_by(paper_id))
+
+    def reference_count(self, paper_id: int) -> int:
+        """引用的本地论文数量"""
+        return len(self.references(paper_id))
+
+    def citation_counts(self) -> np.ndarray:
+        """全部论文的被引次数（下标为论文ID）"""
+        return np.diff(self.in_indptr)
+
+    def edge_sources(self) -> np.ndarray:
+        """与 out_indices 对齐的施引论文ID数组"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.out_indptr))
+
+    def pagerank(
+        self,
+        valid: Optional[np.ndarray] = None,
+        damping: float = 0.85,
+        tol: float = 1e-10,
+        max_iter: int = 100
+    ) -> np.ndarray:
+        """
+        幂迭代计算 PageRank（每轮一次按边的 bincount，向量化，不逐节点循环）
+
+        Args:
+            valid: 布尔数组，标记存在的论文ID（主键有空洞时，空洞不参与随机跳转）
+            damping: 阻尼系数
+            tol: 两轮结果的 L1 差小于该值时停止
+            max_iter: 最大迭代轮数
+
+        Returns:
+            下标为论文ID的 PageRank 数组（存在的论文之和为 1）
+        """
+        num_nodes = self.num_nodes
+        valid = np.ones(num_nodes, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+        if not valid.any():
+            return np.zeros(num_nodes)
+
+        teleport = valid / valid.sum()
+        out_degree = np.diff(self.out_indptr)
+        inv_degree = np.divide(1.0, out_degree, out=np.zeros(num_nodes), where=out_degree > 0)
+        # 没有引用本地论文的论文，其分数按随机跳转分配
+        dangling = valid & (out_degree == 0)
+        sources = self.edge_sources()
+
+        rank = teleport
+        for _ in range(max_iter):
+            flow = np.bincount(self.out_indices, weights=(rank * inv_degree)[sources], minlength=num_nodes)
+            updated = damping * flow + (damping * rank[dangling].sum() + 1 - damping) * teleport
+            converged = np.abs(updated - rank).sum() < tol
+            rank = updated
+            if converged:
+                break
+        return rank
+
+    def decayed_citation_counts(self, timestamps: np.ndarray, now: float, half_life_days: float = 365.0) -> np.ndarray:
+        """
+        时间衰减的被引次数：每条引用按施引论文发布时间加权，发布越早权重越低
+
+        Args:
+            timestamps: 下标为论文ID的发布时间（Unix 秒）
+            now: 当前时间（Unix 秒）
+            half_life_days: 半衰期（天），发布于该时长之前的论文的一次引用权重为 0.5
+
+        Returns:
+            下标为论文ID的分数数组
+        """
+        ages = np.maximum(now - timestamps[self.edge_sources()], 0) / 86400.0
+        weights = np.power(0.5, ages / half_life_days)
+        return np.bincount(self.out_indices, weights=weights, minlength=self.num_nodes)
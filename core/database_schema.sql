@@ -169,8 +169,7 @@ CREATE TABLE `arxiv_reference_extract_log` (
     `pdf_file_size` INT NULL COMMENT 'PDF文件大小（字节）',
     `text_extracted` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '文本是否成功提取',
     `reference_section_found` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否找到参考文献部分',
-    `reference_raw_text` MEDIUMTEXT NULL COMMENT '从PDF中提取的参考文献部分的原始文本',
-    `reference_text_length` INT NULL COMMENT '参考文献原始文本的字符数',
+    `reference_text_length` INT NULL COMMENT '参考文献原始文本的字符数（为 0 或空表示没有原始文本）',
     `llm_processed` TINYINT(1) NOT NULL DEFAULT 0 COMMENT 'LLM是否成功处理',
     
     -- 错误信息
@@ -180,8 +179,6 @@ CREATE TABLE `arxiv_reference_extract_log` (
     -- 处理详情
     `processing_details` JSON NULL COMMENT '处理过程中的详细信息（JSON格式）',
     
-    `llm_response` MEDIUMTEXT NULL COMMENT 'LLM返回的原始响应内容（用于调试）',
-    
     -- 时间信息
     `started_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '开始时间',
     `completed_at` DATETIME NULL COMMENT '完成时间',
@@ -200,6 +197,116 @@ CREATE TABLE `arxiv_reference_extract_log` (
     INDEX `idx_started_at` (`started_at` DESC)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv参考文献提取日志表';
 
+-- ============================================================
+-- 表5: ArXiv参考文献提取日志大文本表 (arxiv_reference_extract_blob)
+-- 压缩存放提取日志的参考文献原始文本和LLM原始响应（common.compression_utils 格式）
+-- ============================================================
+CREATE TABLE `arxiv_reference_extract_blob` (
+    `log_id` INT NOT NULL PRIMARY KEY COMMENT '提取日志ID',
+    `reference_raw_text` LONGBLOB NULL COMMENT '压缩后的参考文献原始文本',
+    `llm_response` LONGBLOB NULL COMMENT '压缩后的LLM原始响应',
+    
+    -- 外键约束
+    FOREIGN KEY (`log_id`) REFERENCES `arxiv_reference_extract_log`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv参考文献提取日志大文本表';
+
+-- ============================================================
+-- 表6: ArXiv参考文献批量解析任务表 (arxiv_reference_batch_job)
+-- 记录提交到LLM批量接口的参考文献解析任务
+-- ============================================================
+CREATE TABLE `arxiv_reference_batch_job` (
+    -- 主键
+    `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增主键',
+    
+    -- 批次信息
+    `batch_id` VARCHAR(100) NOT NULL UNIQUE COMMENT 'LLM提供商返回的批次ID',
+    `provider` VARCHAR(50) NOT NULL COMMENT 'LLM提供商',
+    `model` VARCHAR(100) NULL COMMENT '模型名称',
+    `status` VARCHAR(20) NOT NULL DEFAULT 'in_progress' COMMENT '状态: in_progress/completed/collected/failed/expired/cancelled',
+    
+    -- 请求统计
+    `request_count` INT NOT NULL DEFAULT 0 COMMENT '批次中的请求数（一篇论文的参考文献可能分成多块）',
+    `succeeded_count` INT NOT NULL DEFAULT 0 COMMENT '成功请求数',
+    `failed_count` INT NOT NULL DEFAULT 0 COMMENT '失败请求数',
+    
+    -- 关联与参数
+    `log_ids` JSON NOT NULL COMMENT '批次包含的 ArxivReferenceExtractLog ID',
+    `options` JSON NOT NULL COMMENT '提交时的解析参数（分块大小、规则解析阈值等），回收结果时按相同参数合并',
+    `input_file_path` VARCHAR(500) NULL COMMENT '本地保存的批次输入JSONL文件',
+    `error_message` TEXT NULL COMMENT '错误信息',
+    
+    -- 时间信息
+    `submitted_at` DATETIME(6) NOT NULL COMMENT '提交时间',
+    `completed_at` DATETIME(6) NULL COMMENT '完成时间',
+    `collected_at` DATETIME(6) NULL COMMENT '结果回收时间',
+    
+    -- 索引
+    INDEX `idx_status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv参考文献批量解析任务表';
+
+-- ============================================================
+-- 表7: ArXiv论文处理租约表 (arxiv_paper_lease)
+-- 多个进程并行处理时，按 (论文, 阶段) 认领论文，到期未续约的租约可被重新认领
+-- ============================================================
+CREATE TABLE `arxiv_paper_lease` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增主键',
+    `paper_id` INT NOT NULL COMMENT '关联的论文ID',
+    `stage` VARCHAR(20) NOT NULL COMMENT '处理阶段: extract/process',
+    `owner` VARCHAR(200) NOT NULL COMMENT '持有租约的进程标识（主机名:进程号:随机串）',
+    `claimed_at` DATETIME(6) NOT NULL COMMENT '认领时间',
+    `heartbeat_at` DATETIME(6) NOT NULL COMMENT '最近心跳时间',
+    `expires_at` DATETIME(6) NOT NULL COMMENT '到期时间',
+    `claim_count` INT NOT NULL DEFAULT 1 COMMENT '租约被认领的累计次数（大于1说明之前的持有者未完成处理）',
+    
+    -- 外键约束
+    FOREIGN KEY (`paper_id`) REFERENCES `arxiv_paper`(`id`) ON DELETE CASCADE,
+    
+    -- 唯一约束与索引
+    UNIQUE KEY `uniq_paper_stage` (`paper_id`, `stage`),
+    INDEX `idx_owner` (`owner`),
+    INDEX `idx_stage_expires` (`stage`, `expires_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv论文处理租约表';
+
+-- ============================================================
+-- 表8: ArXiv论文引用关系表 (arxiv_citation)
+-- 参考文献匹配到本地论文后形成的引用边（施引论文 -> 被引论文）
+-- ============================================================
+CREATE TABLE `arxiv_citation` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增主键',
+    `citing_id` INT NOT NULL COMMENT '施引论文ID',
+    `cited_id` INT NOT NULL COMMENT '被引论文ID',
+    `match_method` VARCHAR(10) NOT NULL COMMENT '匹配方式: arxiv_id/doi/title/fuzzy',
+    `confidence_score` DOUBLE NOT NULL DEFAULT 1.0 COMMENT '匹配的置信度（0-1），精确匹配为 1，标题模糊匹配为标题相似度',
+    
+    -- 外键约束
+    FOREIGN KEY (`citing_id`) REFERENCES `arxiv_paper`(`id`) ON DELETE CASCADE,
+    FOREIGN KEY (`cited_id`) REFERENCES `arxiv_paper`(`id`) ON DELETE CASCADE,
+    
+    -- 唯一约束与索引
+    UNIQUE KEY `uniq_citing_cited` (`citing_id`, `cited_id`),
+    INDEX `idx_cited_citing` (`cited_id`, `citing_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv论文引用关系表';
+
+-- ============================================================
+-- 表9: ArXiv论文排序分数表 (arxiv_paper_score)
+-- 由引用图计算的被引次数、PageRank 和时间衰减引用分
+-- ============================================================
+CREATE TABLE `arxiv_paper_score` (
+    `paper_id` INT NOT NULL PRIMARY KEY COMMENT '论文ID',
+    `citation_count` INT NOT NULL DEFAULT 0 COMMENT '被本地论文库中的论文引用的次数',
+    `pagerank` DOUBLE NOT NULL DEFAULT 0 COMMENT '引用图上的 PageRank（全部论文之和为 1）',
+    `decayed_score` DOUBLE NOT NULL DEFAULT 0 COMMENT '按施引论文发布时间指数衰减加权的被引次数（反映近期热度）',
+    `computed_at` DATETIME(6) NOT NULL COMMENT '计算时间',
+    
+    -- 外键约束
+    FOREIGN KEY (`paper_id`) REFERENCES `arxiv_paper`(`id`) ON DELETE CASCADE,
+    
+    -- 索引
+    INDEX `idx_citation_count` (`citation_count` DESC),
+    INDEX `idx_pagerank` (`pagerank` DESC),
+    INDEX `idx_decayed_score` (`decayed_score` DESC)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='ArXiv论文排序分数表';
+
 -- ============================================================
 -- 示例查询语句
 -- ============================================================
@@ -345,3 +452,24 @@ CREATE TABLE `ai_model_config` (
 -- WHERE is_active = 1 
 -- GROUP BY provider, model_name 
 -- ORDER BY user_count DESC;
+
+-- ============================================================
+-- 翻译缓存表 (translation_cache)
+-- 按 (标准化原文哈希, 目标语言, 模型) 缓存翻译结果，重复翻译直接返回
+-- ============================================================
+CREATE TABLE `translation_cache` (
+    `id` BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '自增主键',
+    `source_hash` VARCHAR(64) NOT NULL COMMENT '标准化原文（合并空白）的 SHA-256',
+    `target_lang` VARCHAR(20) NOT NULL COMMENT '目标语言代码',
+    `model` VARCHAR(200) NOT NULL COMMENT '翻译使用的模型（提供商/模型名）',
+    `translated_text` LONGTEXT NOT NULL COMMENT '翻译结果',
+    `hit_count` INT NOT NULL DEFAULT 0 COMMENT '命中次数',
+    `created_at` DATETIME(6) NOT NULL COMMENT '创建时间',
+    `last_used_at` DATETIME(6) NOT NULL COMMENT '最后命中或写入时间',
+    
+    UNIQUE KEY `uniq_translation_cache_key` (`source_hash`, `target_lang`, `model`),
+    INDEX `idx_last_used` (`last_used_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='翻译缓存表';
+
+-- 清理长期未使用的缓存
+-- DELETE FROM translation_cache WHERE last_used_at < DATE_SUB(NOW(), INTERVAL 180 DAY);
@@ -0,0 +1,176 @@
+"""
+参考文献提取日志的批量写入
+新日志立即插入（重试次数和"是否已有日志"的检查依赖数据库中的日志），
+处理过程中的状态变化先保存在内存中，定期以 bulk_update 批量写入，
+且只写入发生变化的列，避免高并发时逐行整行 UPDATE 成为数据库瓶颈。
+大文本字段（参考文献原始文本、LLM原始响应）同时批量写入 ArxivReferenceExtractBlob。
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from django.db import connection, transaction
+
+from core.arxiv_models import ArxivReferenceExtractBlob, ArxivReferenceExtractLog
+
+
+_MISSING = object()
+
+
+class ExtractLogWriter:
+    """ArxivReferenceExtractLog 的缓冲写入器（线程安全）"""
+
+    def __init__(self, flush_size: int = 50, flush_interval: float = 10.0, batch_size: int = 500):
+        """
+        初始化写入器
+
+        Args:
+            flush_size: 缓冲的日志数量达到该值时写入数据库
+            flush_interval: 距上次写入超过该时间（秒）时写入数据库
+            batch_size: bulk_create / bulk_update 每条 SQL 的最大行数
+        """
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._fields = [field for field in ArxivReferenceExtractLog._meta.concrete_fields if not field.primary_key]
+        # _lock 只保护缓冲区；_write_lock 保证批量写入按顺序进行（after_flush 回调执行时之前的变化都已写入）
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._updates: Dict[int, Tuple[ArxivReferenceExtractLog, set]] = {}
+        self._callbacks: List[Callable[[], None]] = []
+        self._last_flush = time.monotonic()
+
+    def _snapshot(self, log: ArxivReferenceExtractLog):
+        """记录日志当前已加载字段的值，用于之后比较哪些列发生了变化"""
+        log._write_snapshot = {field.attname: log.__dict__.get(field.attname, _MISSING) for field in self._fields}
+
+    def _changed_fields(self, log: ArxivReferenceExtractLog) -> set:
+        snapshot = getattr(log, '_write_snapshot', None)
+        changed = set()
+        for field in self._fields:
+            if field.attname not in log.__dict__:
+                # 未加载（deferred）且未赋值的字段
+                continue
+            if snapshot is None or snapshot.get(field.attname, _MISSING) != log.__dict__[field.attname]:
+                changed.add(field.name)
+        return changed
+
+    def track(self, log: ArxivReferenceExtractLog) -> ArxivReferenceExtractLog:
+        """开始跟踪从数据库读取的日志，之后 save 只写入变化的列"""
+        self._snapshot(log)
+        return log
+
+    def create(self, **fields) -> ArxivReferenceExtractLog:
+        """
+        创建日志（立即插入）
+
+        重试次数统计和"是否已有日志"的检查读取数据库，插入不能延迟
+        """
+        log = ArxivReferenceExtractLog(**fields)
+        log.save(force_insert=True)
+        self._snapshot(log)
+        self._maybe_flush()
+        return log
+
+    def save(self, log: ArxivReferenceExtractLog):
+        """记录日志的变化（在下次写入时批量更新）"""
+        if log.pk is None:
+            # 未通过 create 创建的新日志同样立即插入
+            log.save(force_insert=True)
+            self._snapshot(log)
+        else:
+            with self._lock:
+                changed = self._changed_fields(log)
+                if changed or log.__dict__.get('_blob_dirty'):
+                    # 只有大文本变化时字段集合为空，只写 ArxivReferenceExtractBlob
+                    _, fields = self._updates.setdefault(id(log), (log, set()))
+                    fields.update(changed)
+        self._maybe_flush()
+
+    def save_now(self, log: ArxivReferenceExtractLog):
+        """
+        立即写入日志的全部变化（包括缓冲中尚未写入的部分）
+
+        用于必须与其他写入同时生效的状态（如在保存参考文献的同一事务中标记完成），
+        避免进程在两次批量写入之间退出时留下已保存参考文献、但日志未完成的论文
+        """
+        with self._lock:
+            _, pending_fields = self._updates.pop(id(log), (log, set()))
+            fields = pending_fields | self._changed_fields(log)
+            self._snapshot(log)
+        if fields:
+            log.save(update_fields=sorted(fields))
+        else:
+            ArxivReferenceExtractBlob.save_for_logs([log])
+
+    def after_flush(self, callback: Callable[[], None]):
+        """注册在下次写入完成后执行的回调（如释放论文租约，保证其他进程能看到处理结果）"""
+        with self._lock:
+            self._callbacks.append(callback)
+        self._maybe_flush()
+
+    @property
+    def pending(self) -> int:
+        """缓冲中尚未写入的日志数量"""
+        with self._lock:
+            return len(self._updates)
+
+    def _maybe_flush(self):
+        if connection.in_atomic_block:
+            # 调用方的事务中不自动写入：缓冲中其他论文的变化会随该事务回滚而丢失，
+            # after_flush 回调（如释放租约）却照常执行；留到事务外的下一次 save 或 flush
+            return
+        with self._lock:
+            due = self.pending >= self.flush_size or (
+                (self.pending or self._callbacks) and time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            # 其他线程正在写入时不等待，缓冲留到下一次写入
+            self.flush(blocking=False)
+
+    def flush(self, blocking: bool = True) -> int:
+        """
+        把缓冲的日志写入数据库
+
+        在锁内取出缓冲区，在锁外写入，写入期间其他线程可以继续记录变化；
+        更新按变化的列分组，每组一条 bulk_update；写入后执行 after_flush 回调
+
+        Args:
+            blocking: 其他线程正在写入时是否等待；为 False 时直接返回 0
+
+        Returns:
+            写入的日志数量
+        """
+        if not self._write_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            with self._lock:
+                updates, self._updates = list(self._updates.values()), {}
+                callbacks, self._callbacks = self._callbacks, []
+                self._last_flush = time.monotonic()
+                # 写入前记录快照：写入期间发生的变化与快照不同，下次 save 时仍会写入
+                for log, _ in updates:
+                    self._snapshot(log)
+
+            groups: Dict[Tuple[str, ...], List[ArxivReferenceExtractLog]] = {}
+            for log, fields in updates:
+                if fields:
+                    groups.setdefault(tuple(sorted(fields)), []).append(log)
+
+            with transaction.atomic():
+                for fields, logs in groups.items():
+                    ArxivReferenceExtractLog.objects.bulk_update(logs, fields, batch_size=self.batch_size)
+                ArxivReferenceExtractBlob.save_for_logs([log for log, _ in updates])
+        finally:
+            self._write_lock.release()
+
+        for callback in callbacks:
+            callback()
+        return len(updates)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
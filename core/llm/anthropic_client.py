@@ -1,9 +1,54 @@
 """
 Anthropic Claude 客户端实现
 """
-from typing import List, Dict, Any, Generator, Optional
+from typing import List, Dict, Any, Generator, AsyncGenerator, Optional
 from .base import BaseLLMClient
 from .config import LLMProviderConfig
+from .telemetry import instrumented
+from .usage import build_usage
+
+
+# 提示词缓存断点
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+
+def split_system_messages(
+    messages: List[Dict[str, str]],
+    prompt_cache: bool = True
+) -> tuple[Optional[List[Dict[str, Any]]], List[Dict[str, str]]]:
+    """
+    把 system 消息转换为 Messages API 的 system 文本块（按原顺序，全部保留）
+
+    prompt_cache 为 True 时在第一个文本块上标记缓存断点：调用方把稳定内容（指令、选中原文）
+    放在第一条系统消息中，逐轮变化的内容（检索片段、对话摘要）放在之后，
+    后续请求即可读取缓存；低于模型最小缓存长度的前缀不会被缓存，也不额外计费
+
+    Returns:
+        (system 文本块列表，没有 system 消息时为 None, 其余消息)
+    """
+    blocks = []
+    converted_messages = []
+    for msg in messages:
+        if msg['role'] == 'system':
+            if msg['content']:
+                blocks.append({'type': 'text', 'text': msg['content']})
+        else:
+            converted_messages.append(msg)
+    if blocks and prompt_cache:
+        blocks[0]['cache_control'] = CACHE_CONTROL
+    return blocks or None, converted_messages
+
+
+def format_usage(usage) -> Dict[str, int]:
+    """统一用量字段（Anthropic 的 input_tokens 不含读取和写入缓存的部分）"""
+    cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+    cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+    return build_usage(
+        usage.input_tokens + cache_read + cache_write,
+        usage.output_tokens,
+        cache_read_tokens=cache_read,
+        cache_write_tokens=cache_write,
+    )
 
 
 class AnthropicClient(BaseLLMClient):
@@ -22,7 +67,7 @@ class AnthropicClient(BaseLLMClient):
             from anthropic import Anthropic
             self._client = Anthropic(
                 api_key=self.config.api_key,
-                base_url=self.config.base_url,
+                base_url=self._sdk_base_url(),
                 timeout=self.config.timeout,
             )
         except ImportError:
@@ -30,25 +75,65 @@ class AnthropicClient(BaseLLMClient):
                 "使用 Anthropic 需要安装 anthropic 库: pip install anthropic"
             )
     
-    def _convert_messages(
-        self, 
-        messages: List[Dict[str, str]]
-    ) -> tuple[Optional[str], List[Dict[str, str]]]:
+    def _sdk_base_url(self) -> Optional[str]:
         """
-        转换消息格式，提取 system 消息
-        Anthropic API 的 system 消息需要单独传递
+        SDK 使用的 API 地址
+        配置中的地址按 OpenAI 习惯带 /v1（如 https://api.anthropic.com/v1），SDK 会自行拼接 /v1/messages
         """
-        system_prompt = None
-        converted_messages = []
+        base_url = (self.config.base_url or '').rstrip('/')
+        if base_url.endswith('/v1'):
+            base_url = base_url[:-len('/v1')]
+        return base_url or None
+    
+    def _get_async_anthropic(self):
+        """当前事件循环中共享的 AsyncAnthropic 客户端"""
+        from anthropic import AsyncAnthropic
+        return self._get_async_client(lambda: AsyncAnthropic(
+            api_key=self.config.api_key,
+            base_url=self._sdk_base_url(),
+            timeout=self.config.timeout,
+        ))
+    
+    def _build_request(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """构建 Messages API 请求参数（同步、异步、流式调用共用）"""
+        params = self._merge_params(**kwargs)
+        
+        # 移除 max_tokens 并用 Anthropic 的参数名
+        max_tokens = params.pop('max_tokens', 4096)
+        
+        # system 消息单独传递，首条系统消息标记为可缓存前缀（prompt_cache=False 关闭）
+        system_blocks, converted_messages = split_system_messages(
+            messages, params.pop('prompt_cache', self.config.prompt_cache)
+        )
+        
+        kwargs_for_api = {
+            'model': params['model'],
+            'messages': converted_messages,
+            'max_tokens': max_tokens,
+        }
         
-        for msg in messages:
-            if msg['role'] == 'system':
-                system_prompt = msg['content']
-            else:
-                converted_messages.append(msg)
+        # 添加 system prompt
+        if system_blocks:
+            kwargs_for_api['system'] = system_blocks
         
-        return system_prompt, converted_messages
+        # 添加其他参数
+        if 'temperature' in params:
+            kwargs_for_api['temperature'] = params['temperature']
+        
+        return kwargs_for_api
+    
+    @staticmethod
+    def _format_response(response) -> Dict[str, Any]:
+        """把 SDK 响应转换为统一的响应字典"""
+        return {
+            'content': response.content[0].text,
+            'role': response.role,
+            'model': response.model,
+            'usage': format_usage(response.usage),
+            'finish_reason': response.stop_reason,
+        }
     
+    @instrumented
     def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -64,44 +149,13 @@ class AnthropicClient(BaseLLMClient):
         Returns:
             响应字典
         """
-        params = self._merge_params(**kwargs)
-        
-        # 移除 max_tokens 并用 Anthropic 的参数名
-        max_tokens = params.pop('max_tokens', 4096)
-        
-        system_prompt, converted_messages = self._convert_messages(messages)
-        
         try:
-            kwargs_for_api = {
-                'model': params['model'],
-                'messages': converted_messages,
-                'max_tokens': max_tokens,
-            }
-            
-            # 添加 system prompt
-            if system_prompt:
-                kwargs_for_api['system'] = system_prompt
-            
-            # 添加其他参数
-            if 'temperature' in params:
-                kwargs_for_api['temperature'] = params['temperature']
-            
-            response = self._client.messages.create(**kwargs_for_api)
-            
-            return {
-                'content': response.content[0].text,
-                'role': response.role,
-                'model': response.model,
-                'usage': {
-                    'prompt_tokens': response.usage.input_tokens,
-                    'completion_tokens': response.usage.output_tokens,
-                    'total_tokens': response.usage.input_tokens + response.usage.output_tokens,
-                },
-                'finish_reason': response.stop_reason,
-            }
+            response = self._client.messages.create(**self._build_request(messages, **kwargs))
+            return self._format_response(response)
         except Exception as e:
             raise RuntimeError(f"调用 Anthropic API 失败: {str(e)}") from e
     
+    @instrumented
     def chat_completion_stream(
         self,
         messages: List[Dict[str, str]],
@@ -117,24 +171,9 @@ class AnthropicClient(BaseLLMClient):
         Yields:
             响应片段字典
         """
-        params = self._merge_params(**kwargs)
-        max_tokens = params.pop('max_tokens', 4096)
-        
-        system_prompt, converted_messages = self._convert_messages(messages)
+        kwargs_for_api = self._build_request(messages, **kwargs)
         
         try:
-            kwargs_for_api = {
-                'model': params['model'],
-                'messages': converted_messages,
-                'max_tokens': max_tokens,
-            }
-            
-            if system_prompt:
-                kwargs_for_api['system'] = system_prompt
-            
-            if 'temperature' in params:
-                kwargs_for_api['temperature'] = params['temperature']
-            
             with self._client.messages.stream(**kwargs_for_api) as stream:
                 for text in stream.text_stream:
                     yield {
@@ -143,11 +182,64 @@ class AnthropicClient(BaseLLMClient):
                         'finish_reason': None,
                     }
                 
-                # 流结束
+                # 流结束（附带本次调用的用量）
+                yield {
+                    'content': '',
+                    'role': 'assistant',
+                    'finish_reason': 'stop',
+                    'usage': format_usage(stream.get_final_message().usage),
+                }
+                
+        except Exception as e:
+            raise RuntimeError(f"调用 Anthropic 流式 API 失败: {str(e)}") from e
+    
+    @instrumented
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步聊天补全（AsyncAnthropic，同一事件循环内共享连接池）
+        
+        Returns:
+            与 chat_completion 相同的响应字典
+        """
+        try:
+            response = await self._get_async_anthropic().messages.create(**self._build_request(messages, **kwargs))
+            return self._format_response(response)
+        except Exception as e:
+            raise RuntimeError(f"调用 Anthropic API 失败: {str(e)}") from e
+    
+    @instrumented
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式聊天补全
+        
+        Yields:
+            与 chat_completion_stream 相同的片段字典
+        """
+        kwargs_for_api = self._build_request(messages, **kwargs)
+        
+        try:
+            async with self._get_async_anthropic().messages.stream(**kwargs_for_api) as stream:
+                async for text in stream.text_stream:
+                    yield {
+                        'content': text,
+                        'role': 'assistant',
+                        'finish_reason': None,
+                    }
+                
+                final_message = await stream.get_final_message()
                 yield {
                     'content': '',
                     'role': 'assistant',
                     'finish_reason': 'stop',
+                    'usage': format_usage(final_message.usage),
                 }
                 
         except Exception as e:
@@ -1,12 +1,27 @@
 """
 LLM 客户端抽象基类
-定义统一的调用接口
+定义统一的调用接口（同步和异步）
 """
+import asyncio
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Generator, Union
+from typing import List, Dict, Any, Optional, Generator, AsyncGenerator, Callable, Union
 from .config import LLMProviderConfig
 
 
+# 异步 SDK 客户端（各自持有 HTTP 连接池）按事件循环共享：
+# 同一事件循环中相同提供商配置的客户端实例复用同一连接池，连接不能跨事件循环使用
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, Any]]' = weakref.WeakKeyDictionary()
+_STREAM_END = object()
+
+
+async def aclose_async_clients():
+    """关闭当前事件循环中共享的异步 SDK 客户端（释放连接池，在事件循环结束前调用）"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
 class BaseLLMClient(ABC):
     """LLM 客户端抽象基类"""
     
@@ -63,6 +78,62 @@ class BaseLLMClient(ABC):
         """
         pass
     
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        计算文本向量（提供商支持向量模型时由子类实现）
+        
+        Args:
+            texts: 文本列表
+            model: 向量模型名称（可选）
+            
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        raise NotImplementedError(f"{self.provider} 客户端不支持向量接口")
+    
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步聊天补全，返回值与 chat_completion 相同
+        
+        默认在线程池中执行同步调用；有异步 SDK 的子类应覆盖此方法，
+        在单个事件循环中并发大量请求而不占用线程
+        """
+        return await asyncio.to_thread(self.chat_completion, messages, **kwargs)
+    
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式聊天补全，片段格式与 chat_completion_stream 相同
+        
+        默认在线程池中逐个读取同步流的片段；有异步 SDK 的子类应覆盖此方法
+        """
+        iterator = iter(self.chat_completion_stream(messages, **kwargs))
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, _STREAM_END)
+            if chunk is _STREAM_END:
+                break
+            yield chunk
+    
+    def _get_async_client(self, factory: Callable[[], Any]) -> Any:
+        """
+        获取当前事件循环中共享的异步 SDK 客户端，不存在时用 factory 创建
+        
+        相同客户端类、密钥、地址和超时的实例共享同一个连接池
+        """
+        loop = asyncio.get_running_loop()
+        key = (type(self), self.config.api_key, self.config.base_url, self.config.timeout)
+        clients = _async_clients.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = factory()
+        return clients[key]
+    
     def _merge_params(self, **kwargs) -> Dict[str, Any]:
         """合并配置参数和调用参数"""
         params = {
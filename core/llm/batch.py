@@ -0,0 +1,382 @@
+"""
+LLM 批量（Batch）API 客户端
+将大量请求打包为一个异步批次提交，吞吐量更高、费用更低，适合离线的批量解析任务。
+
+支持：
+- OpenAI 及兼容 OpenAI Batch API 的提供商（上传 JSONL 文件 -> 创建批次 -> 下载结果文件）
+- Anthropic Message Batches API
+"""
+import io
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Generator, Iterable
+
+from .anthropic_client import format_usage as format_anthropic_usage, split_system_messages
+from .config import LLMConfig, LLMProviderConfig
+
+
+# 统一的批次状态
+BATCH_IN_PROGRESS = 'in_progress'
+BATCH_COMPLETED = 'completed'
+BATCH_FAILED = 'failed'
+BATCH_EXPIRED = 'expired'
+BATCH_CANCELLED = 'cancelled'
+
+# 批次已结束（不会再变化）的状态
+BATCH_FINAL_STATUSES = {BATCH_COMPLETED, BATCH_FAILED, BATCH_EXPIRED, BATCH_CANCELLED}
+
+
+@dataclass
+class BatchRequest:
+    """批次中的单个请求"""
+    custom_id: str
+    messages: List[Dict[str, str]]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    """批次中单个请求的结果"""
+    custom_id: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchStatus:
+    """批次状态"""
+    batch_id: str
+    status: str
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    raw_status: Optional[str] = None
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in BATCH_FINAL_STATUSES
+
+
+class BaseBatchClient(ABC):
+    """批量 API 客户端抽象基类"""
+
+    def __init__(self, config: LLMProviderConfig):
+        """
+        初始化批量客户端
+
+        Args:
+            config: LLM 提供商配置
+        """
+        self.config = config
+        self.provider = config.provider
+        self.model = config.model
+        self._client = None
+
+    @abstractmethod
+    def _initialize_client(self):
+        """初始化客户端实例（子类实现）"""
+        pass
+
+    @abstractmethod
+    def submit(self, requests: List[BatchRequest], jsonl_path: Optional[str] = None) -> str:
+        """
+        提交批次
+
+        Args:
+            requests: 请求列表
+            jsonl_path: 可选，本地保存一份批次输入（JSONL），便于排查和重新提交
+
+        Returns:
+            批次ID
+        """
+        pass
+
+    @abstractmethod
+    def get_status(self, batch_id: str) -> BatchStatus:
+        """查询批次状态"""
+        pass
+
+    @abstractmethod
+    def iter_results(self, batch_id: str) -> Generator[BatchResult, None, None]:
+        """逐条读取已结束批次的结果（流式读取，不一次性加载全部结果）"""
+        pass
+
+    def cancel(self, batch_id: str):
+        """取消批次（子类可选实现）"""
+        raise NotImplementedError(f"{self.provider} 批量客户端不支持取消批次")
+
+    def _merge_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """合并配置参数和请求参数"""
+        merged = {
+            'model': self.model,
+            'temperature': self.config.temperature,
+            'max_tokens': self.config.max_tokens,
+        }
+        if self.config.extra_params:
+            merged.update(self.config.extra_params)
+        merged.update(params)
+        return merged
+
+    @staticmethod
+    def _write_jsonl(lines: Iterable[Dict[str, Any]], jsonl_path: Optional[str] = None) -> bytes:
+        """序列化为 JSONL，可选同时写入本地文件"""
+        data = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines).encode('utf-8')
+        if jsonl_path:
+            path = Path(jsonl_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        return data
+
+
+class OpenAIBatchClient(BaseBatchClient):
+    """
+    OpenAI Batch API 客户端
+    也适用于兼容 OpenAI Batch API 的提供商（如 Qwen 百炼）
+    """
+
+    ENDPOINT = '/v1/chat/completions'
+
+    # OpenAI 批次状态 -> 统一状态
+    STATUS_MAP = {
+        'validating': BATCH_IN_PROGRESS,
+        'in_progress': BATCH_IN_PROGRESS,
+        'finalizing': BATCH_IN_PROGRESS,
+        'cancelling': BATCH_IN_PROGRESS,
+        'completed': BATCH_COMPLETED,
+        'failed': BATCH_FAILED,
+        'expired': BATCH_EXPIRED,
+        'cancelled': BATCH_CANCELLED,
+    }
+
+    def __init__(self, config: LLMProviderConfig):
+        super().__init__(config)
+        self._initialize_client()
+
+    def _initialize_client(self):
+        """初始化 OpenAI 客户端"""
+        from openai import OpenAI
+        self._client = OpenAI(
+            api_key=self.config.api_key,
+            base_url=self.config.base_url,
+            timeout=self.config.timeout,
+        )
+
+    def submit(self, requests: List[BatchRequest], jsonl_path: Optional[str] = None) -> str:
+        lines = (
+            {
+                'custom_id': request.custom_id,
+                'method': 'POST',
+                'url': self.ENDPOINT,
+                'body': {'messages': request.messages, **self._merge_params(request.params)},
+            }
+            for request in requests
+        )
+        data = self._write_jsonl(lines, jsonl_path)
+
+        try:
+            input_file = self._client.files.create(
+                file=(Path(jsonl_path).name if jsonl_path else 'batch_input.jsonl', io.BytesIO(data)),
+                purpose='batch',
+            )
+            batch = self._client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=self.ENDPOINT,
+                completion_window='24h',
+            )
+        except Exception as e:
+            raise RuntimeError(f"提交 {self.provider} 批次失败: {str(e)}") from e
+        return batch.id
+
+    def get_status(self, batch_id: str) -> BatchStatus:
+        try:
+            batch = self._client.batches.retrieve(batch_id)
+        except Exception as e:
+            raise RuntimeError(f"查询 {self.provider} 批次状态失败: {str(e)}") from e
+
+        counts = batch.request_counts
+        return BatchStatus(
+            batch_id=batch.id,
+            status=self.STATUS_MAP.get(batch.status, BATCH_IN_PROGRESS),
+            total=counts.total if counts else 0,
+            completed=counts.completed if counts else 0,
+            failed=counts.failed if counts else 0,
+            raw_status=batch.status,
+        )
+
+    def iter_results(self, batch_id: str) -> Generator[BatchResult, None, None]:
+        batch = self._client.batches.retrieve(batch_id)
+        # 成功结果和失败请求分别在输出文件和错误文件中
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self._client.files.with_streaming_response.content(file_id) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield self._parse_result_line(json.loads(line))
+
+    def _parse_result_line(self, item: Dict[str, Any]) -> BatchResult:
+        custom_id = item.get('custom_id', '')
+        if item.get('error'):
+            error = item['error']
+            return BatchResult(custom_id=custom_id, error=error.get('message') if isinstance(error, dict) else str(error))
+
+        response = item.get('response') or {}
+        body = response.get('body') or {}
+        if response.get('status_code', 200) != 200:
+            message = (body.get('error') or {}).get('message') if isinstance(body.get('error'), dict) else None
+            return BatchResult(custom_id=custom_id, error=message or f"HTTP {response.get('status_code')}")
+
+        try:
+            content = body['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            return BatchResult(custom_id=custom_id, error='响应中缺少 choices')
+        return BatchResult(custom_id=custom_id, content=content, usage=body.get('usage'))
+
+    def cancel(self, batch_id: str):
+        self._client.batches.cancel(batch_id)
+
+
+class AnthropicBatchClient(BaseBatchClient):
+    """Anthropic Message Batches API 客户端"""
+
+    def __init__(self, config: LLMProviderConfig):
+        super().__init__(config)
+        self._initialize_client()
+
+    def _initialize_client(self):
+        """初始化 Anthropic 客户端"""
+        try:
+            from anthropic import Anthropic
+            self._client = Anthropic(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                timeout=self.config.timeout,
+            )
+        except ImportError:
+            raise ImportError(
+                "使用 Anthropic 需要安装 anthropic 库: pip install anthropic"
+            )
+
+    def _build_params(self, request: BatchRequest) -> Dict[str, Any]:
+        """转换为 Messages API 参数（system 消息单独传递，首条系统消息标记为可缓存前缀）"""
+        params = self._merge_params(request.params)
+        system_blocks, messages = split_system_messages(
+            request.messages, params.pop('prompt_cache', self.config.prompt_cache)
+        )
+        params['messages'] = messages
+        if system_blocks:
+            params['system'] = system_blocks
+        return params
+
+    def submit(self, requests: List[BatchRequest], jsonl_path: Optional[str] = None) -> str:
+        batch_requests = [
+            {'custom_id': request.custom_id, 'params': self._build_params(request)}
+            for request in requests
+        ]
+        self._write_jsonl(batch_requests, jsonl_path)
+
+        try:
+            batch = self._client.messages.batches.create(requests=batch_requests)
+        except Exception as e:
+            raise RuntimeError(f"提交 {self.provider} 批次失败: {str(e)}") from e
+        return batch.id
+
+    def get_status(self, batch_id: str) -> BatchStatus:
+        try:
+            batch = self._client.messages.batches.retrieve(batch_id)
+        except Exception as e:
+            raise RuntimeError(f"查询 {self.provider} 批次状态失败: {str(e)}") from e
+
+        counts = batch.request_counts
+        failed = counts.errored + counts.expired + counts.canceled
+        total = counts.processing + counts.succeeded + failed
+        status = BATCH_COMPLETED if batch.processing_status == 'ended' else BATCH_IN_PROGRESS
+        return BatchStatus(
+            batch_id=batch.id,
+            status=status,
+            total=total,
+            completed=counts.succeeded,
+            failed=failed,
+            raw_status=batch.processing_status,
+        )
+
+    def iter_results(self, batch_id: str) -> Generator[BatchResult, None, None]:
+        for item in self._client.messages.batches.results(batch_id):
+            result = item.result
+            if result.type != 'succeeded':
+                error = getattr(getattr(result, 'error', None), 'error', None)
+                message = getattr(error, 'message', None) or result.type
+                yield BatchResult(custom_id=item.custom_id, error=message)
+                continue
+
+            content = ''.join(
+                block.text for block in result.message.content if getattr(block, 'type', None) == 'text'
+            )
+            yield BatchResult(
+                custom_id=item.custom_id,
+                content=content,
+                usage=format_anthropic_usage(result.message.usage),
+            )
+
+    def cancel(self, batch_id: str):
+        self._client.messages.batches.cancel(batch_id)
+
+
+# 提供商 -> 批量客户端类
+_BATCH_CLIENT_REGISTRY = {
+    'openai': OpenAIBatchClient,
+    'qwen': OpenAIBatchClient,
+    'anthropic': AnthropicBatchClient,
+}
+
+
+def create_batch_client(
+    provider: str,
+    model: Optional[str] = None,
+    config: Optional[LLMProviderConfig] = None
+) -> BaseBatchClient:
+    """
+    创建批量 API 客户端
+
+    Args:
+        provider: LLM 提供商名称
+        model: 模型名称（可选，不指定则使用默认模型）
+        config: LLM 配置对象（可选，不指定则从环境变量读取）
+
+    Returns:
+        批量客户端实例
+
+    Raises:
+        ValueError: 提供商不支持批量 API
+    """
+    provider = provider.lower()
+    if provider not in _BATCH_CLIENT_REGISTRY:
+        supported = ', '.join(get_batch_supported_providers())
+        raise ValueError(
+            f"提供商 {provider} 不支持批量 API。"
+            f"支持的提供商: {supported}"
+        )
+
+    if config is None:
+        config = LLMConfig.from_env(provider, model)
+
+    return _BATCH_CLIENT_REGISTRY[provider](config)
+
+
+def register_batch_client(provider: str, client_class: type):
+    """注册新的批量客户端类（如其他兼容 OpenAI Batch API 的提供商）"""
+    if not issubclass(client_class, BaseBatchClient):
+        raise TypeError(f"{client_class} 必须继承 BaseBatchClient")
+    _BATCH_CLIENT_REGISTRY[provider.lower()] = client_class
+
+
+def get_batch_supported_providers() -> List[str]:
+    """获取支持批量 API 的提供商列表"""
+    return list(_BATCH_CLIENT_REGISTRY.keys())
@@ -0,0 +1,329 @@
+"""
+LLM 响应缓存
+可选的客户端装饰器（CachedLLMClient），在调用提供商之前查两级缓存：
+- 精确层：按提供商、地址、合并后的调用参数和完整消息列表的哈希命中
+- 近似层：同一上下文（除最后一条用户消息外的全部消息和参数相同，
+  且问题中的数字和带数字的标识符完全相同）中，
+  最后一条用户消息的向量与已缓存问题的余弦相似度超过阈值时命中，
+  适合针对同一段论文原文反复提出的近似问题
+
+缓存条目按 TTL 过期、按最近使用淘汰；调用时传入 use_cache=False 跳过缓存。
+默认向量为字符 n-gram 哈希向量（无需额外依赖和 API 调用），也可以传入任意 embedder
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+
+import numpy as np
+
+from .base import BaseLLMClient
+
+
+CACHE_EXACT = 'exact'
+CACHE_SEMANTIC = 'semantic'
+
+# 问题中必须精确一致的标识符：数字以及带数字的词（公式/表格编号、arXiv ID、模型名等）
+_IDENTIFIER_RE = re.compile(r'\w*\d[\w.\-]*')
+
+
+def hashed_ngram_embedding(text: str, dim: int = 512, ngram: int = 3) -> np.ndarray:
+    """
+    字符 n-gram 哈希向量（L2 归一化）
+
+    对措辞略有不同的同一问题（大小写、标点、个别词）相似度较高，对语义改写不敏感
+    """
+    normalized = ' ' + re.sub(r'[^\w]+', ' ', (text or '').lower()).strip() + ' '
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(max(1, len(normalized) - ngram + 1)):
+        vector[zlib.crc32(normalized[i:i + ngram].encode('utf-8')) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embedding_function(client: BaseLLMClient, model: Optional[str] = None) -> Callable[[str], np.ndarray]:
+    """使用提供商向量模型的 embedder（每次近似查找多一次向量 API 调用）"""
+    def embed(text: str) -> np.ndarray:
+        return np.asarray(client.embed([text], model=model)[0], dtype=np.float32)
+    return embed
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    ).hexdigest()
+
+
+@dataclass
+class _CacheEntry:
+    response: Dict[str, Any]
+    expires_at: float
+    context_key: Optional[str]
+    embedding: Optional[np.ndarray]
+
+
+class LLMResponseCache:
+    """两级 LLM 响应缓存（线程安全）"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        similarity_threshold: Optional[float] = 0.92,
+        embedder: Optional[Callable[[str], np.ndarray]] = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多保留的响应数（按最近使用淘汰）
+            ttl: 响应有效期（秒）
+            similarity_threshold: 近似层的余弦相似度阈值（0-1），设为 None 关闭近似层；
+                                  默认向量只反映字面相似，因此问题中的数字和标识符计入上下文键，
+                                  只差公式、表格编号的问题不会互相命中
+            embedder: 文本向量函数（返回一维向量），默认为 hashed_ngram_embedding，
+                      可用 embedding_function(client) 改用提供商的向量模型
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or hashed_ngram_embedding
+
+        self._entries: 'OrderedDict[str, _CacheEntry]' = OrderedDict()
+        self._contexts: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, CACHE_EXACT: 0, CACHE_SEMANTIC: 0, 'misses': 0, 'bypassed': 0}
+
+    @staticmethod
+    def _split_query(messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """拆分为上下文和最后一条用户消息"""
+        if messages and messages[-1].get('role') == 'user':
+            return messages[:-1], messages[-1].get('content') or ''
+        return messages, None
+
+    @staticmethod
+    def _identifiers(query: str) -> List[str]:
+        """问题中的数字和带数字的标识符（按出现顺序，统一小写、去掉结尾标点）"""
+        return [token.rstrip('.-') for token in _IDENTIFIER_RE.findall(query.lower())]
+
+    def keys(self, namespace: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        计算缓存键
+
+        Returns:
+            (精确键, 上下文键, 最后一条用户消息)；没有用户消息时上下文键和问题为 None
+        """
+        exact_key = _digest([namespace, params, messages])
+        context, query = self._split_query(messages)
+        if query is None:
+            return exact_key, None, None
+        return exact_key, _digest([namespace, params, context, self._identifiers(query)]), query
+
+    def _embed(self, query: str) -> np.ndarray:
+        """问题向量（L2 归一化，点积即余弦相似度）"""
+        vector = np.asarray(self.embedder(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.context_key is not None:
+            members = self._contexts.get(entry.context_key)
+            if members is not None:
+                members.pop(key, None)
+                if not members:
+                    del self._contexts[entry.context_key]
+
+    def get(self, namespace: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        查找缓存的响应
+
+        Returns:
+            (响应字典, 命中层级 CACHE_EXACT / CACHE_SEMANTIC)；未命中时为 (None, None)
+        """
+        exact_key, context_key, query = self.keys(namespace, messages, params)
+        # 在锁外计算向量，避免阻塞其他线程
+        embedding = None
+        if context_key is not None and self.similarity_threshold is not None:
+            embedding = self._embed(query)
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats['requests'] += 1
+            entry = self._entries.get(exact_key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(exact_key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(exact_key)
+                self._stats[CACHE_EXACT] += 1
+                return entry.response, CACHE_EXACT
+
+            if embedding is not None:
+                best_key, best_score = None, self.similarity_threshold
+                for key in list(self._contexts.get(context_key, ())):
+                    candidate = self._entries[key]
+                    if candidate.expires_at <= now:
+                        self._remove(key)
+                        continue
+                    score = float(np.dot(embedding, candidate.embedding))
+                    if score >= best_score:
+                        best_key, best_score = key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._stats[CACHE_SEMANTIC] += 1
+                    return self._entries[best_key].response, CACHE_SEMANTIC
+
+            self._stats['misses'] += 1
+            return None, None
+
+    def put(self, namespace: str, messages: List[Dict[str, str]], params: Dict[str, Any], response: Dict[str, Any]):
+        """保存响应（内容为空的响应不缓存）"""
+        if not response.get('content'):
+            return
+        exact_key, context_key, query = self.keys(namespace, messages, params)
+        embedding = None
+        if context_key is not None and self.similarity_threshold is not None:
+            embedding = self._embed(query)
+        else:
+            context_key = None
+
+        with self._lock:
+            if exact_key in self._entries:
+                self._remove(exact_key)
+            self._entries[exact_key] = _CacheEntry(
+                response=dict(response),
+                expires_at=time.monotonic() + self.ttl,
+                context_key=context_key,
+                embedding=embedding
+            )
+            if context_key is not None:
+                self._contexts.setdefault(context_key, {})[exact_key] = None
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats['bypassed'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计：请求数、各层命中数、未命中数、跳过数、命中率和当前条目数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        hits = stats[CACHE_EXACT] + stats[CACHE_SEMANTIC]
+        stats['hit_rate'] = hits / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._contexts.clear()
+
+
+class CachedLLMClient(BaseLLMClient):
+    """
+    带响应缓存的客户端装饰器，接口与被包装的客户端相同
+
+    命中缓存的响应字典带 'cache' 字段（'exact' / 'semantic'），流式调用命中时一次性返回完整内容
+    """
+
+    def __init__(self, client: BaseLLMClient, cache: Optional[LLMResponseCache] = None, **cache_kwargs):
+        """
+        Args:
+            client: 被包装的客户端
+            cache: 缓存实例（多个客户端可共享），为空时按 cache_kwargs 创建
+            **cache_kwargs: 传给 LLMResponseCache 的参数
+        """
+        super().__init__(client.config)
+        self.client = client
+        self.cache = cache or LLMResponseCache(**cache_kwargs)
+        # 不同提供商或地址的同名模型不共享缓存
+        self._namespace = f'{client.provider}|{client.config.base_url or ""}'
+
+    def _initialize_client(self):
+        pass
+
+    def _lookup(self, messages, kwargs, use_cache):
+        params = self.client._merge_params(**kwargs)
+        if not use_cache:
+            self.cache.record_bypass()
+            return params, None
+        response, tier = self.cache.get(self._namespace, messages, params)
+        if response is None:
+            return params, None
+        # 缓存命中没有调用提供商，不返回原调用的遥测数据
+        response = {key: value for key, value in response.items() if key != 'metrics'}
+        return params, {**response, 'cache': tier}
+
+    @staticmethod
+    def _replay(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {'content': response['content'], 'role': 'assistant', 'finish_reason': None},
+            {'content': '', 'role': 'assistant', 'finish_reason': response.get('finish_reason') or 'stop'},
+        ]
+
+    def chat_completion(self, messages: List[Dict[str, str]], use_cache: bool = True, **kwargs) -> Dict[str, Any]:
+        """同步聊天补全，use_cache=False 时跳过缓存（也不写入）"""
+        params, cached = self._lookup(messages, kwargs, use_cache)
+        if cached is not None:
+            return cached
+        response = self.client.chat_completion(messages, **kwargs)
+        if use_cache:
+            self.cache.put(self._namespace, messages, params, response)
+        return response
+
+    def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        use_cache: bool = True,
+        **kwargs
+    ) -> Generator[Dict[str, Any], None, None]:
+        """流式聊天补全，完整读完的响应才写入缓存"""
+        params, cached = self._lookup(messages, kwargs, use_cache)
+        if cached is not None:
+            yield from self._replay(cached)
+            return
+        parts = []
+        for chunk in self.client.chat_completion_stream(messages, **kwargs):
+            parts.append(chunk.get('content') or '')
+            yield chunk
+        if use_cache:
+            self.cache.put(self._namespace, messages, params, {'content': ''.join(parts), 'finish_reason': 'stop'})
+
+    async def achat_completion(self, messages: List[Dict[str, str]], use_cache: bool = True, **kwargs) -> Dict[str, Any]:
+        """异步聊天补全"""
+        params, cached = self._lookup(messages, kwargs, use_cache)
+        if cached is not None:
+            return cached
+        response = await self.client.achat_completion(messages, **kwargs)
+        if use_cache:
+            self.cache.put(self._namespace, messages, params, response)
+        return response
+
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        use_cache: bool = True,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """异步流式聊天补全"""
+        params, cached = self._lookup(messages, kwargs, use_cache)
+        if cached is not None:
+            for chunk in self._replay(cached):
+                yield chunk
+            return
+        parts = []
+        async for chunk in self.client.astream(messages, **kwargs):
+            parts.append(chunk.get('content') or '')
+            yield chunk
+        if use_cache:
+            self.cache.put(self._namespace, messages, params, {'content': ''.join(parts), 'finish_reason': 'stop'})
+
+    def __repr__(self) -> str:
+        return f"<CachedLLMClient {self.client!r}>"
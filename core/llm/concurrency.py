@@ -0,0 +1,205 @@
+"""
+LLM 调用自适应并发控制
+按 AIMD（加性增、乘性减）调整同时进行的 LLM 请求数：
+- 请求成功且延迟正常时，每完成约一个窗口（当前上限个）请求，上限加 1
+- 遇到限流（429）、超时或服务过载时，上限乘以回退系数；同一拥塞窗口内只回退一次
+- 其他错误（如响应格式问题）不调整上限
+
+同一进程内按提供商共享一个控制器（get_limiter），论文级线程和分块线程的请求统一计数，
+--workers 可以设置得比较大，实际并发由控制器逼近提供商的配额上限
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+OUTCOME_SUCCESS = 'success'
+OUTCOME_OVERLOAD = 'overload'
+OUTCOME_ERROR = 'error'
+
+# 表示限流或服务过载的 HTTP 状态码（529 为 Anthropic 的 overloaded）
+OVERLOAD_STATUS_CODES = {408, 429, 502, 503, 504, 529}
+OVERLOAD_ERROR_NAMES = ('RateLimit', 'Timeout', 'Overloaded', 'InternalServer')
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    判断异常是否表示限流、超时或服务过载
+
+    客户端会把 SDK 异常包装为 RuntimeError，这里沿异常链（__cause__ / __context__）查找
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, TimeoutError):
+            return True
+        status_code = getattr(error, 'status_code', None)
+        if status_code is None:
+            status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status_code in OVERLOAD_STATUS_CODES:
+            return True
+        if any(name in type(error).__name__ for name in OVERLOAD_ERROR_NAMES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 并发控制器（线程安全）"""
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_retries: int = 2,
+        retry_delay: float = 2.0
+    ):
+        """
+        初始化控制器
+
+        Args:
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            backoff: 遇到限流或超时时上限乘以的系数
+            latency_tolerance: 延迟超过基线（近期最小延迟）的该倍数时视为拥塞，暂停增加上限
+            max_retries: call() 遇到限流或超时时的重试次数（指数退避）
+            retry_delay: 第一次重试前的等待时间（秒）
+        """
+        if not 0 < backoff < 1:
+            raise ValueError('backoff 必须在 (0, 1) 之间')
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError('必须满足 1 <= min_limit <= max_limit')
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._baseline_latency: Optional[float] = None
+        self._last_backoff = 0.0
+        self._stats = {OUTCOME_SUCCESS: 0, OUTCOME_OVERLOAD: 0, OUTCOME_ERROR: 0, 'backoffs': 0}
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """正在进行的请求数"""
+        return self._in_flight
+
+    def acquire(self) -> float:
+        """
+        等待并占用一个并发名额
+
+        Returns:
+            占用时间（传给 release，用于判断结果是否属于已回退过的拥塞窗口）
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, outcome: str, latency: Optional[float] = None):
+        """
+        释放名额并根据结果调整上限
+
+        Args:
+            started: acquire 的返回值
+            outcome: OUTCOME_SUCCESS / OUTCOME_OVERLOAD / OUTCOME_ERROR
+            latency: 请求延迟（秒），默认为 acquire 到现在的时间
+        """
+        if latency is None:
+            latency = time.monotonic() - started
+
+        with self._condition:
+            saturated = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+            self._stats[outcome] += 1
+
+            if outcome == OUTCOME_OVERLOAD:
+                # 回退前已发出的请求再失败属于同一拥塞窗口，不重复回退
+                if started >= self._last_backoff:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_backoff = time.monotonic()
+                    self._stats['backoffs'] += 1
+            elif outcome == OUTCOME_SUCCESS:
+                healthy = self._observe_latency(latency)
+                # 只有名额用满时才说明上限在限制吞吐，此时才增加
+                if healthy and saturated:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+            self._condition.notify_all()
+
+    def _observe_latency(self, latency: float) -> bool:
+        """更新延迟基线（缓慢上浮的最小值），返回延迟是否正常"""
+        baseline = self._baseline_latency
+        if baseline is None or latency < baseline:
+            self._baseline_latency = latency
+            return True
+        # 基线缓慢追随较大的延迟，避免一次偶然的快速响应长期压低基线
+        self._baseline_latency = baseline + (latency - baseline) * 0.01
+        return latency <= baseline * self.latency_tolerance
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在并发控制下调用函数，遇到限流或超时时按指数退避重试
+
+        Raises:
+            最后一次调用抛出的异常
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                overload = is_overload_error(e)
+                self.release(started, OUTCOME_OVERLOAD if overload else OUTCOME_ERROR)
+                if not overload or attempt >= self.max_retries:
+                    raise
+                # 带随机抖动，避免所有线程在同一时刻重试
+                time.sleep(self.retry_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
+                continue
+            self.release(started, OUTCOME_SUCCESS)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前状态和累计统计"""
+        with self._condition:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'baseline_latency': self._baseline_latency,
+                **self._stats,
+            }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: str, **kwargs) -> AdaptiveConcurrencyLimiter:
+    """
+    获取进程内共享的并发控制器（通常按提供商区分）
+
+    Args:
+        key: 控制器名称
+        **kwargs: 首次创建时传给 AdaptiveConcurrencyLimiter 的参数（已存在时忽略）
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveConcurrencyLimiter(**kwargs)
+        return limiter
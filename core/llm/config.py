@@ -18,6 +18,11 @@ class LLMProviderConfig:
     temperature: float = 0.7
     timeout: int = 60
     extra_params: Optional[Dict[str, Any]] = None
+    # 提供商侧提示词缓存（Anthropic 在首条系统消息上标记缓存断点，OpenAI 按稳定前缀自动缓存）
+    prompt_cache: bool = True
+    # 流式调用请求返回用量（stream_options.include_usage）；None 表示只对 OpenAI 官方接口请求，
+    # 支持该参数的兼容接口可设置为 True
+    stream_usage: Optional[bool] = None
 
 
 class LLMConfig:
@@ -0,0 +1,234 @@
+"""
+对话上下文窗口
+按 token 预算裁剪每轮发送给模型的消息，使提示词长度不随对话轮数线性增长：
+- 最近的若干条消息原样保留
+- 更早的消息压缩为一条摘要（默认为抽取式摘要，不调用LLM），放不下时直接丢弃
+- 选中的论文原文超过预算时保留开头和结尾
+
+token 数优先用 tiktoken 在本地计算，未安装时按字符数估算（中日韩字符按 1 个 token，
+其他字符按 4 个字符 1 个 token），估算值偏保守
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# 每条消息的格式开销（角色和分隔符）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 省略标记
+ELLIPSIS = '\n[...]\n'
+
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+_encodings: Dict[str, Any] = {}
+
+
+def _get_encoding(model: Optional[str]):
+    """按模型获取 tiktoken 编码（未知模型使用 o200k_base）"""
+    key = model or ''
+    encoding = _encodings.get(key)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('o200k_base')
+        except (KeyError, ValueError):
+            encoding = tiktoken.get_encoding('o200k_base')
+        _encodings[key] = encoding
+    return encoding
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    计算文本的 token 数
+
+    Args:
+        text: 文本
+        model: 模型名称（选择 tiktoken 编码，其他提供商的模型按 o200k_base 近似）
+
+    Returns:
+        token 数
+    """
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: Dict[str, str], model: Optional[str] = None) -> int:
+    """单条消息的 token 数（含格式开销）"""
+    return count_tokens(message.get('content') or '', model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None, keep_tail: float = 0.25) -> str:
+    """
+    把文本截断到 token 预算内，保留开头和结尾（中间以省略标记代替）
+
+    Args:
+        text: 文本
+        max_tokens: token 预算
+        model: 模型名称
+        keep_tail: 预算中留给结尾的比例（0 表示只保留开头）
+
+    Returns:
+        截断后的文本（未超出预算时原样返回）
+    """
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    budget = max_tokens - count_tokens(ELLIPSIS, model)
+    tail_budget = int(budget * keep_tail)
+    head = _prefix_within(text, budget - tail_budget, model)
+    tail = _prefix_within(text[::-1], tail_budget, model)[::-1] if tail_budget > 0 else ''
+    return head.rstrip() + ELLIPSIS + tail.lstrip()
+
+
+def _prefix_within(text: str, max_tokens: int, model: Optional[str]) -> str:
+    """不超过 token 预算的最长前缀（二分查找字符位置，优先在空白处断开）"""
+    if max_tokens <= 0:
+        return ''
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid], model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+    if low < len(text):
+        cut = max(prefix.rfind(' '), prefix.rfind('\n'))
+        if cut > low * 0.8:
+            prefix = prefix[:cut]
+    return prefix
+
+
+def extractive_summary(messages: List[Dict[str, str]], max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    抽取式摘要：按顺序列出早先每轮的问题和回答开头
+
+    Args:
+        messages: 被压缩的消息
+        max_tokens: 摘要 token 预算
+
+    Returns:
+        摘要文本
+    """
+    lines = []
+    for message in messages:
+        content = re.sub(r'\s+', ' ', message.get('content') or '').strip()
+        if not content or message.get('role') == 'system':
+            continue
+        speaker = 'User' if message.get('role') == 'user' else 'Assistant'
+        lines.append(f"- {speaker}: {truncate_tokens(content, 60, model, keep_tail=0)}")
+    # 预算不足时优先保留最近的内容
+    summary = '\n'.join(lines)
+    while lines and count_tokens(summary, model) > max_tokens:
+        lines.pop(0)
+        summary = '\n'.join(lines)
+    return summary
+
+
+class ContextWindow:
+    """按 token 预算构建每轮对话的消息列表"""
+
+    def __init__(
+        self,
+        max_prompt_tokens: int = 12000,
+        context_tokens: int = 4000,
+        keep_recent_messages: int = 6,
+        summary_tokens: int = 400,
+        model: Optional[str] = None,
+        summarizer: Optional[Callable[[List[Dict[str, str]], int], str]] = None
+    ):
+        """
+        初始化
+
+        Args:
+            max_prompt_tokens: 提示词（全部输入消息）的 token 上限，需给回复留出空间
+            context_tokens: 选中原文的 token 上限
+            keep_recent_messages: 原样保留的最近消息条数（预算允许时）
+            summary_tokens: 早先对话摘要的 token 上限，0 表示直接丢弃早先消息
+            model: 模型名称（选择分词器）
+            summarizer: 摘要函数 (消息列表, token预算) -> 摘要，默认为 extractive_summary
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.context_tokens = context_tokens
+        self.keep_recent_messages = keep_recent_messages
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self.summarizer = summarizer or (lambda messages, budget: extractive_summary(messages, budget, model))
+
+    def build(
+        self,
+        messages: List[Dict[str, str]],
+        context_text: str = '',
+        system_template: Optional[Callable[[str], str]] = None,
+        extra_system: str = ''
+    ) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """
+        构建本轮发送的消息列表
+
+        消息按 稳定的系统提示词 -> 附加系统消息 -> 早先对话摘要 -> 最近消息 的顺序排列，
+        同一原文的多轮对话中第一条系统消息逐字节不变，可命中提供商的提示词缓存
+
+        Args:
+            messages: 客户端发送的完整对话历史（最后一条通常是本轮问题）
+            context_text: 选中的论文原文
+            system_template: 把（裁剪后的）原文转为系统提示词的函数，返回空字符串时不添加系统消息
+            extra_system: 逐轮变化的附加系统消息（如检索到的论文片段），为空时不添加
+
+        Returns:
+            (消息列表, 统计)；统计包括 prompt_tokens、context_trimmed、summarized_messages、dropped_messages
+        """
+        stats = {'prompt_tokens': 0, 'context_trimmed': 0, 'summarized_messages': 0, 'dropped_messages': 0}
+
+        system_messages = []
+        if system_template is not None:
+            trimmed = truncate_tokens(context_text, self.context_tokens, self.model) if context_text else ''
+            stats['context_trimmed'] = int(trimmed != context_text)
+            system_prompt = system_template(trimmed)
+            if system_prompt:
+                system_messages.append({'role': 'system', 'content': system_prompt})
+        if extra_system:
+            system_messages.append({'role': 'system', 'content': extra_system})
+        budget = self.max_prompt_tokens - sum(message_tokens(m, self.model) for m in system_messages)
+
+        # 从最新的消息向前保留，最后一条消息无论如何都要发送（超长时截断）
+        history = list(messages)
+        recent = []
+        while history and len(recent) < max(1, self.keep_recent_messages):
+            cost = message_tokens(history[-1], self.model)
+            if recent and cost > budget:
+                break
+            message = history.pop()
+            if not recent and cost > budget:
+                content = truncate_tokens(message.get('content') or '', budget - MESSAGE_OVERHEAD_TOKENS, self.model)
+                message = {**message, 'content': content}
+                cost = message_tokens(message, self.model)
+            recent.insert(0, message)
+            budget -= cost
+
+        # 更早的消息压缩为摘要
+        if history and self.summary_tokens > 0 and budget > MESSAGE_OVERHEAD_TOKENS:
+            summary = self.summarizer(history, min(self.summary_tokens, budget - MESSAGE_OVERHEAD_TOKENS))
+            if summary:
+                summary_message = {'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"}
+                cost = message_tokens(summary_message, self.model)
+                if cost <= budget:
+                    system_messages.append(summary_message)
+                    stats['summarized_messages'] = len(history)
+                    budget -= cost
+        if not stats['summarized_messages']:
+            stats['dropped_messages'] = len(history)
+
+        result = system_messages + recent
+        stats['prompt_tokens'] = sum(message_tokens(m, self.model) for m in result)
+        return result, stats
@@ -2,7 +2,7 @@
 LLM 工厂类
 提供统一的客户端创建接口
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from .base import BaseLLMClient
 from .config import LLMConfig, LLMProviderConfig
 from .openai_client import OpenAIClient
@@ -105,6 +105,47 @@ class LLMFactory:
         provider = config_dict['provider']
         return cls.create(provider, config=config)
     
+    @classmethod
+    def create_failover(
+        cls,
+        entries: List[Union[str, Dict[str, Any], BaseLLMClient]],
+        **options
+    ) -> BaseLLMClient:
+        """
+        创建多提供商故障转移客户端
+        
+        Args:
+            entries: 按优先级排列的提供商，元素为提供商名称（从环境变量读取配置，
+                     可写作 "provider:model"）、配置字典（同 create_from_dict）或客户端实例
+            **options: 传给 FailoverLLMClient 的参数（routing, hedge, hedge_quantile 等）
+            
+        Returns:
+            故障转移客户端（只有一个提供商时直接返回该客户端）
+            
+        Example:
+            client = LLMFactory.create_failover(
+                ['deepseek:deepseek-chat', 'qwen:qwen-plus'],
+                routing='latency',
+                hedge=True
+            )
+        """
+        from .failover import FailoverLLMClient, parse_provider_spec
+        
+        clients = []
+        for entry in entries:
+            if isinstance(entry, BaseLLMClient):
+                clients.append(entry)
+            elif isinstance(entry, dict):
+                clients.append(cls.create_from_dict(entry))
+            else:
+                clients.append(cls.create(*parse_provider_spec(entry)))
+        
+        if not clients:
+            raise ValueError("至少需要一个提供商")
+        if len(clients) == 1:
+            return clients[0]
+        return FailoverLLMClient(clients, **options)
+    
     @classmethod
     def register_client(cls, provider: str, client_class: type):
         """
@@ -0,0 +1,422 @@
+"""
+多提供商故障转移客户端
+把多个 LLM 客户端组合为一个客户端（接口与单个客户端相同）：
+- 路由：跳过熔断中的提供商；按配置顺序（priority）或按近期延迟（latency）选择
+- 故障转移：限流、过载、超时或连接失败时依次尝试下一个提供商；连续失败达到阈值后熔断一段时间。
+  请求本身的错误（如 400 上下文过长、401 密钥无效）直接抛出，不转移也不计入熔断
+- 对冲请求（可选）：首个 token（非流式为完整响应）超过该提供商近期 p95 延迟仍未到达时，
+  向下一个提供商并发发送相同请求，先返回的结果胜出，另一个请求被丢弃
+
+各提供商的健康状态（延迟样本、连续失败、熔断）按客户端实例和模型在进程内共享，
+同一客户端参与多个组合（如每个对话请求各自组合）时统计一致
+"""
+import contextvars
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple, Union
+
+from .base import BaseLLMClient
+from .concurrency import is_overload_error
+
+
+ROUTING_PRIORITY = 'priority'
+ROUTING_LATENCY = 'latency'
+
+# 表示网络传输失败的异常类型名（httpx / openai / anthropic SDK）
+TRANSPORT_ERROR_NAMES = ('Connection', 'ConnectError', 'Timeout', 'RemoteProtocol', 'NetworkError', 'ReadError')
+
+# 流式对冲时的内部事件
+_CHUNK = 'chunk'
+_DONE = 'done'
+_ERROR = 'error'
+
+
+def parse_provider_spec(spec: str) -> Tuple[str, Optional[str]]:
+    """解析 "provider" 或 "provider:model" 形式的提供商配置"""
+    provider, _, model = spec.strip().partition(':')
+    if not provider:
+        raise ValueError(f'无效的提供商配置: {spec!r}')
+    return provider.lower(), model or None
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """
+    判断异常是否应转移到备用提供商：限流、过载、超时、5xx 或网络连接失败
+
+    沿异常链（__cause__ / __context__）查找，客户端会把 SDK 异常包装为 RuntimeError
+    """
+    if is_overload_error(error):
+        return True
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, ConnectionError):
+            return True
+        status_code = getattr(error, 'status_code', None)
+        if status_code is None:
+            status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+        if isinstance(status_code, int) and status_code >= 500:
+            return True
+        if any(name in type(error).__name__ for name in TRANSPORT_ERROR_NAMES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class ProviderHealth:
+    """单个提供商的健康状态（线程安全）"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.first_token_latencies = deque(maxlen=window)
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.hedged = 0
+        self._lock = threading.Lock()
+
+    def available(self, now: Optional[float] = None) -> bool:
+        """未熔断（或熔断已到期，允许试探）"""
+        return (now or time.monotonic()) >= self.open_until
+
+    def record_success(self, latency: float, first_token_latency: Optional[float] = None):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.latencies.append(latency)
+            if first_token_latency is not None:
+                self.first_token_latencies.append(first_token_latency)
+            self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedged += 1
+
+    def record_failure(self, failure_threshold: int, cooldown: float):
+        """记录失败；连续失败达到阈值后熔断，之后每次试探失败熔断时间加倍（最多 8 倍）"""
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= failure_threshold:
+                extra = min(self.consecutive_failures - failure_threshold, 3)
+                self.open_until = time.monotonic() + cooldown * (2 ** extra)
+
+    def percentile(self, quantile: float, first_token: bool = False, min_samples: int = 5) -> Optional[float]:
+        """近期延迟的分位数，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self.first_token_latencies if first_token else self.latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'available': self.available(),
+                'successes': self.successes,
+                'failures': self.failures,
+                'consecutive_failures': self.consecutive_failures,
+                'hedged': self.hedged,
+                'ewma_latency': self.ewma_latency,
+            }
+
+
+_health: 'weakref.WeakKeyDictionary[BaseLLMClient, Dict[Optional[str], ProviderHealth]]' = weakref.WeakKeyDictionary()
+_health_lock = threading.Lock()
+
+
+def get_health(client: BaseLLMClient, model: Optional[str] = None) -> ProviderHealth:
+    """客户端实例上某个模型的健康状态（进程内共享，同一客户端的不同模型分别统计）"""
+    with _health_lock:
+        models = _health.setdefault(client, {})
+        health = models.get(model or client.model)
+        if health is None:
+            health = models[model or client.model] = ProviderHealth()
+        return health
+
+
+class FailoverLLMClient(BaseLLMClient):
+    """
+    多提供商故障转移客户端
+
+    调用参数中的 model 会被忽略，每个提供商使用组合时指定的模型（不同提供商的模型名不通用）；
+    响应字典带 'provider' 字段，表示实际返回结果的提供商，'fallback' 表示结果是否来自第一个以外的提供商
+    """
+
+    def __init__(
+        self,
+        members: Sequence[Union[BaseLLMClient, Tuple[BaseLLMClient, Optional[str]]]],
+        routing: str = ROUTING_PRIORITY,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_delay: float = 10.0,
+        min_hedge_delay: float = 1.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0
+    ):
+        """
+        初始化
+
+        Args:
+            members: 客户端列表（按优先级），元素为客户端或 (客户端, 模型名)；未指定模型时使用客户端的默认模型
+            routing: priority（按配置顺序，适合用户选定模型的对话）或 latency（按近期平均延迟，适合批量任务）
+            hedge: 是否发送对冲请求
+            hedge_quantile: 触发对冲的延迟分位数
+            hedge_delay: 延迟样本不足时触发对冲的等待时间（秒）
+            min_hedge_delay: 触发对冲的最短等待时间（秒），避免正常波动也发送重复请求
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断时间（秒）
+        """
+        if not members:
+            raise ValueError('至少需要一个客户端')
+        if routing not in (ROUTING_PRIORITY, ROUTING_LATENCY):
+            raise ValueError(f'不支持的路由策略: {routing}')
+
+        self.members: List[Tuple[BaseLLMClient, Optional[str]]] = [
+            member if isinstance(member, tuple) else (member, None) for member in members
+        ]
+        super().__init__(self.members[0][0].config)
+        self.routing = routing
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+    def _initialize_client(self):
+        pass
+
+    @staticmethod
+    def _name(client: BaseLLMClient, model: Optional[str]) -> str:
+        return f'{client.provider}/{model or client.model}'
+
+    def _candidates(self) -> List[Tuple[BaseLLMClient, Optional[str]]]:
+        """本次调用的尝试顺序：可用的提供商在前；全部熔断时仍按原顺序尝试"""
+        now = time.monotonic()
+        available = [member for member in self.members if get_health(*member).available(now)]
+        if self.routing == ROUTING_LATENCY:
+            # 没有延迟样本的提供商排在最前，先收集样本
+            available.sort(key=lambda member: get_health(*member).ewma_latency or 0.0)
+        unavailable = [member for member in self.members if member not in available]
+        return available + unavailable
+
+    def _hedge_after(self, member, first_token: bool) -> float:
+        """触发对冲的等待时间"""
+        observed = get_health(*member).percentile(self.hedge_quantile, first_token=first_token)
+        return max(self.min_hedge_delay, observed if observed is not None else self.hedge_delay)
+
+    @staticmethod
+    def _call_params(kwargs: Dict[str, Any], model: Optional[str]) -> Dict[str, Any]:
+        params = {key: value for key, value in kwargs.items() if key != 'model'}
+        if model:
+            params['model'] = model
+        return params
+
+    def _record_failure(self, member):
+        get_health(*member).record_failure(self.failure_threshold, self.cooldown)
+
+    def _served_by(self, member) -> Dict[str, Any]:
+        """响应中标记实际返回结果的提供商"""
+        return {'provider': self._name(*member), 'fallback': member != self.members[0]}
+
+    def _all_failed(self, errors) -> RuntimeError:
+        error = RuntimeError('所有提供商调用失败: ' + '; '.join(f'{self._name(*member)}: {e}' for member, e in errors))
+        error.__cause__ = errors[-1][1] if errors else None
+        return error
+
+    def _complete(self, member, messages, kwargs) -> Dict[str, Any]:
+        client, model = member
+        started = time.monotonic()
+        try:
+            response = client.chat_completion(messages, **self._call_params(kwargs, model))
+        except Exception as e:
+            if is_failover_error(e):
+                self._record_failure(member)
+            raise
+        get_health(client, model).record_success(time.monotonic() - started)
+        return {**response, **self._served_by(member)}
+
+    def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        同步聊天补全（失败时转移到下一个提供商，启用对冲时超过 p95 延迟后并发请求下一个提供商）
+
+        Raises:
+            RuntimeError: 全部提供商均失败（异常链保留最后一个提供商的原始异常，供限流判断使用）；
+                          请求本身的错误（is_failover_error 为 False）原样抛出
+        """
+        candidates = self._candidates()
+        errors = []
+        if not self.hedge or len(candidates) < 2:
+            for member in candidates:
+                try:
+                    return self._complete(member, messages, kwargs)
+                except Exception as e:
+                    if not is_failover_error(e):
+                        raise
+                    errors.append((member, e))
+            raise self._all_failed(errors)
+
+        # 对冲：同时在途的请求最多两个，失败或超时都会启动下一个候选
+        executor = ThreadPoolExecutor(max_workers=len(candidates))
+        try:
+            pending = {}
+            remaining = list(candidates)
+
+            def launch():
+                member = remaining.pop(0)
+                # 带上调用方的上下文（遥测汇总等）
+                context = contextvars.copy_context()
+                pending[executor.submit(context.run, self._complete, member, messages, kwargs)] = member
+                return member
+
+            deadline_member = launch()
+            while pending:
+                timeout = self._hedge_after(deadline_member, first_token=False) if remaining else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # 超过 p95 仍未返回：对冲到下一个提供商
+                    get_health(*deadline_member).record_hedge()
+                    deadline_member = launch()
+                    continue
+                for future in done:
+                    member = pending.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        if not is_failover_error(e):
+                            raise
+                        errors.append((member, e))
+                if remaining and len(pending) < 2:
+                    deadline_member = launch()
+            raise self._all_failed(errors)
+        finally:
+            # 不等待被丢弃的请求（其线程在请求结束后退出，结果被忽略）
+            executor.shutdown(wait=False)
+
+    def _stream_worker(self, member, messages, kwargs, events: 'queue.Queue', cancelled: threading.Event):
+        """在线程中读取一个提供商的流式响应，片段放入队列"""
+        client, model = member
+        started = time.monotonic()
+        first_token = None
+        stream = None
+        try:
+            stream = client.chat_completion_stream(messages, **self._call_params(kwargs, model))
+            for chunk in stream:
+                if cancelled.is_set():
+                    return
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                events.put((_CHUNK, member, chunk))
+            get_health(client, model).record_success(time.monotonic() - started, first_token)
+            events.put((_DONE, member, None))
+        except Exception as e:
+            if not cancelled.is_set():
+                if is_failover_error(e):
+                    self._record_failure(member)
+                events.put((_ERROR, member, e))
+        finally:
+            # 关闭生成器即关闭底层 HTTP 流（被取消的请求不再继续读取）
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    def chat_completion_stream(self, messages: List[Dict[str, str]], **kwargs) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式聊天补全
+
+        首个片段到达前失败（is_failover_error）会转移到下一个提供商，请求本身的错误原样抛出；启用对冲时，首个片段超过 p95 首 token 延迟仍未到达，
+        并发请求下一个提供商，先输出片段的一方胜出。开始输出后失败不再转移（已输出的内容无法撤回）
+        """
+        candidates = self._candidates()
+        remaining = list(candidates)
+        events: 'queue.Queue' = queue.Queue()
+        cancel_flags: Dict[int, threading.Event] = {}
+        running = []
+        errors = []
+
+        def launch():
+            member = remaining.pop(0)
+            cancelled = threading.Event()
+            cancel_flags[id(member)] = cancelled
+            running.append(member)
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._stream_worker, member, messages, kwargs, events, cancelled),
+                daemon=True
+            ).start()
+            return member
+
+        winner = None
+        deadline_member = launch()
+        try:
+            while winner is None:
+                hedging = self.hedge and remaining
+                timeout = self._hedge_after(deadline_member, first_token=True) if hedging else None
+                try:
+                    kind, member, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    get_health(*deadline_member).record_hedge()
+                    deadline_member = launch()
+                    continue
+
+                if kind == _ERROR:
+                    if not is_failover_error(payload):
+                        raise payload
+                    running.remove(member)
+                    errors.append((member, payload))
+                    if remaining and (not running or (self.hedge and len(running) < 2)):
+                        launch()
+                    if not running:
+                        raise self._all_failed(errors)
+                    deadline_member = running[-1]
+                    continue
+
+                winner = member
+                for other in running:
+                    if other is not winner:
+                        cancel_flags[id(other)].set()
+                if kind == _CHUNK:
+                    yield {**payload, **self._served_by(winner)}
+                else:
+                    return
+
+            while True:
+                kind, member, payload = events.get()
+                if member is not winner:
+                    continue
+                if kind == _CHUNK:
+                    yield {**payload, **self._served_by(winner)}
+                elif kind == _DONE:
+                    return
+                else:
+                    raise RuntimeError(f'{self._name(*winner)} 流式输出中断: {payload}') from payload
+        finally:
+            for flag in cancel_flags.values():
+                flag.set()
+
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """向量接口使用第一个支持的提供商"""
+        errors = []
+        for client, _ in self._candidates():
+            try:
+                return client.embed(texts, model=model)
+            except NotImplementedError as e:
+                errors.append(str(e))
+        raise NotImplementedError('; '.join(errors))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各提供商的健康状态"""
+        return [
+            {'provider': self._name(client, model), **get_health(client, model).snapshot()}
+            for client, model in self.members
+        ]
+
+    def __repr__(self) -> str:
+        return f"<FailoverLLMClient {[self._name(client, model) for client, model in self.members]}>"
@@ -2,10 +2,12 @@
 基于 OpenAI 库的 LLM 客户端实现
 支持 OpenAI 及兼容 OpenAI API 的提供商
 """
-from typing import List, Dict, Any, Generator
-from openai import OpenAI
+from typing import List, Dict, Any, Generator, AsyncGenerator, Optional
+from openai import OpenAI, AsyncOpenAI
 from .base import BaseLLMClient
 from .config import LLMProviderConfig
+from .telemetry import instrumented
+from .usage import build_usage, prompt_cache_key
 
 
 class OpenAIClient(BaseLLMClient):
@@ -33,6 +35,113 @@ class OpenAIClient(BaseLLMClient):
             timeout=self.config.timeout,
         )
     
+    def _get_async_openai(self) -> AsyncOpenAI:
+        """当前事件循环中共享的 AsyncOpenAI 客户端"""
+        return self._get_async_client(lambda: AsyncOpenAI(
+            api_key=self.config.api_key,
+            base_url=self.config.base_url,
+            timeout=self.config.timeout,
+        ))
+    
+    def _is_official_api(self) -> bool:
+        """是否为 OpenAI 官方接口（兼容接口不一定支持官方的新参数）"""
+        return (self.config.base_url or '').startswith('https://api.openai.com')
+    
+    @staticmethod
+    def _set_extra_body(params: Dict[str, Any], key: str, value: Any):
+        """
+        通过 extra_body 发送较新的请求参数
+        
+        旧版 SDK 不认识 prompt_cache_key、stream_options 等命名参数，直接传入会抛出 TypeError；
+        extra_body 原样合并到请求体，与 SDK 版本无关。调用方显式传入的同名参数（命名参数或 extra_body 中）优先
+        """
+        value = params.pop(key, value)
+        extra_body = dict(params.get('extra_body') or {})
+        extra_body.setdefault(key, value)
+        params['extra_body'] = extra_body
+    
+    def _request_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        合并调用参数并处理提示词缓存选项（prompt_cache=False 关闭）
+        
+        OpenAI 对 1024 token 以上的相同前缀自动缓存，无需标记；官方接口额外按首条系统消息
+        设置 prompt_cache_key，使相同前缀的请求路由到同一缓存。兼容接口不一定支持该参数，不发送
+        """
+        params = self._merge_params(**kwargs)
+        prompt_cache = params.pop('prompt_cache', self.config.prompt_cache)
+        if not (prompt_cache and self._is_official_api()):
+            params.pop('prompt_cache_key', None)
+        elif 'prompt_cache_key' in params:
+            self._set_extra_body(params, 'prompt_cache_key', None)
+        elif messages and messages[0].get('role') == 'system':
+            self._set_extra_body(params, 'prompt_cache_key', prompt_cache_key(messages[0].get('content') or ''))
+        return params
+    
+    def _stream_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        流式调用参数：请求在最后一个片段中返回用量
+        
+        stream_usage 未配置时只对官方接口请求（兼容接口不一定支持 stream_options），
+        已确认支持的兼容接口可设置 stream_usage=True
+        """
+        params = self._request_params(messages, **kwargs)
+        params['stream'] = True
+        stream_usage = params.pop('stream_usage', self.config.stream_usage)
+        if stream_usage is None:
+            stream_usage = self._is_official_api()
+        if stream_usage:
+            self._set_extra_body(params, 'stream_options', {'include_usage': True})
+        else:
+            params.pop('stream_options', None)
+        return params
+    
+    @staticmethod
+    def _final_stream_chunk(finish_reason, usage) -> Dict[str, Any]:
+        """流结束片段（附带本次调用的用量）"""
+        return {
+            'content': '',
+            'role': 'assistant',
+            'finish_reason': finish_reason or 'stop',
+            'usage': usage,
+        }
+    
+    @staticmethod
+    def _format_usage(usage) -> Optional[Dict[str, int]]:
+        """统一用量字段（命中缓存的 token 数：OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens）"""
+        if usage is None:
+            return None
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cache_read = getattr(details, 'cached_tokens', None) or getattr(usage, 'prompt_cache_hit_tokens', None) or 0
+        return build_usage(usage.prompt_tokens, usage.completion_tokens, cache_read_tokens=cache_read)
+    
+    @classmethod
+    def _format_response(cls, response) -> Dict[str, Any]:
+        """把 SDK 响应转换为统一的响应字典"""
+        message = response.choices[0].message
+        return {
+            'content': message.content,
+            'role': message.role,
+            'model': response.model,
+            'usage': cls._format_usage(response.usage),
+            'finish_reason': response.choices[0].finish_reason,
+        }
+    
+    @staticmethod
+    def _format_stream_chunk(chunk) -> Optional[Dict[str, Any]]:
+        """把流式片段转换为统一的片段字典，没有内容时返回 None"""
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta
+        finish_reason = chunk.choices[0].finish_reason
+        if not delta.content and not finish_reason:
+            return None
+        return {
+            'content': delta.content or '',
+            'role': delta.role or 'assistant',
+            'finish_reason': finish_reason,
+        }
+    
+    @instrumented
     def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -55,30 +164,18 @@ class OpenAIClient(BaseLLMClient):
                 'finish_reason': 'stop'
             }
         """
-        params = self._merge_params(**kwargs)
+        params = self._request_params(messages, **kwargs)
         
         try:
             response = self._client.chat.completions.create(
                 messages=messages,
                 **params
             )
-            
-            message = response.choices[0].message
-            
-            return {
-                'content': message.content,
-                'role': message.role,
-                'model': response.model,
-                'usage': {
-                    'prompt_tokens': response.usage.prompt_tokens,
-                    'completion_tokens': response.usage.completion_tokens,
-                    'total_tokens': response.usage.total_tokens,
-                },
-                'finish_reason': response.choices[0].finish_reason,
-            }
+            return self._format_response(response)
         except Exception as e:
             raise RuntimeError(f"调用 {self.provider} API 失败: {str(e)}") from e
     
+    @instrumented
     def chat_completion_stream(
         self,
         messages: List[Dict[str, str]],
@@ -98,9 +195,9 @@ class OpenAIClient(BaseLLMClient):
                 'role': 'assistant',
                 'finish_reason': None or 'stop'
             }
+            最后一个片段内容为空，带 finish_reason 和 usage（提供商未返回用量时为 None）
         """
-        params = self._merge_params(**kwargs)
-        params['stream'] = True
+        params = self._stream_params(messages, **kwargs)
         
         try:
             stream = self._client.chat.completions.create(
@@ -108,21 +205,101 @@ class OpenAIClient(BaseLLMClient):
                 **params
             )
             
+            # 用量在 finish_reason 之后单独的片段中返回（choices 为空），读到流结束
+            finish_reason, usage = None, None
             for chunk in stream:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    finish_reason = chunk.choices[0].finish_reason
-                    
-                    if delta.content:
-                        yield {
-                            'content': delta.content,
-                            'role': delta.role or 'assistant',
-                            'finish_reason': finish_reason,
-                        }
-                    
-                    # 流结束
-                    if finish_reason:
-                        break
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = self._format_usage(chunk.usage)
+                item = self._format_stream_chunk(chunk)
+                if item is None:
+                    continue
+                if item['content']:
+                    yield item
+                finish_reason = item['finish_reason'] or finish_reason
+            
+            yield self._final_stream_chunk(finish_reason, usage)
                         
         except Exception as e:
             raise RuntimeError(f"调用 {self.provider} 流式 API 失败: {str(e)}") from e
+    
+    # 未指定向量模型时使用的默认模型
+    DEFAULT_EMBEDDING_MODEL = 'text-embedding-3-small'
+    
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        计算文本向量（/embeddings 接口）
+        
+        Args:
+            texts: 文本列表
+            model: 向量模型名称，默认为 text-embedding-3-small
+            
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        try:
+            response = self._client.embeddings.create(
+                model=model or self.DEFAULT_EMBEDDING_MODEL,
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            raise RuntimeError(f"调用 {self.provider} 向量 API 失败: {str(e)}") from e
+    
+    @instrumented
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步聊天补全（AsyncOpenAI，同一事件循环内共享连接池）
+        
+        Returns:
+            与 chat_completion 相同的响应字典
+        """
+        params = self._request_params(messages, **kwargs)
+        
+        try:
+            response = await self._get_async_openai().chat.completions.create(
+                messages=messages,
+                **params
+            )
+            return self._format_response(response)
+        except Exception as e:
+            raise RuntimeError(f"调用 {self.provider} API 失败: {str(e)}") from e
+    
+    @instrumented
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式聊天补全
+        
+        Yields:
+            与 chat_completion_stream 相同的片段字典
+        """
+        params = self._stream_params(messages, **kwargs)
+        
+        try:
+            stream = await self._get_async_openai().chat.completions.create(
+                messages=messages,
+                **params
+            )
+            
+            finish_reason, usage = None, None
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = self._format_usage(chunk.usage)
+                item = self._format_stream_chunk(chunk)
+                if item is None:
+                    continue
+                if item['content']:
+                    yield item
+                finish_reason = item['finish_reason'] or finish_reason
+            
+            yield self._final_stream_chunk(finish_reason, usage)
+                    
+        except Exception as e:
+            raise RuntimeError(f"调用 {self.provider} 流式 API 失败: {str(e)}") from e
@@ -0,0 +1,86 @@
+"""
+LLM 客户端注册表
+按 (提供商, base_url, API 密钥哈希) 在进程内复用客户端实例，
+SDK 客户端持有 HTTP 连接池，复用后同一提供商的后续请求不再重新建立 TCP/TLS 连接
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .base import BaseLLMClient
+from .config import LLMConfig, LLMProviderConfig
+from .factory import LLMFactory
+
+
+# 最多保留的客户端数量（用户各自配置密钥时按最近使用淘汰）
+MAX_CLIENTS = 256
+
+_clients: 'OrderedDict[Tuple[str, str, str], BaseLLMClient]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key_hash(api_key: str) -> str:
+    """注册表键中只保存密钥哈希"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def get_client(
+    provider: str,
+    api_key: str,
+    base_url: Optional[str] = None,
+    model: Optional[str] = None,
+    timeout: int = 60
+) -> BaseLLMClient:
+    """
+    获取（必要时创建）可复用的 LLM 客户端
+
+    同一提供商、地址和密钥的不同模型共用一个客户端，调用时通过 model 参数指定模型
+
+    Args:
+        provider: LLMFactory 支持的提供商名称
+        api_key: API 密钥
+        base_url: API 地址，为空时使用提供商默认地址
+        model: 默认模型（仅在创建客户端时使用）
+        timeout: 请求超时时间（秒，仅在创建客户端时使用）
+
+    Returns:
+        LLM 客户端实例
+
+    Raises:
+        ValueError: 不支持的提供商
+    """
+    provider = provider.lower()
+    if not LLMFactory.is_supported(provider):
+        supported = ', '.join(LLMFactory.get_supported_providers())
+        raise ValueError(f"不支持的 LLM 提供商: {provider}。支持的提供商: {supported}")
+
+    # 通过 register_client 注册的提供商可能没有默认配置
+    defaults = LLMConfig.PROVIDER_CONFIGS.get(provider, {})
+    base_url = (base_url or defaults.get('base_url') or '').rstrip('/')
+    key = (provider, base_url, _key_hash(api_key))
+
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+        config = LLMProviderConfig(
+            provider=provider,
+            api_key=api_key,
+            base_url=base_url or None,
+            model=model or defaults.get('default_model'),
+            timeout=timeout,
+        )
+        client = LLMFactory.create(provider, config=config)
+        _clients[key] = client
+        while len(_clients) > MAX_CLIENTS:
+            _clients.popitem(last=False)
+        return client
+
+
+def clear_clients():
+    """清空注册表（测试或密钥轮换后使用）"""
+    with _lock:
+        _clients.clear()
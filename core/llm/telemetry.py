@@ -0,0 +1,454 @@
+"""
+LLM 调用遥测
+记录每次提供商 API 调用的首 token 延迟（TTFT）、总耗时、输入/输出 token 数、输出速度和估算费用：
+- 客户端方法用 @instrumented 装饰，同步、异步、流式调用均自动记录
+- 非流式响应字典带 'metrics' 字段；流式调用在最后追加一个内容为空、带 'metrics' 字段的片段
+- 进程内累计为 Prometheus 文本格式的指标（telemetry.render_prometheus()）
+- collect_llm_metrics() 汇总一段代码中的全部调用（如一篇论文的参考文献解析）
+
+提供商未返回用量时（部分兼容接口的流式响应），token 数按 core.llm.context.count_tokens 估算，
+并标记 usage_estimated。费用按 MODEL_PRICES（美元 / 百万 token）估算，未知模型的费用为 None，
+可用 set_model_price() 或环境变量 LLM_MODEL_PRICES（JSON，{"模型": [输入, 输出, 缓存输入]}）补充
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .context import count_tokens
+
+
+@dataclass
+class ModelPrice:
+    """模型价格（美元 / 百万 token）"""
+    input: float
+    output: float
+    # 命中提示词缓存的输入价格，为空时按 input 计
+    cached_input: Optional[float] = None
+    # 写入提示词缓存的输入价格（Anthropic 为输入价格的 1.25 倍），为空时按 input 计
+    cache_write: Optional[float] = None
+
+
+# 常用模型的公开价格，按模型名前缀匹配（最长前缀优先），价格变化时更新或用 set_model_price 覆盖
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    'gpt-4o-mini': ModelPrice(0.15, 0.60, cached_input=0.075),
+    'gpt-4o': ModelPrice(2.50, 10.00, cached_input=1.25),
+    'gpt-4.1-nano': ModelPrice(0.10, 0.40, cached_input=0.025),
+    'gpt-4.1-mini': ModelPrice(0.40, 1.60, cached_input=0.10),
+    'gpt-4.1': ModelPrice(2.00, 8.00, cached_input=0.50),
+    'deepseek-chat': ModelPrice(0.27, 1.10, cached_input=0.07),
+    'deepseek-reasoner': ModelPrice(0.55, 2.19, cached_input=0.14),
+    'claude-3-5-haiku': ModelPrice(0.80, 4.00, cached_input=0.08, cache_write=1.00),
+    'claude-3-5-sonnet': ModelPrice(3.00, 15.00, cached_input=0.30, cache_write=3.75),
+    'claude-3-7-sonnet': ModelPrice(3.00, 15.00, cached_input=0.30, cache_write=3.75),
+    'claude-sonnet-4': ModelPrice(3.00, 15.00, cached_input=0.30, cache_write=3.75),
+}
+
+# 延迟直方图的分桶（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 输出速度直方图的分桶（token/秒）
+SPEED_BUCKETS = (5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+TOKEN_FIELDS = ('prompt_tokens', 'completion_tokens', 'cache_read_tokens', 'cache_write_tokens')
+
+
+def set_model_price(
+    model: str,
+    input: float,
+    output: float,
+    cached_input: Optional[float] = None,
+    cache_write: Optional[float] = None
+):
+    """设置（覆盖）模型价格，model 为模型名或模型名前缀"""
+    MODEL_PRICES[model] = ModelPrice(input, output, cached_input, cache_write)
+
+
+def _load_env_prices():
+    try:
+        prices = json.loads(os.getenv('LLM_MODEL_PRICES') or '{}')
+    except json.JSONDecodeError as e:
+        print(f"LLM_MODEL_PRICES 格式错误: {e}")
+        return
+    for model, values in prices.items():
+        set_model_price(model, *values)
+
+
+_load_env_prices()
+
+
+def get_model_price(model: Optional[str]) -> Optional[ModelPrice]:
+    """按模型名查找价格（最长前缀匹配）"""
+    if not model:
+        return None
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, int]) -> Optional[float]:
+    """
+    估算一次调用的费用（美元）
+
+    Args:
+        model: 模型名称
+        usage: 统一格式的用量字典（prompt_tokens 含缓存读取和写入的部分）
+
+    Returns:
+        费用，未知模型时为 None
+    """
+    price = get_model_price(model)
+    if price is None:
+        return None
+    cache_read = usage.get('cache_read_tokens') or 0
+    cache_write = usage.get('cache_write_tokens') or 0
+    uncached = max(0, (usage.get('prompt_tokens') or 0) - cache_read - cache_write)
+    cost = (
+        uncached * price.input
+        + cache_read * (price.input if price.cached_input is None else price.cached_input)
+        + cache_write * (price.input if price.cache_write is None else price.cache_write)
+        + (usage.get('completion_tokens') or 0) * price.output
+    )
+    return cost / 1_000_000
+
+
+class _Histogram:
+    """Prometheus 风格的累计直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class LLMTelemetry:
+    """进程内的 LLM 调用指标（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空全部指标"""
+        with self._lock:
+            self._requests: Dict[Tuple[str, str, str, str], int] = {}
+            self._tokens: Dict[Tuple[str, str, str], int] = {}
+            self._cost: Dict[Tuple[str, str], float] = {}
+            self._latency: Dict[Tuple[str, str, str], _Histogram] = {}
+            self._ttft: Dict[Tuple[str, str], _Histogram] = {}
+            self._speed: Dict[Tuple[str, str], _Histogram] = {}
+
+    def record(self, metrics: Dict[str, Any]):
+        """累计一次调用的指标（build_metrics 的返回值）"""
+        provider, model, operation = metrics['provider'], metrics['model'] or '', metrics['operation']
+        with self._lock:
+            key = (provider, model, operation, metrics['status'])
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._latency.setdefault((provider, model, operation), _Histogram(LATENCY_BUCKETS)).observe(metrics['latency'])
+            if metrics['status'] != 'ok':
+                return
+            for field in TOKEN_FIELDS:
+                token_key = (provider, model, field[:-len('_tokens')])
+                self._tokens[token_key] = self._tokens.get(token_key, 0) + (metrics.get(field) or 0)
+            if metrics.get('cost') is not None:
+                self._cost[(provider, model)] = self._cost.get((provider, model), 0.0) + metrics['cost']
+            if metrics.get('ttft') is not None:
+                self._ttft.setdefault((provider, model), _Histogram(LATENCY_BUCKETS)).observe(metrics['ttft'])
+            if metrics.get('tokens_per_second'):
+                self._speed.setdefault((provider, model), _Histogram(SPEED_BUCKETS)).observe(metrics['tokens_per_second'])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """按 提供商/模型 汇总的调用次数、token 数和费用"""
+        with self._lock:
+            summary: Dict[str, Dict[str, Any]] = {}
+            for (provider, model, _, status), count in self._requests.items():
+                entry = summary.setdefault(f'{provider}/{model}', {'requests': 0, 'errors': 0, 'cost': 0.0})
+                entry['requests'] += count
+                if status != 'ok':
+                    entry['errors'] += count
+            for (provider, model, kind), count in self._tokens.items():
+                entry = summary[f'{provider}/{model}']
+                entry[f'{kind}_tokens'] = entry.get(f'{kind}_tokens', 0) + count
+            for (provider, model), cost in self._cost.items():
+                summary[f'{provider}/{model}']['cost'] += cost
+            return summary
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, series, label_names):
+            for key, hist in sorted(series.items()):
+                labels = dict(zip(label_names, key))
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {count}')
+                lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.count}')
+                lines.append(f'{name}_sum{_labels(**labels)} {hist.sum}')
+                lines.append(f'{name}_count{_labels(**labels)} {hist.count}')
+
+        with self._lock:
+            header('llm_requests_total', 'counter', 'LLM API calls by status (ok, error, cancelled).')
+            for (provider, model, operation, status), count in sorted(self._requests.items()):
+                lines.append(f'llm_requests_total{_labels(provider=provider, model=model, operation=operation, status=status)} {count}')
+
+            header('llm_tokens_total', 'counter', 'Tokens by type (prompt includes cache_read and cache_write).')
+            for (provider, model, kind), count in sorted(self._tokens.items()):
+                lines.append(f'llm_tokens_total{_labels(provider=provider, model=model, type=kind)} {count}')
+
+            header('llm_cost_usd_total', 'counter', 'Estimated cost in USD for models with a known price.')
+            for (provider, model), cost in sorted(self._cost.items()):
+                lines.append(f'llm_cost_usd_total{_labels(provider=provider, model=model)} {cost:.6f}')
+
+            header('llm_request_duration_seconds', 'histogram', 'Total LLM call latency.')
+            histogram('llm_request_duration_seconds', self._latency, ('provider', 'model', 'operation'))
+
+            header('llm_time_to_first_token_seconds', 'histogram', 'Time to first streamed token.')
+            histogram('llm_time_to_first_token_seconds', self._ttft, ('provider', 'model'))
+
+            header('llm_output_tokens_per_second', 'histogram', 'Completion tokens per second after the first token.')
+            histogram('llm_output_tokens_per_second', self._speed, ('provider', 'model'))
+        return '\n'.join(lines) + '\n'
+
+
+# 进程内共享的指标
+telemetry = LLMTelemetry()
+
+
+class LLMMetricsCollector:
+    """汇总一段代码中的全部 LLM 调用（线程安全）"""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, metrics: Dict[str, Any]):
+        with self._lock:
+            self.calls.append(metrics)
+
+    def summary(self) -> Dict[str, Any]:
+        """调用次数、失败次数、token 数、累计耗时、最长耗时和估算费用（有未知价格的调用时为 None）"""
+        with self._lock:
+            calls = list(self.calls)
+        ok = [call for call in calls if call['status'] == 'ok']
+        summary = {
+            'calls': len(calls),
+            'errors': len(calls) - len(ok),
+            'models': sorted({f"{call['provider']}/{call['model']}" for call in calls}),
+            'latency': round(sum(call['latency'] for call in calls), 3),
+            'max_latency': round(max((call['latency'] for call in calls), default=0.0), 3),
+        }
+        for field in TOKEN_FIELDS:
+            summary[field] = sum(call.get(field) or 0 for call in ok)
+        costs = [call.get('cost') for call in ok]
+        summary['cost'] = round(sum(costs), 6) if None not in costs else None
+        return summary
+
+
+_collector: contextvars.ContextVar[Optional[LLMMetricsCollector]] = contextvars.ContextVar('llm_metrics_collector', default=None)
+
+
+@contextmanager
+def collect_llm_metrics():
+    """
+    汇总 with 块内的 LLM 调用
+
+    在线程池中调用时需用 contextvars.copy_context() 把上下文带到工作线程
+
+    Example:
+        with collect_llm_metrics() as collector:
+            extractor.process_reference_text_with_llm(...)
+        print(collector.summary())
+    """
+    collector = LLMMetricsCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def build_metrics(
+    provider: str,
+    model: Optional[str],
+    operation: str,
+    status: str,
+    latency: float,
+    ttft: Optional[float] = None,
+    usage: Optional[Dict[str, int]] = None,
+    messages: Optional[List[Dict[str, str]]] = None,
+    completion_text: str = ''
+) -> Dict[str, Any]:
+    """
+    构建一次调用的指标字典
+
+    Args:
+        provider: 提供商
+        model: 模型名称
+        operation: chat（非流式）或 stream
+        status: ok / error / cancelled
+        latency: 总耗时（秒）
+        ttft: 首个内容片段的延迟（秒，仅流式调用）
+        usage: 提供商返回的用量，为空时按消息和输出文本估算
+        messages: 输入消息（估算输入 token 数）
+        completion_text: 输出文本（估算输出 token 数）
+    """
+    metrics: Dict[str, Any] = {
+        'provider': provider,
+        'model': model,
+        'operation': operation,
+        'status': status,
+        'latency': round(latency, 3),
+        'ttft': round(ttft, 3) if ttft is not None else None,
+    }
+    if status != 'ok':
+        return metrics
+
+    if not usage:
+        usage = {
+            'prompt_tokens': sum(count_tokens(m.get('content') or '', model) for m in messages or [] if isinstance(m.get('content'), str)),
+            'completion_tokens': count_tokens(completion_text, model),
+        }
+        metrics['usage_estimated'] = True
+    for field in TOKEN_FIELDS:
+        metrics[field] = usage.get(field) or 0
+
+    # 输出速度：流式调用按首 token 之后的时间计算，非流式调用按总耗时计算
+    generation_time = latency - (ttft or 0.0)
+    completion = metrics['completion_tokens']
+    metrics['tokens_per_second'] = round(completion / generation_time, 1) if completion and generation_time > 0 else None
+    cost = estimate_cost(model, metrics)
+    metrics['cost'] = round(cost, 6) if cost is not None else None
+    return metrics
+
+
+def _record(metrics: Dict[str, Any]):
+    telemetry.record(metrics)
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(metrics)
+
+
+class _CallTracker:
+    """跟踪一次调用的耗时、首 token 和输出"""
+
+    def __init__(self, client, operation: str, messages, kwargs):
+        self.provider = client.provider
+        self.model = kwargs.get('model') or client.model
+        self.operation = operation
+        self.messages = messages
+        self.started = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.parts: List[str] = []
+        self.usage: Optional[Dict[str, int]] = None
+
+    def on_chunk(self, chunk: Dict[str, Any]):
+        if chunk.get('content'):
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self.parts.append(chunk['content'])
+        if chunk.get('usage'):
+            self.usage = chunk['usage']
+
+    def finish(self, status: str, response: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if response is not None:
+            self.usage = response.get('usage')
+            self.parts = [response.get('content') or '']
+            self.model = response.get('model') or self.model
+        metrics = build_metrics(
+            self.provider, self.model, self.operation, status, time.perf_counter() - self.started,
+            ttft=self.ttft, usage=self.usage, messages=self.messages, completion_text=''.join(self.parts)
+        )
+        _record(metrics)
+        return metrics
+
+    def final_chunk(self, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        return {'content': '', 'role': 'assistant', 'finish_reason': None, 'metrics': metrics}
+
+
+def instrumented(method):
+    """
+    客户端方法的遥测装饰器（chat_completion / chat_completion_stream / achat_completion / astream）
+
+    非流式响应增加 'metrics' 字段；流式调用结束后追加一个带 'metrics' 字段的空片段。
+    调用失败时记录 error，流式调用被提前关闭时记录 cancelled
+    """
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, messages, **kwargs):
+            tracker = _CallTracker(self, 'stream', messages, kwargs)
+            try:
+                async for chunk in method(self, messages, **kwargs):
+                    tracker.on_chunk(chunk)
+                    yield chunk
+            except GeneratorExit:
+                tracker.finish('cancelled')
+                raise
+            except BaseException:
+                tracker.finish('error')
+                raise
+            yield tracker.final_chunk(tracker.finish('ok'))
+        return wrapper
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, messages, **kwargs):
+            tracker = _CallTracker(self, 'chat', messages, kwargs)
+            try:
+                response = await method(self, messages, **kwargs)
+            except BaseException:
+                tracker.finish('error')
+                raise
+            return {**response, 'metrics': tracker.finish('ok', response)}
+        return wrapper
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def wrapper(self, messages, **kwargs):
+            tracker = _CallTracker(self, 'stream', messages, kwargs)
+            try:
+                for chunk in method(self, messages, **kwargs):
+                    tracker.on_chunk(chunk)
+                    yield chunk
+            except GeneratorExit:
+                tracker.finish('cancelled')
+                raise
+            except BaseException:
+                tracker.finish('error')
+                raise
+            yield tracker.final_chunk(tracker.finish('ok'))
+        return wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, messages, **kwargs):
+        tracker = _CallTracker(self, 'chat', messages, kwargs)
+        try:
+            response = method(self, messages, **kwargs)
+        except BaseException:
+            tracker.finish('error')
+            raise
+        return {**response, 'metrics': tracker.finish('ok', response)}
+    return wrapper
@@ -0,0 +1,206 @@
+"""
+LLM 客户端测试工具
+本地模拟的 OpenAI 兼容 API 服务，供 core.llm.tests 和 core.tests 共用
+"""
+import email
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import LLMProviderConfig
+
+
+class FakeBatchServer:
+    """
+    本地模拟的 OpenAI 兼容 API 服务（聊天补全，以及 Batch API 的文件上传、创建批次、查询状态、下载结果）
+    
+    responder(custom_id, body) 返回响应文本（聊天补全的 custom_id 为 None）；抛出异常则该请求记为失败。
+    批次在被查询 polls_before_complete 次后完成。
+    """
+    
+    def __init__(self, responder, polls_before_complete=1):
+        self.responder = responder
+        self.polls_before_complete = polls_before_complete
+        self.files = {}
+        self.batches = {}
+        self.chat_requests = 0
+        self._lock = threading.RLock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+    
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def client_config(self, provider='openai', model='fake-model'):
+        """指向本服务的提供商配置（本服务支持流式用量）"""
+        return LLMProviderConfig(
+            provider=provider, api_key='sk-fake', base_url=self.base_url, model=model, stream_usage=True
+        )
+    
+    def _add_file(self, data, purpose):
+        with self._lock:
+            file_id = f'file-{len(self.files) + 1}'
+            self.files[file_id] = data
+        return {
+            'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+            'filename': f'{file_id}.jsonl', 'purpose': purpose, 'status': 'processed',
+        }
+    
+    def _run_batch(self, batch):
+        """执行批次中的所有请求，生成输出文件和错误文件"""
+        output_lines, error_lines = [], []
+        for line in self.files[batch['input_file_id']].decode('utf-8').splitlines():
+            request = json.loads(line)
+            try:
+                content = self.responder(request['custom_id'], request['body'])
+                output_lines.append({
+                    'id': f"resp-{request['custom_id']}",
+                    'custom_id': request['custom_id'],
+                    'response': {
+                        'status_code': 200,
+                        'body': {
+                            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}],
+                            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+                        },
+                    },
+                    'error': None,
+                })
+            except Exception as e:
+                error_lines.append({
+                    'id': f"resp-{request['custom_id']}",
+                    'custom_id': request['custom_id'],
+                    'response': None,
+                    'error': {'code': 'server_error', 'message': str(e)},
+                })
+        
+        def dump(lines):
+            return ''.join(json.dumps(item) + '\n' for item in lines).encode('utf-8')
+        
+        batch['status'] = 'completed'
+        batch['output_file_id'] = self._add_file(dump(output_lines), 'batch_output')['id'] if output_lines else None
+        batch['error_file_id'] = self._add_file(dump(error_lines), 'batch_output')['id'] if error_lines else None
+        batch['request_counts'] = {
+            'total': len(output_lines) + len(error_lines),
+            'completed': len(output_lines),
+            'failed': len(error_lines),
+        }
+    
+    def _make_handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _read_body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            
+            def _send_chat(self, params):
+                content = fake.responder(None, params)
+                if not params.get('stream'):
+                    self._send_json({
+                        'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': int(time.time()),
+                        'model': params['model'],
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': content}}],
+                        'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15,
+                                  'prompt_tokens_details': {'cached_tokens': 8}},
+                    })
+                    return
+                
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                pieces = [(word, None) for word in content.split(' ')] + [('', 'stop')]
+                for i, (piece, finish_reason) in enumerate(pieces):
+                    chunk = {
+                        'id': 'chatcmpl-1', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                        'model': params['model'],
+                        'choices': [{'index': 0, 'finish_reason': finish_reason,
+                                     'delta': {'content': piece if i == 0 or not piece else ' ' + piece}}],
+                    }
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                if (params.get('stream_options') or {}).get('include_usage'):
+                    chunk = {
+                        'id': 'chatcmpl-1', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                        'model': params['model'], 'choices': [],
+                        'usage': {'prompt_tokens': 10, 'completion_tokens': len(pieces) - 1, 'total_tokens': 9 + len(pieces)},
+                    }
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                self.wfile.write(b'data: [DONE]\n\n')
+            
+            def do_POST(self):
+                body = self._read_body()
+                if self.path == '/v1/chat/completions':
+                    with fake._lock:
+                        fake.chat_requests += 1
+                    self._send_chat(json.loads(body))
+                elif self.path == '/v1/files':
+                    message = email.message_from_bytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                    )
+                    fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                              for part in message.get_payload()}
+                    self._send_json(fake._add_file(fields['file'], fields['purpose'].decode()))
+                elif self.path == '/v1/batches':
+                    params = json.loads(body)
+                    with fake._lock:
+                        batch_id = f'batch-{len(fake.batches) + 1}'
+                        fake.batches[batch_id] = {
+                            'id': batch_id, 'object': 'batch', 'endpoint': params['endpoint'],
+                            'input_file_id': params['input_file_id'],
+                            'completion_window': params['completion_window'],
+                            'status': 'validating', 'created_at': int(time.time()),
+                            'output_file_id': None, 'error_file_id': None,
+                            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+                            'polls': 0,
+                        }
+                    self._send_json(self._public(fake.batches[batch_id]))
+                else:
+                    self._send_json({'error': {'message': 'not found'}}, status=404)
+            
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                if parts[:2] == ['v1', 'batches'] and len(parts) == 3 and parts[2] in fake.batches:
+                    batch = fake.batches[parts[2]]
+                    with fake._lock:
+                        if batch['status'] != 'completed':
+                            batch['polls'] += 1
+                            batch['status'] = 'in_progress'
+                            if batch['polls'] > fake.polls_before_complete:
+                                fake._run_batch(batch)
+                    self._send_json(self._public(batch))
+                elif parts[:2] == ['v1', 'files'] and len(parts) == 4 and parts[2] in fake.files:
+                    data = fake.files[parts[2]]
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self._send_json({'error': {'message': 'not found'}}, status=404)
+            
+            @staticmethod
+            def _public(batch):
+                return {k: v for k, v in batch.items() if k != 'polls'}
+        
+        return Handler
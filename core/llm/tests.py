@@ -2,10 +2,28 @@
 LLM 客户端单元测试
 """
 import os
+import asyncio
+import json
+import threading
+import time
 from unittest.mock import Mock, patch, MagicMock
 from .factory import LLMFactory
 from .config import LLMConfig, LLMProviderConfig
-from .base import BaseLLMClient
+from .base import BaseLLMClient, aclose_async_clients
+from .openai_client import OpenAIClient
+from .registry import get_client, clear_clients
+from .cache import CachedLLMClient
+from .concurrency import AdaptiveConcurrencyLimiter, is_overload_error
+from .context import ContextWindow, count_tokens, truncate_tokens
+from .anthropic_client import AnthropicClient, format_usage as format_anthropic_usage
+from .usage import UsageCounter
+from .failover import FailoverLLMClient, get_health, is_failover_error
+from .telemetry import collect_llm_metrics, estimate_cost, telemetry
+from .testing import FakeBatchServer
+from .batch import (
+    BatchRequest, OpenAIBatchClient, create_batch_client,
+    BATCH_IN_PROGRESS, BATCH_COMPLETED,
+)
 
 
 class TestLLMConfig:
@@ -124,6 +142,640 @@ class TestBaseLLMClient:
         print("✓ 参数合并功能正常")
 
 
+class TestBatchClient:
+    """测试批量 API 客户端（使用本地模拟的 Batch API 服务）"""
+    
+    def test_create_batch_client(self):
+        """测试批量客户端工厂"""
+        config = LLMProviderConfig(provider='openai', api_key='sk-test', base_url='http://127.0.0.1:1/v1', model='gpt-4')
+        client = create_batch_client('openai', config=config)
+        assert isinstance(client, OpenAIBatchClient)
+        
+        try:
+            create_batch_client('deepseek', config=config)
+            assert False, "应该抛出 ValueError"
+        except ValueError as e:
+            assert '不支持批量 API' in str(e)
+        print("✓ 批量客户端工厂正常")
+    
+    def test_openai_batch_roundtrip(self):
+        """测试提交批次、轮询状态和流式读取结果"""
+        def responder(custom_id, body):
+            if custom_id == 'req-bad':
+                raise RuntimeError('boom')
+            return f"{body['model']}:{body['messages'][-1]['content']}"
+        
+        with FakeBatchServer(responder, polls_before_complete=1) as server:
+            client = OpenAIBatchClient(server.client_config())
+            requests = [
+                BatchRequest('req-1', [{'role': 'user', 'content': 'hello'}], {'temperature': 0.1}),
+                BatchRequest('req-2', [{'role': 'user', 'content': 'world'}]),
+                BatchRequest('req-bad', [{'role': 'user', 'content': 'x'}]),
+            ]
+            batch_id = client.submit(requests)
+            
+            # 提交的 JSONL 包含合并后的请求参数
+            submitted = [json.loads(line) for line in server.files['file-1'].decode().splitlines()]
+            assert submitted[0]['url'] == '/v1/chat/completions'
+            assert submitted[0]['body']['temperature'] == 0.1
+            assert submitted[0]['body']['model'] == 'fake-model'
+            
+            assert client.get_status(batch_id).status == BATCH_IN_PROGRESS
+            status = client.get_status(batch_id)
+            assert status.status == BATCH_COMPLETED
+            assert (status.total, status.completed, status.failed) == (3, 2, 1)
+            
+            results = {result.custom_id: result for result in client.iter_results(batch_id)}
+            assert results['req-1'].content == 'fake-model:hello'
+            assert results['req-2'].usage['total_tokens'] == 15
+            assert not results['req-bad'].success
+            assert results['req-bad'].error == 'boom'
+        print("✓ 批次提交与结果回收正常")
+
+
+class TestAsyncClient:
+    """测试异步调用接口（使用本地模拟的 OpenAI 兼容服务）"""
+    
+    def test_openai_async_completion_and_stream(self):
+        """测试 achat_completion / astream，同一事件循环中的客户端共享 AsyncOpenAI 连接池"""
+        def responder(custom_id, body):
+            return f"echo {body['messages'][-1]['content']}"
+        
+        async def run(config):
+            clients = [OpenAIClient(config) for _ in range(2)]
+            try:
+                responses = await asyncio.gather(*(
+                    clients[i % 2].achat_completion([{'role': 'user', 'content': f'q{i}'}])
+                    for i in range(20)
+                ))
+                chunks = [chunk async for chunk in clients[0].astream([{'role': 'user', 'content': 'a b c'}])]
+                shared = clients[0]._get_async_openai() is clients[1]._get_async_openai()
+                return responses, chunks, shared
+            finally:
+                await aclose_async_clients()
+        
+        with FakeBatchServer(responder) as server:
+            responses, chunks, shared = asyncio.run(run(server.client_config()))
+            assert server.chat_requests == 21
+        
+        assert [r['content'] for r in responses] == [f'echo q{i}' for i in range(20)]
+        assert responses[0]['usage']['total_tokens'] == 15
+        assert ''.join(chunk['content'] for chunk in chunks) == 'echo a b c'
+        assert shared
+        print("✓ 异步调用与共享连接池正常")
+    
+    def test_default_async_fallback(self):
+        """没有异步 SDK 的客户端默认在线程池中执行同步调用"""
+        class EchoClient(BaseLLMClient):
+            def _initialize_client(self):
+                pass
+            
+            def chat_completion(self, messages, **kwargs):
+                return {'content': messages[-1]['content']}
+            
+            def chat_completion_stream(self, messages, **kwargs):
+                for word in messages[-1]['content'].split():
+                    yield {'content': word, 'role': 'assistant', 'finish_reason': None}
+        
+        client = EchoClient(LLMProviderConfig(provider='echo', api_key='x', model='echo'))
+        
+        async def run():
+            response = await client.achat_completion([{'role': 'user', 'content': 'hi there'}])
+            chunks = [chunk['content'] async for chunk in client.astream([{'role': 'user', 'content': 'hi there'}])]
+            return response, chunks
+        
+        response, chunks = asyncio.run(run())
+        assert response['content'] == 'hi there'
+        assert chunks == ['hi', 'there']
+        print("✓ 默认异步实现正常")
+
+
+class TestClientRegistry:
+    """测试进程内客户端注册表"""
+    
+    def test_reuses_clients(self):
+        """相同提供商、地址和密钥复用同一客户端（不同模型也复用），否则创建新客户端"""
+        clear_clients()
+        client = get_client('openai', 'sk-a', base_url='http://127.0.0.1:1/v1/', model='gpt-4o')
+        assert get_client('openai', 'sk-a', base_url='http://127.0.0.1:1/v1', model='gpt-4o-mini') is client
+        assert get_client('openai', 'sk-b', base_url='http://127.0.0.1:1/v1') is not client
+        assert get_client('deepseek', 'sk-a', base_url='http://127.0.0.1:1/v1') is not client
+        assert client.config.base_url == 'http://127.0.0.1:1/v1'
+        
+        try:
+            get_client('gemini', 'sk-a')
+            assert False, "应该抛出 ValueError"
+        except ValueError as e:
+            assert '不支持的 LLM 提供商' in str(e)
+        clear_clients()
+        print("✓ 客户端注册表复用正常")
+
+
+class CountingClient(BaseLLMClient):
+    """记录调用次数、按问题回复的测试客户端"""
+    
+    def __init__(self):
+        super().__init__(LLMProviderConfig(provider='fake', api_key='x', model='fake-model'))
+        self.calls = 0
+    
+    def _initialize_client(self):
+        pass
+    
+    def chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        return {'content': f"answer {self.calls}: {messages[-1]['content']}", 'finish_reason': 'stop'}
+    
+    def chat_completion_stream(self, messages, **kwargs):
+        content = self.chat_completion(messages, **kwargs)['content']
+        for word in content.split(' '):
+            yield {'content': word + ' ', 'role': 'assistant', 'finish_reason': None}
+
+
+class TestResponseCache:
+    """测试 LLM 响应缓存装饰器"""
+    
+    CONTEXT = [{'role': 'system', 'content': 'The user selected: Attention is all you need.'}]
+    
+    def _ask(self, client, question, context=None, **kwargs):
+        messages = (context or self.CONTEXT) + [{'role': 'user', 'content': question}]
+        return client.chat_completion(messages, **kwargs)
+    
+    def test_exact_and_semantic_tiers(self):
+        """相同消息精确命中；同一上下文中的近似问题近似命中；不同上下文或参数不命中"""
+        inner = CountingClient()
+        client = CachedLLMClient(inner, similarity_threshold=0.9)
+        
+        first = self._ask(client, 'What is the main contribution of this paper?')
+        assert self._ask(client, 'What is the main contribution of this paper?')['cache'] == 'exact'
+        similar = self._ask(client, 'what is the main contribution of this paper')
+        assert similar['cache'] == 'semantic' and similar['content'] == first['content']
+        assert inner.calls == 1
+        
+        # 不同问题、不同上下文、不同调用参数都不命中
+        assert 'cache' not in self._ask(client, 'What is the main limitation of this paper?')
+        other_context = [{'role': 'system', 'content': 'The user selected: BERT.'}]
+        assert 'cache' not in self._ask(client, 'What is the main contribution of this paper?', context=other_context)
+        assert 'cache' not in self._ask(client, 'What is the main contribution of this paper?', temperature=0.0)
+        assert inner.calls == 4
+        
+        # 跳过缓存
+        assert 'cache' not in self._ask(client, 'What is the main contribution of this paper?', use_cache=False)
+        assert inner.calls == 5
+        
+        stats = client.cache.stats()
+        assert (stats['exact'], stats['semantic'], stats['misses'], stats['bypassed']) == (1, 1, 4, 1)
+        assert abs(stats['hit_rate'] - 2 / 6) < 1e-9
+        print("✓ 精确层与近似层缓存正常")
+    
+    def test_semantic_tier_requires_same_identifiers(self):
+        """只差公式、表格编号的问题字面相似度很高，但不能互相命中"""
+        inner = CountingClient()
+        client = CachedLLMClient(inner)
+        
+        self._ask(client, 'Can you explain the loss function in equation 3?')
+        assert 'cache' not in self._ask(client, 'Can you explain the loss function in equation 4?')
+        self._ask(client, 'What does Table 2 show about the results?')
+        assert 'cache' not in self._ask(client, 'What does Table 5 show about the results?')
+        assert inner.calls == 4
+        
+        # 编号相同、措辞略有不同时仍然近似命中
+        assert self._ask(client, 'can you explain the loss function in Equation 3')['cache'] == 'semantic'
+        assert inner.calls == 4
+        print("✓ 编号不同的问题不会近似命中")
+    
+    def test_ttl_lru_and_stream(self):
+        """过期和超出容量的条目被淘汰；流式响应读完后写入缓存并可回放"""
+        inner = CountingClient()
+        client = CachedLLMClient(inner, max_entries=2, ttl=0.05, similarity_threshold=None)
+        self._ask(client, 'q1')
+        time.sleep(0.06)
+        assert 'cache' not in self._ask(client, 'q1')
+        
+        self._ask(client, 'q2')
+        self._ask(client, 'q3')
+        assert client.cache.stats()['entries'] == 2
+        assert 'cache' not in self._ask(client, 'q1')
+        assert self._ask(client, 'q3')['cache'] == 'exact'
+        
+        messages = self.CONTEXT + [{'role': 'user', 'content': 'stream me'}]
+        streamed = ''.join(chunk['content'] for chunk in client.chat_completion_stream(messages))
+        calls = inner.calls
+        replayed = list(client.chat_completion_stream(messages))
+        assert inner.calls == calls
+        assert ''.join(chunk['content'] for chunk in replayed) == streamed
+        assert replayed[-1]['finish_reason'] == 'stop'
+        print("✓ TTL、LRU 淘汰和流式缓存正常")
+
+
+class TestContextWindow:
+    """测试按 token 预算裁剪对话上下文"""
+    
+    @staticmethod
+    def _conversation(turns):
+        messages = []
+        for i in range(turns):
+            messages.append({'role': 'user', 'content': f'Question {i}: ' + 'why does attention scale quadratically? ' * 10})
+            messages.append({'role': 'assistant', 'content': f'Answer {i}: ' + 'because every token attends to every other token. ' * 20})
+        messages.append({'role': 'user', 'content': 'Latest question?'})
+        return messages
+    
+    def test_truncate_keeps_head_and_tail(self):
+        """超出预算的原文保留开头和结尾"""
+        text = 'Start of the selection. ' + 'filler words here. ' * 500 + 'End of the selection.'
+        trimmed = truncate_tokens(text, 100)
+        assert count_tokens(trimmed) <= 100
+        assert trimmed.startswith('Start of the selection.') and trimmed.endswith('End of the selection.')
+        assert '[...]' in trimmed
+        assert truncate_tokens('short text', 100) == 'short text'
+        print("✓ 原文截断正常")
+    
+    def test_prompt_size_is_bounded(self):
+        """对话轮数增加时提示词长度不超过预算，最近消息原样保留，早先消息压缩为摘要"""
+        window = ContextWindow(max_prompt_tokens=1500, context_tokens=300, keep_recent_messages=4, summary_tokens=200)
+        template = lambda text: f'Selected text:\n{text}'
+        context = 'Attention is all you need. ' * 400
+        
+        sizes = []
+        for turns in (1, 10, 50):
+            messages = self._conversation(turns)
+            result, stats = window.build(messages, context, template)
+            sizes.append(stats['prompt_tokens'])
+            assert stats['prompt_tokens'] <= 1500
+            assert stats['context_trimmed'] == 1
+            assert result[-1] == messages[-1]
+            assert result[0]['content'].startswith('Selected text:')
+        assert abs(sizes[1] - sizes[2]) < 100
+        
+        result, stats = window.build(self._conversation(50), context, template)
+        assert stats['summarized_messages'] == 101 - 4
+        assert result[1]['content'].startswith('Summary of the earlier conversation')
+        assert result[2:] == self._conversation(50)[-4:]
+        
+        # 关闭摘要时早先消息直接丢弃
+        window.summary_tokens = 0
+        result, stats = window.build(self._conversation(50), context, template)
+        assert stats['dropped_messages'] == 97 and stats['summarized_messages'] == 0
+        assert len(result) == 5
+        print("✓ 上下文窗口裁剪正常")
+    
+    def test_oversized_last_message_is_truncated(self):
+        """单条超长问题也会被截断到预算内"""
+        window = ContextWindow(max_prompt_tokens=200)
+        result, stats = window.build([{'role': 'user', 'content': 'word ' * 5000}])
+        assert len(result) == 1 and stats['prompt_tokens'] <= 200
+        print("✓ 超长问题截断正常")
+
+
+class TestPromptCache:
+    """测试提供商侧提示词缓存的请求构建和用量统计"""
+    
+    MESSAGES = [
+        {'role': 'system', 'content': 'Fixed instructions and the selected paper text.'},
+        {'role': 'system', 'content': 'Per-question excerpts.'},
+        {'role': 'user', 'content': 'What is the main result?'},
+    ]
+    
+    def test_anthropic_cache_breakpoint(self):
+        """全部系统消息按顺序保留，只在第一条（稳定前缀）上标记缓存断点"""
+        client = AnthropicClient(LLMProviderConfig(provider='anthropic', api_key='sk-test', model='claude-test'))
+        request = client._build_request(self.MESSAGES)
+        assert [block['text'] for block in request['system']] == [m['content'] for m in self.MESSAGES[:2]]
+        assert request['system'][0]['cache_control'] == {'type': 'ephemeral'}
+        assert 'cache_control' not in request['system'][1]
+        assert request['messages'] == self.MESSAGES[2:]
+        
+        request = client._build_request(self.MESSAGES, prompt_cache=False)
+        assert not any('cache_control' in block for block in request['system'])
+        assert 'prompt_cache' not in request
+        
+        usage = format_anthropic_usage(Mock(
+            input_tokens=20, output_tokens=5, cache_read_input_tokens=1500, cache_creation_input_tokens=0
+        ))
+        assert (usage['prompt_tokens'], usage['cache_read_tokens'], usage['cache_write_tokens']) == (1520, 1500, 0)
+        print("✓ Anthropic 缓存断点和用量正常")
+    
+    def test_openai_prefix_cache(self):
+        """官方接口按首条系统消息设置稳定的 prompt_cache_key；兼容接口不发送；用量中带缓存命中数"""
+        official = OpenAIClient(LLMProviderConfig(
+            provider='openai', api_key='sk-test', base_url='https://api.openai.com/v1', model='gpt-4o'
+        ))
+        # 新参数通过 extra_body 发送，旧版 SDK 同样可用
+        key = official._request_params(self.MESSAGES)['extra_body']['prompt_cache_key']
+        other_question = self.MESSAGES[:2] + [{'role': 'user', 'content': 'Another question?'}]
+        assert official._request_params(other_question)['extra_body']['prompt_cache_key'] == key
+        other_paper = [{'role': 'system', 'content': 'Another paper.'}] + self.MESSAGES[1:]
+        assert official._request_params(other_paper)['extra_body']['prompt_cache_key'] != key
+        params = official._request_params(self.MESSAGES, prompt_cache=False)
+        assert 'extra_body' not in params and 'prompt_cache' not in params
+        params = official._stream_params(self.MESSAGES, prompt_cache_key='custom')
+        assert 'prompt_cache_key' not in params and 'stream_options' not in params
+        assert params['extra_body'] == {'prompt_cache_key': 'custom', 'stream_options': {'include_usage': True}}
+        
+        with FakeBatchServer(lambda custom_id, body: 'ok') as server:
+            compatible = OpenAIClient(LLMProviderConfig(
+                provider='openai', api_key='sk-test', base_url=server.base_url, model='gpt-4o'
+            ))
+            assert 'extra_body' not in compatible._request_params(self.MESSAGES)
+            # 兼容接口默认不请求流式用量
+            assert 'extra_body' not in compatible._stream_params(self.MESSAGES)
+            response = compatible.chat_completion(self.MESSAGES)
+        
+        counter = UsageCounter()
+        counter.add(response['usage'])
+        counter.add(None)
+        usage = counter.snapshot()
+        assert (usage['requests'], usage['prompt_tokens'], usage['cache_read_tokens']) == (1, 10, 8)
+        assert usage['cache_hit_rate'] == 0.8
+        print("✓ OpenAI 前缀缓存和用量统计正常")
+
+
+class RateLimitError(Exception):
+    """模拟 SDK 的限流异常"""
+    status_code = 429
+
+
+class BadRequestError(Exception):
+    """模拟 SDK 的请求错误（上下文过长、密钥无效等）"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TestAdaptiveConcurrency:
+    """测试 LLM 调用的 AIMD 并发控制"""
+    
+    def test_is_overload_error(self):
+        """测试限流/超时识别（客户端会把 SDK 异常包装为 RuntimeError）"""
+        try:
+            try:
+                raise RateLimitError('too many requests')
+            except RateLimitError as e:
+                raise RuntimeError('调用 qwen API 失败') from e
+        except RuntimeError as wrapped:
+            assert is_overload_error(wrapped)
+        assert is_overload_error(TimeoutError())
+        assert not is_overload_error(ValueError('LLM返回的格式无效'))
+        print("✓ 限流错误识别正常")
+    
+    def test_converges_to_provider_quota(self):
+        """模拟配额为 6 个并发的提供商：并发上限应增长到配额附近，超出时回退，请求最终全部成功"""
+        quota = 6
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=32, max_retries=10, retry_delay=0.001)
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+        
+        def provider_call(i):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+                over = state['active'] > quota
+            try:
+                if over:
+                    raise RuntimeError('调用 qwen API 失败') from RateLimitError('429')
+                time.sleep(0.005)
+                return i
+            finally:
+                with lock:
+                    state['active'] -= 1
+        
+        results = []
+        def worker(start):
+            for i in range(start, start + 25):
+                results.append(limiter.call(provider_call, i))
+        
+        threads = [threading.Thread(target=worker, args=(n * 25,)) for n in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        snapshot = limiter.snapshot()
+        assert sorted(results) == list(range(16 * 25))
+        assert snapshot['success'] == 16 * 25
+        assert snapshot['overload'] > 0 and snapshot['backoffs'] > 0
+        assert state['peak'] >= quota
+        assert 2 <= snapshot['limit'] <= quota + 1
+        assert snapshot['in_flight'] == 0
+        print("✓ 并发上限收敛到提供商配额附近")
+    
+    def test_other_errors_do_not_back_off(self):
+        """非限流错误直接抛出，不调整并发上限"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+        
+        def broken():
+            raise ValueError('bad response')
+        
+        try:
+            limiter.call(broken)
+            assert False, "应该抛出 ValueError"
+        except ValueError:
+            pass
+        snapshot = limiter.snapshot()
+        assert (snapshot['limit'], snapshot['error'], snapshot['backoffs']) == (4, 1, 0)
+        print("✓ 其他错误不触发回退")
+
+
+class ScriptedClient(BaseLLMClient):
+    """按设定的延迟回复或抛出异常的测试客户端"""
+    
+    def __init__(self, name, delay=0.0, error=None):
+        super().__init__(LLMProviderConfig(provider=name, api_key='x', model=f'{name}-model'))
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.models = []
+    
+    def _initialize_client(self):
+        pass
+    
+    def chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        self.models.append(kwargs.get('model'))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'content': f'{self.provider} answer', 'finish_reason': 'stop'}
+    
+    def chat_completion_stream(self, messages, **kwargs):
+        content = self.chat_completion(messages, **kwargs)['content']
+        for word in content.split(' '):
+            yield {'content': word + ' ', 'role': 'assistant', 'finish_reason': None}
+
+
+class TestFailover:
+    """测试多提供商故障转移和对冲请求"""
+    
+    MESSAGES = [{'role': 'user', 'content': 'hi'}]
+    
+    def test_fails_over_and_opens_circuit(self):
+        """主提供商出错时转移到备用提供商；连续失败后熔断，之后直接使用备用提供商"""
+        primary = ScriptedClient('primary', error=RateLimitError('429'))
+        backup = ScriptedClient('backup')
+        client = FailoverLLMClient([(primary, 'p-large'), backup], failure_threshold=2, cooldown=60)
+        
+        for _ in range(3):
+            response = client.chat_completion(self.MESSAGES, model='ignored')
+            assert response['content'] == 'backup answer' and response['provider'] == 'backup/backup-model'
+            assert response['fallback']
+        # 第三次调用时主提供商已熔断
+        assert (primary.calls, backup.calls) == (2, 3)
+        assert primary.models == ['p-large', 'p-large'] and backup.models == [None] * 3
+        snapshot = client.snapshot()
+        assert not snapshot[0]['available'] and snapshot[0]['failures'] == 2
+        assert snapshot[1]['successes'] == 3
+        
+        # 全部失败时抛出异常（熔断中的提供商最后尝试），异常链保留原始的限流异常
+        backup.error = ConnectionError('connection reset')
+        try:
+            client.chat_completion(self.MESSAGES)
+            assert False, "应该抛出 RuntimeError"
+        except RuntimeError as e:
+            assert 'backup' in str(e) and 'primary' in str(e)
+            assert is_overload_error(e)
+        print("✓ 故障转移和熔断正常")
+    
+    def test_request_errors_do_not_fail_over(self):
+        """密钥无效、上下文过长等请求错误原样抛出，不使用备用提供商，也不计入熔断"""
+        for error in (BadRequestError('context length exceeded'), BadRequestError('invalid api key', status_code=401)):
+            primary = ScriptedClient('primary', error=RuntimeError(f'primary 调用失败: {error}'))
+            primary.error.__cause__ = error
+            backup = ScriptedClient('backup')
+            client = FailoverLLMClient([primary, backup], failure_threshold=1)
+            assert not is_failover_error(primary.error)
+            
+            for call in (client.chat_completion, lambda messages: list(client.chat_completion_stream(messages))):
+                try:
+                    call(self.MESSAGES)
+                    assert False, "应该抛出原始异常"
+                except RuntimeError as e:
+                    assert e is primary.error
+            assert backup.calls == 0
+            assert client.snapshot()[0]['available'] and client.snapshot()[0]['failures'] == 0
+        
+        # 超时、连接失败和 5xx 仍然转移
+        assert is_failover_error(TimeoutError()) and is_failover_error(ConnectionResetError())
+        assert is_failover_error(BadRequestError('internal error', status_code=500))
+        print("✓ 请求错误不触发故障转移")
+    
+    def test_hedged_request_bounds_latency(self):
+        """主提供商超过 p95 延迟仍未返回时发送对冲请求，较快的备用提供商胜出"""
+        primary = ScriptedClient('primary', delay=0.01)
+        backup = ScriptedClient('backup', delay=0.01)
+        client = FailoverLLMClient([primary, backup], hedge=True, min_hedge_delay=0.05)
+        for _ in range(5):
+            assert client.chat_completion(self.MESSAGES)['provider'] == 'primary/primary-model'
+        assert backup.calls == 0
+        
+        primary.delay = 1.0
+        start = time.monotonic()
+        response = client.chat_completion(self.MESSAGES)
+        elapsed = time.monotonic() - start
+        assert response['provider'] == 'backup/backup-model'
+        assert elapsed < 0.5
+        assert get_health(primary).snapshot()['hedged'] == 1
+        print(f"✓ 对冲请求在 {elapsed:.2f} 秒内返回")
+    
+    def test_stream_hedges_on_first_token(self):
+        """流式调用首个片段迟迟不到时对冲，只输出胜出方的片段"""
+        primary = ScriptedClient('primary', delay=1.0)
+        backup = ScriptedClient('backup')
+        client = FailoverLLMClient([primary, backup], hedge=True, hedge_delay=0.05, min_hedge_delay=0.05)
+        
+        start = time.monotonic()
+        chunks = list(client.chat_completion_stream(self.MESSAGES))
+        assert time.monotonic() - start < 0.5
+        assert ''.join(chunk['content'] for chunk in chunks) == 'backup answer '
+        assert {chunk['provider'] for chunk in chunks} == {'backup/backup-model'}
+        
+        # 首个片段之前出错时转移（不启用对冲）
+        failing = ScriptedClient('failing', error=BadRequestError('bad gateway', status_code=502))
+        client = FailoverLLMClient([failing, backup])
+        assert ''.join(chunk['content'] for chunk in client.chat_completion_stream(self.MESSAGES)) == 'backup answer '
+        print("✓ 流式首 token 对冲和故障转移正常")
+    
+    def test_latency_routing(self):
+        """latency 路由优先使用近期平均延迟较低的提供商"""
+        slow = ScriptedClient('slow', delay=0.03)
+        fast = ScriptedClient('fast')
+        client = FailoverLLMClient([slow, fast], routing='latency')
+        # 先各收集一次样本
+        client.chat_completion(self.MESSAGES)
+        client.chat_completion(self.MESSAGES)
+        for _ in range(3):
+            assert client.chat_completion(self.MESSAGES)['provider'] == 'fast/fast-model'
+        assert slow.calls == 1
+        print("✓ 按延迟路由正常")
+
+
+class TestTelemetry:
+    """测试 LLM 调用遥测"""
+    
+    MESSAGES = [{'role': 'user', 'content': 'one two three'}]
+    
+    def test_client_calls_report_metrics(self):
+        """非流式和流式调用都带遥测；流式调用读取提供商返回的用量并记录首 token 延迟"""
+        telemetry.reset()
+        with FakeBatchServer(lambda custom_id, body: 'alpha beta gamma') as server:
+            client = OpenAIClient(server.client_config(model='gpt-4o-mini'))
+            with collect_llm_metrics() as collector:
+                response = client.chat_completion(self.MESSAGES)
+                chunks = list(client.chat_completion_stream(self.MESSAGES))
+        
+        metrics = response['metrics']
+        assert (metrics['provider'], metrics['model'], metrics['operation'], metrics['status']) == ('openai', 'gpt-4o-mini', 'chat', 'ok')
+        assert (metrics['prompt_tokens'], metrics['completion_tokens'], metrics['cache_read_tokens']) == (10, 5, 8)
+        assert metrics['cost'] == round(estimate_cost('gpt-4o-mini', metrics), 6) and metrics['cost'] > 0
+        
+        # 内容片段之后是带用量的结束片段和带遥测的片段
+        assert ''.join(chunk['content'] for chunk in chunks) == 'alpha beta gamma'
+        assert chunks[-2]['finish_reason'] == 'stop' and chunks[-2]['usage']['completion_tokens'] == 3
+        stream_metrics = chunks[-1]['metrics']
+        assert stream_metrics['operation'] == 'stream' and stream_metrics['completion_tokens'] == 3
+        assert 'usage_estimated' not in stream_metrics
+        assert 0 <= stream_metrics['ttft'] <= stream_metrics['latency']
+        
+        summary = collector.summary()
+        assert (summary['calls'], summary['errors'], summary['prompt_tokens'], summary['completion_tokens']) == (2, 0, 20, 8)
+        assert summary['models'] == ['openai/gpt-4o-mini']
+        
+        text = telemetry.render_prometheus()
+        assert 'llm_requests_total{provider="openai",model="gpt-4o-mini",operation="stream",status="ok"} 1' in text
+        assert 'llm_tokens_total{provider="openai",model="gpt-4o-mini",type="completion"} 8' in text
+        assert 'llm_request_duration_seconds_count{provider="openai",model="gpt-4o-mini",operation="chat"} 1' in text
+        assert 'llm_time_to_first_token_seconds_bucket{provider="openai",model="gpt-4o-mini",le="+Inf"} 1' in text
+        print("✓ 调用遥测和 Prometheus 指标正常")
+    
+    def test_estimated_usage_errors_and_cancellation(self):
+        """未返回用量时估算 token 数；失败和提前关闭的流分别记为 error 和 cancelled"""
+        telemetry.reset()
+        with FakeBatchServer(lambda custom_id, body: 'alpha beta gamma') as server:
+            config = server.client_config(model='unpriced-model')
+            config.stream_usage = False
+            client = OpenAIClient(config)
+            metrics = list(client.chat_completion_stream(self.MESSAGES))[-1]['metrics']
+            assert metrics['usage_estimated'] and metrics['completion_tokens'] > 0
+            assert metrics['cost'] is None
+            
+            stream = client.chat_completion_stream(self.MESSAGES)
+            next(stream)
+            stream.close()
+        
+        broken = OpenAIClient(LLMProviderConfig(
+            provider='openai', api_key='sk-test', base_url='http://127.0.0.1:9/v1', model='unpriced-model', timeout=1
+        ))
+        broken._client = broken._client.with_options(max_retries=0)
+        try:
+            broken.chat_completion(self.MESSAGES)
+            assert False, "应该抛出 RuntimeError"
+        except RuntimeError:
+            pass
+        
+        statuses = {key[3]: count for key, count in telemetry._requests.items()}
+        assert statuses == {'ok': 1, 'cancelled': 1, 'error': 1}
+        assert telemetry.snapshot()['openai/unpriced-model']['errors'] == 2
+        print("✓ 用量估算、失败和取消记录正常")
+
+
 def run_tests():
     """运行所有测试"""
     print("开始运行 LLM 客户端测试...\n")
@@ -149,6 +801,64 @@ def run_tests():
     base_tests = TestBaseLLMClient()
     base_tests.test_merge_params()
     
+    # 测试批量客户端
+    print("\n[测试批量客户端]")
+    batch_tests = TestBatchClient()
+    batch_tests.test_create_batch_client()
+    batch_tests.test_openai_batch_roundtrip()
+    
+    # 测试异步接口
+    print("\n[测试异步接口]")
+    async_tests = TestAsyncClient()
+    async_tests.test_openai_async_completion_and_stream()
+    async_tests.test_default_async_fallback()
+    
+    # 测试客户端注册表
+    print("\n[测试客户端注册表]")
+    TestClientRegistry().test_reuses_clients()
+    
+    # 测试响应缓存
+    print("\n[测试响应缓存]")
+    cache_tests = TestResponseCache()
+    cache_tests.test_exact_and_semantic_tiers()
+    cache_tests.test_semantic_tier_requires_same_identifiers()
+    cache_tests.test_ttl_lru_and_stream()
+    
+    # 测试上下文窗口
+    print("\n[测试上下文窗口]")
+    context_tests = TestContextWindow()
+    context_tests.test_truncate_keeps_head_and_tail()
+    context_tests.test_prompt_size_is_bounded()
+    context_tests.test_oversized_last_message_is_truncated()
+    
+    # 测试提示词缓存
+    print("\n[测试提示词缓存]")
+    prompt_cache_tests = TestPromptCache()
+    prompt_cache_tests.test_anthropic_cache_breakpoint()
+    prompt_cache_tests.test_openai_prefix_cache()
+    
+    # 测试并发控制
+    print("\n[测试并发控制]")
+    concurrency_tests = TestAdaptiveConcurrency()
+    concurrency_tests.test_is_overload_error()
+    concurrency_tests.test_converges_to_provider_quota()
+    concurrency_tests.test_other_errors_do_not_back_off()
+    
+    # 测试故障转移
+    print("\n[测试故障转移]")
+    failover_tests = TestFailover()
+    failover_tests.test_fails_over_and_opens_circuit()
+    failover_tests.test_request_errors_do_not_fail_over()
+    failover_tests.test_hedged_request_bounds_latency()
+    failover_tests.test_stream_hedges_on_first_token()
+    failover_tests.test_latency_routing()
+    
+    # 测试调用遥测
+    print("\n[测试调用遥测]")
+    telemetry_tests = TestTelemetry()
+    telemetry_tests.test_client_calls_report_metrics()
+    telemetry_tests.test_estimated_usage_errors_and_cancellation()
+    
     print("\n" + "=" * 50)
     print("✓ 所有测试通过！")
 
@@ -0,0 +1,64 @@
+"""
+LLM token 用量统计
+统一各提供商的用量字段（含提示词缓存的读取/写入 token 数），并在进程内按任务累计
+"""
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'cache_read_tokens', 'cache_write_tokens')
+
+
+def build_usage(
+    prompt_tokens: int,
+    completion_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> Dict[str, int]:
+    """
+    统一格式的用量字典
+
+    Args:
+        prompt_tokens: 输入 token 总数（含命中缓存和写入缓存的部分）
+        completion_tokens: 输出 token 数
+        cache_read_tokens: 命中提示词缓存的输入 token 数
+        cache_write_tokens: 写入提示词缓存的输入 token 数
+    """
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'cache_read_tokens': cache_read_tokens,
+        'cache_write_tokens': cache_write_tokens,
+    }
+
+
+def prompt_cache_key(prefix: str) -> str:
+    """稳定前缀的缓存路由键（相同前缀的请求路由到同一缓存）"""
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:32]
+
+
+class UsageCounter:
+    """线程安全的用量累计"""
+
+    def __init__(self):
+        self._totals = dict.fromkeys(('requests',) + USAGE_FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, usage: Optional[Dict[str, Any]]):
+        """累计一次调用的用量（响应中没有用量时忽略）"""
+        if not usage:
+            return
+        with self._lock:
+            self._totals['requests'] += 1
+            for field in USAGE_FIELDS:
+                self._totals[field] += usage.get(field) or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """累计用量和缓存命中率（命中缓存的输入 token 占比）"""
+        with self._lock:
+            totals = dict(self._totals)
+        prompt = totals['prompt_tokens']
+        totals['cache_hit_rate'] = totals['cache_read_tokens'] / prompt if prompt else 0.0
+        return totals
@@ -0,0 +1,298 @@
+"""
+Django管理命令：参考文献定位性能基准测试
+对一组样例arXiv PDF分别使用整篇提取和按页定向提取（从末尾向前），
+对比解析页数、耗时以及定位结果是否一致；
+也可用 --synthetic-pages 生成长文档文本，测试参考文献定位本身的耗时随文本长度的变化；
+--corpus 在内置回归样例上同时检查准确性和各阶段的耗时、CPU 时间、峰值内存
+"""
+from django.core.management.base import BaseCommand, CommandError
+from pathlib import Path
+import contextlib
+import io
+import json
+import time
+
+from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.reference_benchmark import DEFAULT_CORPUS_DIR, load_corpus, run_case, summarize
+
+
+class Command(BaseCommand):
+    help = '参考文献定位基准测试：对比整篇提取与按页定向提取的解析页数和耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdf-dir',
+            type=str,
+            default='data/benchmark_pdfs',
+            help='样例PDF目录（默认: data/benchmark_pdfs）'
+        )
+        parser.add_argument(
+            '--arxiv-id',
+            type=str,
+            nargs='*',
+            default=[],
+            help='先下载这些arXiv论文到样例目录（如 2301.00001 2302.00002）'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='最多测试的PDF数量'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1,
+            help='每个PDF重复测试的次数，取最短耗时（默认: 1）'
+        )
+        parser.add_argument(
+            '--synthetic-pages',
+            type=int,
+            default=None,
+            help='不测试PDF，改为生成指定页数的合成长文档（如 100 页的学位论文），测试参考文献定位耗时'
+        )
+        parser.add_argument(
+            '--corpus',
+            type=str,
+            nargs='?',
+            const=str(DEFAULT_CORPUS_DIR),
+            default=None,
+            help='运行回归样例基准（默认样例目录: core/benchmark_corpus），报告准确性和各阶段资源消耗'
+        )
+        parser.add_argument(
+            '--with-llm',
+            action='store_true',
+            help='回归样例基准同时运行 LLM 解析阶段（需要LLM配置，会产生调用费用）'
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            default=None,
+            help='回归样例基准结果另存为 JSON 文件，便于不同版本之间对比'
+        )
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            self._benchmark_corpus(options)
+            return
+
+        if options['synthetic_pages']:
+            self._benchmark_synthetic(options['synthetic_pages'], options['repeat'])
+            return
+        
+        pdf_dir = Path(options['pdf_dir'])
+        pdf_dir.mkdir(parents=True, exist_ok=True)
+
+        # 基准测试不使用文本层缓存，保证每次都真实解析PDF
+        full_extractor = ArxivReferenceExtractor(
+            pdf_download_dir=str(pdf_dir),
+            use_text_cache=False,
+            page_targeted=False
+        )
+        tail_extractor = ArxivReferenceExtractor(
+            pdf_download_dir=str(pdf_dir),
+            use_text_cache=False,
+            page_targeted=True
+        )
+
+        for arxiv_id in options['arxiv_id']:
+            pdf_url = f'https://arxiv.org/pdf/{arxiv_id}'
+            success, _, error = full_extractor.download_pdf(pdf_url, arxiv_id)
+            if success:
+                self.stdout.write(f'已下载: {arxiv_id}')
+            else:
+                self.stdout.write(self.style.ERROR(f'下载失败 {arxiv_id}: {error}'))
+
+        pdf_files = sorted(pdf_dir.glob('*.pdf'))
+        if options['limit']:
+            pdf_files = pdf_files[:options['limit']]
+
+        if not pdf_files:
+            raise CommandError(f'目录中没有PDF文件: {pdf_dir}')
+
+        self.stdout.write(f'共 {len(pdf_files)} 个PDF，重复 {options["repeat"]} 次\n')
+        self.stdout.write(
+            f'{"文件":<28}{"总页数":>6}{"解析页数":>8}{"整篇(ms)":>10}{"定向(ms)":>10}{"策略":>6}  结果'
+        )
+        self.stdout.write('-' * 84)
+
+        totals = {
+            'pages': 0,
+            'pages_parsed': 0,
+            'full_seconds': 0.0,
+            'tail_seconds': 0.0,
+            'same': 0,
+        }
+
+        for pdf_path in pdf_files:
+            row = self._benchmark_pdf(str(pdf_path), full_extractor, tail_extractor, options['repeat'])
+            if row is None:
+                self.stdout.write(self.style.ERROR(f'{pdf_path.name[:27]:<28}解析失败'))
+                continue
+
+            totals['pages'] += row['page_count']
+            totals['pages_parsed'] += row['pages_parsed']
+            totals['full_seconds'] += row['full_seconds']
+            totals['tail_seconds'] += row['tail_seconds']
+            totals['same'] += int(row['same'])
+
+            self.stdout.write(
+                f'{pdf_path.name[:27]:<28}{row["page_count"]:>6}{row["pages_parsed"]:>8}'
+                f'{row["full_seconds"] * 1000:>10.1f}{row["tail_seconds"] * 1000:>10.1f}'
+                f'{row["strategy"]:>6}  {"一致" if row["same"] else "不一致"}'
+            )
+
+        self.stdout.write('-' * 84)
+        if totals['pages'] and totals['full_seconds']:
+            page_ratio = totals['pages_parsed'] / totals['pages'] * 100
+            saved = (1 - totals['tail_seconds'] / totals['full_seconds']) * 100
+            self.stdout.write(
+                f'解析页数: {totals["pages_parsed"]}/{totals["pages"]} ({page_ratio:.1f}%)'
+            )
+            self.stdout.write(
+                f'总耗时: 整篇 {totals["full_seconds"]:.2f}s -> 定向 {totals["tail_seconds"]:.2f}s '
+                f'(节省 {saved:.1f}%)'
+            )
+            self.stdout.write(f'定位结果一致: {totals["same"]}/{len(pdf_files)}')
+
+    def _benchmark_pdf(self, pdf_path, full_extractor, tail_extractor, repeat):
+        """分别用两种策略定位参考文献，返回统计信息"""
+        full_seconds = None
+        tail_seconds = None
+        full_reference = tail_reference = None
+        stats = None
+
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            success, document, _ = full_extractor.extract_document(pdf_path)
+            if not success:
+                return None
+            _, full_reference, _ = full_extractor.find_reference_section(document.text)
+            elapsed = time.perf_counter() - start
+            full_seconds = elapsed if full_seconds is None else min(full_seconds, elapsed)
+
+            start = time.perf_counter()
+            success, text, _, stats = tail_extractor.locate_reference_text(pdf_path)
+            if not success:
+                return None
+            _, tail_reference, _ = tail_extractor.find_reference_section(
+                text, text_offset=stats['text_offset'], document_length=stats['document_length']
+            )
+            elapsed = time.perf_counter() - start
+            tail_seconds = elapsed if tail_seconds is None else min(tail_seconds, elapsed)
+
+        return {
+            'page_count': stats['page_count'],
+            'pages_parsed': stats['pages_parsed'],
+            'strategy': stats['strategy'],
+            'full_seconds': full_seconds,
+            'tail_seconds': tail_seconds,
+            # 标题前的空白可能因页间分隔符不同而不同，比较时忽略首尾空白
+            'same': (full_reference or '').strip() == (tail_reference or '').strip(),
+        }
+
+    def _build_synthetic_document(self, pages):
+        """
+        生成合成长文档：正文中夹杂引用标记，每 10 页一章且章末带参考文献列表
+        （类似学位论文，标题候选位置多），文末为全文参考文献
+        """
+        body_line = (
+            'In this chapter we study the proposed method and compare it with prior work [12], '
+            'following Smith et al. (2019) and the analysis in Section 3.'
+        )
+        entry = '[{n}] A. Author, B. Writer, et al. Title of paper number {n}. In Proc. Conf., ({year}).'
+        
+        parts = []
+        for page in range(pages):
+            parts.extend(body_line for _ in range(30))
+            parts.append(str(page + 1))
+            if page % 10 == 9 and page != pages - 1:
+                parts.append('References')
+                parts.extend(entry.format(n=n, year=2000 + n % 20) for n in range(1, 6))
+        
+        parts.append('References')
+        parts.extend(entry.format(n=n, year=2000 + n % 20) for n in range(1, 80))
+        parts.append('Appendix A')
+        parts.extend(body_line for _ in range(30))
+        return '\n'.join(parts)
+    
+    def _benchmark_synthetic(self, pages, repeat):
+        """对不同长度的合成文档测试参考文献定位耗时，耗时应随文本长度线性增长"""
+        extractor = ArxivReferenceExtractor(use_text_cache=False)
+        
+        self.stdout.write(f'合成文档参考文献定位基准，重复 {repeat} 次取最短耗时\n')
+        self.stdout.write(f'{"页数":>6}{"字符数":>12}{"耗时(ms)":>12}{"us/KB":>10}  结果')
+        self.stdout.write('-' * 52)
+        
+        for size in sorted({max(1, pages // 4), max(1, pages // 2), pages}):
+            text = self._build_synthetic_document(size)
+            best = None
+            found = False
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                # 定位过程中的提示信息不输出到基准结果
+                with contextlib.redirect_stdout(io.StringIO()):
+                    found, _, _ = extractor.find_reference_section(text)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            
+            self.stdout.write(
+                f'{size:>6}{len(text):>12}{best * 1000:>12.2f}{best * 1e6 / (len(text) / 1024):>10.2f}'
+                f'  {"找到" if found else "未找到"}'
+            )
+
+    def _benchmark_corpus(self, options):
+        """在回归样例上运行各阶段，输出准确性和每个阶段的耗时、CPU 时间、峰值内存"""
+        try:
+            cases = load_corpus(options['corpus'])
+        except FileNotFoundError as e:
+            raise CommandError(f'样例清单不存在: {e.filename}')
+
+        extractor = ArxivReferenceExtractor(use_text_cache=False)
+        results = [
+            run_case(extractor, case, repeat=options['repeat'], with_llm=options['with_llm'])
+            for case in cases
+        ]
+
+        self.stdout.write(f'回归样例 {len(cases)} 个，重复 {options["repeat"]} 次取最短耗时\n')
+        self.stdout.write(f'{"样例":<30}{"条目数":>8}{"期望":>6}{"耗时(ms)":>10}  结果')
+        self.stdout.write('-' * 70)
+        for result in results:
+            case = result.case
+            total_ms = sum(metrics.wall_seconds for metrics in result.stages.values()) * 1000
+            failed = [name for name, passed in result.checks.items() if not passed]
+            if result.passed:
+                status = self.style.SUCCESS('通过')
+            elif case.known_issue:
+                status = self.style.WARNING(f'已知问题（{", ".join(failed)}）')
+            else:
+                status = self.style.ERROR(f'失败（{", ".join(failed)}）{result.error or ""}')
+            self.stdout.write(
+                f'{case.name[:29]:<30}{str(result.reference_count or "-"):>8}'
+                f'{str(case.reference_count or "-"):>6}{total_ms:>10.1f}  {status}'
+            )
+
+        summary = summarize(results)
+        self.stdout.write('-' * 70)
+        self.stdout.write(f'通过: {summary["passed"]}/{summary["cases"]}')
+        for name, (passed, total) in summary['checks'].items():
+            self.stdout.write(f'  {name:<10}{passed}/{total}')
+
+        self.stdout.write(f'\n{"阶段":<16}{"耗时(ms)":>10}{"CPU(ms)":>10}{"峰值内存(KB)":>14}')
+        for name, metrics in summary['stages'].items():
+            self.stdout.write(
+                f'{name:<16}{metrics["wall_seconds"] * 1000:>10.1f}{metrics["cpu_seconds"] * 1000:>10.1f}'
+                f'{metrics["peak_bytes"] / 1024:>14.1f}'
+            )
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'summary': summary, 'results': [result.to_dict() for result in results]},
+                    f, ensure_ascii=False, indent=2, default=str
+                )
+            self.stdout.write(f'结果已保存到 {options["json"]}')
+
+        unexpected = [r.case.name for r in results if not r.passed and not r.case.known_issue]
+        if unexpected:
+            raise CommandError(f'回归样例未通过: {", ".join(unexpected)}')
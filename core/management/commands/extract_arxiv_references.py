@@ -6,13 +6,21 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
+import contextlib
 import logging
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from core.arxiv_models import ArxivPaper, ArxivPaperReference, ArxivReferenceExtractLog
+from common.db_utils import keyset_iterator, iter_batches, run_bounded, peek
+from core.arxiv_models import (
+    ArxivPaper, ArxivPaperReference, ArxivReferenceExtractLog, PAPER_WORK_FIELDS, EXTRACT_LOG_WORK_FIELDS,
+)
 from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.extract_log_writer import ExtractLogWriter
+from core.llm.failover import parse_provider_spec
+from core.llm.telemetry import collect_llm_metrics
+from core.paper_lease import PaperLeaseQueue
+from core.reference_batch import ReferenceBatchRunner
 
 
 # 配置日志
@@ -21,7 +29,7 @@ logger = logging.getLogger(__name__)
 
 class ThreadSafeStats:
     """线程安全的统计计数器"""
-    def __init__(self, total):
+    def __init__(self, total=None):
         self.total = total
         self.processed = 0
         self.success = 0
@@ -59,9 +67,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '--mode',
             type=str,
-            choices=['extract', 'process', 'full'],
+            choices=['extract', 'process', 'full', 'batch'],
             default='full',
-            help='处理模式：extract（只提取文本）、process（只LLM处理）、full（完整流程，默认）'
+            help='处理模式：extract（只提取文本）、process（只LLM处理）、full（完整流程，默认）、'
+                 'batch（通过LLM批量API处理已提取的文本）'
         )
         parser.add_argument(
             '--arxiv-id',
@@ -83,7 +92,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--skip-existing',
             action='store_true',
-            help='跳过已经提取过参考文献的论文'
+            help='跳过已经提取过参考文献的论文（extract/full 模式使用 --lease 时自动启用）'
         )
         parser.add_argument(
             '--retry-failed',
@@ -135,20 +144,107 @@ class Command(BaseCommand):
         parser.add_argument(
             '--max-chars',
             type=int,
-            default=50000,
-            help='（process模式）最大字符数限制（默认: 50000）'
+            default=None,
+            help='（process模式）每次LLM调用的最大字符数，更长的参考文献按条目分块并行解析（默认: 8000）'
+        )
+        parser.add_argument(
+            '--llm-workers',
+            type=int,
+            default=4,
+            help='（process模式）并发解析参考文献分块的LLM线程数（默认: 4）'
+        )
+        parser.add_argument(
+            '--llm-max-concurrency',
+            type=int,
+            default=16,
+            help='（process/full模式）同一LLM提供商的最大并发请求数，从 --llm-workers 起按延迟和限流自动调整，'
+                 '遇到 429/超时时回退并重试（默认: 16，设为 0 则不做并发控制）'
+        )
+        parser.add_argument(
+            '--llm-fallback',
+            type=str,
+            nargs='+',
+            default=None,
+            metavar='PROVIDER[:MODEL]',
+            help='（process/full模式）备用LLM提供商（如 deepseek:deepseek-chat），主提供商出错、超时或熔断时自动转移，'
+                 '按近期延迟选择；API密钥读取 <PROVIDER>_API_KEY 环境变量'
+        )
+        parser.add_argument(
+            '--llm-hedge',
+            action='store_true',
+            help='（process/full模式）请求超过近期 p95 延迟仍未返回时，并发向备用提供商发送相同请求，先返回的结果胜出'
+        )
+        parser.add_argument(
+            '--no-rule-parser',
+            action='store_true',
+            help='不使用规则解析，全部参考文献交给LLM处理'
+        )
+        parser.add_argument(
+            '--rule-threshold',
+            type=float,
+            default=0.75,
+            help='规则解析的置信度阈值，低于该值的条目交给LLM（默认: 0.75）'
+        )
+        # Batch 模式特有参数
+        parser.add_argument(
+            '--batch-resume',
+            action='store_true',
+            help='（batch模式）继续轮询并回收之前提交但未回收结果的批次，不提交新批次'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=60.0,
+            help='（batch模式）轮询批次状态的间隔（秒，默认: 60）'
+        )
+        parser.add_argument(
+            '--no-wait',
+            action='store_true',
+            help='（batch模式）提交后立即退出，之后用 --batch-resume 回收结果'
         )
         parser.add_argument(
             '--clean-old-logs',
             action='store_true',
             help='重跑时清理该论文之前的所有日志记录（避免重复）'
         )
+        # 多机协同参数
+        parser.add_argument(
+            '--lease',
+            action='store_true',
+            help='通过数据库租约认领待处理论文，多台机器可同时运行本命令而不重复处理（extract/full/process模式）。'
+                 'extract/full 模式下未指定 --retry-failed 时会自动启用 --skip-existing，'
+                 '否则一台机器释放租约后，其他机器会再次认领已完成的论文'
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=900,
+            help='租约有效期（秒，默认: 900），持有者超过该时间未续约时其他机器可重新认领'
+        )
+        parser.add_argument(
+            '--worker-id',
+            type=str,
+            default=None,
+            help='租约持有者标识（默认: 主机名:进程号:随机串）'
+        )
         parser.add_argument(
             '--workers',
             type=int,
             default=1,
             help='并发处理的线程数（默认: 1，建议 extract 模式使用 3-5，process 模式保持 1）'
         )
+        parser.add_argument(
+            '--log-flush-size',
+            type=int,
+            default=50,
+            help='提取日志的状态更新缓冲到该数量时批量写入数据库（默认: 50，设为 1 则逐条写入）'
+        )
+        parser.add_argument(
+            '--log-flush-interval',
+            type=float,
+            default=10.0,
+            help='提取日志状态更新的最长缓冲时间（秒，默认: 10）'
+        )
     
     def handle(self, *args, **options):
         mode = options['mode']
@@ -157,7 +253,8 @@ class Command(BaseCommand):
         mode_titles = {
             'extract': '【第一阶段】开始提取ArXiv论文参考文献原始文本...',
             'process': '【第二阶段】开始使用LLM处理参考文献...',
-            'full': '开始提取ArXiv论文参考文献（完整流程）...'
+            'full': '开始提取ArXiv论文参考文献（完整流程）...',
+            'batch': '【第二阶段】开始使用LLM批量API处理参考文献...'
         }
         self.stdout.write(self.style.SUCCESS(mode_titles[mode]))
         
@@ -175,7 +272,13 @@ class Command(BaseCommand):
                     llm_provider=options['llm_provider'],
                     llm_model=options['llm_model'],
                     max_retries=options['max_retries'],
-                    llm_timeout=options['llm_timeout']
+                    llm_timeout=options['llm_timeout'],
+                    use_rule_parser=not options['no_rule_parser'],
+                    rule_confidence_threshold=options['rule_threshold'],
+                    llm_workers=options['llm_workers'],
+                    llm_max_concurrency=options['llm_max_concurrency'],
+                    llm_fallbacks=[parse_provider_spec(spec) for spec in options['llm_fallback'] or []],
+                    llm_hedge=options['llm_hedge']
                 )
                 self.stdout.write(f'LLM配置: {options["llm_provider"]}/{options["llm_model"]} (超时: {options["llm_timeout"]}秒)')
         except Exception as e:
@@ -189,16 +292,66 @@ class Command(BaseCommand):
             if not options['arxiv_id']:
                 return
         
-        # 根据模式调用不同的处理方法
-        if mode == 'extract':
-            self._handle_extract_mode(extractor, options)
-        elif mode == 'process':
-            self._handle_process_mode(extractor, options)
-        else:  # full
-            self._handle_full_mode(extractor, options)
+        # 多机协同：通过租约认领论文（batch 模式由批次记录保证不重复提交）
+        self.lease_queue = None
+        if options['lease'] and mode != 'batch':
+            self.lease_queue = PaperLeaseQueue(
+                stage='process' if mode == 'process' else 'extract',
+                owner=options['worker_id'],
+                lease_seconds=options['lease_seconds'],
+                claim_size=max(options['batch_size'], options['workers'] * 2)
+            )
+            self.stdout.write(f'租约模式: {self.lease_queue.owner} (有效期: {options["lease_seconds"]}秒)')
+            if mode != 'process' and not options['skip_existing'] and not options['retry_failed']:
+                # 否则一台机器处理完释放租约后，游标尚未经过该论文的其他机器会再次认领
+                options['skip_existing'] = True
+                self.stdout.write(self.style.WARNING('租约模式下自动跳过已完成的论文（--skip-existing）'))
+        
+        # 提取日志批量写入（先于租约退出，保证释放租约前处理结果已写入数据库）
+        self.log_writer = ExtractLogWriter(
+            flush_size=options['log_flush_size'],
+            flush_interval=options['log_flush_interval']
+        )
+        
+        with self.lease_queue or contextlib.nullcontext(), self.log_writer:
+            # 根据模式调用不同的处理方法
+            if mode == 'extract':
+                self._handle_extract_mode(extractor, options)
+            elif mode == 'process':
+                self._handle_process_mode(extractor, options)
+            elif mode == 'batch':
+                self._handle_batch_mode(extractor, options)
+            else:  # full
+                self._handle_full_mode(extractor, options)
+        
+        if mode != 'extract':
+            self._print_llm_concurrency(extractor)
+            self._print_llm_usage(extractor)
+    
+    def _leased(self, process_func):
+        """
+        包装单条处理函数：处理结束后释放该论文的租约
+        
+        提取日志是批量写入的，租约在日志写入数据库后才释放，
+        否则其他机器可能在看到处理结果之前重新认领该论文
+        """
+        if self.lease_queue is None:
+            return process_func
+        
+        def wrapper(item, *args, **kwargs):
+            paper_id = item.paper_id if isinstance(item, ArxivReferenceExtractLog) else item.id
+            try:
+                return process_func(item, *args, **kwargs)
+            finally:
+                self.log_writer.after_flush(lambda: self.lease_queue.release(paper_id))
+        return wrapper
     
     def _get_papers_to_process(self, options):
-        """获取需要处理的论文列表"""
+        """
+        获取需要处理的论文（按发布时间倒序流式读取）
+        
+        按排序键分页读取，只加载工作线程用到的字段，启动快且内存占用与待处理数量无关
+        """
         queryset = ArxivPaper.objects.all()
         
         # 如果指定了arxiv_id
@@ -232,14 +385,15 @@ class Command(BaseCommand):
             
             queryset = queryset.filter(Exists(failed_logs))
         
-        # 按发布时间排序
-        queryset = queryset.order_by('-published')
-        
-        # 应用限制
-        if options['limit']:
-            queryset = queryset[:options['limit']]
+        queryset = queryset.only(*PAPER_WORK_FIELDS)
+        if self.lease_queue is not None:
+            return self.lease_queue.iter_claimed(queryset, ('-published', '-id'), limit=options['limit'])
         
-        return list(queryset)
+        return keyset_iterator(
+            queryset,
+            order_by=('-published', '-id'),
+            limit=options['limit']
+        )
     
     def _process_single_paper(self, paper, extractor, options):
         """处理单篇论文"""
@@ -278,7 +432,7 @@ class Command(BaseCommand):
             return 'skipped'
         
         # 创建提取日志
-        log = ArxivReferenceExtractLog.objects.create(
+        log = self.log_writer.create(
             paper=paper,
             status='pending',
             retry_count=retry_count
@@ -324,17 +478,18 @@ class Command(BaseCommand):
             log.llm_processed = result['llm_processed']
             log.reference_count = result['reference_count']
             log.llm_response = result.get('llm_response')  # 保存LLM原始响应
+            self._record_llm_metrics(log, result.get('llm_metrics'))
             
             if result['success']:
                 log.status = 'completed'
-                
-                # 保存参考文献到数据库
-                self.stdout.write('  💾 正在保存参考文献到数据库...')
-                self._save_references(paper, result['references'], log)
-                
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                
+                # 参考文献和完成状态在同一事务中写入，中途退出不会留下没有完成日志的参考文献
+                self.stdout.write('  💾 正在保存参考文献到数据库...')
+                with transaction.atomic():
+                    self._save_references(paper, result['references'], log)
+                    self.log_writer.save_now(log)
                 
                 self.stdout.write(self.style.SUCCESS(
                     f'  ✓ 处理完成！提取 {result["reference_count"]} 条参考文献，耗时 {log.duration_seconds} 秒'
@@ -346,7 +501,7 @@ class Command(BaseCommand):
                 log.error_message = result['error_message']
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.ERROR(
                     f'  ✗ 处理失败: {result["error_type"]}'
@@ -362,58 +517,78 @@ class Command(BaseCommand):
             log.error_message = str(e)
             log.completed_at = timezone.now()
             log.duration_seconds = (log.completed_at - start_time).seconds
-            log.save()
+            self.log_writer.save(log)
             
             self.stdout.write(self.style.ERROR(f'  ✗ 异常: {str(e)}'))
             logger.exception(f'处理论文 {arxiv_id} 时发生异常')
             return 'failed'
     
+    def _record_llm_metrics(self, log, metrics):
+        """把本篇论文的LLM调用遥测（耗时、token 数、估算费用）写入提取日志的处理详情"""
+        if not metrics or not metrics['calls']:
+            return
+        log.processing_details = {**(log.processing_details or {}), 'llm': metrics}
+        cost = f'，估算费用 ${metrics["cost"]:.4f}' if metrics['cost'] is not None else ''
+        self.stdout.write(
+            f'  ℹ️  LLM: {metrics["calls"]} 次调用（失败 {metrics["errors"]}），输入 {metrics["prompt_tokens"]} / '
+            f'输出 {metrics["completion_tokens"]} tokens，最长 {metrics["max_latency"]:.1f} 秒{cost}'
+        )
+    
     def _save_references(self, paper, references, log):
-        """保存参考文献到数据库"""
-        try:
-            with transaction.atomic():
-                # 删除旧的参考文献（如果存在）
-                ArxivPaperReference.objects.filter(paper=paper).delete()
-                
-                # 批量创建新的参考文献
-                reference_objects = []
-                for ref_data in references:
-                    reference_objects.append(
-                        ArxivPaperReference(
-                            paper=paper,
-                            reference_number=ref_data.get('reference_number', 0),
-                            title=ref_data.get('title'),
-                            authors=ref_data.get('authors'),
-                            year=ref_data.get('year'),
-                            venue=ref_data.get('venue'),
-                            venue_type=ref_data.get('venue_type'),
-                            volume=ref_data.get('volume'),
-                            issue=ref_data.get('issue'),
-                            pages=ref_data.get('pages'),
-                            doi=ref_data.get('doi'),
-                            arxiv_id=ref_data.get('arxiv_id'),
-                            url=ref_data.get('url'),
-                            raw_text=ref_data.get('raw_text', ''),
-                            extraction_method='llm',
-                        )
-                    )
-                
-                ArxivPaperReference.objects.bulk_create(reference_objects)
-                
-        except Exception as e:
-            log.error_message = f'保存参考文献失败: {str(e)}'
-            log.save()
-            raise
+        """
+        保存参考文献到数据库
+        
+        在调用方的事务中执行，失败时不在这里写日志（事务会回滚），由调用方的异常处理记录失败
+        """
+        ArxivPaperReference.replace_for_paper(paper, references)
     
     def _print_progress(self, stats):
         """打印进度信息"""
+        total = f"/{stats['total']}" if stats['total'] is not None else ''
         self.stdout.write(
-            f"\n进度: {stats['processed']}/{stats['total']} | "
+            f"\n进度: {stats['processed']}{total} | "
             f"成功: {stats['success']} | "
             f"失败: {stats['failed']} | "
             f"跳过: {stats['skipped']}"
         )
     
+    def _final_stats(self, stats):
+        """处理结束后的统计（总数即实际处理的数量）"""
+        final = stats.get_dict()
+        final['total'] = final['processed']
+        return final
+    
+    def _print_llm_concurrency(self, extractor):
+        """打印LLM自适应并发控制的统计"""
+        if extractor.llm_limiter is None:
+            return
+        snapshot = extractor.llm_limiter.snapshot()
+        if not (snapshot['success'] or snapshot['overload'] or snapshot['error']):
+            return
+        self.stdout.write(
+            f'LLM并发: 当前上限 {snapshot["limit"]} | 成功 {snapshot["success"]} | '
+            f'限流/超时 {snapshot["overload"]}（回退 {snapshot["backoffs"]} 次） | 其他错误 {snapshot["error"]}'
+        )
+
+    def _print_llm_usage(self, extractor):
+        """打印LLM token 用量和提示词缓存命中情况"""
+        usage = extractor.llm_usage.snapshot()
+        if not usage['requests']:
+            return
+        self.stdout.write(
+            f'LLM用量: {usage["requests"]} 次调用 | 输入 {usage["prompt_tokens"]} tokens'
+            f'（缓存命中 {usage["cache_read_tokens"]}，{usage["cache_hit_rate"]:.1%}；写入缓存 {usage["cache_write_tokens"]}） | '
+            f'输出 {usage["completion_tokens"]} tokens'
+        )
+        health = getattr(extractor.llm_client, 'snapshot', None)
+        if health is not None:
+            for member in health():
+                latency = f'{member["ewma_latency"]:.1f}s' if member['ewma_latency'] is not None else '-'
+                self.stdout.write(
+                    f'  {member["provider"]}: 成功 {member["successes"]} | 失败 {member["failures"]} | '
+                    f'对冲 {member["hedged"]} | 平均延迟 {latency}{"" if member["available"] else " | 熔断中"}'
+                )
+
     def _print_final_stats(self, stats):
         """打印最终统计信息"""
         # 计算参考文献总数
@@ -435,21 +610,20 @@ class Command(BaseCommand):
     def _handle_extract_mode(self, extractor, options):
         """处理 extract 模式：只提取参考文献原始文本"""
         # 获取需要处理的论文
-        papers = self._get_papers_to_process(options)
+        first, papers = peek(self._get_papers_to_process(options))
         
-        if not papers:
+        if first is None:
             self.stdout.write(self.style.WARNING('没有找到需要处理的论文'))
             return
         
-        total = len(papers)
         workers = options['workers']
-        self.stdout.write(f'找到 {total} 篇论文待处理')
+        self.stdout.write('开始处理待处理论文（按发布时间倒序）')
         
         if workers > 1:
             self.stdout.write(f'使用 {workers} 个线程并发处理')
         
         # 线程安全的统计信息
-        stats = ThreadSafeStats(total)
+        stats = ThreadSafeStats()
         
         # 如果只有 1 个 worker，使用单线程处理
         if workers == 1:
@@ -460,24 +634,23 @@ class Command(BaseCommand):
         # 最终统计
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS('【第一阶段】处理完成！'))
-        self._print_extract_final_stats(stats.get_dict())
+        self._print_extract_final_stats(self._final_stats(stats))
     
     def _handle_extract_mode_single_thread(self, papers, extractor, options, stats):
         """单线程处理 extract 模式"""
         batch_size = options['batch_size']
         delay = options['delay']
-        total = len(papers)
         
-        for i in range(0, total, batch_size):
-            batch = papers[i:i + batch_size]
-            self.stdout.write(f'\n处理批次 {i // batch_size + 1} (论文 {i + 1}-{min(i + batch_size, total)})')
+        for batch_index, batch in enumerate(iter_batches(papers, batch_size)):
+            start = batch_index * batch_size
+            self.stdout.write(f'\n处理批次 {batch_index + 1} (论文 {start + 1}-{start + len(batch)})')
             
             for paper in batch:
-                result = self._process_paper_extract_only(paper, extractor, options)
+                result = self._leased(self._process_paper_extract_only)(paper, extractor, options)
                 stats.update(result)
                 
                 # 延迟
-                if delay > 0 and stats.processed < total:
+                if delay > 0:
                     time.sleep(delay)
             
             # 显示进度
@@ -486,17 +659,16 @@ class Command(BaseCommand):
     def _handle_extract_mode_multi_thread(self, papers, extractor, options, stats, workers):
         """多线程处理 extract 模式"""
         delay = options['delay']
-        total = len(papers)
         output_lock = threading.Lock()
         
         def process_paper_with_output(paper):
             """\u5904\u7406\u5355\u7bc7\u8bba\u6587\uff08\u5e26\u8f93\u51fa\u9501\uff09"""
-            result = self._process_paper_extract_only(paper, extractor, options)
+            result = self._leased(self._process_paper_extract_only)(paper, extractor, options)
             stats.update(result)
             
             # 线程安全地打印进度
             with output_lock:
-                if stats.processed % 10 == 0 or stats.processed == total:
+                if stats.processed % 10 == 0:
                     self._print_progress(stats.get_dict())
             
             # 延迟
@@ -505,34 +677,28 @@ class Command(BaseCommand):
             
             return result
         
-        # 使用线程池处理
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {executor.submit(process_paper_with_output, paper): paper for paper in papers}
-            
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    paper = futures[future]
-                    with output_lock:
-                        self.stdout.write(self.style.ERROR(f'处理论文 {paper.arxiv_id} 时发生异常: {str(e)}'))
-                        logger.exception(f'多线程处理论文 {paper.arxiv_id} 失败')
+        def on_error(paper, e):
+            with output_lock:
+                self.stdout.write(self.style.ERROR(f'处理论文 {paper.arxiv_id} 时发生异常: {str(e)}'))
+                logger.exception(f'多线程处理论文 {paper.arxiv_id} 失败', exc_info=e)
+        
+        # 使用线程池处理（边读取边提交，在途任务数有上限）
+        run_bounded(papers, process_paper_with_output, workers, on_error=on_error)
     
     def _handle_process_mode(self, extractor, options):
         """处理 process 模式：只使用LLM处理已提取的文本"""
         # 获取需要处理的日志记录
-        logs = self._get_logs_to_process(options)
+        first, logs = peek(self._get_logs_to_process(options))
         
-        if not logs:
+        if first is None:
             self.stdout.write(self.style.WARNING('没有找到需要处理的记录'))
             return
         
-        total = len(logs)
-        self.stdout.write(f'找到 {total} 条记录待处理')
+        self.stdout.write('开始处理待处理记录（按开始时间倒序）')
         
         # 统计信息
         stats = {
-            'total': total,
+            'total': None,
             'processed': 0,
             'success': 0,
             'failed': 0,
@@ -543,12 +709,12 @@ class Command(BaseCommand):
         batch_size = options['batch_size']
         delay = options['delay']
         
-        for i in range(0, total, batch_size):
-            batch = logs[i:i + batch_size]
-            self.stdout.write(f'\n处理批次 {i // batch_size + 1} (记录 {i + 1}-{min(i + batch_size, total)})')
+        for batch_index, batch in enumerate(iter_batches(logs, batch_size)):
+            start = batch_index * batch_size
+            self.stdout.write(f'\n处理批次 {batch_index + 1} (记录 {start + 1}-{start + len(batch)})')
             
             for log in batch:
-                result = self._process_log_with_llm(log, extractor, options)
+                result = self._leased(self._process_log_with_llm)(log, extractor, options)
                 
                 # 更新统计
                 stats['processed'] += 1
@@ -560,36 +726,72 @@ class Command(BaseCommand):
                     stats['skipped'] += 1
                 
                 # 延迟
-                if delay > 0 and stats['processed'] < total:
+                if delay > 0:
                     time.sleep(delay)
             
             # 显示进度
             self._print_progress(stats)
         
         # 最终统计
+        stats['total'] = stats['processed']
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS('【第二阶段】处理完成！'))
         self._print_process_final_stats(stats)
     
+    def _handle_batch_mode(self, extractor, options):
+        """处理 batch 模式：通过LLM批量API处理已提取的文本，可中断后继续"""
+        runner = ReferenceBatchRunner(extractor, log=self.stdout.write)
+        wait = not options['no_wait']
+        
+        try:
+            if options['batch_resume']:
+                result = runner.resume(poll_interval=options['poll_interval'], wait=wait)
+                self.stdout.write(f'未回收的批次: {result["jobs"]}，本次回收: {result["collected"]}')
+            else:
+                first, logs = peek(self._get_logs_to_process(options))
+                if first is None:
+                    self.stdout.write(self.style.WARNING('没有找到需要处理的记录'))
+                    return
+                
+                result = runner.run(
+                    logs,
+                    max_chars=options['max_chars'],
+                    poll_interval=options['poll_interval'],
+                    wait=wait
+                )
+                self.stdout.write(
+                    f'规则解析直接完成: {result["rule_only"]}，跳过（已在批次中）: {result["skipped"]}，'
+                    f'提交批次: {len(result["jobs"])}（{result["requests"]} 个请求）'
+                )
+                if not wait and result['jobs']:
+                    self.stdout.write('批次已提交，完成后使用 --mode batch --batch-resume 回收结果')
+        except Exception as e:
+            raise CommandError(f'批量处理失败: {str(e)}')
+        
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('【第二阶段】批量处理完成！'))
+        self.stdout.write(self.style.SUCCESS(f'成功: {result["success"]}'))
+        if result['failed'] > 0:
+            self.stdout.write(self.style.ERROR(f'失败: {result["failed"]}'))
+    
     def _handle_full_mode(self, extractor, options):
         """处理 full 模式：完整流程（提取文本 + LLM处理）"""
         # 获取需要处理的论文
-        papers = self._get_papers_to_process(options)
+        first, papers = peek(self._get_papers_to_process(options))
         
-        if not papers:
+        if first is None:
             self.stdout.write(self.style.WARNING('没有找到需要处理的论文'))
             return
         
-        total = len(papers)
         workers = options['workers']
-        self.stdout.write(f'找到 {total} 篇论文待处理')
+        self.stdout.write('开始处理待处理论文（按发布时间倒序）')
         
         if workers > 1:
             self.stdout.write(f'使用 {workers} 个线程并发处理')
-            self.stdout.write(self.style.WARNING('注意: full 模式包含 LLM 调用，建议 workers 设置为 2-3 以避免 API 限流'))
+            self.stdout.write(self.style.WARNING('注意: full 模式包含 LLM 调用，LLM 并发由 --llm-max-concurrency 自适应控制'))
         
         # 线程安全的统计信息
-        stats = ThreadSafeStats(total)
+        stats = ThreadSafeStats()
         
         # 如果只有 1 个 worker，使用单线程处理
         if workers == 1:
@@ -600,24 +802,23 @@ class Command(BaseCommand):
         # 最终统计
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS('处理完成！'))
-        self._print_final_stats(stats.get_dict())
+        self._print_final_stats(self._final_stats(stats))
     
     def _handle_full_mode_single_thread(self, papers, extractor, options, stats):
         """单线程处理 full 模式"""
         batch_size = options['batch_size']
         delay = options['delay']
-        total = len(papers)
         
-        for i in range(0, total, batch_size):
-            batch = papers[i:i + batch_size]
-            self.stdout.write(f'\n处理批次 {i // batch_size + 1} (论文 {i + 1}-{min(i + batch_size, total)})')
+        for batch_index, batch in enumerate(iter_batches(papers, batch_size)):
+            start = batch_index * batch_size
+            self.stdout.write(f'\n处理批次 {batch_index + 1} (论文 {start + 1}-{start + len(batch)})')
             
             for paper in batch:
-                result = self._process_single_paper(paper, extractor, options)
+                result = self._leased(self._process_single_paper)(paper, extractor, options)
                 stats.update(result)
                 
                 # 延迟
-                if delay > 0 and stats.processed < total:
+                if delay > 0:
                     time.sleep(delay)
             
             # 显示进度
@@ -626,17 +827,16 @@ class Command(BaseCommand):
     def _handle_full_mode_multi_thread(self, papers, extractor, options, stats, workers):
         """多线程处理 full 模式"""
         delay = options['delay']
-        total = len(papers)
         output_lock = threading.Lock()
         
         def process_paper_with_output(paper):
             """\u5904\u7406\u5355\u7bc7\u8bba\u6587\uff08\u5e26\u8f93\u51fa\u9501\uff09"""
-            result = self._process_single_paper(paper, extractor, options)
+            result = self._leased(self._process_single_paper)(paper, extractor, options)
             stats.update(result)
             
             # 线程安全地打印进度
             with output_lock:
-                if stats.processed % 5 == 0 or stats.processed == total:
+                if stats.processed % 5 == 0:
                     self._print_progress(stats.get_dict())
             
             # 延迟
@@ -645,25 +845,20 @@ class Command(BaseCommand):
             
             return result
         
-        # 使用线程池处理
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {executor.submit(process_paper_with_output, paper): paper for paper in papers}
-            
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    paper = futures[future]
-                    with output_lock:
-                        self.stdout.write(self.style.ERROR(f'处理论文 {paper.arxiv_id} 时发生异常: {str(e)}'))
-                        logger.exception(f'多线程处理论文 {paper.arxiv_id} 失败')
+        def on_error(paper, e):
+            with output_lock:
+                self.stdout.write(self.style.ERROR(f'处理论文 {paper.arxiv_id} 时发生异常: {str(e)}'))
+                logger.exception(f'多线程处理论文 {paper.arxiv_id} 失败', exc_info=e)
+        
+        # 使用线程池处理（边读取边提交，在途任务数有上限）
+        run_bounded(papers, process_paper_with_output, workers, on_error=on_error)
     
     def _get_logs_to_process(self, options):
-        """获取需要处理的提取日志列表（用于process模式）"""
+        """获取需要处理的提取日志（用于process模式，按开始时间倒序流式读取）"""
         # 基础查询：只选择已提取文本但未LLM处理的记录
         queryset = ArxivReferenceExtractLog.objects.filter(
             reference_section_found=True,
-            reference_raw_text__isnull=False
+            reference_text_length__gt=0
         )
         
         # 如果指定了arxiv_id
@@ -684,14 +879,21 @@ class Command(BaseCommand):
             # 默认只处理未LLM处理的
             queryset = queryset.filter(llm_processed=False)
         
-        # 按时间排序
-        queryset = queryset.select_related('paper').order_by('-started_at')
+        # 关联论文一并查询，避免每条日志单独查询论文
+        queryset = queryset.select_related('paper').only(
+            *EXTRACT_LOG_WORK_FIELDS, *(f'paper__{field}' for field in PAPER_WORK_FIELDS)
+        )
         
-        # 应用限制
-        if options['limit']:
-            queryset = queryset[:options['limit']]
+        if self.lease_queue is not None:
+            return self.lease_queue.iter_claimed(
+                queryset, ('-started_at', '-id'), paper_field='paper_id', limit=options['limit']
+            )
         
-        return list(queryset)
+        return keyset_iterator(
+            queryset,
+            order_by=('-started_at', '-id'),
+            limit=options['limit']
+        )
     
     def _process_paper_extract_only(self, paper, extractor, options):
         """处理单篇论文（只提取文本，不调用LLM）"""
@@ -707,7 +909,7 @@ class Command(BaseCommand):
             existing_log = ArxivReferenceExtractLog.objects.filter(
                 paper=paper,
                 reference_section_found=True,
-                reference_raw_text__isnull=False
+                reference_text_length__gt=0
             ).first()
             
             if existing_log:
@@ -731,7 +933,7 @@ class Command(BaseCommand):
             return 'skipped'
         
         # 创建提取日志
-        log = ArxivReferenceExtractLog.objects.create(
+        log = self.log_writer.create(
             paper=paper,
             status='extracting',
             retry_count=retry_count
@@ -778,7 +980,7 @@ class Command(BaseCommand):
                 log.reference_text_length = result['reference_text_length']
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.SUCCESS(
                     f'  ✓ 提取完成！参考文献文本长度: {result["reference_text_length"]} 字符，耗时 {log.duration_seconds} 秒'
@@ -790,7 +992,7 @@ class Command(BaseCommand):
                 log.error_message = result['error_message']
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.ERROR(
                     f'  ✗ 提取失败: {result["error_type"]}'
@@ -806,7 +1008,7 @@ class Command(BaseCommand):
             log.error_message = str(e)
             log.completed_at = timezone.now()
             log.duration_seconds = (log.completed_at - start_time).seconds
-            log.save()
+            self.log_writer.save(log)
             
             self.stdout.write(self.style.ERROR(f'  ✗ 异常: {str(e)}'))
             logger.exception(f'处理论文 {arxiv_id} 时发生异常')
@@ -814,6 +1016,7 @@ class Command(BaseCommand):
     
     def _process_log_with_llm(self, log, extractor, options):
         """处理单条提取记录（只使用LLM处理）"""
+        self.log_writer.track(log)
         paper = log.paper
         arxiv_id = paper.arxiv_id
         
@@ -834,27 +1037,29 @@ class Command(BaseCommand):
             # 使用LLM处理参考文献文本
             self.stdout.write(f'  🤖 正在调用 {options["llm_provider"]}/{options["llm_model"]} 解析参考文献...')
             
-            success, references, error, llm_response = extractor.process_reference_text_with_llm(
-                reference_text=log.reference_raw_text,
-                arxiv_id=arxiv_id,
-                max_chars=options['max_chars']
-            )
+            with collect_llm_metrics() as llm_metrics:
+                success, references, error, llm_response = extractor.process_reference_text_with_llm(
+                    reference_text=log.reference_raw_text,
+                    arxiv_id=arxiv_id,
+                    max_chars=options['max_chars']
+                )
             
-            # 保存LLM原始响应
+            # 保存LLM原始响应和调用遥测
             log.llm_response = llm_response
+            self._record_llm_metrics(log, llm_metrics.summary())
             
             if success:
                 log.llm_processed = True
                 log.reference_count = len(references)
                 log.status = 'completed'
-                
-                # 保存参考文献到数据库
-                self.stdout.write('  💾 正在保存参考文献到数据库...')
-                self._save_references(paper, references, log)
-                
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                
+                # 参考文献和完成状态在同一事务中写入，中途退出不会留下没有完成日志的参考文献
+                self.stdout.write('  💾 正在保存参考文献到数据库...')
+                with transaction.atomic():
+                    self._save_references(paper, references, log)
+                    self.log_writer.save_now(log)
                 
                 self.stdout.write(self.style.SUCCESS(
                     f'  ✓ 处理完成！提取 {log.reference_count} 条参考文献，耗时 {log.duration_seconds} 秒'
@@ -867,7 +1072,7 @@ class Command(BaseCommand):
                 log.status = 'failed'
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.ERROR(
                     f'  ✗ LLM处理失败'
@@ -884,7 +1089,7 @@ class Command(BaseCommand):
             log.status = 'failed'
             log.completed_at = timezone.now()
             log.duration_seconds = (log.completed_at - start_time).seconds
-            log.save()
+            self.log_writer.save(log)
             
             self.stdout.write(self.style.ERROR(f'  ✗ 异常: {str(e)}'))
             logger.exception(f'处理论文 {arxiv_id} 时发生异常')
@@ -895,7 +1100,7 @@ class Command(BaseCommand):
         # 计算已提取文本的记录数
         total_extracted = ArxivReferenceExtractLog.objects.filter(
             reference_section_found=True,
-            reference_raw_text__isnull=False
+            reference_text_length__gt=0
         ).count()
         
         self.stdout.write(f'总论文数: {stats["total"]}')
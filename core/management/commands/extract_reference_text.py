@@ -9,8 +9,10 @@ from datetime import datetime, timedelta
 import logging
 import time
 
-from core.arxiv_models import ArxivPaper, ArxivReferenceExtractLog
+from common.db_utils import keyset_iterator, iter_batches, peek
+from core.arxiv_models import ArxivPaper, ArxivReferenceExtractLog, PAPER_WORK_FIELDS
 from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.extract_log_writer import ExtractLogWriter
 
 
 # 配置日志
@@ -60,6 +62,18 @@ class Command(BaseCommand):
             default=0.5,
             help='每篇论文处理之间的延迟（秒）'
         )
+        parser.add_argument(
+            '--log-flush-size',
+            type=int,
+            default=50,
+            help='提取日志的状态更新缓冲到该数量时批量写入数据库（默认: 50，设为 1 则逐条写入）'
+        )
+        parser.add_argument(
+            '--log-flush-interval',
+            type=float,
+            default=10.0,
+            help='提取日志状态更新的最长缓冲时间（秒，默认: 10）'
+        )
     
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('【第一阶段】开始提取ArXiv论文参考文献原始文本...'))
@@ -74,31 +88,47 @@ class Command(BaseCommand):
             raise CommandError(f'初始化提取器失败: {str(e)}')
         
         # 获取需要处理的论文
-        papers = self._get_papers_to_process(options)
+        first, papers = peek(self._get_papers_to_process(options))
         
-        if not papers:
+        if first is None:
             self.stdout.write(self.style.WARNING('没有找到需要处理的论文'))
             return
         
-        total = len(papers)
-        self.stdout.write(f'找到 {total} 篇论文待处理')
+        self.stdout.write('开始处理待处理论文（按发布时间倒序）')
         
         # 统计信息
         stats = {
-            'total': total,
+            'total': None,
             'processed': 0,
             'success': 0,
             'failed': 0,
             'skipped': 0,
         }
         
+        # 提取日志批量写入
+        self.log_writer = ExtractLogWriter(
+            flush_size=options['log_flush_size'],
+            flush_interval=options['log_flush_interval']
+        )
+        
+        with self.log_writer:
+            self._process_papers(papers, extractor, options, stats)
+        
+        # 最终统计
+        stats['total'] = stats['processed']
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('【第一阶段】处理完成！'))
+        self._print_final_stats(stats)
+    
+    def _process_papers(self, papers, extractor, options, stats):
+        """逐批处理论文并更新统计"""
         # 批量处理
         batch_size = options['batch_size']
         delay = options['delay']
         
-        for i in range(0, total, batch_size):
-            batch = papers[i:i + batch_size]
-            self.stdout.write(f'\n处理批次 {i // batch_size + 1} (论文 {i + 1}-{min(i + batch_size, total)})')
+        for batch_index, batch in enumerate(iter_batches(papers, batch_size)):
+            start = batch_index * batch_size
+            self.stdout.write(f'\n处理批次 {batch_index + 1} (论文 {start + 1}-{start + len(batch)})')
             
             for paper in batch:
                 result = self._process_single_paper(paper, extractor, options)
@@ -113,19 +143,14 @@ class Command(BaseCommand):
                     stats['skipped'] += 1
                 
                 # 延迟
-                if delay > 0 and stats['processed'] < total:
+                if delay > 0:
                     time.sleep(delay)
             
             # 显示进度
             self._print_progress(stats)
-        
-        # 最终统计
-        self.stdout.write('\n' + '=' * 60)
-        self.stdout.write(self.style.SUCCESS('【第一阶段】处理完成！'))
-        self._print_final_stats(stats)
     
     def _get_papers_to_process(self, options):
-        """获取需要处理的论文列表"""
+        """获取需要处理的论文（按发布时间倒序流式读取，只加载处理用到的字段）"""
         queryset = ArxivPaper.objects.all()
         
         # 如果指定了arxiv_id
@@ -137,7 +162,7 @@ class Command(BaseCommand):
             # 获取已经提取了参考文献文本的论文ID
             processed_ids = ArxivReferenceExtractLog.objects.filter(
                 reference_section_found=True,
-                reference_raw_text__isnull=False
+                reference_text_length__gt=0
             ).values_list('paper_id', flat=True)
             
             queryset = queryset.exclude(id__in=processed_ids)
@@ -150,14 +175,11 @@ class Command(BaseCommand):
             
             queryset = queryset.filter(id__in=failed_ids)
         
-        # 按发布时间排序
-        queryset = queryset.order_by('-published')
-        
-        # 应用限制
-        if options['limit']:
-            queryset = queryset[:options['limit']]
-        
-        return list(queryset)
+        return keyset_iterator(
+            queryset.only(*PAPER_WORK_FIELDS),
+            order_by=('-published', '-id'),
+            limit=options['limit']
+        )
     
     def _process_single_paper(self, paper, extractor, options):
         """处理单篇论文"""
@@ -173,7 +195,7 @@ class Command(BaseCommand):
             existing_log = ArxivReferenceExtractLog.objects.filter(
                 paper=paper,
                 reference_section_found=True,
-                reference_raw_text__isnull=False
+                reference_text_length__gt=0
             ).first()
             
             if existing_log:
@@ -190,7 +212,7 @@ class Command(BaseCommand):
             return 'skipped'
         
         # 创建提取日志
-        log = ArxivReferenceExtractLog.objects.create(
+        log = self.log_writer.create(
             paper=paper,
             status='extracting',
             retry_count=retry_count
@@ -237,7 +259,7 @@ class Command(BaseCommand):
                 log.reference_text_length = result['reference_text_length']
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.SUCCESS(
                     f'  ✓ 提取完成！参考文献文本长度: {result["reference_text_length"]} 字符，耗时 {log.duration_seconds} 秒'
@@ -249,7 +271,7 @@ class Command(BaseCommand):
                 log.error_message = result['error_message']
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.ERROR(
                     f'  ✗ 提取失败: {result["error_type"]}'
@@ -265,7 +287,7 @@ class Command(BaseCommand):
             log.error_message = str(e)
             log.completed_at = timezone.now()
             log.duration_seconds = (log.completed_at - start_time).seconds
-            log.save()
+            self.log_writer.save(log)
             
             self.stdout.write(self.style.ERROR(f'  ✗ 异常: {str(e)}'))
             logger.exception(f'处理论文 {arxiv_id} 时发生异常')
@@ -273,8 +295,9 @@ class Command(BaseCommand):
     
     def _print_progress(self, stats):
         """打印进度信息"""
+        total = f"/{stats['total']}" if stats['total'] is not None else ''
         self.stdout.write(
-            f"\n进度: {stats['processed']}/{stats['total']} | "
+            f"\n进度: {stats['processed']}{total} | "
             f"成功: {stats['success']} | "
             f"失败: {stats['failed']} | "
             f"跳过: {stats['skipped']}"
@@ -285,7 +308,7 @@ class Command(BaseCommand):
         # 计算已提取文本的记录数
         total_extracted = ArxivReferenceExtractLog.objects.filter(
             reference_section_found=True,
-            reference_raw_text__isnull=False
+            reference_text_length__gt=0
         ).count()
         
         self.stdout.write(f'总论文数: {stats["total"]}')
@@ -0,0 +1,206 @@
+"""
+Django管理命令：整篇论文预翻译
+提取论文正文段落，在自适应并发控制下并行翻译，结果写入翻译缓存；
+读者之后在阅读页选中段落翻译时直接命中缓存，无需等待LLM
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ai_config_views import API_BASE_CONFIG, API_KEY_ENV_MAP
+from core.arxiv_models import ArxivPaper
+from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.chat_views import LANGUAGE_NAMES, build_translation_messages, call_llm_api, translation_cache_model
+from core.llm.concurrency import get_limiter
+from core.models import AIModelConfig
+from core.paper_translation import PaperPretranslator, extract_paragraphs
+
+
+class Command(BaseCommand):
+    help = '预翻译整篇论文的正文段落并写入翻译缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--arxiv-id',
+            type=str,
+            nargs='+',
+            help='预翻译指定的arXiv ID'
+        )
+        parser.add_argument(
+            '--pdf',
+            type=str,
+            nargs='+',
+            help='预翻译本地PDF文件'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=None,
+            help='预翻译被引次数最多的N篇论文（需先运行 compute_paper_scores）'
+        )
+        parser.add_argument(
+            '--target-lang',
+            type=str,
+            default='zh',
+            choices=sorted(LANGUAGE_NAMES),
+            help='目标语言（默认: zh）'
+        )
+        parser.add_argument(
+            '--provider',
+            type=str,
+            default='gpt',
+            help='模型提供商，与AI模型配置中的提供商一致（默认: gpt）'
+        )
+        parser.add_argument(
+            '--model',
+            type=str,
+            default='gpt-4o-mini',
+            help='模型名称，与读者使用的模型一致时才能命中缓存（默认: gpt-4o-mini）'
+        )
+        parser.add_argument(
+            '--api-key',
+            type=str,
+            default=None,
+            help='API密钥（默认读取提供商对应的环境变量）'
+        )
+        parser.add_argument(
+            '--api-base',
+            type=str,
+            default=None,
+            help='API地址（默认使用提供商的默认地址；自定义地址的翻译不与读者共享缓存）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='翻译线程数（默认: 8）'
+        )
+        parser.add_argument(
+            '--llm-max-concurrency',
+            type=int,
+            default=16,
+            help='同一提供商的最大并发请求数，遇到限流自动回退（默认: 16，0 表示只受线程数限制）'
+        )
+        parser.add_argument(
+            '--min-chars',
+            type=int,
+            default=40,
+            help='段落最短字符数，更短的文本块（页眉、页码、公式碎片）不翻译（默认: 40）'
+        )
+
+    def handle(self, *args, **options):
+        if not (options['arxiv_id'] or options['pdf'] or options['top']):
+            raise CommandError('请指定 --arxiv-id、--pdf 或 --top')
+
+        provider = options['provider']
+        api_key = options['api_key'] or os.getenv(API_KEY_ENV_MAP.get(provider, ''), '')
+        if not api_key:
+            raise CommandError(f'缺少 {provider} 的API密钥（--api-key 或环境变量 {API_KEY_ENV_MAP.get(provider)}）')
+
+        # 与读者的AI模型配置相同的调用方式和模型标识，保证缓存键一致（不保存到数据库）
+        config = AIModelConfig(
+            provider=provider,
+            model_name=options['model'],
+            api_key=api_key,
+            api_base=options['api_base'] or API_BASE_CONFIG.get(provider, '')
+        )
+        target_lang = options['target_lang']
+
+        limiter = None
+        if options['llm_max_concurrency']:
+            limiter = get_limiter(
+                f'translate:{provider}',
+                initial_limit=min(options['workers'], options['llm_max_concurrency']),
+                max_limit=options['llm_max_concurrency']
+            )
+
+        def translate(text):
+            served_by = {}
+            translated = call_llm_api(config, build_translation_messages(text, target_lang), served_by=served_by)
+            if served_by.get('fallback'):
+                # 备用提供商的译文不能按指定模型写入缓存，记为失败，下次运行重新翻译
+                raise RuntimeError(f'由备用提供商 {served_by["provider"]} 返回，未写入缓存')
+            return translated
+
+        pretranslator = PaperPretranslator(
+            translate=translate,
+            target_lang=target_lang,
+            model=translation_cache_model(config),
+            limiter=limiter,
+            workers=options['workers'],
+            log=self.stdout.write
+        )
+        extractor = ArxivReferenceExtractor()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'开始预翻译: {config.provider}/{config.model_name} -> {LANGUAGE_NAMES[target_lang]}'
+        ))
+        start = time.time()
+        totals = {'papers': 0, 'total': 0, 'cached': 0, 'translated': 0, 'failed': 0}
+
+        for label, load_document in self._iter_documents(extractor, options):
+            self.stdout.write(f'\n📄 {label}')
+            document, error = load_document()
+            if document is None:
+                self.stdout.write(self.style.ERROR(f'  ✗ 提取失败: {error}'))
+                continue
+
+            paragraphs = extract_paragraphs(document, extractor, min_chars=options['min_chars'])
+            stats = pretranslator.run(paragraphs)
+            self.stdout.write(
+                f'  ✓ {stats["total"]} 段: 已缓存 {stats["cached"]}，新翻译 {stats["translated"]}，失败 {stats["failed"]}'
+            )
+            totals['papers'] += 1
+            for key in ('total', 'cached', 'translated', 'failed'):
+                totals[key] += stats[key]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n完成: {totals["papers"]} 篇论文，{totals["total"]} 段（已缓存 {totals["cached"]}，'
+            f'新翻译 {totals["translated"]}，失败 {totals["failed"]}），耗时 {time.time() - start:.1f} 秒'
+        ))
+        if limiter is not None:
+            snapshot = limiter.snapshot()
+            self.stdout.write(
+                f'LLM并发: 当前上限 {snapshot["limit"]} | 成功 {snapshot["success"]} | '
+                f'限流/超时 {snapshot["overload"]}（回退 {snapshot["backoffs"]} 次） | 其他错误 {snapshot["error"]}'
+            )
+
+    def _iter_documents(self, extractor, options):
+        """生成 (显示名称, 加载函数)，加载函数返回 (文档, 错误信息)"""
+        for pdf_path in options['pdf'] or []:
+            yield pdf_path, lambda pdf_path=pdf_path: self._load_local(extractor, pdf_path)
+
+        papers = []
+        if options['arxiv_id']:
+            papers.extend(ArxivPaper.objects.filter(arxiv_id__in=options['arxiv_id']).only('arxiv_id', 'title', 'pdf_url'))
+        if options['top']:
+            papers.extend(
+                ArxivPaper.objects.filter(score__isnull=False)
+                .order_by('-score__citation_count', '-score__pagerank')
+                .only('arxiv_id', 'title', 'pdf_url')[:options['top']]
+            )
+
+        seen = set()
+        for paper in papers:
+            if paper.arxiv_id in seen:
+                continue
+            seen.add(paper.arxiv_id)
+            yield f'{paper.arxiv_id} {paper.title[:60]}', lambda paper=paper: self._load_paper(extractor, paper)
+
+    @staticmethod
+    def _load_local(extractor, pdf_path):
+        success, document, error = extractor.extract_document(pdf_path)
+        return (document, None) if success else (None, error)
+
+    @staticmethod
+    def _load_paper(extractor, paper):
+        # 优先使用文本层缓存（与参考文献提取共用），只接受整篇提取结果
+        document = extractor.get_cached_document(paper.pdf_url)
+        if document is not None:
+            return document, None
+        success, pdf_path, error = extractor.download_pdf(paper.pdf_url, paper.arxiv_id)
+        if not success:
+            return None, error
+        success, document, error = extractor.extract_document(pdf_path, aliases=(paper.pdf_url,))
+        return (document, None) if success else (None, error)
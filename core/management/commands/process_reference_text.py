@@ -9,8 +9,15 @@ from datetime import datetime, timedelta
 import logging
 import time
 
-from core.arxiv_models import ArxivPaper, ArxivPaperReference, ArxivReferenceExtractLog
+from common.db_utils import keyset_iterator, iter_batches, peek
+from core.arxiv_models import (
+    ArxivPaper, ArxivPaperReference, ArxivReferenceExtractLog, PAPER_WORK_FIELDS, EXTRACT_LOG_WORK_FIELDS,
+)
 from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.extract_log_writer import ExtractLogWriter
+from core.llm.failover import parse_provider_spec
+from core.llm.telemetry import collect_llm_metrics
+from core.reference_batch import ReferenceBatchRunner
 
 
 # 配置日志
@@ -75,8 +82,79 @@ class Command(BaseCommand):
         parser.add_argument(
             '--max-chars',
             type=int,
-            default=50000,
-            help='最大字符数限制（默认: 50000）'
+            default=None,
+            help='每次LLM调用的最大字符数，更长的参考文献按条目分块并行解析（默认: 8000）'
+        )
+        parser.add_argument(
+            '--llm-workers',
+            type=int,
+            default=4,
+            help='并发解析参考文献分块的LLM线程数（默认: 4）'
+        )
+        parser.add_argument(
+            '--llm-max-concurrency',
+            type=int,
+            default=16,
+            help='同一LLM提供商的最大并发请求数，从 --llm-workers 起按延迟和限流自动调整，'
+                 '遇到 429/超时时回退并重试（默认: 16，设为 0 则不做并发控制）'
+        )
+        parser.add_argument(
+            '--llm-fallback',
+            type=str,
+            nargs='+',
+            default=None,
+            metavar='PROVIDER[:MODEL]',
+            help='备用LLM提供商（如 deepseek:deepseek-chat），主提供商出错、超时或熔断时自动转移，'
+                 '按近期延迟选择；API密钥读取 <PROVIDER>_API_KEY 环境变量'
+        )
+        parser.add_argument(
+            '--llm-hedge',
+            action='store_true',
+            help='请求超过近期 p95 延迟仍未返回时，并发向备用提供商发送相同请求，先返回的结果胜出'
+        )
+        parser.add_argument(
+            '--no-rule-parser',
+            action='store_true',
+            help='不使用规则解析，全部参考文献交给LLM处理'
+        )
+        parser.add_argument(
+            '--rule-threshold',
+            type=float,
+            default=0.75,
+            help='规则解析的置信度阈值，低于该值的条目交给LLM（默认: 0.75）'
+        )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='通过LLM批量API提交处理（吞吐量更高、费用更低，结果异步返回）'
+        )
+        parser.add_argument(
+            '--batch-resume',
+            action='store_true',
+            help='继续轮询并回收之前提交但未回收结果的批次，不提交新批次'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=60.0,
+            help='轮询批次状态的间隔（秒，默认: 60）'
+        )
+        parser.add_argument(
+            '--no-wait',
+            action='store_true',
+            help='提交批次后立即退出，之后用 --batch-resume 回收结果'
+        )
+        parser.add_argument(
+            '--log-flush-size',
+            type=int,
+            default=50,
+            help='提取日志的状态更新缓冲到该数量时批量写入数据库（默认: 50，设为 1 则逐条写入）'
+        )
+        parser.add_argument(
+            '--log-flush-interval',
+            type=float,
+            default=10.0,
+            help='提取日志状态更新的最长缓冲时间（秒，默认: 10）'
         )
     
     def handle(self, *args, **options):
@@ -87,25 +165,34 @@ class Command(BaseCommand):
             extractor = ArxivReferenceExtractor(
                 llm_provider=options['llm_provider'],
                 llm_model=options['llm_model'],
-                llm_timeout=options['llm_timeout']
+                llm_timeout=options['llm_timeout'],
+                use_rule_parser=not options['no_rule_parser'],
+                rule_confidence_threshold=options['rule_threshold'],
+                llm_workers=options['llm_workers'],
+                llm_max_concurrency=options['llm_max_concurrency'],
+                llm_fallbacks=[parse_provider_spec(spec) for spec in options['llm_fallback'] or []],
+                llm_hedge=options['llm_hedge']
             )
             self.stdout.write(f'LLM配置: {options["llm_provider"]}/{options["llm_model"]} (超时: {options["llm_timeout"]}秒)')
         except Exception as e:
             raise CommandError(f'初始化提取器失败: {str(e)}')
         
+        if options['batch'] or options['batch_resume']:
+            self._handle_batch(extractor, options)
+            return
+        
         # 获取需要处理的记录
-        logs = self._get_logs_to_process(options)
+        first, logs = peek(self._get_logs_to_process(options))
         
-        if not logs:
+        if first is None:
             self.stdout.write(self.style.WARNING('没有找到需要处理的记录'))
             return
         
-        total = len(logs)
-        self.stdout.write(f'找到 {total} 条记录待处理')
+        self.stdout.write('开始处理待处理记录（按开始时间倒序）')
         
         # 统计信息
         stats = {
-            'total': total,
+            'total': None,
             'processed': 0,
             'success': 0,
             'failed': 0,
@@ -113,13 +200,32 @@ class Command(BaseCommand):
             'total_references': 0,
         }
         
+        # 提取日志批量写入
+        self.log_writer = ExtractLogWriter(
+            flush_size=options['log_flush_size'],
+            flush_interval=options['log_flush_interval']
+        )
+        
+        with self.log_writer:
+            self._process_logs(logs, extractor, options, stats)
+        
+        # 最终统计
+        stats['total'] = stats['processed']
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('【第二阶段】处理完成！'))
+        self._print_final_stats(stats)
+        self._print_llm_concurrency(extractor)
+        self._print_llm_usage(extractor)
+    
+    def _process_logs(self, logs, extractor, options, stats):
+        """逐批处理记录并更新统计"""
         # 批量处理
         batch_size = options['batch_size']
         delay = options['delay']
         
-        for i in range(0, total, batch_size):
-            batch = logs[i:i + batch_size]
-            self.stdout.write(f'\n处理批次 {i // batch_size + 1} (记录 {i + 1}-{min(i + batch_size, total)})')
+        for batch_index, batch in enumerate(iter_batches(logs, batch_size)):
+            start = batch_index * batch_size
+            self.stdout.write(f'\n处理批次 {batch_index + 1} (记录 {start + 1}-{start + len(batch)})')
             
             for log in batch:
                 result = self._process_single_log(log, extractor, options)
@@ -134,23 +240,54 @@ class Command(BaseCommand):
                     stats['skipped'] += 1
                 
                 # 延迟
-                if delay > 0 and stats['processed'] < total:
+                if delay > 0:
                     time.sleep(delay)
             
             # 显示进度
             self._print_progress(stats)
+    
+    def _handle_batch(self, extractor, options):
+        """通过LLM批量API处理，可中断后用 --batch-resume 继续"""
+        runner = ReferenceBatchRunner(extractor, log=self.stdout.write)
+        wait = not options['no_wait']
+        
+        try:
+            if options['batch_resume']:
+                result = runner.resume(poll_interval=options['poll_interval'], wait=wait)
+                self.stdout.write(f'未回收的批次: {result["jobs"]}，本次回收: {result["collected"]}')
+            else:
+                first, logs = peek(self._get_logs_to_process(options))
+                if first is None:
+                    self.stdout.write(self.style.WARNING('没有找到需要处理的记录'))
+                    return
+                
+                result = runner.run(
+                    logs,
+                    max_chars=options['max_chars'],
+                    poll_interval=options['poll_interval'],
+                    wait=wait
+                )
+                self.stdout.write(
+                    f'规则解析直接完成: {result["rule_only"]}，跳过（已在批次中）: {result["skipped"]}，'
+                    f'提交批次: {len(result["jobs"])}（{result["requests"]} 个请求）'
+                )
+                if not wait and result['jobs']:
+                    self.stdout.write('批次已提交，完成后使用 --batch-resume 回收结果')
+        except Exception as e:
+            raise CommandError(f'批量处理失败: {str(e)}')
         
-        # 最终统计
         self.stdout.write('\n' + '=' * 60)
-        self.stdout.write(self.style.SUCCESS('【第二阶段】处理完成！'))
-        self._print_final_stats(stats)
+        self.stdout.write(self.style.SUCCESS('【第二阶段】批量处理完成！'))
+        self.stdout.write(self.style.SUCCESS(f'成功: {result["success"]}'))
+        if result['failed'] > 0:
+            self.stdout.write(self.style.ERROR(f'失败: {result["failed"]}'))
     
     def _get_logs_to_process(self, options):
-        """获取需要处理的提取日志列表"""
+        """获取需要处理的提取日志（按开始时间倒序流式读取，只加载处理用到的字段）"""
         # 基础查询：只选择已提取文本但未LLM处理的记录
         queryset = ArxivReferenceExtractLog.objects.filter(
             reference_section_found=True,
-            reference_raw_text__isnull=False
+            reference_text_length__gt=0
         )
         
         # 如果指定了arxiv_id
@@ -171,17 +308,20 @@ class Command(BaseCommand):
             # 默认只处理未LLM处理的
             queryset = queryset.filter(llm_processed=False)
         
-        # 按时间排序
-        queryset = queryset.select_related('paper').order_by('-started_at')
-        
-        # 应用限制
-        if options['limit']:
-            queryset = queryset[:options['limit']]
+        # 关联论文一并查询，避免每条日志单独查询论文
+        queryset = queryset.select_related('paper').only(
+            *EXTRACT_LOG_WORK_FIELDS, *(f'paper__{field}' for field in PAPER_WORK_FIELDS)
+        )
         
-        return list(queryset)
+        return keyset_iterator(
+            queryset,
+            order_by=('-started_at', '-id'),
+            limit=options['limit']
+        )
     
     def _process_single_log(self, log, extractor, options):
         """处理单条提取记录"""
+        self.log_writer.track(log)
         paper = log.paper
         arxiv_id = paper.arxiv_id
         
@@ -202,27 +342,29 @@ class Command(BaseCommand):
             # 使用LLM处理参考文献文本
             self.stdout.write(f'  🤖 正在调用 {options["llm_provider"]}/{options["llm_model"]} 解析参考文献...')
             
-            success, references, error, llm_response = extractor.process_reference_text_with_llm(
-                reference_text=log.reference_raw_text,
-                arxiv_id=arxiv_id,
-                max_chars=options['max_chars']
-            )
+            with collect_llm_metrics() as llm_metrics:
+                success, references, error, llm_response = extractor.process_reference_text_with_llm(
+                    reference_text=log.reference_raw_text,
+                    arxiv_id=arxiv_id,
+                    max_chars=options['max_chars']
+                )
             
-            # 保存LLM原始响应
+            # 保存LLM原始响应和调用遥测
             log.llm_response = llm_response
+            self._record_llm_metrics(log, llm_metrics.summary())
             
             if success:
                 log.llm_processed = True
                 log.reference_count = len(references)
                 log.status = 'completed'
-                
-                # 保存参考文献到数据库
-                self.stdout.write('  💾 正在保存参考文献到数据库...')
-                self._save_references(paper, references, log)
-                
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                
+                # 参考文献和完成状态在同一事务中写入，中途退出不会留下没有完成日志的参考文献
+                self.stdout.write('  💾 正在保存参考文献到数据库...')
+                with transaction.atomic():
+                    self._save_references(paper, references, log)
+                    self.log_writer.save_now(log)
                 
                 self.stdout.write(self.style.SUCCESS(
                     f'  ✓ 处理完成！提取 {log.reference_count} 条参考文献，耗时 {log.duration_seconds} 秒'
@@ -235,7 +377,7 @@ class Command(BaseCommand):
                 log.status = 'failed'
                 log.completed_at = timezone.now()
                 log.duration_seconds = (log.completed_at - start_time).seconds
-                log.save()
+                self.log_writer.save(log)
                 
                 self.stdout.write(self.style.ERROR(
                     f'  ✗ LLM处理失败'
@@ -252,58 +394,72 @@ class Command(BaseCommand):
             log.status = 'failed'
             log.completed_at = timezone.now()
             log.duration_seconds = (log.completed_at - start_time).seconds
-            log.save()
+            self.log_writer.save(log)
             
             self.stdout.write(self.style.ERROR(f'  ✗ 异常: {str(e)}'))
             logger.exception(f'处理论文 {arxiv_id} 时发生异常')
             return 'failed'
     
+    def _record_llm_metrics(self, log, metrics):
+        """把本篇论文的LLM调用遥测（耗时、token 数、估算费用）写入提取日志的处理详情"""
+        if not metrics or not metrics['calls']:
+            return
+        log.processing_details = {**(log.processing_details or {}), 'llm': metrics}
+        cost = f'，估算费用 ${metrics["cost"]:.4f}' if metrics['cost'] is not None else ''
+        self.stdout.write(
+            f'  ℹ️  LLM: {metrics["calls"]} 次调用（失败 {metrics["errors"]}），输入 {metrics["prompt_tokens"]} / '
+            f'输出 {metrics["completion_tokens"]} tokens，最长 {metrics["max_latency"]:.1f} 秒{cost}'
+        )
+    
     def _save_references(self, paper, references, log):
-        """保存参考文献到数据库"""
-        try:
-            with transaction.atomic():
-                # 删除旧的参考文献（如果存在）
-                ArxivPaperReference.objects.filter(paper=paper).delete()
-                
-                # 批量创建新的参考文献
-                reference_objects = []
-                for ref_data in references:
-                    reference_objects.append(
-                        ArxivPaperReference(
-                            paper=paper,
-                            reference_number=ref_data.get('reference_number', 0),
-                            title=ref_data.get('title'),
-                            authors=ref_data.get('authors'),
-                            year=ref_data.get('year'),
-                            venue=ref_data.get('venue'),
-                            venue_type=ref_data.get('venue_type'),
-                            volume=ref_data.get('volume'),
-                            issue=ref_data.get('issue'),
-                            pages=ref_data.get('pages'),
-                            doi=ref_data.get('doi'),
-                            arxiv_id=ref_data.get('arxiv_id'),
-                            url=ref_data.get('url'),
-                            raw_text=ref_data.get('raw_text', ''),
-                            extraction_method='llm',
-                        )
-                    )
-                
-                ArxivPaperReference.objects.bulk_create(reference_objects)
-                
-        except Exception as e:
-            log.error_message = f'保存参考文献失败: {str(e)}'
-            log.save()
-            raise
+        """
+        保存参考文献到数据库
+        
+        在调用方的事务中执行，失败时不在这里写日志（事务会回滚），由调用方的异常处理记录失败
+        """
+        ArxivPaperReference.replace_for_paper(paper, references)
     
     def _print_progress(self, stats):
         """打印进度信息"""
+        total = f"/{stats['total']}" if stats['total'] is not None else ''
         self.stdout.write(
-            f"\n进度: {stats['processed']}/{stats['total']} | "
+            f"\n进度: {stats['processed']}{total} | "
             f"成功: {stats['success']} | "
             f"失败: {stats['failed']} | "
             f"跳过: {stats['skipped']}"
         )
     
+    def _print_llm_concurrency(self, extractor):
+        """打印LLM自适应并发控制的统计"""
+        if extractor.llm_limiter is None:
+            return
+        snapshot = extractor.llm_limiter.snapshot()
+        if not (snapshot['success'] or snapshot['overload'] or snapshot['error']):
+            return
+        self.stdout.write(
+            f'LLM并发: 当前上限 {snapshot["limit"]} | 成功 {snapshot["success"]} | '
+            f'限流/超时 {snapshot["overload"]}（回退 {snapshot["backoffs"]} 次） | 其他错误 {snapshot["error"]}'
+        )
+
+    def _print_llm_usage(self, extractor):
+        """打印LLM token 用量和提示词缓存命中情况"""
+        usage = extractor.llm_usage.snapshot()
+        if not usage['requests']:
+            return
+        self.stdout.write(
+            f'LLM用量: {usage["requests"]} 次调用 | 输入 {usage["prompt_tokens"]} tokens'
+            f'（缓存命中 {usage["cache_read_tokens"]}，{usage["cache_hit_rate"]:.1%}；写入缓存 {usage["cache_write_tokens"]}） | '
+            f'输出 {usage["completion_tokens"]} tokens'
+        )
+        health = getattr(extractor.llm_client, 'snapshot', None)
+        if health is not None:
+            for member in health():
+                latency = f'{member["ewma_latency"]:.1f}s' if member['ewma_latency'] is not None else '-'
+                self.stdout.write(
+                    f'  {member["provider"]}: 成功 {member["successes"]} | 失败 {member["failures"]} | '
+                    f'对冲 {member["hedged"]} | 平均延迟 {latency}{"" if member["available"] else " | 熔断中"}'
+                )
+
     def _print_final_stats(self, stats):
         """打印最终统计信息"""
         # 计算参考文献总数
@@ -0,0 +1,97 @@
+"""
+Django管理命令：解析论文引用关系
+把已解析的参考文献按 arXiv ID、DOI、标准化标题匹配到本地论文，写入引用边表，
+并导出可内存映射的 CSR 邻接文件
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.arxiv_models import ArxivPaper
+from core.citation_graph import CitationGraph, CitationResolver
+from core.title_index import RAPIDFUZZ_SUPPORT, TitleIndex
+
+
+class Command(BaseCommand):
+    help = '把参考文献匹配到本地论文，物化引用边并导出 CSR 引用图'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--arxiv-id',
+            type=str,
+            help='只重新匹配指定论文的参考文献'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的施引论文数量（默认: 500）'
+        )
+        parser.add_argument(
+            '--min-title-length',
+            type=int,
+            default=20,
+            help='参与标题匹配的标准化标题最短长度（默认: 20，过短的标题容易误匹配）'
+        )
+        parser.add_argument(
+            '--fuzzy-titles',
+            action='store_true',
+            help='标题精确匹配失败时使用 MinHash 索引模糊匹配（建索引需要更多内存和时间）'
+        )
+        parser.add_argument(
+            '--fuzzy-threshold',
+            type=float,
+            default=0.9,
+            help='标题模糊匹配的相似度阈值（0-1，默认: 0.9）'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='CSR 文件输出目录（默认: data/citation_graph）'
+        )
+        parser.add_argument(
+            '--export-only',
+            action='store_true',
+            help='不重新匹配，只根据现有引用边导出 CSR 文件'
+        )
+        parser.add_argument(
+            '--no-export',
+            action='store_true',
+            help='只更新引用边表，不导出 CSR 文件'
+        )
+
+    def handle(self, *args, **options):
+        if options['export_only'] and options['no_export']:
+            raise CommandError('--export-only 和 --no-export 不能同时使用')
+
+        if not options['export_only']:
+            self.stdout.write(self.style.SUCCESS('开始匹配参考文献与本地论文...'))
+            papers = None
+            if options['arxiv_id']:
+                papers = ArxivPaper.objects.filter(arxiv_id=options['arxiv_id'])
+                if not papers.exists():
+                    raise CommandError(f'论文不存在: {options["arxiv_id"]}')
+
+            title_index = None
+            if options['fuzzy_titles']:
+                title_index = TitleIndex(min_length=options['min_title_length'])
+                if not RAPIDFUZZ_SUPPORT:
+                    self.stdout.write(self.style.WARNING('未安装 rapidfuzz，使用 difflib 计算标题相似度（较慢）'))
+
+            resolver = CitationResolver(
+                min_title_length=options['min_title_length'],
+                title_index=title_index,
+                fuzzy_threshold=options['fuzzy_threshold'],
+                log=self.stdout.write
+            )
+            stats = resolver.run(papers, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'匹配完成：{stats["papers"]} 篇施引论文，{stats["edges"]} 条引用边'
+            ))
+
+        if not options['no_export']:
+            self.stdout.write('导出 CSR 引用图...')
+            graph = CitationGraph.from_database()
+            path = graph.save(options['output'])
+            self.stdout.write(self.style.SUCCESS(
+                f'已导出到 {path}（节点 {graph.num_nodes}，边 {graph.num_edges}）'
+            ))
@@ -0,0 +1,32 @@
+"""
+监控指标视图
+"""
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from core.llm.telemetry import telemetry
+
+
+def metrics(request):
+    """
+    Prometheus 格式的 LLM 调用指标（调用次数、token 数、估算费用、延迟 / 首 token 延迟 / 输出速度直方图）
+    
+    GET /metrics
+    settings.LLM_METRICS 未启用时返回 404；需携带 Authorization: Bearer <token>，
+    只有 DEBUG 模式下允许不设置 token。指标按进程累计，多进程部署时需分别抓取各进程
+    """
+    options = getattr(settings, 'LLM_METRICS', None) or {}
+    if not options.get('enabled', False):
+        return HttpResponse('Not found', status=404, content_type='text/plain')
+    
+    token = options.get('token') or ''
+    if not token and not settings.DEBUG:
+        return HttpResponse('LLM_METRICS_TOKEN is required', status=403, content_type='text/plain')
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided.encode(), token.encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    
+    return HttpResponse(telemetry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
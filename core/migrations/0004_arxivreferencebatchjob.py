@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chatsession_chatmessage_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArxivReferenceBatchJob',
+            fields=[
+                ('id', models.AutoField(help_text='自增主键', primary_key=True, serialize=False, verbose_name='主键ID')),
+                ('batch_id', models.CharField(help_text='LLM提供商返回的批次ID', max_length=100, unique=True, verbose_name='批次ID')),
+                ('provider', models.CharField(max_length=50, verbose_name='LLM提供商')),
+                ('model', models.CharField(blank=True, max_length=100, null=True, verbose_name='模型名称')),
+                ('status', models.CharField(choices=[('in_progress', '处理中'), ('completed', '已完成'), ('collected', '结果已回收'), ('failed', '失败'), ('expired', '已过期'), ('cancelled', '已取消')], db_index=True, default='in_progress', max_length=20, verbose_name='状态')),
+                ('request_count', models.IntegerField(default=0, help_text='批次中的请求数（一篇论文的参考文献可能分成多块）', verbose_name='请求数量')),
+                ('succeeded_count', models.IntegerField(default=0, verbose_name='成功请求数')),
+                ('failed_count', models.IntegerField(default=0, verbose_name='失败请求数')),
+                ('log_ids', models.JSONField(default=list, help_text='批次包含的 ArxivReferenceExtractLog ID', verbose_name='提取日志ID列表')),
+                ('options', models.JSONField(blank=True, default=dict, help_text='提交时的解析参数（分块大小、规则解析阈值等），回收结果时按相同参数合并', verbose_name='解析参数')),
+                ('input_file_path', models.CharField(blank=True, help_text='本地保存的批次输入JSONL文件', max_length=500, null=True, verbose_name='输入文件路径')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='错误信息')),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='提交时间')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('collected_at', models.DateTimeField(blank=True, null=True, verbose_name='结果回收时间')),
+            ],
+            options={
+                'verbose_name': 'ArXiv参考文献批量解析任务',
+                'verbose_name_plural': 'ArXiv参考文献批量解析任务',
+                'db_table': 'arxiv_reference_batch_job',
+                'ordering': ['-submitted_at'],
+            },
+        ),
+    ]
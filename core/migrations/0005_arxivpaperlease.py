@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_arxivreferencebatchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArxivPaperLease',
+            fields=[
+                ('id', models.AutoField(help_text='自增主键', primary_key=True, serialize=False, verbose_name='主键ID')),
+                ('stage', models.CharField(choices=[('extract', '提取参考文献文本'), ('process', 'LLM处理参考文献')], max_length=20, verbose_name='处理阶段')),
+                ('owner', models.CharField(db_index=True, help_text='持有租约的进程标识（主机名:进程号:随机串）', max_length=200, verbose_name='持有者')),
+                ('claimed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='认领时间')),
+                ('heartbeat_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最近心跳时间')),
+                ('expires_at', models.DateTimeField(help_text='到期未续约的租约可被其他进程重新认领', verbose_name='到期时间')),
+                ('claim_count', models.IntegerField(default=1, help_text='租约被认领的累计次数（大于1说明之前的持有者未完成处理）', verbose_name='认领次数')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='core.arxivpaper', verbose_name='论文')),
+            ],
+            options={
+                'verbose_name': 'ArXiv论文处理租约',
+                'verbose_name_plural': 'ArXiv论文处理租约',
+                'db_table': 'arxiv_paper_lease',
+                'indexes': [models.Index(fields=['stage', 'expires_at'], name='arxiv_paper_stage_7baeb9_idx')],
+                'unique_together': {('paper', 'stage')},
+            },
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from common.compression_utils import compress_text, decompress_text
+
+
+BLOB_FIELDS = ('reference_raw_text', 'llm_response')
+
+# 每页处理的日志数：按 id 范围分页，不依赖数据库驱动的服务端游标（mysqlclient 的 iterator 会缓冲整个结果集）
+PAGE_SIZE = 500
+
+
+def iter_pages(queryset, key, *fields):
+    """按主键 key 分页读取 (key, *fields)，每页一次查询"""
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(**{f'{key}__gt': last_id}).order_by(key).values_list(key, *fields)[:PAGE_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def move_text_to_blobs(apps, schema_editor):
+    """把日志表中的大文本压缩后写入 arxiv_reference_extract_blob"""
+    ExtractLog = apps.get_model('core', 'ArxivReferenceExtractLog')
+    ExtractBlob = apps.get_model('core', 'ArxivReferenceExtractBlob')
+
+    queryset = ExtractLog.objects.filter(
+        models.Q(reference_raw_text__isnull=False) | models.Q(llm_response__isnull=False)
+    )
+    for rows in iter_pages(queryset, 'id', 'reference_text_length', *BLOB_FIELDS):
+        ExtractBlob.objects.bulk_create([
+            ExtractBlob(
+                log_id=log_id,
+                reference_raw_text=compress_text(raw_text) if raw_text is not None else None,
+                llm_response=compress_text(llm_response) if llm_response is not None else None,
+            )
+            for log_id, _, raw_text, llm_response in rows
+        ])
+        # 之后通过文本长度判断是否有原始文本
+        lengths = [
+            ExtractLog(id=log_id, reference_text_length=len(raw_text))
+            for log_id, text_length, raw_text, _ in rows
+            if raw_text and not text_length
+        ]
+        ExtractLog.objects.bulk_update(lengths, ['reference_text_length'])
+
+
+def move_blobs_to_text(apps, schema_editor):
+    """回滚：把大文本解压写回日志表"""
+    ExtractLog = apps.get_model('core', 'ArxivReferenceExtractLog')
+    ExtractBlob = apps.get_model('core', 'ArxivReferenceExtractBlob')
+
+    for rows in iter_pages(ExtractBlob.objects.all(), 'log_id', *BLOB_FIELDS):
+        ExtractLog.objects.bulk_update([
+            ExtractLog(id=log_id, **{
+                name: decompress_text(bytes(value)) if value is not None else None
+                for name, value in zip(BLOB_FIELDS, values)
+            })
+            for log_id, *values in rows
+        ], list(BLOB_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_arxivpaperlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArxivReferenceExtractBlob',
+            fields=[
+                ('log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blob', serialize=False, to='core.arxivreferenceextractlog', verbose_name='提取日志')),
+                ('reference_raw_text', models.BinaryField(blank=True, help_text='压缩后的参考文献原始文本（common.compression_utils 格式）', null=True, verbose_name='参考文献原始文本')),
+                ('llm_response', models.BinaryField(blank=True, help_text='压缩后的LLM原始响应（common.compression_utils 格式）', null=True, verbose_name='LLM原始响应')),
+            ],
+            options={
+                'verbose_name': 'ArXiv参考文献提取日志大文本',
+                'verbose_name_plural': 'ArXiv参考文献提取日志大文本',
+                'db_table': 'arxiv_reference_extract_blob',
+            },
+        ),
+        migrations.RunPython(move_text_to_blobs, move_blobs_to_text),
+        migrations.RemoveField(
+            model_name='arxivreferenceextractlog',
+            name='llm_response',
+        ),
+        migrations.RemoveField(
+            model_name='arxivreferenceextractlog',
+            name='reference_raw_text',
+        ),
+        migrations.AlterField(
+            model_name='arxivreferenceextractlog',
+            name='reference_text_length',
+            field=models.IntegerField(blank=True, help_text='参考文献原始文本的字符数（为 0 或空表示没有原始文本）', null=True, verbose_name='参考文献文本长度'),
+        ),
+    ]
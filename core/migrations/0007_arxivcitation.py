@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_arxivreferenceextractblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArxivCitation',
+            fields=[
+                ('id', models.AutoField(help_text='自增主键', primary_key=True, serialize=False, verbose_name='主键ID')),
+                ('match_method', models.CharField(choices=[('arxiv_id', 'arXiv ID'), ('doi', 'DOI'), ('title', '标准化标题')], help_text='参考文献匹配到本地论文的依据', max_length=10, verbose_name='匹配方式')),
+                ('cited', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citations_received', to='core.arxivpaper', verbose_name='被引论文')),
+                ('citing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citations_made', to='core.arxivpaper', verbose_name='施引论文')),
+            ],
+            options={
+                'verbose_name': 'ArXiv论文引用关系',
+                'verbose_name_plural': 'ArXiv论文引用关系',
+                'db_table': 'arxiv_citation',
+                'indexes': [models.Index(fields=['cited', 'citing'], name='arxiv_citat_cited_i_ed229d_idx')],
+                'unique_together': {('citing', 'cited')},
+            },
+        ),
+    ]
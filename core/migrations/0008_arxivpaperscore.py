@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_arxivcitation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArxivPaperScore',
+            fields=[
+                ('paper', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='core.arxivpaper', verbose_name='论文')),
+                ('citation_count', models.IntegerField(default=0, help_text='被本地论文库中的论文引用的次数', verbose_name='被引次数')),
+                ('pagerank', models.FloatField(default=0.0, help_text='引用图上的 PageRank（全部论文之和为 1）', verbose_name='PageRank')),
+                ('decayed_score', models.FloatField(default=0.0, help_text='按施引论文发布时间指数衰减加权的被引次数（反映近期热度）', verbose_name='时间衰减引用分')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': 'ArXiv论文排序分数',
+                'verbose_name_plural': 'ArXiv论文排序分数',
+                'db_table': 'arxiv_paper_score',
+                'indexes': [models.Index(fields=['-citation_count'], name='arxiv_paper_citatio_567fa2_idx'), models.Index(fields=['-pagerank'], name='arxiv_paper_pageran_071bfc_idx'), models.Index(fields=['-decayed_score'], name='arxiv_paper_decayed_ba7926_idx')],
+            },
+        ),
+    ]
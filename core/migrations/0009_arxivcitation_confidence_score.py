@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_arxivpaperscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arxivcitation',
+            name='confidence_score',
+            field=models.FloatField(default=1.0, help_text='匹配的置信度（0-1），精确匹配为 1，标题模糊匹配为标题相似度', verbose_name='置信度'),
+        ),
+        migrations.AlterField(
+            model_name='arxivcitation',
+            name='match_method',
+            field=models.CharField(choices=[('arxiv_id', 'arXiv ID'), ('doi', 'DOI'), ('title', '标准化标题'), ('fuzzy', '标题模糊匹配')], help_text='参考文献匹配到本地论文的依据', max_length=10, verbose_name='匹配方式'),
+        ),
+    ]
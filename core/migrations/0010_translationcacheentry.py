@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_arxivcitation_confidence_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(help_text='标准化原文的 SHA-256', max_length=64)),
+                ('target_lang', models.CharField(help_text='目标语言代码', max_length=20)),
+                ('model', models.CharField(help_text='翻译使用的模型（提供商/模型名）', max_length=200)),
+                ('translated_text', models.TextField(help_text='翻译结果')),
+                ('hit_count', models.IntegerField(default=0, help_text='命中次数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True, help_text='最后命中或写入时间')),
+            ],
+            options={
+                'db_table': 'translation_cache',
+                'indexes': [models.Index(fields=['last_used_at'], name='translation_last_us_1dcbb8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source_hash', 'target_lang', 'model'), name='uniq_translation_cache_key')],
+            },
+        ),
+    ]
@@ -122,3 +122,29 @@ class ChatMessage(models.Model):
     
     def __str__(self):
         return f'{self.role}: {self.content[:50]}...'
+
+
+class TranslationCacheEntry(models.Model):
+    """翻译缓存（持久层）：相同原文、目标语言和模型的翻译结果"""
+    source_hash = models.CharField(max_length=64, help_text='标准化原文的 SHA-256')
+    target_lang = models.CharField(max_length=20, help_text='目标语言代码')
+    model = models.CharField(max_length=200, help_text='翻译使用的模型（提供商/模型名）')
+    
+    translated_text = models.TextField(help_text='翻译结果')
+    hit_count = models.IntegerField(default=0, help_text='命中次数')
+    
+    # 时间戳
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, help_text='最后命中或写入时间')
+    
+    class Meta:
+        db_table = 'translation_cache'
+        constraints = [
+            models.UniqueConstraint(fields=['source_hash', 'target_lang', 'model'], name='uniq_translation_cache_key'),
+        ]
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.target_lang}/{self.model}: {self.source_hash[:12]}'
@@ -0,0 +1,406 @@
+"""
+论文检索索引
+把论文正文切分为若干段（按段落合并到 token 上限），每段计算向量后保存为按论文缓存的小型本地向量索引；
+问答时只检索与问题最相关的 top-k 段加入提示词，无需把整篇论文或大段原文发给模型
+
+默认向量为字符 n-gram 哈希向量乘以索引内的 IDF 权重（本地计算，无需 API 调用，
+对术语、方法名、数据集名等字面匹配效果较好），也可以传入提供商的向量模型
+
+缓存目录结构:
+    cache_dir/
+        ab/abcdef....ngram1024.v1.npz   # 分段文本、页码、向量矩阵、IDF 权重
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from core.llm.cache import hashed_ngram_embedding
+from core.llm.context import count_tokens
+from core.paper_translation import iter_paragraphs
+from core.pdf_text_cache import ExtractedDocument
+
+
+# 索引格式版本（分段或向量算法变化时递增，旧缓存自动失效）
+INDEX_VERSION = 1
+
+# 默认哈希向量维度
+NGRAM_DIM = 1024
+
+# 下载PDF的默认大小上限（字节）
+MAX_PDF_BYTES = 50 * 1024 * 1024
+
+
+def load_document(
+    extractor,
+    pdf_url: str,
+    timeout: int = 30,
+    max_bytes: int = MAX_PDF_BYTES
+) -> ExtractedDocument:
+    """
+    读取PDF的提取结果，优先使用文本层缓存（与参考文献提取共用），未命中时下载并解析
+
+    Args:
+        extractor: ArxivReferenceExtractor
+        pdf_url: PDF URL
+        timeout: 下载超时时间（秒）
+        max_bytes: 下载大小上限（字节），超过时放弃下载
+
+    Returns:
+        ExtractedDocument
+
+    Raises:
+        ValueError: 解析失败或PDF超过大小上限
+        requests.RequestException: 下载失败
+    """
+    document = extractor.get_cached_document(pdf_url)
+    if document is not None:
+        return document
+
+    with requests.get(pdf_url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > max_bytes:
+            raise ValueError(f'PDF超过大小上限（{max_bytes} 字节）')
+        # 边下载边计数，服务端未返回或谎报 Content-Length 时同样受上限约束
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f'PDF超过大小上限（{max_bytes} 字节）')
+                    tmp_file.write(chunk)
+            except BaseException:
+                tmp_file.close()
+                os.remove(tmp_path)
+                raise
+    try:
+        success, document, error = extractor.extract_document(tmp_path, aliases=(pdf_url,))
+    finally:
+        os.remove(tmp_path)
+    if not success:
+        raise ValueError(error)
+    return document
+
+
+def split_chunks(
+    paragraphs: List[Tuple[int, str]],
+    chunk_tokens: int = 300
+) -> List[Tuple[int, str]]:
+    """
+    把段落合并为不超过 token 上限的分段（超长段落按句子拆分）
+
+    Args:
+        paragraphs: (页码, 段落) 列表
+        chunk_tokens: 每段的 token 上限
+
+    Returns:
+        (起始页码, 分段文本) 列表
+    """
+    pieces = []
+    for page, text in paragraphs:
+        if count_tokens(text) <= chunk_tokens:
+            pieces.append((page, text))
+            continue
+        for sentence in re.split(r'(?<=[.!?。！？])\s+', text):
+            if sentence.strip():
+                pieces.append((page, sentence.strip()))
+
+    chunks = []
+    current, current_page, current_tokens = [], 0, 0
+    for page, text in pieces:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append((current_page, '\n'.join(current)))
+            current, current_tokens = [], 0
+        if not current:
+            current_page = page
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append((current_page, '\n'.join(current)))
+    return chunks
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class PaperIndex:
+    """单篇论文的向量索引"""
+
+    def __init__(
+        self,
+        chunks: List[str],
+        pages: List[int],
+        vectors: np.ndarray,
+        idf: Optional[np.ndarray] = None,
+        embedder: Optional[Callable[[str], np.ndarray]] = None
+    ):
+        """
+        Args:
+            chunks: 分段文本
+            pages: 每段的起始页码（从 0 开始）
+            vectors: 分段向量矩阵（每行 L2 归一化）
+            idf: 哈希向量各维的 IDF 权重（使用提供商向量时为 None）
+            embedder: 问题的向量函数，需与构建索引时一致
+        """
+        self.chunks = chunks
+        self.pages = pages
+        self.vectors = vectors
+        self.idf = idf
+        self.embedder = embedder or (lambda text: hashed_ngram_embedding(text, dim=NGRAM_DIM))
+
+    @classmethod
+    def build(
+        cls,
+        document: ExtractedDocument,
+        extractor,
+        chunk_tokens: int = 300,
+        embedder: Optional[Callable[[str], np.ndarray]] = None
+    ) -> 'PaperIndex':
+        """
+        从PDF提取结果构建索引
+
+        Args:
+            document: PDF提取结果
+            extractor: ArxivReferenceExtractor（复用段落提取和阅读顺序排序）
+            chunk_tokens: 每段的 token 上限
+            embedder: 向量函数，默认为本地哈希向量（加 IDF 权重）
+        """
+        chunks = split_chunks(list(iter_paragraphs(document, extractor)), chunk_tokens)
+        index = cls([text for _, text in chunks], [page for page, _ in chunks], np.zeros((0, 0), dtype=np.float32), embedder=embedder)
+        if not chunks:
+            return index
+
+        matrix = np.vstack([np.asarray(index.embedder(text), dtype=np.float32) for text in index.chunks])
+        if embedder is None:
+            # 出现在很多分段中的 n-gram（常用词、论文通用术语）权重较低
+            document_frequency = np.count_nonzero(matrix > 0, axis=0)
+            index.idf = np.log((1 + len(chunks)) / (1 + document_frequency)).astype(np.float32) + 1.0
+            matrix = matrix * index.idf
+        index.vectors = _normalize_rows(matrix)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, k: int = 4, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        检索与问题最相关的分段
+
+        Args:
+            query: 问题
+            k: 返回的分段数
+            min_score: 最低余弦相似度
+
+        Returns:
+            (分段下标, 相似度) 列表，按相似度降序
+        """
+        if not len(self) or not query.strip():
+            return []
+        vector = np.asarray(self.embedder(query), dtype=np.float32)
+        if self.idf is not None:
+            vector = vector * self.idf
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return []
+        scores = self.vectors @ (vector / norm)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def save(self, path: Path):
+        """保存为 npz（先写临时文件再替换）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp.npz')
+        arrays = {
+            'chunks': np.array(json.dumps(self.chunks, ensure_ascii=False)),
+            'pages': np.asarray(self.pages, dtype=np.int32),
+            'vectors': self.vectors.astype(np.float16),
+        }
+        if self.idf is not None:
+            arrays['idf'] = self.idf
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, embedder: Optional[Callable[[str], np.ndarray]] = None) -> 'PaperIndex':
+        with np.load(path) as data:
+            return cls(
+                chunks=json.loads(str(data['chunks'])),
+                pages=data['pages'].tolist(),
+                vectors=data['vectors'].astype(np.float32),
+                idf=data['idf'] if 'idf' in data.files else None,
+                embedder=embedder
+            )
+
+
+class PaperIndexStore:
+    """按论文缓存检索索引（内存 LRU + 磁盘），线程安全"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_indexes: int = 32,
+        chunk_tokens: int = 300,
+        extractor=None,
+        embedder: Optional[Callable[[str], np.ndarray]] = None,
+        embedder_name: Optional[str] = None,
+        max_pdf_bytes: int = MAX_PDF_BYTES
+    ):
+        """
+        初始化
+
+        Args:
+            cache_dir: 索引缓存目录，默认为 data/paper_index
+            max_indexes: 内存中最多保留的索引数
+            chunk_tokens: 每段的 token 上限
+            extractor: ArxivReferenceExtractor，默认延迟创建（使用默认文本层缓存）
+            embedder: 向量函数，默认为本地哈希向量
+            embedder_name: 向量函数名称（写入缓存文件名，更换向量模型后旧索引不会被误用）
+            max_pdf_bytes: 下载PDF的大小上限（字节）
+        """
+        if cache_dir is None:
+            from django.conf import settings
+            base_dir = getattr(settings, 'BASE_DIR', Path.cwd())
+            cache_dir = os.path.join(base_dir, 'data', 'paper_index')
+        if embedder is not None and not embedder_name:
+            raise ValueError('使用自定义向量函数时需要指定 embedder_name')
+
+        self.cache_dir = Path(cache_dir)
+        self.max_indexes = max_indexes
+        self.chunk_tokens = chunk_tokens
+        self._extractor = extractor
+        self.embedder = embedder
+        self.embedder_name = embedder_name or f'ngram{NGRAM_DIM}'
+        self.max_pdf_bytes = max_pdf_bytes
+        self._indexes: 'OrderedDict[str, PaperIndex]' = OrderedDict()
+        # 后台构建中的索引：PDF URL -> 线程
+        self._building: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def extractor(self):
+        if self._extractor is None:
+            from core.arxiv_reference_extractor import ArxivReferenceExtractor
+            self._extractor = ArxivReferenceExtractor()
+        return self._extractor
+
+    def _entry_path(self, content_hash: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f'{content_hash}.{self.embedder_name}.v{INDEX_VERSION}.npz'
+
+    def _remember(self, key: str, index: PaperIndex):
+        with self._lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+
+    def get_cached(self, document: ExtractedDocument) -> Optional[PaperIndex]:
+        """只从内存或磁盘缓存读取论文的检索索引，未缓存时返回 None"""
+        key = document.content_hash
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        path = self._entry_path(key)
+        if not path.exists():
+            return None
+        try:
+            index = PaperIndex.load(path, embedder=self.embedder)
+        except Exception as e:
+            # 缓存损坏时重新构建
+            print(f"Paper index load error: {e}")
+            return None
+        self._remember(key, index)
+        return index
+
+    def get(self, document: ExtractedDocument) -> PaperIndex:
+        """获取（必要时构建并缓存）论文的检索索引"""
+        index = self.get_cached(document)
+        if index is None:
+            path = self._entry_path(document.content_hash)
+            index = PaperIndex.build(document, self.extractor, chunk_tokens=self.chunk_tokens, embedder=self.embedder)
+            try:
+                index.save(path)
+            except OSError as e:
+                print(f"Paper index save error: {e}")
+            self._remember(document.content_hash, index)
+        return index
+
+    def get_for_url(self, pdf_url: str) -> PaperIndex:
+        """按PDF URL获取索引（文本层缓存未命中时下载PDF）"""
+        return self.get(load_document(self.extractor, pdf_url, max_bytes=self.max_pdf_bytes))
+
+    def get_or_schedule(self, pdf_url: str) -> Optional[PaperIndex]:
+        """
+        按PDF URL获取已缓存的索引，不在当前线程下载PDF或构建索引
+
+        未缓存时在后台线程下载并构建（同一URL只构建一次），本次返回 None，构建完成后的请求即可命中
+        """
+        document = self.extractor.get_cached_document(pdf_url)
+        index = self.get_cached(document) if document is not None else None
+        if index is not None:
+            return index
+
+        with self._lock:
+            if pdf_url in self._building:
+                return None
+            thread = threading.Thread(target=self._build_in_background, args=(pdf_url,), daemon=True)
+            self._building[pdf_url] = thread
+        thread.start()
+        return None
+
+    def _build_in_background(self, pdf_url: str):
+        try:
+            self.get_for_url(pdf_url)
+        except Exception as e:
+            print(f"Paper index build error: {e}")
+        finally:
+            with self._lock:
+                self._building.pop(pdf_url, None)
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待后台构建结束（测试和命令行使用）"""
+        with self._lock:
+            threads = list(self._building.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def retrieve(
+        self,
+        pdf_url: str,
+        query: str,
+        k: int = 4,
+        min_score: float = 0.05,
+        background: bool = False
+    ) -> List[Tuple[int, str]]:
+        """
+        检索与问题最相关的分段
+
+        Args:
+            background: 为 True 时索引未缓存则在后台构建并返回空列表，不阻塞调用方
+
+        Returns:
+            (页码, 分段文本) 列表，按在论文中的顺序排列
+        """
+        index = self.get_or_schedule(pdf_url) if background else self.get_for_url(pdf_url)
+        if index is None:
+            return []
+        hits = sorted(i for i, _ in index.search(query, k=k, min_score=min_score))
+        return [(index.pages[i], index.chunks[i]) for i in hits]
@@ -0,0 +1,228 @@
+"""
+论文处理租约队列
+多台机器同时运行参考文献提取命令时，通过数据库行级租约分配待处理的论文，避免重复处理。
+
+认领流程（在一个短事务中完成）：
+1. 按排序键读取下一批没有有效租约的候选行，SELECT ... FOR UPDATE SKIP LOCKED
+   （其他进程正在认领的行被跳过而不是等待）
+2. 为锁定的论文写入或接管（已过期的）租约，提交事务释放行锁
+
+处理期间后台线程定期续约，处理完一篇论文即释放其租约；
+进程崩溃时租约到期后可被其他进程重新认领。
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from typing import Iterator, Optional, Sequence
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, OuterRef, QuerySet
+from django.utils import timezone
+
+from common.db_utils import keyset_condition
+from core.arxiv_models import ArxivPaperLease
+
+
+def default_lease_owner() -> str:
+    """当前进程的租约持有者标识"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class PaperLeaseQueue:
+    """基于数据库行级租约的待处理论文队列"""
+
+    def __init__(
+        self,
+        stage: str,
+        owner: Optional[str] = None,
+        lease_seconds: int = 900,
+        claim_size: int = 10,
+        heartbeat_interval: Optional[float] = None
+    ):
+        """
+        初始化租约队列
+
+        Args:
+            stage: 处理阶段（extract / process），不同阶段的租约互不影响
+            owner: 持有者标识，默认为 主机名:进程号:随机串
+            lease_seconds: 租约有效期（秒），超过该时间未续约视为持有者已退出
+            claim_size: 每次认领的论文数量
+            heartbeat_interval: 续约间隔（秒），默认为租约有效期的 1/3
+        """
+        self.stage = stage
+        self.owner = owner or default_lease_owner()
+        self.lease_seconds = lease_seconds
+        self.claim_size = max(1, claim_size)
+        self.heartbeat_interval = heartbeat_interval or max(1.0, lease_seconds / 3)
+
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = None
+
+    def _active_leases(self, paper_ref: str):
+        """其他进程持有的有效租约（用于排除候选行）"""
+        return ArxivPaperLease.objects.filter(
+            paper_id=OuterRef(paper_ref),
+            stage=self.stage,
+            expires_at__gt=timezone.now()
+        )
+
+    def claim(
+        self,
+        queryset: QuerySet,
+        order_by: Sequence[str],
+        paper_field: str = 'id',
+        after: Optional[Sequence] = None
+    ) -> list:
+        """
+        认领一批待处理的行
+
+        Args:
+            queryset: 候选行（ArxivPaper 或以 paper 关联论文的模型）
+            order_by: 排序字段，最后一个字段必须唯一
+            paper_field: 候选行中论文ID的字段名（ArxivPaper 为 id，提取日志为 paper_id）
+            after: 上一批最后一行的排序键，只认领排在其后的行
+
+        Returns:
+            认领成功的行列表（为空表示没有可认领的行）
+        """
+        candidates = queryset.filter(~Exists(self._active_leases(paper_field))).order_by(*order_by)
+        if after is not None:
+            candidates = candidates.filter(keyset_condition(list(order_by), list(after)))
+
+        with transaction.atomic():
+            rows = list(candidates.select_for_update(skip_locked=True)[:self.claim_size])
+            now = timezone.now()
+            expires_at = now + timedelta(seconds=self.lease_seconds)
+
+            claimed = []
+            for row in rows:
+                paper_id = getattr(row, paper_field)
+                try:
+                    # 同一论文的另一条候选行可能刚被其他进程认领，用保存点隔离唯一约束冲突
+                    with transaction.atomic():
+                        updated = ArxivPaperLease.objects.filter(
+                            paper_id=paper_id,
+                            stage=self.stage,
+                            expires_at__lte=now
+                        ).update(
+                            owner=self.owner,
+                            claimed_at=now,
+                            heartbeat_at=now,
+                            expires_at=expires_at,
+                            claim_count=F('claim_count') + 1
+                        )
+                        if not updated:
+                            ArxivPaperLease.objects.create(
+                                paper_id=paper_id,
+                                stage=self.stage,
+                                owner=self.owner,
+                                claimed_at=now,
+                                heartbeat_at=now,
+                                expires_at=expires_at
+                            )
+                except IntegrityError:
+                    continue
+                claimed.append(row)
+
+        with self._lock:
+            self._held.update(getattr(row, paper_field) for row in claimed)
+        return claimed
+
+    def iter_claimed(
+        self,
+        queryset: QuerySet,
+        order_by: Sequence[str],
+        paper_field: str = 'id',
+        limit: Optional[int] = None
+    ) -> Iterator:
+        """
+        按排序键顺序逐批认领并返回待处理的行
+
+        每个进程只向前推进自己的排序游标，其他进程已认领的行被跳过；
+        迭代结束或中断时释放尚未处理的行的租约
+        """
+        attnames = [field.lstrip('-') for field in order_by]
+        last_values = None
+        remaining = limit
+
+        try:
+            while remaining is None or remaining > 0:
+                rows = self.claim(queryset, order_by, paper_field, after=last_values)
+                if not rows:
+                    # 本批候选行全部被其他进程抢先认领时继续向后查找
+                    rows_seen = self._peek_next(queryset, order_by, paper_field, last_values)
+                    if rows_seen is None:
+                        return
+                    last_values = rows_seen
+                    continue
+
+                if remaining is not None:
+                    for row in rows[remaining:]:
+                        self.release(getattr(row, paper_field))
+                    rows = rows[:remaining]
+                    remaining -= len(rows)
+                last_values = [getattr(rows[-1], attname) for attname in attnames]
+                yield from rows
+        finally:
+            self.release_all()
+
+    def _peek_next(self, queryset, order_by, paper_field, after):
+        """返回下一批候选行中最后一行的排序键；没有候选行时返回 None"""
+        candidates = queryset.filter(~Exists(self._active_leases(paper_field))).order_by(*order_by)
+        if after is not None:
+            candidates = candidates.filter(keyset_condition(list(order_by), list(after)))
+        attnames = [field.lstrip('-') for field in order_by]
+        rows = list(candidates.values_list(*attnames)[:self.claim_size])
+        return list(rows[-1]) if rows else None
+
+    def release(self, paper_id: int):
+        """处理完成后释放租约"""
+        ArxivPaperLease.objects.filter(paper_id=paper_id, stage=self.stage, owner=self.owner).delete()
+        with self._lock:
+            self._held.discard(paper_id)
+
+    def release_all(self):
+        """释放当前进程持有的全部租约"""
+        with self._lock:
+            held = list(self._held)
+            self._held.clear()
+        if held:
+            ArxivPaperLease.objects.filter(paper_id__in=held, stage=self.stage, owner=self.owner).delete()
+
+    def heartbeat(self) -> int:
+        """为当前进程持有的租约续约，返回续约的数量"""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return 0
+        now = timezone.now()
+        return ArxivPaperLease.objects.filter(
+            paper_id__in=held,
+            stage=self.stage,
+            owner=self.owner
+        ).update(heartbeat_at=now, expires_at=now + timedelta(seconds=self.lease_seconds))
+
+    def _heartbeat_loop(self):
+        try:
+            while not self._stop_heartbeat.wait(self.heartbeat_interval):
+                self.heartbeat()
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        """启动后台续约线程"""
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        self.release_all()
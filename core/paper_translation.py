@@ -0,0 +1,142 @@
+"""
+整篇论文预翻译
+从PDF文本块中提取正文段落（与参考文献提取共用 PyMuPDF 文本块和阅读顺序排序），
+在自适应并发控制下并行翻译，结果写入翻译缓存；读者之后点击任意段落时直接命中缓存
+"""
+import re
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from common.db_utils import iter_batches, run_bounded
+from core.llm.concurrency import AdaptiveConcurrencyLimiter
+from core.pdf_text_cache import ExtractedDocument
+from core.translation_cache import TranslationCache, normalize_source, translation_cache
+
+
+def iter_paragraphs(
+    document: ExtractedDocument,
+    extractor,
+    min_chars: int = 40,
+    skip_references: bool = True
+) -> Iterator[Tuple[int, str]]:
+    """
+    按阅读顺序生成正文段落（每个文本块为一段）
+
+    Args:
+        document: PDF提取结果（PyMuPDF 提取时按文本块分段，PyPDF2 提取时按空行分段）
+        extractor: ArxivReferenceExtractor（使用其文本块排序和参考文献标题模式）
+        min_chars: 段落最短字符数（过滤页眉、页码、公式碎片等）
+        skip_references: 遇到参考文献标题后停止（参考文献无需翻译）
+
+    Returns:
+        (页码, 段落) 迭代器，页码从 0 开始，重复段落只生成一次
+    """
+    heading_patterns = [re.compile(pattern, re.MULTILINE) for pattern in extractor.reference_section_patterns]
+    seen = set()
+
+    for page in document.pages:
+        if page.blocks:
+            # 排序会原地修改列表，传入副本
+            texts = extractor._sort_blocks_for_reading([list(block) for block in page.blocks], page.width)
+        else:
+            texts = re.split(r'\n\s*\n', page.text)
+
+        for text in texts:
+            # 参考文献标题只出现在文档后半部分，避免正文中单独成行的 "References" 误判
+            if skip_references and page.number >= document.page_count // 2:
+                if any(pattern.match(text.strip()) for pattern in heading_patterns):
+                    return
+
+            normalized = normalize_source(text)
+            if len(normalized) < min_chars or normalized in seen:
+                continue
+            seen.add(normalized)
+            yield page.number, text.strip()
+
+
+def extract_paragraphs(
+    document: ExtractedDocument,
+    extractor,
+    min_chars: int = 40,
+    skip_references: bool = True
+) -> List[str]:
+    """按阅读顺序提取去重后的正文段落，参数同 iter_paragraphs"""
+    return [text for _, text in iter_paragraphs(document, extractor, min_chars, skip_references)]
+
+
+class PaperPretranslator:
+    """把段落并行翻译并写入翻译缓存"""
+
+    def __init__(
+        self,
+        translate: Callable[[str], str],
+        target_lang: str,
+        model: str,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        workers: int = 8,
+        batch_size: int = 32,
+        cache: Optional[TranslationCache] = None,
+        log: Callable[[str], None] = print
+    ):
+        """
+        初始化
+
+        Args:
+            translate: 翻译一个段落的函数（与 /api/translate 使用相同提示词，保证缓存结果一致）
+            target_lang: 目标语言代码
+            model: 缓存键中的模型标识（core.chat_views.translation_cache_model，与翻译接口一致）
+            limiter: LLM并发控制器（遇到限流自动回退并重试），为空时只受线程数限制
+            workers: 翻译线程数（并发上限由 limiter 决定时可以设置得较大）
+            batch_size: 每批提交的段落数（每批结束后输出进度）
+            cache: 翻译缓存，默认为进程共享的 translation_cache
+            log: 进度输出函数
+        """
+        self.translate = translate
+        self.target_lang = target_lang
+        self.model = model
+        self.limiter = limiter
+        self.workers = workers
+        self.batch_size = batch_size
+        self.cache = cache or translation_cache
+        self.log = log
+        self._lock = threading.Lock()
+
+    def _translate_one(self, text: str, stats: Dict[str, int]):
+        if self.limiter is not None:
+            translated = self.limiter.call(self.translate, text)
+        else:
+            translated = self.translate(text)
+        self.cache.put(text, self.target_lang, self.model, translated)
+        with self._lock:
+            stats['translated'] += 1
+
+    def run(self, paragraphs: Iterable[str]) -> Dict[str, int]:
+        """
+        翻译尚未缓存的段落
+
+        Returns:
+            {'total': 段落数, 'cached': 已有缓存, 'translated': 新翻译, 'failed': 失败}
+        """
+        paragraphs = list(paragraphs)
+        stats = {'total': len(paragraphs), 'cached': 0, 'translated': 0, 'failed': 0}
+
+        pending = []
+        for text in paragraphs:
+            if self.cache.get(text, self.target_lang, self.model) is not None:
+                stats['cached'] += 1
+            else:
+                pending.append(text)
+
+        def on_error(text, error):
+            with self._lock:
+                stats['failed'] += 1
+            self.log(f"  ⚠️  段落翻译失败（{normalize_source(text)[:40]}...）: {error}")
+
+        for batch in iter_batches(pending, self.batch_size):
+            run_bounded(batch, lambda text: self._translate_one(text, stats), self.workers, on_error=on_error)
+            self.log(
+                f"  ℹ️  已翻译 {stats['translated']}/{len(pending)} 段"
+                + (f"，失败 {stats['failed']} 段" if stats['failed'] else '')
+            )
+
+        return stats
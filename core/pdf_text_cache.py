@@ -0,0 +1,237 @@
+"""
+PDF 文本层缓存
+以 PDF 内容哈希 + 提取器版本为键，持久化存储逐页文本和文本块坐标（压缩存储），
+供参考文献提取、词云分词、对话上下文等下游步骤复用，避免重复打开和解析PDF
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Callable
+
+from common.compression_utils import compress_text, decompress_text
+
+
+# 提取器版本：修改文本块过滤/排序逻辑后需要递增，使旧缓存自动失效
+EXTRACTOR_VERSION = 1
+
+# 别名的默认有效期（秒）：不带版本号的URL（如 arxiv.org/pdf/<id>）在论文更新后会指向新版本
+ALIAS_TTL = 24 * 3600
+
+# 带版本号的 arXiv URL（.../pdf/<id>vN）内容不变，别名不过期
+_VERSIONED_ARXIV_URL_RE = re.compile(r'arxiv\.org/(?:abs|pdf)/(?:\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})v\d+', re.IGNORECASE)
+
+
+@dataclass
+class ExtractedPage:
+    """单页提取结果"""
+    number: int
+    width: float = 0.0
+    height: float = 0.0
+    # 按阅读顺序排列后的页面文本（块之间以换行分隔）
+    text: str = ''
+    # 原始文本块 [x0, y0, x1, y1, text]
+    blocks: List[List] = field(default_factory=list)
+
+
+@dataclass
+class ExtractedDocument:
+    """整篇PDF的提取结果"""
+    content_hash: str
+    page_count: int
+    extractor: str = 'pymupdf'
+    version: int = EXTRACTOR_VERSION
+    pdf_size: Optional[int] = None
+    pages: List[ExtractedPage] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """全文文本（非空页面之间以空行分隔，与提取器的输出格式一致）"""
+        return '\n\n'.join(page.text for page in self.pages if page.text)
+
+    @property
+    def is_complete(self) -> bool:
+        """是否包含全部页面（按页定向提取时可能只缓存了文档末尾的若干页）"""
+        return len(self.pages) >= self.page_count
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ExtractedDocument':
+        pages = [ExtractedPage(**page) for page in data.get('pages', [])]
+        return cls(
+            content_hash=data['content_hash'],
+            page_count=data['page_count'],
+            extractor=data.get('extractor', 'pymupdf'),
+            version=data.get('version', EXTRACTOR_VERSION),
+            pdf_size=data.get('pdf_size'),
+            pages=pages,
+        )
+
+
+class PdfTextCache:
+    """
+    PDF 文本层缓存
+
+    目录结构:
+        cache_dir/
+            ab/abcdef....v1.bin      # 压缩后的 ExtractedDocument JSON
+            aliases/12/1234....txt   # 别名（如PDF URL）-> 内容哈希
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        version: int = EXTRACTOR_VERSION,
+        alias_ttl: Optional[float] = ALIAS_TTL
+    ):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录，默认为 data/pdf_text_cache
+            version: 提取器版本号
+            alias_ttl: 别名有效期（秒），None 表示不过期；带版本号的 arXiv URL 别名始终有效
+        """
+        if cache_dir is None:
+            from django.conf import settings
+            base_dir = getattr(settings, 'BASE_DIR', Path.cwd())
+            cache_dir = os.path.join(base_dir, 'data', 'pdf_text_cache')
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self.alias_ttl = alias_ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """计算PDF内容哈希"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(pdf_path: str) -> str:
+        """分块读取文件并计算内容哈希"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, content_hash: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f'{content_hash}.v{self.version}.bin'
+
+    def _alias_path(self, alias: str) -> Path:
+        alias_hash = hashlib.sha1(alias.encode('utf-8')).hexdigest()
+        return self.cache_dir / 'aliases' / alias_hash[:2] / f'{alias_hash}.txt'
+
+    def _atomic_write(self, path: Path, data: bytes):
+        """先写临时文件再替换，避免并发读到半写入的文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, content_hash: str, allow_partial: bool = False) -> Optional[ExtractedDocument]:
+        """
+        按内容哈希读取缓存
+
+        Args:
+            content_hash: PDF内容哈希
+            allow_partial: 是否接受只包含部分页面的缓存
+
+        Returns:
+            ExtractedDocument，未命中或缓存损坏时返回 None
+        """
+        path = self._entry_path(content_hash)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = json.loads(decompress_text(f.read()))
+            document = ExtractedDocument.from_dict(data)
+        except Exception:
+            # 缓存损坏时视为未命中，下次写入会覆盖
+            return None
+        if not allow_partial and not document.is_complete:
+            return None
+        return document
+
+    def put(self, document: ExtractedDocument, aliases: Iterable[str] = ()):
+        """
+        写入缓存
+
+        Args:
+            document: 提取结果
+            aliases: 额外的查找键（如PDF URL），可在不下载PDF的情况下命中缓存
+        """
+        payload = json.dumps(document.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._atomic_write(self._entry_path(document.content_hash), compress_text(payload))
+        self.add_aliases(document.content_hash, aliases)
+
+    def _alias_expired(self, alias: str, path: Path) -> bool:
+        """别名是否过期（按写入时间计算；带版本号的 arXiv URL 不过期）"""
+        if self.alias_ttl is None or _VERSIONED_ARXIV_URL_RE.search(alias):
+            return False
+        return time.time() - path.stat().st_mtime > self.alias_ttl
+
+    def add_aliases(self, content_hash: str, aliases: Iterable[str]):
+        """写入（或刷新）指向内容哈希的别名"""
+        with self._lock:
+            for alias in aliases:
+                if alias:
+                    self._atomic_write(self._alias_path(alias), content_hash.encode('ascii'))
+
+    def get_by_alias(self, alias: str, allow_partial: bool = False) -> Optional[ExtractedDocument]:
+        """
+        通过别名（如PDF URL）读取缓存
+
+        不带版本号的URL可能已指向论文的新版本，别名超过有效期后视为未命中，
+        重新下载后按新内容的哈希写入
+        """
+        if not alias:
+            return None
+        path = self._alias_path(alias)
+        try:
+            if self._alias_expired(alias, path):
+                return None
+            content_hash = path.read_text(encoding='ascii').strip()
+        except (OSError, ValueError):
+            return None
+        return self.get(content_hash, allow_partial=allow_partial)
+
+    def get_or_extract(
+        self,
+        pdf_path: str,
+        extract_fn: Callable[[str, str], ExtractedDocument],
+        aliases: Iterable[str] = ()
+    ) -> ExtractedDocument:
+        """
+        读取完整缓存，未命中（或只有部分页面）时调用 extract_fn 提取并写入缓存
+
+        Args:
+            pdf_path: 本地PDF路径
+            extract_fn: 提取函数，接收 (pdf_path, content_hash)，返回 ExtractedDocument
+            aliases: 额外的查找键
+
+        Returns:
+            ExtractedDocument
+        """
+        content_hash = self.hash_file(pdf_path)
+        document = self.get(content_hash)
+        if document is None:
+            document = extract_fn(pdf_path, content_hash)
+            if document.pdf_size is None:
+                document.pdf_size = os.path.getsize(pdf_path)
+            self.put(document, aliases=aliases)
+        elif aliases:
+            # 已有缓存但别名可能是新的（如同一PDF的不同URL）或已过期
+            self.add_aliases(content_hash, aliases)
+        return document
@@ -0,0 +1,397 @@
+"""
+参考文献批量（Batch API）解析
+把待处理的参考文献提取日志打包为一个批次提交给LLM提供商的批量接口，
+轮询完成后流式读取结果并写回 ArxivPaperReference。
+
+批次ID和提交参数保存在 ArxivReferenceBatchJob 中，进程中断后可以继续轮询和回收结果。
+分块、规则解析和结果合并与同步解析共用 ArxivReferenceExtractor 的
+plan_reference_parsing / complete_reference_parsing，两种方式的结果一致。
+"""
+import os
+import re
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.arxiv_models import ArxivPaperReference, ArxivReferenceExtractLog, ArxivReferenceBatchJob
+from core.arxiv_reference_extractor import ArxivReferenceExtractor
+from core.llm.batch import BaseBatchClient, BatchRequest, BatchStatus, BATCH_COMPLETED, create_batch_client
+
+
+# custom_id 格式：log-<日志ID>-<块序号>
+_CUSTOM_ID_RE = re.compile(r'^log-(\d+)-(\d+)$')
+
+# 结果已回收的批次状态；其他状态（包括轮询后记为 failed / expired / cancelled 但进程在回收前退出的批次）
+# 都还需要回收，把其中日志的状态写回
+COLLECTED_JOB_STATUS = 'collected'
+
+
+def build_custom_id(log_id: int, chunk_index: int) -> str:
+    """生成批次请求的 custom_id"""
+    return f'log-{log_id}-{chunk_index}'
+
+
+def parse_custom_id(custom_id: str) -> Optional[tuple]:
+    """解析 custom_id，返回 (日志ID, 块序号)，格式不符时返回 None"""
+    match = _CUSTOM_ID_RE.match(custom_id or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class ReferenceBatchRunner:
+    """参考文献批量解析任务的提交、轮询与结果回收"""
+
+    def __init__(
+        self,
+        extractor: ArxivReferenceExtractor,
+        batch_client: Optional[BaseBatchClient] = None,
+        input_dir: Optional[str] = None,
+        max_requests_per_batch: int = 10000,
+        log: Callable[[str], None] = print
+    ):
+        """
+        初始化批量解析任务
+
+        Args:
+            extractor: 参考文献提取器（提供分块规划、提示词和结果合并）
+            batch_client: 批量API客户端，默认按提取器的 LLM 提供商和模型创建
+            input_dir: 本地保存批次输入JSONL的目录，默认为 data/reference_batches
+            max_requests_per_batch: 单个批次的最大请求数，超过时拆分为多个批次
+            log: 输出进度信息的函数
+        """
+        self.extractor = extractor
+        self._batch_client = batch_client
+
+        if input_dir is None:
+            base_dir = getattr(settings, 'BASE_DIR', Path.cwd())
+            input_dir = os.path.join(base_dir, 'data', 'reference_batches')
+        self.input_dir = Path(input_dir)
+
+        self.max_requests_per_batch = max(1, max_requests_per_batch)
+        self.log = log
+
+    @property
+    def batch_client(self) -> BaseBatchClient:
+        """批量API客户端（延迟初始化）"""
+        if self._batch_client is None:
+            self._batch_client = create_batch_client(self.extractor.llm_provider, self.extractor.llm_model)
+        return self._batch_client
+
+    def _options(self, max_chars: Optional[int]) -> Dict[str, Any]:
+        """提交时的解析参数，回收结果时按相同参数重新规划分块"""
+        return {
+            'max_chars': max_chars or self.extractor.llm_chunk_chars,
+            'use_rule_parser': self.extractor.rule_parser is not None,
+            'rule_confidence_threshold': self.extractor.rule_confidence_threshold,
+        }
+
+    def _extractor_for(self, job: ArxivReferenceBatchJob) -> ArxivReferenceExtractor:
+        """返回与批次提交参数一致的提取器"""
+        options = job.options or {}
+        if options.get('use_rule_parser', True) == (self.extractor.rule_parser is not None) and \
+                options.get('rule_confidence_threshold', 0.75) == self.extractor.rule_confidence_threshold:
+            return self.extractor
+        return ArxivReferenceExtractor(
+            pdf_download_dir=str(self.extractor.pdf_download_dir),
+            llm_provider=job.provider,
+            llm_model=job.model,
+            use_text_cache=False,
+            use_rule_parser=options.get('use_rule_parser', True),
+            rule_confidence_threshold=options.get('rule_confidence_threshold', 0.75),
+        )
+
+    # ------------------------------------------------------------------
+    # 提交
+    # ------------------------------------------------------------------
+
+    def submit(self, logs: Iterable[ArxivReferenceExtractLog], max_chars: Optional[int] = None) -> Dict[str, Any]:
+        """
+        规划并提交批次
+
+        规则解析即可完成的论文直接保存，不进入批次；已在未回收批次中的日志会被跳过
+
+        Args:
+            logs: 待处理的提取日志
+            max_chars: 每个请求的最大字符数，默认为提取器的 llm_chunk_chars
+
+        Returns:
+            {'jobs': 提交的批次列表, 'rule_only': 规则解析直接完成的日志数,
+             'skipped': 跳过的日志数, 'requests': 请求总数}
+        """
+        options = self._options(max_chars)
+        in_flight = self.in_flight_log_ids()
+        result = {'jobs': [], 'rule_only': 0, 'skipped': 0, 'requests': 0}
+
+        pending_logs = []
+        requests = []
+        chunk_counts = {}
+
+        for log in logs:
+            if log.id in in_flight or not log.reference_raw_text:
+                result['skipped'] += 1
+                continue
+
+            plan = self.extractor.plan_reference_parsing(log.reference_raw_text, options['max_chars'])
+            if not plan['chunks']:
+                # 所有条目规则解析置信度达标，无需调用LLM
+                self._finish_log(log, self.extractor.complete_reference_parsing(plan, []), None)
+                result['rule_only'] += 1
+                continue
+
+            # 一篇论文的所有分块放在同一个批次中
+            if requests and len(requests) + len(plan['chunks']) > self.max_requests_per_batch:
+                result['jobs'].append(self._submit_job(pending_logs, requests, chunk_counts, options))
+                pending_logs, requests, chunk_counts = [], [], {}
+
+            pending_logs.append(log)
+            chunk_counts[str(log.id)] = len(plan['chunks'])
+            requests.extend(
+                BatchRequest(
+                    custom_id=build_custom_id(log.id, index),
+                    messages=self.extractor.build_reference_messages(chunk_text),
+                    params=dict(self.extractor.REFERENCE_LLM_PARAMS),
+                )
+                for index, (chunk_text, _) in enumerate(plan['chunks'])
+            )
+
+        if requests:
+            result['jobs'].append(self._submit_job(pending_logs, requests, chunk_counts, options))
+        result['requests'] = sum(job.request_count for job in result['jobs'])
+        return result
+
+    def _submit_job(
+        self,
+        logs: List[ArxivReferenceExtractLog],
+        requests: List[BatchRequest],
+        chunk_counts: Dict[str, int],
+        options: Dict[str, Any]
+    ) -> ArxivReferenceBatchJob:
+        """提交一个批次并保存批次记录，日志状态置为 processing"""
+        input_path = self.input_dir / f"{timezone.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+        batch_id = self.batch_client.submit(requests, jsonl_path=str(input_path))
+
+        job = ArxivReferenceBatchJob.objects.create(
+            batch_id=batch_id,
+            provider=self.batch_client.provider,
+            model=self.batch_client.model,
+            request_count=len(requests),
+            log_ids=[log.id for log in logs],
+            options={**options, 'chunk_counts': chunk_counts},
+            input_file_path=str(input_path),
+        )
+        ArxivReferenceExtractLog.objects.filter(id__in=job.log_ids).update(status='processing')
+
+        self.log(f'  ℹ️  已提交批次 {batch_id}: {len(logs)} 篇论文，{len(requests)} 个请求')
+        return job
+
+    def in_flight_log_ids(self) -> set:
+        """已提交但尚未回收结果的日志ID"""
+        log_ids = set()
+        for ids in ArxivReferenceBatchJob.objects.exclude(
+            status=COLLECTED_JOB_STATUS
+        ).values_list('log_ids', flat=True):
+            log_ids.update(ids or [])
+        return log_ids
+
+    # ------------------------------------------------------------------
+    # 轮询
+    # ------------------------------------------------------------------
+
+    def unfinished_jobs(self) -> List[ArxivReferenceBatchJob]:
+        """尚未回收结果的批次（用于中断后继续）"""
+        return list(ArxivReferenceBatchJob.objects.exclude(status=COLLECTED_JOB_STATUS).order_by('submitted_at'))
+
+    def poll(self, job: ArxivReferenceBatchJob) -> BatchStatus:
+        """查询批次状态并更新批次记录"""
+        status = self.batch_client.get_status(job.batch_id)
+        job.succeeded_count = status.completed
+        job.failed_count = status.failed
+        if status.is_final and job.status == 'in_progress':
+            job.status = status.status
+            job.completed_at = timezone.now()
+            if status.status != BATCH_COMPLETED:
+                job.error_message = f'批次状态: {status.raw_status}'
+        job.save()
+        return status
+
+    def wait(
+        self,
+        jobs: List[ArxivReferenceBatchJob],
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ) -> bool:
+        """
+        轮询直到所有批次结束
+
+        Returns:
+            所有批次均已结束返回 True，超时返回 False
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        remaining = [job for job in jobs if job.status == 'in_progress']
+
+        while remaining:
+            for job in list(remaining):
+                status = self.poll(job)
+                self.log(
+                    f'  ℹ️  批次 {job.batch_id}: {status.raw_status} '
+                    f'({status.completed + status.failed}/{status.total or job.request_count})'
+                )
+                if status.is_final:
+                    remaining.remove(job)
+            if not remaining:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    # ------------------------------------------------------------------
+    # 回收结果
+    # ------------------------------------------------------------------
+
+    def collect(self, job: ArxivReferenceBatchJob) -> Dict[str, int]:
+        """
+        流式读取已结束批次的结果，合并后写回参考文献
+
+        一篇论文的所有分块结果到齐后立即处理，无需把整个批次的结果留在内存中；
+        批次失败或过期时，缺少结果的分块按失败处理（规则解析结果仍会保留）
+
+        Returns:
+            {'success': 成功的论文数, 'failed': 失败的论文数}
+        """
+        extractor = self._extractor_for(job)
+        max_chars = (job.options or {}).get('max_chars')
+        chunk_counts = {int(k): v for k, v in (job.options or {}).get('chunk_counts', {}).items()}
+        logs = ArxivReferenceExtractLog.objects.select_related('paper').in_bulk(job.log_ids)
+
+        stats = {'success': 0, 'failed': 0}
+        received = {}
+
+        def finish(log_id):
+            log = logs.get(log_id)
+            results = received.pop(log_id, {})
+            if log is None:
+                return
+            plan = extractor.plan_reference_parsing(log.reference_raw_text or '', max_chars)
+            chunk_results = [
+                results.get(index) or (False, None, '批量结果缺失', None)
+                for index in range(len(plan['chunks']))
+            ]
+            ok = self._finish_log(log, extractor.complete_reference_parsing(plan, chunk_results), job)
+            stats['success' if ok else 'failed'] += 1
+
+        if job.status == BATCH_COMPLETED:
+            for item in self.batch_client.iter_results(job.batch_id):
+                parsed = parse_custom_id(item.custom_id)
+                if parsed is None or parsed[0] not in logs:
+                    continue
+                log_id, index = parsed
+                if item.success:
+                    chunk_result = extractor.parse_reference_chunk_response(item.content)
+                else:
+                    chunk_result = (False, None, f'LLM处理失败: {item.error}', None)
+                received.setdefault(log_id, {})[index] = chunk_result
+
+                if len(received[log_id]) >= chunk_counts.get(log_id, 1):
+                    finish(log_id)
+
+        # 结果不完整（部分分块缺失或批次未成功完成）的论文
+        for log_id in job.log_ids:
+            log = logs.get(log_id)
+            if log_id in received or (log is not None and log.status == 'processing'):
+                finish(log_id)
+
+        job.status = COLLECTED_JOB_STATUS
+        job.collected_at = timezone.now()
+        job.save()
+
+        self.log(f'  ℹ️  批次 {job.batch_id} 结果已回收: 成功 {stats["success"]} 篇，失败 {stats["failed"]} 篇')
+        return stats
+
+    def _finish_log(self, log: ArxivReferenceExtractLog, parse_result, job: Optional[ArxivReferenceBatchJob]) -> bool:
+        """根据解析结果保存参考文献并更新提取日志"""
+        success, references, error, llm_response = parse_result
+        log.llm_response = llm_response
+        log.completed_at = timezone.now()
+
+        details = dict(log.processing_details or {})
+        details['parse_mode'] = 'batch' if job is not None else 'rule'
+        if job is not None:
+            details['batch_id'] = job.batch_id
+        log.processing_details = details
+
+        # 参考文献与完成状态在同一事务中写入
+        with transaction.atomic():
+            if success:
+                ArxivPaperReference.replace_for_paper(log.paper, references)
+                log.llm_processed = True
+                log.reference_count = len(references)
+                log.status = 'completed'
+                log.error_type = None
+                log.error_message = None
+            else:
+                log.llm_processed = False
+                log.status = 'failed'
+                log.error_type = 'llm_error'
+                log.error_message = error
+            log.save()
+        return success
+
+    def run(
+        self,
+        logs: Iterable[ArxivReferenceExtractLog],
+        max_chars: Optional[int] = None,
+        poll_interval: float = 60.0,
+        wait: bool = True
+    ) -> Dict[str, Any]:
+        """
+        提交批次；wait 为 True 时轮询直到结束并回收结果
+
+        Returns:
+            提交统计，wait 时额外包含 'success' / 'failed'
+        """
+        result = self.submit(logs, max_chars)
+        result['success'] = result['rule_only']
+        result['failed'] = 0
+        if not wait or not result['jobs']:
+            return result
+
+        self.wait(result['jobs'], poll_interval)
+        for job in result['jobs']:
+            stats = self.collect(job)
+            result['success'] += stats['success']
+            result['failed'] += stats['failed']
+        return result
+
+    def resume(self, poll_interval: float = 60.0, wait: bool = True) -> Dict[str, int]:
+        """
+        继续处理之前提交但尚未回收结果的批次
+
+        Returns:
+            {'jobs': 批次数, 'collected': 已回收的批次数, 'success': ..., 'failed': ...}
+        """
+        jobs = self.unfinished_jobs()
+        result = {'jobs': len(jobs), 'collected': 0, 'success': 0, 'failed': 0}
+        if not jobs:
+            return result
+
+        if wait:
+            self.wait(jobs, poll_interval)
+        else:
+            for job in jobs:
+                if job.status == 'in_progress':
+                    self.poll(job)
+
+        for job in jobs:
+            if job.status == 'in_progress':
+                continue
+            stats = self.collect(job)
+            result['collected'] += 1
+            result['success'] += stats['success']
+            result['failed'] += stats['failed']
+        return result
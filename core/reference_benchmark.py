@@ -0,0 +1,240 @@
+"""
+参考文献提取回归基准
+在仓库内置的样例（core/benchmark_corpus）上运行提取流程的各个阶段，
+同时报告准确性（是否找到参考文献、起止边界、条目数）和每个阶段的耗时、CPU 时间、峰值内存，
+修改参考文献标题模式、文本块排序或提示词时，性能和准确性的变化可以一起对比
+
+阶段：
+    pdf_text       按页定向提取PDF文本（仅PDF样例）
+    find_section   定位参考文献部分
+    split_entries  规则切分参考文献条目
+    rule_parse     规则解析条目字段
+    llm            LLM解析（可选，需要LLM配置）
+"""
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_CORPUS_DIR = Path(__file__).resolve().parent / 'benchmark_corpus'
+
+STAGES = ('pdf_text', 'find_section', 'split_entries', 'rule_parse', 'llm')
+
+
+@dataclass
+class BenchmarkCase:
+    """基准样例"""
+    name: str
+    path: Path
+    is_pdf: bool
+    found: bool
+    starts_with: Optional[str] = None
+    ends_with: Optional[str] = None
+    reference_count: Optional[int] = None
+    known_issue: Optional[str] = None
+
+
+@dataclass
+class StageMetrics:
+    """单个阶段的资源消耗（多次运行取最小耗时、最大峰值内存）"""
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_bytes: int = 0
+
+    def merge(self, other: 'StageMetrics'):
+        self.wall_seconds = min(self.wall_seconds, other.wall_seconds) if self.wall_seconds else other.wall_seconds
+        self.cpu_seconds = min(self.cpu_seconds, other.cpu_seconds) if self.cpu_seconds else other.cpu_seconds
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+
+
+@dataclass
+class CaseResult:
+    """样例运行结果"""
+    case: BenchmarkCase
+    found: bool = False
+    first_line: Optional[str] = None
+    last_line: Optional[str] = None
+    reference_count: Optional[int] = None
+    rule_confident_count: Optional[int] = None
+    llm_reference_count: Optional[int] = None
+    error: Optional[str] = None
+    stages: Dict[str, StageMetrics] = field(default_factory=dict)
+
+    @property
+    def checks(self) -> Dict[str, bool]:
+        """各项准确性检查（不适用的检查不出现）"""
+        case = self.case
+        checks = {'found': self.error is None and self.found == case.found}
+        if case.found:
+            checks['boundary'] = (
+                (case.starts_with is None or self.first_line == case.starts_with)
+                and (case.ends_with is None or (self.last_line or '').endswith(case.ends_with))
+            )
+            if case.reference_count is not None:
+                checks['count'] = self.reference_count == case.reference_count
+                if self.llm_reference_count is not None:
+                    checks['llm_count'] = self.llm_reference_count == case.reference_count
+        return checks
+
+    @property
+    def passed(self) -> bool:
+        return all(self.checks.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['case'] = {'name': self.case.name, 'known_issue': self.case.known_issue}
+        data['checks'] = self.checks
+        data['passed'] = self.passed
+        return data
+
+
+def load_corpus(corpus_dir: Optional[str] = None) -> List[BenchmarkCase]:
+    """读取基准样例清单（manifest.json）"""
+    corpus_dir = Path(corpus_dir) if corpus_dir else DEFAULT_CORPUS_DIR
+    with open(corpus_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    cases = []
+    for item in manifest['cases']:
+        expected = item['expected']
+        cases.append(BenchmarkCase(
+            name=item['name'],
+            path=corpus_dir / (item.get('pdf') or item['text']),
+            is_pdf='pdf' in item,
+            found=expected['found'],
+            starts_with=expected.get('starts_with'),
+            ends_with=expected.get('ends_with'),
+            reference_count=expected.get('reference_count'),
+            known_issue=item.get('known_issue'),
+        ))
+    return cases
+
+
+@contextlib.contextmanager
+def _measure(stages: Dict[str, StageMetrics], name: str):
+    """记录一个阶段的墙钟时间、CPU 时间和 Python 堆峰值内存（tracemalloc）"""
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        metrics = StageMetrics(
+            wall_seconds=time.perf_counter() - wall,
+            cpu_seconds=time.process_time() - cpu,
+            peak_bytes=max(0, tracemalloc.get_traced_memory()[1] - baseline),
+        )
+        if started_tracing:
+            tracemalloc.stop()
+        if name in stages:
+            stages[name].merge(metrics)
+        else:
+            stages[name] = metrics
+
+
+def _run_once(extractor, case: BenchmarkCase, result: CaseResult, with_llm: bool):
+    stages = result.stages
+    if case.is_pdf:
+        with _measure(stages, 'pdf_text'):
+            success, text, error, stats = extractor.locate_reference_text(str(case.path))
+        if not success:
+            result.error = error
+            return
+        position = {'text_offset': stats['text_offset'], 'document_length': stats['document_length']}
+    else:
+        text = case.path.read_text(encoding='utf-8')
+        position = {}
+
+    with _measure(stages, 'find_section'):
+        found, reference_text, _ = extractor.find_reference_section(text, **position)
+    result.found = found
+    if not found:
+        return
+
+    lines = [line.strip() for line in reference_text.strip().split('\n') if line.strip()]
+    result.first_line = lines[0] if lines else None
+    result.last_line = lines[-1] if lines else None
+
+    parser = extractor.rule_parser
+    if parser is not None:
+        with _measure(stages, 'split_entries'):
+            entries, _ = parser.split_entries(reference_text)
+        result.reference_count = len(entries)
+
+        with _measure(stages, 'rule_parse'):
+            references = parser.parse(reference_text)
+        result.rule_confident_count = sum(
+            1 for reference in references
+            if reference['confidence_score'] >= extractor.rule_confidence_threshold
+        )
+
+    if with_llm:
+        with _measure(stages, 'llm'):
+            success, references, error, _ = extractor.parse_references(reference_text, case.name)
+        if success:
+            result.llm_reference_count = len(references)
+        else:
+            result.error = error
+
+
+def run_case(extractor, case: BenchmarkCase, repeat: int = 1, with_llm: bool = False) -> CaseResult:
+    """
+    运行单个样例
+
+    Args:
+        extractor: 参考文献提取器（应关闭文本层缓存，保证每次都真实解析PDF）
+        case: 基准样例
+        repeat: 重复次数（耗时取最小值）；LLM 阶段只运行一次
+        with_llm: 是否运行 LLM 解析阶段
+
+    Returns:
+        CaseResult
+    """
+    result = CaseResult(case=case)
+    for i in range(max(1, repeat)):
+        # 提取器的进度提示不输出到基准结果
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                _run_once(extractor, case, result, with_llm=with_llm and i == 0)
+            except Exception as e:
+                result.error = str(e)
+        if result.error:
+            break
+    return result
+
+
+def summarize(results: List[CaseResult]) -> Dict[str, Any]:
+    """
+    汇总准确性和各阶段资源消耗
+
+    Returns:
+        {'cases': 样例数, 'passed': 通过数, 'checks': {检查项: [通过数, 总数]},
+         'stages': {阶段: {'wall_seconds', 'cpu_seconds', 'peak_bytes'}}}
+    """
+    checks: Dict[str, List[int]] = {}
+    stages: Dict[str, Dict[str, float]] = {}
+    for result in results:
+        for name, passed in result.checks.items():
+            counts = checks.setdefault(name, [0, 0])
+            counts[0] += int(passed)
+            counts[1] += 1
+        for name, metrics in result.stages.items():
+            total = stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': 0})
+            total['wall_seconds'] += metrics.wall_seconds
+            total['cpu_seconds'] += metrics.cpu_seconds
+            total['peak_bytes'] = max(total['peak_bytes'], metrics.peak_bytes)
+
+    return {
+        'cases': len(results),
+        'passed': sum(1 for result in results if result.passed),
+        'checks': checks,
+        'stages': {name: stages[name] for name in STAGES if name in stages},
+    }
@@ -0,0 +1,490 @@
+"""
+基于规则的参考文献解析器
+将参考文献部分切分为单条条目，并用正则和启发式规则提取作者、标题、年份、
+发表场所以及 arXiv ID、DOI、URL 等标识符，同时给出置信度。
+格式规整的条目（如 "[12] A. Author, ..."）直接由规则解析，
+只有低置信度的条目才需要交给 LLM 处理。
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# 条目编号格式
+_BRACKET_MARKER_RE = re.compile(r'^\s*\[(\d{1,4})\]\s*')
+_NUMERIC_MARKER_RE = re.compile(r'^\s*(\d{1,4})\.\s+(?=\S)')
+
+# 参考文献标题行和页码行
+_HEADER_LINE_RE = re.compile(
+    r'^\s*(?:\d+\.?\s+)?(?:References?|Bibliography|Bibliographical\s+References?|Literature\s+Cited)\.?\s*$',
+    re.IGNORECASE
+)
+_PAGE_NUMBER_RE = re.compile(r'^\s*\d{1,3}\s*$')
+
+# 作者-年份格式中条目的起始行：Surname, A. / Surname A / A. Surname
+_AUTHOR_YEAR_START_RE = re.compile(
+    r"^\s*(?:[A-Z][A-Za-z'\-]+,\s+[A-Z]\.|[A-Z][A-Za-z'\-]+\s+[A-Z]{1,3}[,.]|[A-Z]\.(?:\s?[A-Z]\.)*\s+[A-Z][A-Za-z'\-]+,)"
+)
+
+# 标识符
+_ARXIV_ID_RES = [
+    re.compile(r'arXiv\s*:?\s*(\d{4}\.\d{4,5})(?:v\d+)?', re.IGNORECASE),
+    re.compile(r'arxiv\.org/(?:abs|pdf)/(\d{4}\.\d{4,5})(?:v\d+)?', re.IGNORECASE),
+    re.compile(r'\babs/(\d{4}\.\d{4,5})(?:v\d+)?'),
+    re.compile(r'arXiv\s*:?\s*([a-z\-]+(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?', re.IGNORECASE),
+]
+_DOI_RE = re.compile(r'\b(10\.\d{4,9}/[^\s,;"]+)', re.IGNORECASE)
+_URL_RE = re.compile(r'https?://[^\s,;"<>]+', re.IGNORECASE)
+_YEAR_RE = re.compile(r'(?<![\d.])((?:19[5-9]\d|20[0-4]\d))[a-z]?(?![\d.]\d)')
+_PAREN_YEAR_RE = re.compile(r'\((?:19[5-9]\d|20[0-4]\d)[a-z]?\)')
+
+# 页码、卷号、期号
+_PAGES_RE = re.compile(r'\b(?:pp?\.|pages)\s*(\d+\s*[-–—]+\s*\d+|\d+)')
+_PAGE_RANGE_RE = re.compile(r'(?<![\d.])(\d{1,5})\s*[-–—]{1,2}\s*(\d{1,5})(?![\d.])')
+_VOLUME_RE = re.compile(r'\bvol(?:ume)?\.?\s*(\d+)', re.IGNORECASE)
+_VOLUME_ISSUE_RE = re.compile(r'\b(\d{1,4})\s*\((\d{1,4})\)')
+_ISSUE_RE = re.compile(r'\bno\.\s*(\d+)', re.IGNORECASE)
+
+# 引号中的标题
+_QUOTED_TITLE_RE = re.compile(r'[“"]([^”"]{4,400}?)[,.]?[”"]')
+
+# 句点后不切分的缩写（作者缩写、会议缩写等）
+_NO_SPLIT_ABBREVIATIONS = {
+    'vs', 'proc', 'conf', 'int', 'intl', 'j', 'vol', 'pp', 'no', 'adv', 'trans',
+    'eds', 'ed', 'dept', 'univ', 'jr', 'sr', 'st', 'assoc', 'comput', 'syst', 'mach',
+    'learn', 'res', 'natl', 'acad', 'sci', 'rev', 'lett', 'phys', 'math', 'inf',
+    'process', 'eng', 'tech', 'rep', 'symp', 'workshop', 'annu', 'ieee', 'acm', 'mr', 'dr',
+}
+
+# 发表场所类型
+_VENUE_TYPE_RULES = [
+    ('thesis', re.compile(r'\b(?:thesis|dissertation)\b', re.IGNORECASE)),
+    ('tech_report', re.compile(r'\b(?:technical\s+report|tech\.\s*rep)', re.IGNORECASE)),
+    ('conference', re.compile(
+        r'\b(?:proc|proceedings|conference|conf|workshop|symposium|neurips|nips|icml|iclr|'
+        r'cvpr|iccv|eccv|acl|emnlp|naacl|coling|aaai|ijcai|kdd|sigir|www|interspeech|icassp)\b'
+        r'|\badvances\s+in\s+neural',
+        re.IGNORECASE
+    )),
+    ('journal', re.compile(
+        r'\b(?:journal|j|trans|transactions|letters|review|nature|science|magazine)\b',
+        re.IGNORECASE
+    )),
+    ('book', re.compile(r'\b(?:press|springer|publishers?|wiley|elsevier|edition)\b', re.IGNORECASE)),
+]
+
+_AUTHOR_SEPARATOR_RE = re.compile(r'\s*(?:,\s*and\s+|\band\s+|&\s*|;\s*|,\s*)')
+_INITIALS_RE = re.compile(r'^(?:[A-Z]\.\s?-?)+(?:[A-Z]\.?)?$|^[A-Z]{1,3}$')
+_NAME_TOKEN_RE = re.compile(r"^(?:(?:[A-Z]\.-?)+|[A-Z][\w'\-]*|van|von|der|de|da|di|del|la|le|du|dos)$", re.UNICODE)
+
+
+class ReferenceRuleParser:
+    """基于规则的参考文献解析器"""
+
+    def __init__(self, max_entry_length: int = 1500):
+        """
+        初始化解析器
+
+        Args:
+            max_entry_length: 单条参考文献的最大长度，超过时认为切分有误（多条粘在一起）
+        """
+        self.max_entry_length = max_entry_length
+
+    def parse(self, reference_text: str) -> List[Dict]:
+        """
+        解析参考文献部分
+
+        Args:
+            reference_text: 参考文献部分的文本
+
+        Returns:
+            参考文献列表，字段与LLM解析结果一致，另含 extraction_method 和 confidence_score
+        """
+        entries, style = self.split_entries(reference_text)
+        return [
+            self.parse_entry(entry_text, number, numbered=(style != 'author_year'))
+            for number, entry_text in entries
+        ]
+
+    def split_entries(self, reference_text: str) -> Tuple[List[Tuple[int, str]], str]:
+        """
+        将参考文献部分切分为单条条目
+
+        Args:
+            reference_text: 参考文献部分的文本
+
+        Returns:
+            ([(序号, 条目文本)], 编号格式)，编号格式为 bracket / numeric / author_year
+        """
+        lines = []
+        for line in reference_text.split('\n'):
+            if not line.strip() or _PAGE_NUMBER_RE.match(line):
+                continue
+            if not lines and _HEADER_LINE_RE.match(line):
+                continue
+            lines.append(line.strip())
+
+        bracket_count = sum(1 for line in lines if _BRACKET_MARKER_RE.match(line))
+        numeric_count = sum(1 for line in lines if _NUMERIC_MARKER_RE.match(line))
+
+        if bracket_count >= 3 and bracket_count >= numeric_count:
+            return self._split_numbered(lines, _BRACKET_MARKER_RE, sequential=False), 'bracket'
+        if numeric_count >= 3:
+            return self._split_numbered(lines, _NUMERIC_MARKER_RE, sequential=True), 'numeric'
+        return self._split_author_year(lines), 'author_year'
+
+    def _split_numbered(self, lines: List[str], marker_re: re.Pattern, sequential: bool) -> List[Tuple[int, str]]:
+        """按编号切分；sequential 为 True 时只接受连续递增的编号（避免把正文中的 "2. " 当成新条目）"""
+        entries = []
+        seen = set()
+        current_number = None
+        current_lines = []
+
+        for line in lines:
+            match = marker_re.match(line)
+            if match:
+                number = int(match.group(1))
+                is_next = current_number is None or number == current_number + 1
+                if (is_next or not sequential) and number not in seen:
+                    if current_number is not None:
+                        entries.append((current_number, self._join_lines(current_lines)))
+                    current_number = number
+                    current_lines = [line[match.end():]]
+                    seen.add(number)
+                    continue
+            if current_number is not None:
+                current_lines.append(line)
+
+        if current_number is not None:
+            entries.append((current_number, self._join_lines(current_lines)))
+        return entries
+
+    def _split_author_year(self, lines: List[str]) -> List[Tuple[int, str]]:
+        """作者-年份格式：上一行以句点结束且当前行以作者名开头时开始新条目"""
+        entries = []
+        current_lines = []
+
+        for line in lines:
+            starts_entry = _AUTHOR_YEAR_START_RE.match(line) is not None
+            previous_ended = bool(current_lines) and current_lines[-1].rstrip().endswith('.')
+            if current_lines and starts_entry and previous_ended:
+                entries.append(self._join_lines(current_lines))
+                current_lines = []
+            current_lines.append(line)
+
+        if current_lines:
+            entries.append(self._join_lines(current_lines))
+        return [(i + 1, entry) for i, entry in enumerate(entries)]
+
+    @staticmethod
+    def _join_lines(lines: List[str]) -> str:
+        """合并条目的多行文本，处理行尾连字符断词和断开的URL"""
+        text = ''
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if not text:
+                text = line
+            elif text.endswith('-') and line[:1].islower():
+                text = text[:-1] + line
+            elif text.endswith(('/', '-', '_')) or re.search(r'https?://\S*$', text) and not line[:1].isupper():
+                text += line
+            else:
+                text += ' ' + line
+        return text
+
+    def parse_entry(self, entry_text: str, number: int, numbered: bool = True) -> Dict:
+        """
+        解析单条参考文献
+
+        Args:
+            entry_text: 条目文本（不含编号）
+            number: 参考文献序号
+            numbered: 条目是否带显式编号
+
+        Returns:
+            结构化的参考文献字典
+        """
+        text = entry_text.strip()
+        arxiv_id = self._extract_arxiv_id(text)
+        doi = self._extract_doi(text)
+        url = self._extract_url(text)
+
+        # 去掉标识符后再解析作者、标题和年份，避免 arXiv ID 被当成年份
+        remainder = text
+        for pattern in (_URL_RE, _DOI_RE, *_ARXIV_ID_RES):
+            remainder = pattern.sub(' ', remainder)
+        remainder = re.sub(r'\b(?:doi|URL|Available\s+(?:at|online))\s*:?\s*$', '', remainder, flags=re.IGNORECASE)
+        remainder = re.sub(r'\s{2,}', ' ', remainder).strip(' ,;')
+
+        year = self._extract_year(remainder)
+        authors, title, venue = self._split_fields(remainder)
+
+        volume, issue, pages = self._extract_volume_issue_pages(venue or '')
+        venue = self._clean_venue(venue)
+        venue_type = self._classify_venue(venue, arxiv_id)
+
+        reference = {
+            'reference_number': number,
+            'title': title,
+            'authors': authors,
+            'year': year,
+            'venue': venue,
+            'venue_type': venue_type,
+            'volume': volume,
+            'issue': issue,
+            'pages': pages,
+            'doi': doi,
+            'arxiv_id': arxiv_id,
+            'url': url,
+            'raw_text': text,
+            'extraction_method': 'rule',
+        }
+        reference['confidence_score'] = self._score(reference, numbered)
+        return reference
+
+    def _extract_arxiv_id(self, text: str) -> Optional[str]:
+        for pattern in _ARXIV_ID_RES:
+            match = pattern.search(text)
+            if match:
+                return match.group(1)
+        return None
+
+    def _extract_doi(self, text: str) -> Optional[str]:
+        match = _DOI_RE.search(text)
+        if not match:
+            return None
+        return match.group(1).rstrip('.)]')
+
+    def _extract_url(self, text: str) -> Optional[str]:
+        match = _URL_RE.search(text)
+        if not match:
+            return None
+        url = match.group(0).rstrip('.)]')
+        return url if len(url) <= 500 else None
+
+    def _extract_year(self, text: str) -> Optional[int]:
+        """优先使用括号中的年份（作者-年份格式），否则取最后一个年份（通常在场所信息之后）"""
+        paren = _PAREN_YEAR_RE.search(text)
+        if paren:
+            return int(paren.group(0)[1:5])
+        years = _YEAR_RE.findall(text)
+        if years:
+            return int(years[-1])
+        return None
+
+    def _split_fields(self, text: str) -> Tuple[Optional[List[str]], Optional[str], Optional[str]]:
+        """将条目切分为 (作者, 标题, 场所)"""
+        # 1. 标题在引号中（IEEE 等格式）
+        quoted = _QUOTED_TITLE_RE.search(text)
+        if quoted:
+            authors = self._parse_authors(text[:quoted.start()])
+            title = quoted.group(1).strip(' ,.')
+            venue = text[quoted.end():].strip(' ,.') or None
+            return authors, title, venue
+
+        # 2. 作者-年份格式：Surname, A. and Doe, B. (2020). Title. Venue.
+        paren = _PAREN_YEAR_RE.search(text)
+        if paren and paren.start() < len(text) * 0.5:
+            authors = self._parse_authors(text[:paren.start()])
+            sentences = self._split_sentences(text[paren.end():].lstrip(' .,:'))
+            title = sentences[0] if sentences else None
+            venue = ' '.join(sentences[1:]) or None
+            return authors, title, venue
+
+        # 3. LNCS 格式：Author, A., Writer, B.: Title. Venue
+        colon = re.match(r'^(.{3,300}?[A-Z]\.|.{3,300}?et al\.?)\s*:\s+(.*)$', text)
+        if colon:
+            authors = self._parse_authors(colon.group(1))
+            if authors:
+                sentences = self._split_sentences(colon.group(2))
+                title = sentences[0] if sentences else None
+                venue = ' '.join(sentences[1:]) or None
+                return authors, title, venue
+
+        # 4. 常见格式：A. Author, B. Writer. Title. Venue, Year.
+        sentences = self._split_sentences(text)
+        if len(sentences) >= 2:
+            authors = self._parse_authors(sentences[0])
+            if authors:
+                return authors, sentences[1], ' '.join(sentences[2:]) or None
+            return None, sentences[0], ' '.join(sentences[1:]) or None
+        return None, None, None
+
+    def _split_sentences(self, text: str) -> List[str]:
+        """按句点切分，跳过姓名缩写、et al. 等缩写后的句点"""
+        sentences = []
+        start = 0
+        for match in re.finditer(r'[.?!]\s+', text):
+            word_match = re.search(r'(\w+)\.?$', text[start:match.start() + 1])
+            word = word_match.group(1) if word_match else ''
+            is_abbreviation = (len(word) <= 1 and not word.isdigit()) or word.lower() in _NO_SPLIT_ABBREVIATIONS
+            if match.group(0).startswith('.') and is_abbreviation:
+                continue
+            sentence = text[start:match.start()].strip(' ,.')
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        tail = text[start:].strip(' ,.')
+        if tail:
+            sentences.append(tail)
+        return sentences
+
+    def _parse_authors(self, text: str) -> Optional[List[str]]:
+        """解析作者列表，不像作者列表时返回 None"""
+        text = text.strip(' ,.:')
+        if not text or len(text) > 400 or re.search(r'\d', text):
+            return None
+
+        et_al = re.search(r',?\s*et\s+al\.?$', text)
+        if et_al:
+            text = text[:et_al.start()]
+
+        parts = [part.strip(' .') for part in _AUTHOR_SEPARATOR_RE.split(text) if part.strip(' .')]
+
+        # "Surname, A., Writer, B." 形式：姓和名缩写被逗号分开，需要两两合并
+        names = []
+        i = 0
+        while i < len(parts):
+            part = parts[i]
+            if i + 1 < len(parts) and _INITIALS_RE.match(parts[i + 1] + '.') and ' ' not in part:
+                names.append(f'{parts[i + 1]}. {part}'.replace('..', '.'))
+                i += 2
+            else:
+                names.append(part)
+                i += 1
+
+        for name in names:
+            tokens = name.split()
+            if not 1 <= len(tokens) <= 6:
+                return None
+            if not all(_NAME_TOKEN_RE.match(token) for token in tokens):
+                return None
+
+        if et_al:
+            names.append('et al.')
+        return names or None
+
+    def _extract_volume_issue_pages(self, venue: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        volume = issue = pages = None
+
+        match = _VOLUME_RE.search(venue)
+        if match:
+            volume = match.group(1)
+        match = _VOLUME_ISSUE_RE.search(venue)
+        if match:
+            volume = volume or match.group(1)
+            issue = match.group(2)
+        if issue is None:
+            match = _ISSUE_RE.search(venue)
+            if match:
+                issue = match.group(1)
+
+        match = _PAGES_RE.search(venue)
+        if match:
+            pages = re.sub(r'\s*[-–—]+\s*', '-', match.group(1))
+        else:
+            match = _PAGE_RANGE_RE.search(venue)
+            if match:
+                pages = f'{match.group(1)}-{match.group(2)}'
+        return volume, issue, pages
+
+    def _clean_venue(self, venue: Optional[str]) -> Optional[str]:
+        """去掉场所中的前缀、年份、页码等附加信息"""
+        if not venue:
+            return None
+        venue = re.sub(r'^in:?\s+', '', venue, flags=re.IGNORECASE)
+        venue = _PAGES_RE.sub('', venue)
+        venue = _YEAR_RE.sub('', venue)
+        venue = re.sub(r'\(\s*\)', '', venue)
+        venue = re.sub(r'\s*,\s*(?=[,.])', '', venue)
+        venue = re.sub(r'\s{2,}', ' ', venue).strip(' ,.;:')
+        return venue[:300] or None
+
+    def _classify_venue(self, venue: Optional[str], arxiv_id: Optional[str]) -> Optional[str]:
+        if arxiv_id or (venue and re.search(r'\barxiv\b|\bcorr\b', venue, re.IGNORECASE)):
+            return 'arxiv'
+        if not venue:
+            return None
+        for venue_type, pattern in _VENUE_TYPE_RULES:
+            if pattern.search(venue):
+                return venue_type
+        return 'other'
+
+    def _score(self, reference: Dict, numbered: bool) -> float:
+        """
+        计算置信度（0-1）
+
+        作者、标题、年份、场所/标识符各自贡献一部分分数；
+        带显式编号的条目切分更可靠，额外加分；过长或过短的条目多半切分有误，扣分
+        """
+        score = 0.0
+        if reference['authors']:
+            score += 0.35
+        title = reference['title'] or ''
+        if 4 <= len(title) <= 400 and not re.fullmatch(r'[\d\W]+', title):
+            score += 0.3
+        if reference['year']:
+            score += 0.15
+        if reference['venue'] or reference['arxiv_id'] or reference['doi']:
+            score += 0.1
+        if numbered:
+            score += 0.1
+
+        length = len(reference['raw_text'])
+        if length > self.max_entry_length or length < 30:
+            score -= 0.3
+        return round(max(0.0, min(1.0, score)), 2)
+
+
+def split_reference_chunks(
+    reference_text: str,
+    max_chars: int,
+    parser: Optional[ReferenceRuleParser] = None
+) -> List[Tuple[str, List[int]]]:
+    """
+    按条目边界将参考文献文本切分为不超过 max_chars 的块（用于分块调用LLM）
+
+    Args:
+        reference_text: 参考文献部分的文本
+        max_chars: 每块的最大字符数（单条超长条目单独成块）
+        parser: 用于切分条目的解析器
+
+    Returns:
+        [(块文本, 块内条目编号)]，无法识别条目时编号列表为空
+    """
+    parser = parser or ReferenceRuleParser()
+    entries, style = parser.split_entries(reference_text)
+    numbers = [number for number, _ in entries]
+
+    # 不超过限制时原样返回，与不分块时的输入完全一致
+    if len(reference_text) <= max_chars:
+        return [(reference_text, numbers)]
+
+    if len(entries) >= 2:
+        if style == 'bracket':
+            units = [(f'[{number}] {text}', number) for number, text in entries]
+        elif style == 'numeric':
+            units = [(f'{number}. {text}', number) for number, text in entries]
+        else:
+            units = [(text, number) for number, text in entries]
+    else:
+        # 无法识别条目时退化为按行切分
+        units = [(line, None) for line in reference_text.split('\n') if line.strip()]
+
+    chunks = []
+    current_texts = []
+    current_numbers = []
+    current_length = 0
+    for text, number in units:
+        if current_texts and current_length + len(text) + 1 > max_chars:
+            chunks.append(('\n'.join(current_texts), current_numbers))
+            current_texts, current_numbers, current_length = [], [], 0
+        current_texts.append(text)
+        if number is not None:
+            current_numbers.append(number)
+        current_length += len(text) + 1
+
+    if current_texts:
+        chunks.append(('\n'.join(current_texts), current_numbers))
+    return chunks
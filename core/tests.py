@@ -1,3 +1,1503 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.pdf_text_cache import PdfTextCache, ExtractedDocument, ExtractedPage
+
+
+class PdfTextCacheTests(SimpleTestCase):
+    """PDF文本层缓存测试"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = PdfTextCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _make_document(self, content_hash='abc123'):
+        return ExtractedDocument(
+            content_hash=content_hash,
+            page_count=3,
+            pages=[
+                ExtractedPage(number=0, text='Introduction', blocks=[[0, 0, 10, 10, 'Introduction']]),
+                ExtractedPage(number=1, text=''),
+                ExtractedPage(number=2, text='References\n[1] A. Author'),
+            ],
+        )
+
+    def test_put_and_get_roundtrip(self):
+        self.cache.put(self._make_document())
+        document = self.cache.get('abc123')
+        self.assertIsNotNone(document)
+        self.assertEqual(document.page_count, 3)
+        self.assertEqual(document.pages[0].blocks, [[0, 0, 10, 10, 'Introduction']])
+        self.assertEqual(document.text, 'Introduction\n\nReferences\n[1] A. Author')
+
+    def test_alias_lookup(self):
+        self.cache.put(self._make_document(), aliases=['https://arxiv.org/pdf/2301.00001'])
+        document = self.cache.get_by_alias('https://arxiv.org/pdf/2301.00001')
+        self.assertEqual(document.content_hash, 'abc123')
+        self.assertIsNone(self.cache.get_by_alias('https://arxiv.org/pdf/unknown'))
+
+    def test_unversioned_alias_expires(self):
+        import os
+        import time
+
+        unversioned = 'https://arxiv.org/pdf/2301.00001'
+        versioned = 'https://arxiv.org/pdf/2301.00001v2'
+        self.cache.put(self._make_document(), aliases=[unversioned, versioned])
+        stale = time.time() - self.cache.alias_ttl - 60
+        for alias in (unversioned, versioned):
+            os.utime(self.cache._alias_path(alias), (stale, stale))
+
+        # 不带版本号的URL可能已指向新版本，过期后需要重新下载；带版本号的URL内容不变
+        self.assertIsNone(self.cache.get_by_alias(unversioned))
+        self.assertEqual(self.cache.get_by_alias(versioned).content_hash, 'abc123')
+
+        self.cache.add_aliases('abc123', [unversioned])
+        self.assertEqual(self.cache.get_by_alias(unversioned).content_hash, 'abc123')
+
+    def test_version_change_invalidates_entries(self):
+        self.cache.put(self._make_document())
+        newer_cache = PdfTextCache(self.tmp_dir.name, version=self.cache.version + 1)
+        self.assertIsNone(newer_cache.get('abc123'))
+
+
+class PageTargetedExtractionTests(SimpleTestCase):
+    """按页定向提取参考文献测试"""
+
+    def setUp(self):
+        import fitz
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = f'{self.tmp_dir.name}/paper.pdf'
+
+        doc = fitz.open()
+        for i in range(8):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(72, 72, 540, 770), f'Section {i} body text about models.', fontsize=9)
+        page = doc.new_page()
+        references = '\n'.join(
+            f'[{n}] A. Author, B. Writer, et al. Title number {n}. In Proc. Conf., ({2000 + n}).'
+            for n in range(1, 11)
+        )
+        page.insert_textbox(fitz.Rect(72, 72, 540, 770), 'References\n\n' + references, fontsize=8)
+        doc.save(self.pdf_path)
+
+        self.extractor = ArxivReferenceExtractor(
+            pdf_download_dir=self.tmp_dir.name,
+            text_cache_dir=f'{self.tmp_dir.name}/cache'
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stops_at_reference_header(self):
+        success, text, error, stats = self.extractor.locate_reference_text(self.pdf_path)
+        self.assertTrue(success, error)
+        self.assertEqual(stats['strategy'], 'tail')
+        self.assertEqual(stats['pages_parsed'], 1)
+        self.assertEqual(stats['page_count'], 9)
+
+        # 只解析了最后一页，位置评分按整篇文档的估计长度计算
+        position = {'text_offset': stats['text_offset'], 'document_length': stats['document_length']}
+        self.assertEqual(position['document_length'] - position['text_offset'], len(text))
+        self.assertGreater(position['text_offset'], 0)
+        self.assertGreater(
+            self.extractor._find_reference_header(text, **position)[1],
+            self.extractor._find_reference_header(text)[1]
+        )
+
+        found, reference_text, _ = self.extractor.find_reference_section(text, **position)
+        self.assertTrue(found)
+        self.assertIn('[10] A. Author', reference_text)
+
+    def test_partial_cache_is_not_served_as_full_text(self):
+        self.extractor.locate_reference_text(self.pdf_path, aliases=('http://example.com/paper.pdf',))
+        self.assertIsNone(self.extractor.get_cached_document('http://example.com/paper.pdf'))
+        self.assertIsNotNone(
+            self.extractor.get_cached_document('http://example.com/paper.pdf', allow_partial=True)
+        )
+
+        success, document, _ = self.extractor.extract_document(self.pdf_path)
+        self.assertTrue(success)
+        self.assertTrue(document.is_complete)
+        self.assertIn('Section 0 body text', document.text)
+
+
+class ReferenceSectionDetectionTests(SimpleTestCase):
+    """参考文献章节定位测试"""
+
+    def setUp(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.extractor = ArxivReferenceExtractor(pdf_download_dir=self.tmp_dir.name, use_text_cache=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _entries(self, count):
+        return '\n'.join(
+            f'[{n}] A. Author, B. Writer, et al. Title of paper number {n}. In Proc. Conf., ({2000 + n}).'
+            for n in range(1, count + 1)
+        )
+
+    def test_line_index_offsets(self):
+        from core.arxiv_reference_extractor import _LineIndex
+
+        text = 'first\n\nthird line\nlast'
+        index = _LineIndex(text)
+        self.assertEqual(index.starts, [0, 6, 7, 18])
+        self.assertEqual(index.line_number(0), 0)
+        self.assertEqual(index.line_number(6), 1)
+        self.assertEqual(index.line_number(10), 2)
+        self.assertEqual(index.line(2), 'third line')
+        self.assertEqual(index.line(3), 'last')
+        self.assertEqual(index.line(2, start=9, end=12), 'ird')
+
+    def test_prefers_last_reference_header_in_long_document(self):
+        body = '\n'.join('We study the method proposed in prior work and compare results.' for _ in range(2000))
+        text = (
+            body + '\nReferences\n' + self._entries(3) + '\n' + body
+            + '\n7. References\n' + self._entries(20) + '\nAcknowledgements\nThanks to everyone.'
+        )
+        found, reference_text, start_pos = self.extractor.find_reference_section(text)
+        self.assertTrue(found)
+        self.assertEqual(start_pos, text.index('7. References'))
+        self.assertIn('[20] A. Author', reference_text)
+        self.assertNotIn('Acknowledgements', reference_text)
+
+    def test_heuristic_detection_start_offset(self):
+        body = '\n'.join('Plain body text without any section header here.' for _ in range(100))
+        text = body + '\n\n' + self._entries(8)
+        found, reference_text, start_pos = self.extractor._heuristic_reference_detection(text)
+        self.assertTrue(found)
+        self.assertEqual(text[start_pos:], reference_text)
+
+
+class ReferenceRuleParserTests(SimpleTestCase):
+    """规则参考文献解析测试"""
+
+    REFERENCE_TEXT = '\n'.join([
+        'References',
+        '[1] A. Vaswani, N. Shazeer, N. Parmar, and I. Polo-',
+        'sukhin. Attention is all you need. In Advances in Neural Information Processing Systems, pages',
+        '5998–6008, 2017.',
+        '[2] J. Devlin, M.-W. Chang, K. Lee, and K. Toutanova. BERT: Pre-training of deep bidirectional',
+        'transformers for language understanding. arXiv preprint arXiv:1810.04805, 2018.',
+        '12',
+        '[3] Y. LeCun, Y. Bengio, and G. Hinton. Deep learning. Nature, 521(7553):436–444, 2015. doi: 10.1038/nature14539.',
+        '[4] Some garbled line without structure',
+    ])
+
+    def setUp(self):
+        from core.reference_rule_parser import ReferenceRuleParser
+
+        self.parser = ReferenceRuleParser()
+
+    def test_split_bracket_entries(self):
+        entries, style = self.parser.split_entries(self.REFERENCE_TEXT)
+        self.assertEqual(style, 'bracket')
+        self.assertEqual([number for number, _ in entries], [1, 2, 3, 4])
+        self.assertIn('Polosukhin. Attention', entries[0][1])
+
+    def test_extract_fields(self):
+        references = self.parser.parse(self.REFERENCE_TEXT)
+
+        self.assertEqual(references[0]['title'], 'Attention is all you need')
+        self.assertEqual(references[0]['authors'][-1], 'I. Polosukhin')
+        self.assertEqual(references[0]['year'], 2017)
+        self.assertEqual(references[0]['pages'], '5998-6008')
+        self.assertEqual(references[0]['venue_type'], 'conference')
+
+        self.assertEqual(references[1]['arxiv_id'], '1810.04805')
+        self.assertEqual(references[1]['authors'][1], 'M.-W. Chang')
+        self.assertEqual(references[1]['venue_type'], 'arxiv')
+
+        self.assertEqual(references[2]['doi'], '10.1038/nature14539')
+        self.assertEqual((references[2]['volume'], references[2]['issue']), ('521', '7553'))
+
+        self.assertTrue(all(ref['extraction_method'] == 'rule' for ref in references))
+        self.assertGreaterEqual(references[0]['confidence_score'], 0.75)
+        self.assertLess(references[3]['confidence_score'], 0.75)
+
+    def test_author_year_entries(self):
+        text = '\n'.join([
+            'Brown, T., Mann, B., et al. (2020). Language models are few-shot learners. In Advances in NeurIPS.',
+            'Radford, A. and Wu, J. (2019). Language models are unsupervised multitask learners.',
+            'Technical Report, OpenAI.',
+        ])
+        entries, style = self.parser.split_entries(text)
+        self.assertEqual(style, 'author_year')
+        self.assertEqual(len(entries), 2)
+
+        reference = self.parser.parse(text)[1]
+        self.assertEqual(reference['authors'], ['A. Radford', 'J. Wu'])
+        self.assertEqual(reference['year'], 2019)
+        self.assertEqual(reference['venue_type'], 'tech_report')
+
+    def test_only_uncertain_entries_sent_to_llm(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        extractor = ArxivReferenceExtractor(pdf_download_dir=tmp_dir.name, use_text_cache=False)
+
+        sent = []
+
+        def fake_chunk(reference_text):
+            sent.append(reference_text)
+            return True, [{'reference_number': 4, 'title': 'Recovered title', 'raw_text': 'x'}], None, '[]'
+
+        extractor._parse_reference_chunk = fake_chunk
+        success, references, error, llm_response = extractor.parse_references(self.REFERENCE_TEXT, '0000.00000')
+
+        self.assertTrue(success, error)
+        self.assertEqual(len(sent), 1)
+        self.assertTrue(sent[0].startswith('[4] Some garbled line'))
+        self.assertEqual([ref['extraction_method'] for ref in references], ['rule', 'rule', 'rule', 'llm'])
+        self.assertEqual(references[3]['title'], 'Recovered title')
+
+    def test_failed_split_sends_whole_section_to_llm(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        extractor = ArxivReferenceExtractor(pdf_download_dir=tmp_dir.name, use_text_cache=False)
+
+        # 没有编号、也不符合作者-年份格式，规则切分只能得到一条粘连的条目
+        text = 'Attention is all you need 2017 Deep learning 2015 Language models are few-shot learners 2020'
+        sent = []
+
+        def fake_chunk(reference_text):
+            sent.append(reference_text)
+            return True, [
+                {'reference_number': i, 'title': title, 'raw_text': title}
+                for i, title in enumerate(['Attention', 'Deep learning', 'Few-shot'], 1)
+            ], None, '[]'
+
+        extractor._parse_reference_chunk = fake_chunk
+        success, references, error, _ = extractor.parse_references(text, '0000.00000')
+
+        self.assertTrue(success, error)
+        self.assertEqual(sent, [text])
+        self.assertEqual([ref['title'] for ref in references], ['Attention', 'Deep learning', 'Few-shot'])
+
+    def test_unmatched_llm_references_replace_uncertain_entries(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        extractor = ArxivReferenceExtractor(pdf_download_dir=tmp_dir.name, use_text_cache=False)
+
+        # 第4条实为两条粘连，LLM返回的编号和条数都对不上
+        extractor._parse_reference_chunk = lambda reference_text: (True, [
+            {'reference_number': 1, 'title': 'First', 'raw_text': 'a'},
+            {'reference_number': 2, 'title': 'Second', 'raw_text': 'b'},
+        ], None, '[]')
+        success, references, error, _ = extractor.parse_references(self.REFERENCE_TEXT, '0000.00000')
+
+        self.assertTrue(success, error)
+        self.assertEqual([ref['reference_number'] for ref in references], [1, 2, 3, 4, 5])
+        self.assertEqual([ref['extraction_method'] for ref in references], ['rule', 'rule', 'rule', 'llm', 'llm'])
+        self.assertEqual([ref['title'] for ref in references[3:]], ['First', 'Second'])
+
+
+class ChunkedReferenceParsingTests(SimpleTestCase):
+    """长参考文献分块解析测试"""
+
+    def setUp(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.extractor = ArxivReferenceExtractor(
+            pdf_download_dir=self.tmp_dir.name,
+            use_text_cache=False,
+            use_rule_parser=False,
+            llm_chunk_chars=1000
+        )
+        self.reference_text = 'References\n' + '\n'.join(
+            f'[{n}] A. Author and B. Writer. A fairly long title for survey entry {n}. In Proc. Conf., {2000 + n % 20}.'
+            for n in range(1, 61)
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_chunks_split_on_entry_boundaries(self):
+        from core.reference_rule_parser import split_reference_chunks
+
+        chunks = split_reference_chunks(self.reference_text, 1000)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(text) <= 1000 for text, _ in chunks))
+        self.assertEqual([number for _, numbers in chunks for number in numbers], list(range(1, 61)))
+        self.assertTrue(all(text.startswith(f'[{numbers[0]}] ') for text, numbers in chunks))
+
+    def test_parallel_chunks_are_merged_renumbered_and_deduplicated(self):
+        def fake_chunk(reference_text):
+            references = []
+            lines = reference_text.split('\n')
+            # 模拟LLM在每块内从1开始编号，并重复输出最后一条
+            for i, line in enumerate(lines + lines[-1:], 1):
+                references.append({'reference_number': i, 'title': line.split('. ')[1], 'raw_text': line})
+            return True, references, None, '[]'
+
+        self.extractor._get_llm_client = lambda: None
+        self.extractor._parse_reference_chunk = fake_chunk
+
+        success, references, error, llm_response = self.extractor.parse_references_with_llm(
+            self.reference_text, '0000.00000'
+        )
+        self.assertTrue(success, error)
+        self.assertEqual(len(references), 60)
+        self.assertEqual([ref['reference_number'] for ref in references], list(range(1, 61)))
+        self.assertIn('survey entry 60', references[-1]['raw_text'])
+
+    def test_failed_chunk_fails_whole_parse(self):
+        def fake_chunk(reference_text):
+            if '[1] ' in reference_text:
+                return False, None, 'LLM处理失败: timeout', None
+            return True, [], None, '[]'
+
+        self.extractor._get_llm_client = lambda: None
+        self.extractor._parse_reference_chunk = fake_chunk
+
+        success, references, error, _ = self.extractor.parse_references_with_llm(self.reference_text, '0000.00000')
+        self.assertFalse(success)
+        self.assertIn('第 1 块', error)
+
+    def test_chunk_prompts_share_cacheable_prefix(self):
+        from core.reference_rule_parser import split_reference_chunks
+
+        chunks = split_reference_chunks(self.reference_text, 1000)
+        first, second = (self.extractor.build_reference_messages(text) for text, _ in chunks[:2])
+        # 固定指令逐字节相同且在前，参考文献文本只出现在最后一条消息中
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn('[1] ', first[0]['content'])
+        self.assertIn(chunks[0][0], first[-1]['content'])
+
+    def test_parallel_chunk_calls_are_collected(self):
+        from core.llm.openai_client import OpenAIClient
+        from core.llm.telemetry import collect_llm_metrics
+        from core.llm.testing import FakeBatchServer
+
+        with FakeBatchServer(lambda custom_id, body: '[]') as server:
+            self.extractor.llm_client = OpenAIClient(server.client_config(model='deepseek-chat'))
+            with collect_llm_metrics() as collector:
+                success, _, error, _ = self.extractor.parse_references_with_llm(self.reference_text, '0000.00000')
+            self.assertTrue(success, error)
+            requests = server.chat_requests
+
+        # 工作线程中的调用也汇总到调用方的收集器
+        summary = collector.summary()
+        self.assertGreater(requests, 1)
+        self.assertEqual((summary['calls'], summary['errors']), (requests, 0))
+        self.assertEqual(summary['prompt_tokens'], 10 * requests)
+        self.assertEqual(summary['models'], ['openai/deepseek-chat'])
+
+
+class ReferenceBatchRunnerTests(TestCase):
+    """参考文献批量（Batch API）解析测试，使用本地模拟的 Batch API 服务"""
+
+    def setUp(self):
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper, ArxivReferenceExtractLog
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.extractor = ArxivReferenceExtractor(
+            pdf_download_dir=self.tmp_dir.name,
+            use_text_cache=False,
+            llm_chunk_chars=1000
+        )
+
+        texts = {
+            # 格式规整，规则解析即可完成
+            '2301.00001': 'References\n' + '\n'.join(
+                f'[{n}] A. Author and B. Writer. Rule parsed title {n}. In Proc. Conf., {2000 + n}.'
+                for n in range(1, 6)
+            ),
+            # 无法规则解析，按条目分块交给LLM
+            '2301.00002': 'References\n' + '\n'.join(
+                f'[{n}] garbled reference fragment number {n} without any recognisable structure at all'
+                for n in range(1, 31)
+            ),
+        }
+        self.logs = {}
+        for arxiv_id, text in texts.items():
+            paper = ArxivPaper.objects.create(
+                arxiv_id=arxiv_id, title=f'Paper {arxiv_id}', summary='', authors=[],
+                primary_category='cs.CL', categories=['cs.CL'],
+                arxiv_url=f'https://arxiv.org/abs/{arxiv_id}', pdf_url=f'https://arxiv.org/pdf/{arxiv_id}',
+                published=timezone.now(), updated=timezone.now(),
+            )
+            self.logs[arxiv_id] = ArxivReferenceExtractLog.objects.create(
+                paper=paper, reference_section_found=True,
+                reference_raw_text=text, reference_text_length=len(text),
+            )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _responder(fail_entry=None):
+        import json
+        import re
+
+        def respond(custom_id, body):
+            lines = re.findall(r'^\[(\d+)\] (.*)$', body['messages'][-1]['content'], re.MULTILINE)
+            if fail_entry is not None and str(fail_entry) in [number for number, _ in lines]:
+                raise RuntimeError('rate limited')
+            return json.dumps([
+                {'reference_number': int(number), 'title': f'LLM title {number}', 'raw_text': raw}
+                for number, raw in lines
+            ])
+        return respond
+
+    def _runner(self, server):
+        from core.llm.batch import OpenAIBatchClient
+        from core.reference_batch import ReferenceBatchRunner
+
+        return ReferenceBatchRunner(
+            self.extractor,
+            batch_client=OpenAIBatchClient(server.client_config()),
+            input_dir=self.tmp_dir.name,
+            max_requests_per_batch=2,
+            log=lambda message: None
+        )
+
+    def test_batch_roundtrip_saves_references(self):
+        from core.arxiv_models import ArxivPaperReference, ArxivReferenceBatchJob
+        from core.llm.testing import FakeBatchServer
+
+        with FakeBatchServer(self._responder()) as server:
+            result = self._runner(server).run(self.logs.values(), poll_interval=0)
+
+        self.assertEqual(result['rule_only'], 1)
+        self.assertEqual(result['success'], 2)
+        self.assertEqual(result['failed'], 0)
+        # 一篇论文的分块不会拆到两个批次中
+        self.assertEqual(len(result['jobs']), 1)
+        self.assertGreater(result['requests'], 2)
+
+        llm_log = self.logs['2301.00002']
+        llm_log.refresh_from_db()
+        self.assertEqual(llm_log.status, 'completed')
+        self.assertEqual(llm_log.reference_count, 30)
+        self.assertEqual(llm_log.processing_details['batch_id'], result['jobs'][0].batch_id)
+
+        references = ArxivPaperReference.objects.filter(paper=llm_log.paper).order_by('reference_number')
+        self.assertEqual([ref.reference_number for ref in references], list(range(1, 31)))
+        self.assertEqual(references[29].title, 'LLM title 30')
+        self.assertEqual(
+            set(ArxivPaperReference.objects.filter(paper=self.logs['2301.00001'].paper)
+                .values_list('extraction_method', flat=True)),
+            {'rule'}
+        )
+        self.assertEqual(ArxivReferenceBatchJob.objects.get().status, 'collected')
+
+    def test_resume_collects_unfinished_batches(self):
+        from core.arxiv_models import ArxivReferenceBatchJob, ArxivReferenceExtractLog
+        from core.llm.testing import FakeBatchServer
+
+        with FakeBatchServer(self._responder(fail_entry=1), polls_before_complete=2) as server:
+            submitted = self._runner(server).run(self.logs.values(), wait=False)
+            llm_log = ArxivReferenceExtractLog.objects.get(pk=self.logs['2301.00002'].pk)
+            self.assertEqual(llm_log.status, 'processing')
+
+            # 已在批次中的日志不会重复提交
+            again = self._runner(server).submit([llm_log])
+            self.assertEqual((again['skipped'], again['jobs']), (1, []))
+
+            # 模拟进程中断后重新启动
+            result = self._runner(server).resume(poll_interval=0)
+
+        self.assertEqual(result['collected'], len(submitted['jobs']))
+        self.assertEqual(result['failed'], 1)
+        llm_log.refresh_from_db()
+        self.assertEqual(llm_log.status, 'failed')
+        self.assertIn('rate limited', llm_log.error_message)
+        self.assertFalse(ArxivReferenceBatchJob.objects.exclude(status='collected').exists())
+
+    def test_resume_collects_batches_that_ended_without_results(self):
+        from core.arxiv_models import ArxivReferenceBatchJob, ArxivReferenceExtractLog
+        from core.llm.testing import FakeBatchServer
+
+        with FakeBatchServer(self._responder(), polls_before_complete=100) as server:
+            runner = self._runner(server)
+            runner.run(self.logs.values(), wait=False)
+            # 模拟轮询时批次已过期、进程在回收结果之前退出
+            ArxivReferenceBatchJob.objects.update(status='expired')
+            llm_log = ArxivReferenceExtractLog.objects.get(pk=self.logs['2301.00002'].pk)
+            self.assertIn(llm_log.pk, runner.in_flight_log_ids())
+
+            result = self._runner(server).resume(poll_interval=0)
+
+        self.assertEqual((result['collected'], result['failed']), (1, 1))
+        llm_log.refresh_from_db()
+        self.assertEqual(llm_log.status, 'failed')
+        self.assertFalse(ArxivReferenceBatchJob.objects.exclude(status='collected').exists())
+        self.assertEqual(self._runner(server).in_flight_log_ids(), set())
+
+
+class KeysetIteratorTests(TestCase):
+    """流式读取待处理记录测试"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper, ArxivReferenceExtractLog
+
+        now = timezone.now()
+        for i in range(7):
+            # 部分论文发布时间相同，需要按 id 区分先后
+            published = now - timedelta(days=i // 2)
+            paper = ArxivPaper.objects.create(
+                arxiv_id=f'2301.{i:05d}', title=f'Paper {i}', summary='long abstract ' * 50, authors=[],
+                primary_category='cs.CL', categories=['cs.CL'],
+                arxiv_url=f'https://arxiv.org/abs/2301.{i:05d}', pdf_url=f'https://arxiv.org/pdf/2301.{i:05d}',
+                published=published, updated=published,
+            )
+            ArxivReferenceExtractLog.objects.create(
+                paper=paper, reference_section_found=True, reference_raw_text=f'References {i}',
+                started_at=published,
+            )
+
+    def test_matches_full_ordering_across_pages(self):
+        from common.db_utils import keyset_iterator
+        from core.arxiv_models import ArxivPaper
+
+        expected = list(ArxivPaper.objects.order_by('-published', '-id').values_list('id', flat=True))
+        streamed = [paper.id for paper in keyset_iterator(ArxivPaper.objects.all(), ('-published', '-id'), chunk_size=2)]
+        self.assertEqual(streamed, expected)
+
+        limited = [paper.id for paper in keyset_iterator(ArxivPaper.objects.all(), ('-published', '-id'), 2, limit=3)]
+        self.assertEqual(limited, expected[:3])
+
+    def test_rows_updated_during_iteration_are_not_skipped(self):
+        from common.db_utils import keyset_iterator
+        from core.arxiv_models import ArxivReferenceExtractLog
+
+        pending = ArxivReferenceExtractLog.objects.filter(llm_processed=False)
+        seen = []
+        for log in keyset_iterator(pending, ('-started_at', '-id'), chunk_size=2):
+            seen.append(log.id)
+            # 处理后不再满足过滤条件；OFFSET 分页在这种情况下会跳过记录
+            ArxivReferenceExtractLog.objects.filter(pk=log.pk).update(llm_processed=True)
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_logs_stream_with_paper_projection(self):
+        from common.db_utils import keyset_iterator
+        from core.arxiv_models import ArxivReferenceExtractLog, EXTRACT_LOG_WORK_FIELDS, PAPER_WORK_FIELDS
+
+        queryset = ArxivReferenceExtractLog.objects.select_related('paper').only(
+            *EXTRACT_LOG_WORK_FIELDS, *(f'paper__{field}' for field in PAPER_WORK_FIELDS)
+        )
+        # 每页一次查询，访问关联论文不产生额外查询（7 条记录、每页 3 条 -> 3 次查询）
+        with self.assertNumQueries(3):
+            titles = [log.paper.title for log in keyset_iterator(queryset, ('-started_at', '-id'), chunk_size=3)]
+        self.assertEqual(len(titles), 7)
+
+    def test_run_bounded_limits_in_flight_items(self):
+        import threading
+        from common.db_utils import run_bounded
+
+        lock = threading.Lock()
+        state = {'read': 0, 'done': 0, 'max_ahead': 0}
+
+        def items():
+            for i in range(50):
+                with lock:
+                    state['read'] += 1
+                    state['max_ahead'] = max(state['max_ahead'], state['read'] - state['done'])
+                yield i
+
+        def work(item):
+            with lock:
+                state['done'] += 1
+
+        errors = []
+        self.assertEqual(run_bounded(items(), work, workers=2, on_error=lambda item, e: errors.append(item)), 50)
+        self.assertEqual(state['done'], 50)
+        self.assertLessEqual(state['max_ahead'], 4)
+        self.assertEqual(errors, [])
+
+
+class PaperLeaseQueueTests(TestCase):
+    """多机协同的论文租约队列测试"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper
+
+        now = timezone.now()
+        for i in range(10):
+            ArxivPaper.objects.create(
+                arxiv_id=f'2302.{i:05d}', title=f'Paper {i}', summary='', authors=[],
+                primary_category='cs.CL', categories=['cs.CL'],
+                arxiv_url=f'https://arxiv.org/abs/2302.{i:05d}', pdf_url=f'https://arxiv.org/pdf/2302.{i:05d}',
+                published=now - timedelta(hours=i), updated=now,
+            )
+
+    def _queue(self, owner, **kwargs):
+        from core.paper_lease import PaperLeaseQueue
+        return PaperLeaseQueue('extract', owner=owner, claim_size=3, **kwargs)
+
+    def test_interleaved_hosts_never_share_papers(self):
+        from django.db.models import Exists, OuterRef
+        from core.arxiv_models import ArxivPaper, ArxivReferenceExtractLog
+
+        # 与 --skip-existing 相同：已完成的论文不再是候选
+        pending = ArxivPaper.objects.filter(~Exists(
+            ArxivReferenceExtractLog.objects.filter(paper_id=OuterRef('id'), status='completed')
+        ))
+        queues = {'a': self._queue('host-a'), 'b': self._queue('host-b')}
+        active = {name: queue.iter_claimed(pending, ('-published', '-id')) for name, queue in queues.items()}
+
+        seen = {'a': [], 'b': []}
+        while active:
+            for name, iterator in list(active.items()):
+                paper = next(iterator, None)
+                if paper is None:
+                    del active[name]
+                    continue
+                seen[name].append(paper.id)
+                ArxivReferenceExtractLog.objects.create(paper=paper, status='completed')
+                queues[name].release(paper.id)
+
+        self.assertFalse(set(seen['a']) & set(seen['b']))
+        self.assertEqual(len(seen['a']) + len(seen['b']), 10)
+        self.assertTrue(seen['a'] and seen['b'])
+
+    def test_expired_lease_can_be_reclaimed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper, ArxivPaperLease
+
+        crashed = self._queue('crashed-host')
+        claimed = crashed.claim(ArxivPaper.objects.all(), ('-published', '-id'))
+        self.assertEqual(len(claimed), 3)
+
+        # 持有者未续约，租约到期
+        ArxivPaperLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        survivor = self._queue('survivor')
+        reclaimed = survivor.claim(ArxivPaper.objects.all(), ('-published', '-id'))
+        self.assertEqual([paper.id for paper in reclaimed], [paper.id for paper in claimed])
+        lease = ArxivPaperLease.objects.get(paper=reclaimed[0])
+        self.assertEqual((lease.owner, lease.claim_count), ('survivor', 2))
+
+        # 原持有者的续约和释放不影响被接管的租约
+        self.assertEqual(crashed.heartbeat(), 0)
+        crashed.release_all()
+        self.assertEqual(ArxivPaperLease.objects.filter(owner='survivor').count(), 3)
+
+    def test_heartbeat_extends_and_release_deletes(self):
+        from core.arxiv_models import ArxivPaper, ArxivPaperLease
+
+        queue = self._queue('host-a', lease_seconds=60)
+        papers = queue.claim(ArxivPaper.objects.all(), ('-published', '-id'))
+        before = ArxivPaperLease.objects.get(paper=papers[0]).expires_at
+
+        queue.lease_seconds = 600
+        self.assertEqual(queue.heartbeat(), 3)
+        self.assertGreater(ArxivPaperLease.objects.get(paper=papers[0]).expires_at, before)
+
+        queue.release(papers[0].id)
+        self.assertEqual(ArxivPaperLease.objects.count(), 2)
+        queue.release_all()
+        self.assertFalse(ArxivPaperLease.objects.exists())
+
+
+class ExtractLogWriterTests(TransactionTestCase):
+    """提取日志批量写入测试（自动写入依赖是否处于事务中，不能使用 TestCase 的外层事务）"""
+
+    def setUp(self):
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper
+
+        now = timezone.now()
+        self.papers = [
+            ArxivPaper.objects.create(
+                arxiv_id=f'2303.{i:05d}', title=f'Paper {i}', summary='', authors=[],
+                primary_category='cs.CL', categories=['cs.CL'],
+                arxiv_url=f'https://arxiv.org/abs/2303.{i:05d}', pdf_url=f'https://arxiv.org/pdf/2303.{i:05d}',
+                published=now, updated=now,
+            )
+            for i in range(4)
+        ]
+
+    def test_creates_are_immediate_and_updates_buffered(self):
+        from core.arxiv_models import ArxivReferenceExtractLog
+        from core.extract_log_writer import ExtractLogWriter
+
+        # 重试次数按数据库中的日志数统计，新日志立即插入
+        writer = ExtractLogWriter(flush_size=2, flush_interval=3600)
+        logs = [writer.create(paper=paper, status='pending') for paper in self.papers[:3]]
+        self.assertEqual(ArxivReferenceExtractLog.objects.count(), 3)
+        self.assertEqual(writer.pending, 0)
+
+        logs[0].status = 'completed'
+        writer.save(logs[0])
+        self.assertEqual(writer.pending, 1)
+        self.assertEqual(ArxivReferenceExtractLog.objects.filter(status='completed').count(), 0)
+
+        logs[1].status = 'failed'
+        writer.save(logs[1])
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(
+            sorted(ArxivReferenceExtractLog.objects.values_list('status', flat=True)),
+            ['completed', 'failed', 'pending']
+        )
+
+    def test_save_now_writes_buffered_changes(self):
+        from core.arxiv_models import ArxivReferenceExtractLog
+        from core.extract_log_writer import ExtractLogWriter
+
+        writer = ExtractLogWriter(flush_size=100, flush_interval=3600)
+        log = writer.create(paper=self.papers[0], status='extracting')
+        log.reference_count = 3
+        writer.save(log)
+        log.status = 'completed'
+        writer.save_now(log)
+
+        self.assertEqual(writer.pending, 0)
+        stored = ArxivReferenceExtractLog.objects.get(pk=log.pk)
+        self.assertEqual((stored.status, stored.reference_count), ('completed', 3))
+
+    def test_no_automatic_flush_inside_callers_transaction(self):
+        from django.db import transaction
+        from core.arxiv_models import ArxivReferenceExtractLog
+        from core.extract_log_writer import ExtractLogWriter
+
+        writer = ExtractLogWriter(flush_size=2, flush_interval=3600)
+        logs = [writer.create(paper=paper, status='pending') for paper in self.papers[:3]]
+        released = []
+        logs[0].status = 'completed'
+        writer.save(logs[0])
+        writer.after_flush(lambda: released.append(logs[0].pk))
+
+        # 事务回滚时，缓冲中其他论文的状态不能随之丢失，回调也不能提前执行
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                logs[1].status = 'failed'
+                writer.save(logs[1])
+                raise RuntimeError('save references failed')
+        self.assertEqual(writer.pending, 2)
+        self.assertEqual(released, [])
+
+        logs[2].status = 'completed'
+        writer.save(logs[2])
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(released, [logs[0].pk])
+        self.assertEqual(
+            sorted(ArxivReferenceExtractLog.objects.values_list('status', flat=True)),
+            ['completed', 'completed', 'failed']
+        )
+
+    def test_update_writes_only_changed_columns(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.arxiv_models import ArxivReferenceExtractLog, EXTRACT_LOG_WORK_FIELDS
+        from core.extract_log_writer import ExtractLogWriter
+
+        for paper in self.papers:
+            ArxivReferenceExtractLog.objects.create(paper=paper, status='extracted', reference_raw_text='[1] A.')
+
+        writer = ExtractLogWriter(flush_size=100, flush_interval=3600)
+        for log in ArxivReferenceExtractLog.objects.only(*EXTRACT_LOG_WORK_FIELDS):
+            writer.track(log)
+            log.status = 'completed'
+            log.reference_count = 1
+            writer.save(log)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(writer.flush(), 4)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('reference_raw_text', updates[0])
+        self.assertIn('reference_count', updates[0])
+        self.assertEqual(ArxivReferenceExtractLog.objects.filter(status='completed', reference_count=1).count(), 4)
+
+        # 没有新的变化时不再写入
+        writer.save(log)
+        self.assertEqual(writer.pending, 0)
+
+    def test_after_flush_callbacks_run_once_written(self):
+        from core.arxiv_models import ArxivReferenceExtractLog
+        from core.extract_log_writer import ExtractLogWriter
+
+        visible = []
+        with ExtractLogWriter(flush_size=100, flush_interval=3600) as writer:
+            writer.create(paper=self.papers[0], status='completed')
+            writer.after_flush(lambda: visible.append(ArxivReferenceExtractLog.objects.count()))
+            self.assertEqual(visible, [])
+        self.assertEqual(visible, [1])
+
+    def test_blob_text_stored_compressed_and_loaded_lazily(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.arxiv_models import ArxivReferenceExtractBlob, ArxivReferenceExtractLog
+        from core.extract_log_writer import ExtractLogWriter
+
+        text = '[1] A. Author. A paper title. 2020.\n' * 200
+        with ExtractLogWriter(flush_size=100, flush_interval=3600) as writer:
+            log = writer.create(paper=self.papers[0], status='extracting')
+            log.reference_raw_text = text
+            writer.save(log)
+        self.assertEqual(log.reference_text_length, len(text))
+        stored = bytes(ArxivReferenceExtractBlob.objects.get(log=log).reference_raw_text)
+        self.assertLess(len(stored), len(text) // 4)
+
+        # 只有大文本变化时不更新日志表
+        writer.track(log)
+        log.llm_response = '[]'
+        with CaptureQueriesContext(connection) as queries:
+            writer.save(log)
+            writer.flush()
+        self.assertFalse(any(q['sql'].startswith('UPDATE "arxiv_reference_extract_log"') for q in queries.captured_queries))
+
+        fetched = ArxivReferenceExtractLog.objects.get(pk=log.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(fetched.reference_raw_text, text)
+            self.assertEqual(fetched.reference_raw_text, text)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(fetched.llm_response, '[]')
+
+
+class CitationGraphTests(TestCase):
+    """引用关系匹配与 CSR 引用图测试"""
+
+    def setUp(self):
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper
+
+        now = timezone.now()
+
+        def paper(arxiv_id, title, doi=None):
+            return ArxivPaper.objects.create(
+                arxiv_id=arxiv_id, title=title, summary='', authors=[], doi=doi,
+                primary_category='cs.CL', categories=['cs.CL'],
+                arxiv_url=f'https://arxiv.org/abs/{arxiv_id}', pdf_url=f'https://arxiv.org/pdf/{arxiv_id}',
+                published=now, updated=now,
+            )
+
+        self.attention = paper('1706.03762', 'Attention Is All You Need')
+        self.bert = paper('1810.04805', 'BERT: Pre-training of Deep Bidirectional Transformers', doi='10.18653/v1/N19-1423')
+        self.survey = paper('2303.18223', 'A Survey of Large Language Models')
+
+    def _reference(self, paper, number, **fields):
+        from core.arxiv_models import ArxivPaperReference
+        return ArxivPaperReference.objects.create(paper=paper, reference_number=number, raw_text='', **fields)
+
+    def test_resolve_by_arxiv_id_doi_and_title(self):
+        from core.arxiv_models import ArxivCitation
+        from core.citation_graph import CitationResolver
+
+        self._reference(self.survey, 1, arxiv_id='arXiv:1706.03762v5')
+        self._reference(self.survey, 2, doi='https://doi.org/10.18653/V1/N19-1423')
+        self._reference(self.bert, 1, title='Attention is all you need.')
+        # 自引、未收录的论文和过短的标题不产生引用边
+        self._reference(self.survey, 3, arxiv_id='2303.18223')
+        self._reference(self.survey, 4, arxiv_id='2401.00001')
+        self._reference(self.bert, 2, title='Survey')
+
+        stats = CitationResolver(log=lambda message: None).run()
+        self.assertEqual(stats, {'papers': 2, 'edges': 3})
+        edges = set(ArxivCitation.objects.values_list('citing_id', 'cited_id', 'match_method'))
+        self.assertEqual(edges, {
+            (self.survey.id, self.attention.id, 'arxiv_id'),
+            (self.survey.id, self.bert.id, 'doi'),
+            (self.bert.id, self.attention.id, 'title'),
+        })
+
+        # 重复执行替换而不是累加
+        CitationResolver(log=lambda message: None).run()
+        self.assertEqual(ArxivCitation.objects.count(), 3)
+
+    def test_run_drops_edges_of_papers_without_references(self):
+        from core.arxiv_models import ArxivCitation, ArxivPaperReference
+        from core.citation_graph import CitationResolver
+
+        self._reference(self.survey, 1, arxiv_id='1706.03762')
+        self._reference(self.bert, 1, arxiv_id='1706.03762')
+        CitationResolver(log=lambda message: None).run()
+        self.assertEqual(ArxivCitation.objects.count(), 2)
+
+        # 参考文献被全部删除后，重新计算应清除该论文的旧引用边
+        ArxivPaperReference.objects.filter(paper=self.survey).delete()
+        stats = CitationResolver(log=lambda message: None).run()
+        self.assertEqual(stats, {'papers': 2, 'edges': 1})
+        self.assertEqual(
+            list(ArxivCitation.objects.values_list('citing_id', flat=True)), [self.bert.id]
+        )
+
+    def test_csr_export_roundtrip(self):
+        from core.arxiv_models import ArxivCitation
+        from core.citation_graph import CitationGraph
+
+        ArxivCitation.objects.create(citing=self.survey, cited=self.attention, match_method='arxiv_id')
+        ArxivCitation.objects.create(citing=self.survey, cited=self.bert, match_method='doi')
+        ArxivCitation.objects.create(citing=self.bert, cited=self.attention, match_method='title')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            CitationGraph.from_database().save(tmp_dir)
+            graph = CitationGraph.load(tmp_dir)
+
+            self.assertEqual(graph.num_edges, 3)
+            self.assertEqual(sorted(graph.references(self.survey.id).tolist()), sorted([self.attention.id, self.bert.id]))
+            self.assertEqual(sorted(graph.cited_by(self.attention.id).tolist()), sorted([self.survey.id, self.bert.id]))
+            self.assertEqual(graph.citation_count(self.attention.id), 2)
+            self.assertEqual(graph.citation_count(self.survey.id), 0)
+            self.assertEqual(int(graph.citation_counts()[self.bert.id]), 1)
+            # 导出之后新增的论文
+            self.assertEqual(graph.citation_count(graph.num_nodes + 10), 0)
+            del graph
+
+    def test_pagerank_and_decayed_counts(self):
+        import numpy as np
+        from core.citation_graph import CitationGraph
+
+        # 0 和 1 都引用 2，2 引用 3；4 为主键空洞
+        graph = CitationGraph.from_edges([0, 1, 2], [2, 2, 3], num_nodes=5)
+        valid = np.array([True, True, True, True, False])
+        rank = graph.pagerank(valid)
+        self.assertAlmostEqual(rank.sum(), 1.0)
+        self.assertEqual(rank[4], 0.0)
+        self.assertGreater(rank[3], rank[2])
+        self.assertGreater(rank[2], rank[0])
+
+        day = 86400.0
+        timestamps = np.array([100 * day, 100 * day - 365 * day, 0.0, 0.0, 0.0])
+        decayed = graph.decayed_citation_counts(timestamps, now=100 * day, half_life_days=365)
+        self.assertAlmostEqual(decayed[2], 1.5)
+
+    def test_scores_served_by_search(self):
+        import json
+        from django.core.management import call_command
+        from core.arxiv_models import ArxivCitation, ArxivPaperScore
+
+        ArxivCitation.objects.create(citing=self.survey, cited=self.attention, match_method='arxiv_id')
+        ArxivCitation.objects.create(citing=self.bert, cited=self.attention, match_method='title')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            call_command('compute_paper_scores', from_database=True, graph=tmp_dir, stdout=io.StringIO())
+        self.assertEqual(ArxivPaperScore.objects.get(paper=self.attention).citation_count, 2)
+
+        response = self.client.get('/api/search/', {'q': 'a', 'sort': 'citations'})
+        results = json.loads(response.content)['results']
+        self.assertEqual(results[0]['arxiv_id'], self.attention.arxiv_id)
+        self.assertEqual([r['citations'] for r in results], [2, 0, 0])
+        self.assertGreater(results[0]['pagerank'], results[1]['pagerank'])
+
+    def test_fuzzy_title_matching(self):
+        from core.arxiv_models import ArxivCitation
+        from core.citation_graph import CitationResolver
+        from core.title_index import TitleIndex
+
+        index = TitleIndex()
+        index.add(self.attention.id, self.attention.title)
+        index.add(self.survey.id, self.survey.title)
+        paper_id, similarity = index.match('Atention is all you need!')
+        self.assertEqual(paper_id, self.attention.id)
+        self.assertGreater(similarity, 0.9)
+        self.assertIsNone(index.match('Deep residual learning for image recognition'))
+        self.assertIsNone(index.match('Attention'))
+
+        # 精确匹配失败的标题由模糊索引匹配，并记录相似度作为置信度
+        self._reference(self.bert, 1, title='A Survey on Large Language Model')
+        self._reference(self.bert, 2, title='Attention is all you need')
+        resolver = CitationResolver(title_index=TitleIndex(), log=lambda message: None)
+        resolver.run()
+        edges = {
+            cited_id: (method, confidence)
+            for cited_id, method, confidence in ArxivCitation.objects.values_list('cited_id', 'match_method', 'confidence_score')
+        }
+        self.assertEqual(edges[self.attention.id], ('title', 1.0))
+        self.assertEqual(edges[self.survey.id][0], 'fuzzy')
+        self.assertLess(edges[self.survey.id][1], 1.0)
+
+
+class ReferenceBenchmarkTests(SimpleTestCase):
+    """回归样例：正常样例必须通过，已知问题样例修复后需要同步更新清单"""
+
+    def test_corpus(self):
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+        from core.reference_benchmark import load_corpus, run_case
+
+        extractor = ArxivReferenceExtractor(use_text_cache=False)
+        for case in load_corpus():
+            with self.subTest(case=case.name):
+                result = run_case(extractor, case)
+                self.assertIn('find_section', result.stages)
+                if case.known_issue:
+                    self.assertFalse(result.passed, f'{case.name} 已通过，请删除清单中的 known_issue')
+                else:
+                    self.assertTrue(result.passed, f'{case.name}: {result.checks} {result.error or ""}')
+
+
+class ChatLLMClientTests(TestCase):
+    """翻译/聊天通过 core.llm 调用，相同配置复用客户端"""
+
+    def test_chat_calls_reuse_pooled_client(self):
+        from core.chat_views import call_llm_api, call_llm_api_stream, get_llm_client
+        from core.llm.registry import clear_clients
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        def responder(custom_id, body):
+            return f"{body['model']} {body['messages'][-1]['content']}"
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        with FakeBatchServer(responder) as server:
+            config = AIModelConfig.objects.create(
+                provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url
+            )
+            self.assertEqual(call_llm_api(config, [{'role': 'user', 'content': 'hello'}]), 'gpt-4o hello')
+            chunks = list(call_llm_api_stream(config, [{'role': 'user', 'content': 'a b'}]))
+            self.assertEqual(''.join(chunks), 'gpt-4o a b')
+            self.assertGreater(len(chunks), 1)
+
+            # 同一提供商、地址和密钥的其他模型复用同一客户端
+            other = AIModelConfig.objects.create(
+                provider='gpt', model_name='gpt-4o-mini', api_key='sk-test', api_base=server.base_url
+            )
+            self.assertIs(get_llm_client(config), get_llm_client(other))
+            self.assertEqual(call_llm_api(other, [{'role': 'user', 'content': 'hi'}]), 'gpt-4o-mini hi')
+            self.assertEqual(server.chat_requests, 3)
+
+    def test_chat_fails_over_to_backup_provider(self):
+        import os
+        import time
+        from unittest.mock import patch
+        from django.test import override_settings
+        from core import chat_views
+        from core.llm.registry import clear_clients
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        def slow(custom_id, body):
+            time.sleep(1.0)
+            return 'slow answer'
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        chat_views._chat_fallbacks = None
+        self.addCleanup(setattr, chat_views, '_chat_fallbacks', None)
+        failover = {'fallbacks': ['deepseek:deepseek-chat'], 'hedge': True, 'hedge_delay': 0.1, 'min_hedge_delay': 0.1}
+        with FakeBatchServer(slow) as primary, \
+                FakeBatchServer(lambda custom_id, body: f"{body['model']} answer") as backup, \
+                patch.dict(os.environ, {'DEEPSEEK_API_KEY': 'sk-backup', 'DEEPSEEK_BASE_URL': backup.base_url}), \
+                override_settings(CHAT_FAILOVER=failover):
+            config = AIModelConfig.objects.create(
+                provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=primary.base_url
+            )
+            start = time.monotonic()
+            served_by = {}
+            answer = ''.join(chat_views.call_llm_api_stream(
+                config, [{'role': 'user', 'content': 'hello'}], served_by=served_by
+            ))
+            # 主提供商超过对冲等待时间仍无首个 token，备用提供商先返回
+            self.assertEqual(answer, 'deepseek-chat answer')
+            self.assertLess(time.monotonic() - start, 0.9)
+            self.assertEqual(backup.chat_requests, 1)
+            # 调用方据此不把备用提供商的结果按用户的模型缓存
+            self.assertEqual(served_by, {'provider': 'deepseek/deepseek-chat', 'fallback': True})
+
+    def test_chat_response_cache(self):
+        from django.test import override_settings
+        from core import chat_views
+        from core.llm.registry import clear_clients
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        chat_views._chat_response_cache = None
+        self.addCleanup(setattr, chat_views, '_chat_response_cache', None)
+        messages = [
+            {'role': 'system', 'content': 'Selected text: Attention is all you need.'},
+            {'role': 'user', 'content': 'What is the main contribution?'},
+        ]
+        cache_settings = {'enabled': True, 'ttl': 60, 'similarity_threshold': 0.9}
+        with FakeBatchServer(lambda custom_id, body: 'The Transformer.') as server, \
+                override_settings(CHAT_RESPONSE_CACHE=cache_settings):
+            config = AIModelConfig.objects.create(
+                provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url
+            )
+            for _ in range(2):
+                self.assertEqual(chat_views.call_llm_api(config, messages, response_cache=True), 'The Transformer.')
+            self.assertEqual(''.join(chat_views.call_llm_api_stream(config, messages, response_cache=True)), 'The Transformer.')
+            chat_views.call_llm_api(config, messages, response_cache=True, use_cache=False)
+            # 翻译不使用问答缓存
+            chat_views.call_llm_api(config, messages)
+            self.assertEqual(server.chat_requests, 3)
+            stats = chat_views.get_chat_response_cache().stats()
+
+        self.assertEqual((stats['exact'], stats['bypassed']), (2, 1))
+
+    def test_chat_stream_bounds_prompt_size(self):
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from core.llm.context import count_tokens
+        from core.llm.registry import clear_clients
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        user = User.objects.create_user('reader', password='x')
+        self.client.force_login(user)
+        prompts = []
+
+        def responder(custom_id, body):
+            prompts.append(body['messages'])
+            return 'ok'
+
+        messages = []
+        for i in range(40):
+            messages.append({'role': 'user', 'content': f'Question {i} about the method? ' * 20})
+            messages.append({'role': 'assistant', 'content': f'Answer {i} explaining the method. ' * 40})
+        messages.append({'role': 'user', 'content': 'And the results?'})
+        window = {'max_prompt_tokens': 2000, 'context_tokens': 500, 'keep_recent_messages': 4, 'summary_tokens': 200}
+
+        with FakeBatchServer(responder) as server, override_settings(CHAT_CONTEXT_WINDOW=window):
+            AIModelConfig.objects.create(
+                user=user, provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url
+            )
+            response = self.client.post('/api/chat/stream/', json.dumps({
+                'messages': messages, 'context_text': 'Selected paragraph. ' * 1000
+            }), content_type='application/json')
+            body = b''.join(response.streaming_content).decode('utf-8')
+
+        start = json.loads(body.split('\n\n')[0][len('data: '):])
+        self.assertEqual(start['context']['context_trimmed'], 1)
+        self.assertEqual(start['context']['summarized_messages'], len(messages) - 4)
+        sent = prompts[0]
+        self.assertLessEqual(sum(count_tokens(m['content']) + 4 for m in sent), 2000)
+        self.assertEqual(sent[-4:], messages[-4:])
+        self.assertEqual([m['role'] for m in sent[:2]], ['system', 'system'])
+
+
+class LLMTelemetryTests(TestCase):
+    """问答消息记录调用遥测，/metrics 输出 Prometheus 指标"""
+
+    def test_chat_stream_records_metrics(self):
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from core.llm.registry import clear_clients
+        from core.llm.telemetry import telemetry
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig, ChatMessage
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        telemetry.reset()
+        user = User.objects.create_user('reader', password='x')
+        self.client.force_login(user)
+
+        with FakeBatchServer(lambda custom_id, body: 'The attention mechanism.') as server:
+            AIModelConfig.objects.create(
+                user=user, provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url
+            )
+            response = self.client.post('/api/chat/stream/', json.dumps({
+                'messages': [{'role': 'user', 'content': 'What is new?'}], 'context_text': 'Selected paragraph.'
+            }), content_type='application/json')
+            body = b''.join(response.streaming_content).decode('utf-8')
+
+        done = json.loads(body.strip().split('\n\n')[-1][len('data: '):])
+        metadata = ChatMessage.objects.get(role='assistant').metadata
+        self.assertEqual(done['metrics'], metadata)
+        self.assertEqual(metadata['context']['summarized_messages'], 0)
+        self.assertLessEqual(metadata['ttft'], metadata['latency'])
+        llm = metadata['llm']
+        self.assertEqual((llm['provider'], llm['model'], llm['operation']), ('openai', 'gpt-4o', 'stream'))
+        # 自定义地址默认不请求流式用量，token 数为本地估算
+        self.assertTrue(llm['usage_estimated'])
+        self.assertGreater(llm['completion_tokens'], 0)
+        self.assertGreater(llm['cost'], 0)
+
+        with override_settings(LLM_METRICS={'enabled': True, 'token': 'secret'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode('utf-8')
+        self.assertIn('llm_requests_total{provider="openai",model="gpt-4o",operation="stream",status="ok"} 1', text)
+        self.assertIn(f'llm_tokens_total{{provider="openai",model="gpt-4o",type="prompt"}} {llm["prompt_tokens"]}', text)
+        with override_settings(LLM_METRICS={'enabled': False}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        # 非 DEBUG 模式下未设置 token 时拒绝访问
+        with override_settings(LLM_METRICS={'enabled': True, 'token': ''}, DEBUG=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class TranslationCacheTests(TestCase):
+    """重复翻译命中缓存，流式接口一次性回放缓存结果"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from core.llm.registry import clear_clients
+        from core.models import AIModelConfig
+        from core.translation_cache import translation_cache
+
+        translation_cache.clear()
+        clear_clients()
+        self.addCleanup(translation_cache.clear)
+        self.addCleanup(clear_clients)
+        self.user = User.objects.create_user('reader', password='x')
+        self.client.force_login(self.user)
+        self.config = AIModelConfig.objects.create(
+            user=self.user, provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base='http://127.0.0.1:1/v1'
+        )
+
+    def _stream_events(self, text):
+        response = self.client.post(
+            '/api/translate/stream/', json.dumps({'text': text, 'target_lang': 'zh'}), content_type='application/json'
+        )
+        body = b''.join(response.streaming_content).decode('utf-8')
+        return [json.loads(line[len('data: '):]) for line in body.split('\n\n') if line.startswith('data: ')]
+
+    def test_repeat_translation_uses_cache(self):
+        from core.chat_views import translation_cache_model
+        from core.llm.testing import FakeBatchServer
+        from core.models import TranslationCacheEntry
+        from core.translation_cache import translation_cache
+
+        with FakeBatchServer(lambda custom_id, body: '译文 ' * 150) as server:
+            self.config.api_base = server.base_url
+            self.config.save()
+
+            events = self._stream_events('Attention is all you need.')
+            self.assertFalse(events[0]['cached'])
+            translated = ''.join(e['content'] for e in events if e['type'] == 'chunk')
+            self.assertEqual(events[-1]['type'], 'done')
+
+            # 空白不同的同一段落命中缓存，不再调用LLM，结果分片回放
+            events = self._stream_events('Attention  is all\nyou need.')
+            chunks = [e['content'] for e in events if e['type'] == 'chunk']
+            self.assertTrue(events[0]['cached'])
+            self.assertEqual(''.join(chunks), translated)
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(events[-1]['type'], 'done')
+
+            # 持久层在内存层清空后仍然命中
+            translation_cache.clear()
+            response = self.client.post(
+                '/api/translate/', {'text': 'Attention is all you need.', 'target_lang': 'zh'}, content_type='application/json'
+            )
+            self.assertTrue(response.json()['data']['cached'])
+            self.assertEqual(response.json()['data']['translated_text'], translated)
+
+            # 其他目标语言不命中
+            response = self.client.post(
+                '/api/translate/', {'text': 'Attention is all you need.', 'target_lang': 'ja'}, content_type='application/json'
+            )
+            self.assertFalse(response.json()['data']['cached'])
+            self.assertEqual(server.chat_requests, 2)
+
+        # 自定义地址的翻译按配置隔离，不进入共享的 "提供商/模型名" 缓存
+        entry = TranslationCacheEntry.objects.get(target_lang='zh')
+        self.assertEqual((entry.model, entry.hit_count), (translation_cache_model(self.config), 1))
+        self.assertTrue(entry.model.startswith('gpt/gpt-4o@'))
+
+    def test_custom_api_base_does_not_share_cache(self):
+        from unittest import mock
+
+        from django.contrib.auth.models import User
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        with FakeBatchServer(lambda custom_id, body: '恶意译文') as server:
+            self.config.api_base = server.base_url
+            self.config.save()
+            self._stream_events('Attention is all you need.')
+
+        # 另一位使用默认地址的读者不会命中自建接口的翻译（默认地址末尾的斜杠不影响比较）
+        other = User.objects.create_user('other', password='x')
+        self.client.force_login(other)
+        with FakeBatchServer(lambda custom_id, body: '译文') as server, \
+                mock.patch.dict('core.chat_views.API_BASE_CONFIG', {'gpt': server.base_url + '/'}):
+            AIModelConfig.objects.create(
+                user=other, provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url
+            )
+            events = self._stream_events('Attention is all you need.')
+            self.assertFalse(events[0]['cached'])
+            self.assertEqual(''.join(e['content'] for e in events if e['type'] == 'chunk'), '译文')
+
+    def test_pretranslated_paper_hits_cache(self):
+        from unittest import mock
+
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+        from core.chat_views import build_translation_messages, call_llm_api, translation_cache_model
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+        from core.paper_translation import PaperPretranslator, extract_paragraphs
+        from core.reference_benchmark import DEFAULT_CORPUS_DIR
+        from core.translation_cache import translation_cache
+
+        # 翻译线程不共享测试事务，只使用内存层
+        translation_cache.persistent = False
+        self.addCleanup(setattr, translation_cache, 'persistent', True)
+
+        extractor = ArxivReferenceExtractor(use_text_cache=False)
+        success, document, _ = extractor.extract_document(str(DEFAULT_CORPUS_DIR / 'single_column.pdf'))
+        self.assertTrue(success)
+        paragraphs = extract_paragraphs(document, extractor)
+        self.assertEqual(len(paragraphs), 4)
+        self.assertTrue(paragraphs[0].startswith('Abstract'))
+        # 参考文献部分不翻译
+        self.assertFalse(any('pages 6105-6114' in paragraph for paragraph in paragraphs))
+
+        with FakeBatchServer(lambda custom_id, body: '译文') as server, \
+                mock.patch.dict('core.chat_views.API_BASE_CONFIG', {'gpt': server.base_url}):
+            # 服务端默认地址的预翻译结果与读者共享
+            config = AIModelConfig(provider='gpt', model_name='gpt-4o', api_key='sk-test', api_base=server.base_url)
+            pretranslator = PaperPretranslator(
+                translate=lambda text: call_llm_api(config, build_translation_messages(text, 'zh')),
+                target_lang='zh',
+                model=translation_cache_model(config),
+                workers=4,
+                log=lambda message: None
+            )
+            self.assertEqual(pretranslator.run(paragraphs), {'total': 4, 'cached': 0, 'translated': 4, 'failed': 0})
+            self.assertEqual(pretranslator.run(paragraphs)['cached'], 4)
+
+            self.config.api_base = server.base_url
+            self.config.save()
+            response = self.client.post(
+                '/api/translate/', {'text': paragraphs[2], 'target_lang': 'zh'}, content_type='application/json'
+            )
+            self.assertTrue(response.json()['data']['cached'])
+            self.assertEqual(server.chat_requests, 4)
+
+
+class PaperRetrievalTests(TestCase):
+    """论文分段索引按论文缓存，问答时只附加与问题相关的片段"""
+
+    PDF_URL = 'http://example.com/single_column.pdf'
+
+    def setUp(self):
+        from core import chat_views
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+        from core.paper_index import PaperIndexStore
+        from core.reference_benchmark import DEFAULT_CORPUS_DIR
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.extractor = ArxivReferenceExtractor(
+            pdf_download_dir=f'{self.temp_dir.name}/pdfs', text_cache_dir=f'{self.temp_dir.name}/text'
+        )
+        # 文本层缓存按URL命中，无需下载
+        success, self.document, _ = self.extractor.extract_document(
+            str(DEFAULT_CORPUS_DIR / 'single_column.pdf'), aliases=(self.PDF_URL,)
+        )
+        self.assertTrue(success)
+        self.store = PaperIndexStore(cache_dir=f'{self.temp_dir.name}/index', chunk_tokens=80, extractor=self.extractor)
+        chat_views._paper_index_store = self.store
+        self.addCleanup(setattr, chat_views, '_paper_index_store', None)
+
+    def _add_paper(self):
+        from django.utils import timezone
+        from core.arxiv_models import ArxivPaper
+
+        ArxivPaper.objects.create(
+            arxiv_id='2301.00001', title='Single column', summary='', authors=[],
+            primary_category='cs.CL', categories=['cs.CL'],
+            arxiv_url='https://arxiv.org/abs/2301.00001', pdf_url=self.PDF_URL,
+            published=timezone.now(), updated=timezone.now(),
+        )
+
+    def _chat(self, pdf_url):
+        from django.contrib.auth.models import User
+        from core.llm.registry import clear_clients
+        from core.llm.testing import FakeBatchServer
+        from core.models import AIModelConfig
+
+        clear_clients()
+        self.addCleanup(clear_clients)
+        user, _ = User.objects.get_or_create(username='reader')
+        self.client.force_login(user)
+        prompts = []
+
+        def responder(custom_id, body):
+            prompts.append(body['messages'])
+            return 'ok'
+
+        with FakeBatchServer(responder) as server:
+            AIModelConfig.objects.update_or_create(
+                user=user, provider='gpt', model_name='gpt-4o',
+                defaults={'api_key': 'sk-test', 'api_base': server.base_url, 'is_active': True}
+            )
+            response = self.client.post('/api/chat/stream/', json.dumps({
+                'messages': [{'role': 'user', 'content': 'Summarize the method section.'}],
+                'pdf_url': pdf_url,
+            }), content_type='application/json')
+            body = b''.join(response.streaming_content).decode('utf-8')
+
+        return json.loads(body.split('\n\n')[0][len('data: '):]), prompts
+
+    def test_index_is_cached_per_paper(self):
+        index = self.store.get_for_url(self.PDF_URL)
+        self.assertGreater(len(index), 4)
+        hits = index.search('What does the conclusion say?', k=2)
+        self.assertTrue(index.chunks[hits[0][0]].startswith('3 Conclusion'))
+        # 参考文献不进入索引
+        self.assertFalse(any('6105-6114' in chunk for chunk in index.chunks))
+
+        self.assertIs(self.store.get(self.document), index)
+        self.store._indexes.clear()
+        reloaded = self.store.get(self.document)
+        self.assertEqual(reloaded.chunks, index.chunks)
+        self.assertEqual(reloaded.search('What does the conclusion say?', k=2)[0][0], hits[0][0])
+
+    def test_chat_stream_adds_retrieved_excerpts(self):
+        self._add_paper()
+
+        # 索引在后台构建，构建完成前的问题不附加片段
+        start, _ = self._chat(self.PDF_URL)
+        self.assertEqual(start['context']['retrieved_chunks'], 0)
+        self.store.wait()
+
+        start, prompts = self._chat(self.PDF_URL)
+        self.assertEqual(start['context']['retrieved_chunks'], 4)
+        system = prompts[0][0]
+        self.assertEqual(system['role'], 'system')
+        self.assertIn('Relevant excerpts retrieved from the paper', system['content'])
+        self.assertIn('2 Method', system['content'])
+        self.assertLess(len(system['content']), len(self.document.text))
+
+    def test_unknown_pdf_url_is_not_fetched(self):
+        from unittest import mock
+        from core.chat_views import is_retrievable_pdf_url
+
+        with mock.patch('core.paper_index.requests.get') as get:
+            start, _ = self._chat('http://169.254.169.254/latest/meta-data')
+            self.store.wait()
+        self.assertEqual(start['context']['retrieved_chunks'], 0)
+        get.assert_not_called()
+
+        allowed = ['arxiv.org']
+        self.assertTrue(is_retrievable_pdf_url('https://arxiv.org/pdf/2301.00001', allowed))
+        self.assertTrue(is_retrievable_pdf_url('https://export.arxiv.org/pdf/2301.00001', allowed))
+        self.assertFalse(is_retrievable_pdf_url('http://arxiv.org/pdf/2301.00001', allowed))
+        self.assertFalse(is_retrievable_pdf_url('https://arxiv.org.evil.com/pdf/1', allowed))
+
+    def test_download_size_is_capped(self):
+        from unittest import mock
+        from core.paper_index import load_document
+
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.headers = {}
+        response.iter_content.return_value = iter([b'x' * 1024] * 4)
+        with mock.patch('core.paper_index.requests.get', return_value=response):
+            with self.assertRaises(ValueError):
+                load_document(self.extractor, 'https://arxiv.org/pdf/big', max_bytes=2048)
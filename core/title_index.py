@@ -0,0 +1,150 @@
+"""
+论文标题模糊匹配索引
+只有标题的参考文献无法用 LIKE 在数百万篇论文中查找，这里用 MinHash + LSH 分桶（blocking）
+先找出少量候选论文，再逐个计算字符串相似度确认：
+
+1. 标题标准化后切分为字符 n-gram，计算 MinHash 签名
+2. 签名按 band 分段，同一 band 取值相同的标题落入同一个桶，只有共享桶的标题才是候选
+3. 候选按共享桶数排序，取前若干个计算相似度，最高且超过阈值的作为匹配结果
+
+安装 rapidfuzz 时用它计算相似度，否则回退到标准库 difflib
+"""
+import zlib
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz
+    RAPIDFUZZ_SUPPORT = True
+except ImportError:
+    fuzz = None
+    RAPIDFUZZ_SUPPORT = False
+
+from core.citation_graph import normalize_title
+
+
+# 大于 2^32 的素数，MinHash 的哈希函数为 (a * x + b) mod P
+_MERSENNE_PRIME = np.uint64(4294967311)
+
+
+def title_similarity(a: str, b: str) -> float:
+    """两个标准化标题的相似度（0-1）"""
+    if RAPIDFUZZ_SUPPORT:
+        return fuzz.ratio(a, b) / 100.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+class TitleIndex:
+    """基于 MinHash LSH 的标题模糊匹配索引（内存）"""
+
+    def __init__(
+        self,
+        num_perm: int = 32,
+        bands: int = 8,
+        shingle_size: int = 3,
+        min_length: int = 20,
+        max_candidates: int = 5,
+        seed: int = 1
+    ):
+        """
+        初始化索引
+
+        Args:
+            num_perm: MinHash 签名长度
+            bands: LSH 分段数（每段 num_perm / bands 个值）；段越多召回越高、候选越多，
+                   默认参数下 Jaccard 相似度约 0.6 以上的标题大概率成为候选
+            shingle_size: 字符 n-gram 长度
+            min_length: 参与匹配的标准化标题最短长度（过短的标题容易误匹配）
+            max_candidates: 每个标题最多计算相似度的候选数
+            seed: 哈希函数随机种子（建索引和查询必须一致）
+        """
+        if num_perm % bands:
+            raise ValueError('num_perm 必须是 bands 的整数倍')
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_length = min_length
+        self.max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        # a, b < 2^31 保证 a * x + b 不超出 uint64
+        self._a = rng.integers(1, 2 ** 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 31, size=(num_perm, 1), dtype=np.uint64)
+
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._titles: List[str] = []
+        self._paper_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._paper_ids)
+
+    def _signature(self, title: str) -> np.ndarray:
+        size = self.shingle_size
+        shingles = {title[i:i + size] for i in range(max(1, len(title) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, paper_id: int, title: Optional[str]) -> bool:
+        """
+        添加论文标题
+
+        Returns:
+            标题过短未加入索引时返回 False
+        """
+        normalized = normalize_title(title)
+        if len(normalized) < self.min_length:
+            return False
+
+        position = len(self._paper_ids)
+        self._titles.append(normalized)
+        self._paper_ids.append(paper_id)
+        for band, key in zip(self._buckets, self._band_keys(self._signature(normalized))):
+            band.setdefault(key, []).append(position)
+        return True
+
+    def candidates(self, normalized: str) -> List[int]:
+        """按共享桶数从多到少返回候选标题的位置"""
+        counts: Dict[int, int] = {}
+        for band, key in zip(self._buckets, self._band_keys(self._signature(normalized))):
+            for position in band.get(key, ()):
+                counts[position] = counts.get(position, 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)[:self.max_candidates]
+
+    def match(self, title: Optional[str], threshold: float = 0.9) -> Optional[Tuple[int, float]]:
+        """
+        查找与标题最相似的论文
+
+        Args:
+            title: 参考文献标题（未标准化）
+            threshold: 相似度阈值
+
+        Returns:
+            (论文ID, 相似度)；没有超过阈值的候选，或最相似的有多篇不同论文时返回 None
+        """
+        normalized = normalize_title(title)
+        if len(normalized) < self.min_length:
+            return None
+
+        best_id, best_score, tied = None, 0.0, False
+        for position in self.candidates(normalized):
+            score = title_similarity(normalized, self._titles[position])
+            paper_id = self._paper_ids[position]
+            if score > best_score:
+                best_id, best_score, tied = paper_id, score, False
+            elif score == best_score and paper_id != best_id:
+                tied = True
+
+        if best_id is None or tied or best_score < threshold:
+            return None
+        return best_id, best_score
+
+    def match_many(self, titles: List[Optional[str]], threshold: float = 0.9) -> List[Optional[Tuple[int, float]]]:
+        """批量匹配，返回与输入顺序一致的结果"""
+        return [self.match(title, threshold) for title in titles]
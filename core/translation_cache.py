@@ -0,0 +1,129 @@
+"""
+翻译缓存
+热门论文的同一段落会被不同读者反复翻译，按 (标准化原文哈希, 目标语言, 模型) 缓存翻译结果：
+- 内存层：进程内按最近使用淘汰（LRU），命中时不访问数据库
+- 持久层：translation_cache 表，进程重启或多进程部署时共享
+
+流式翻译命中缓存时把结果切成片段一次性回放，不再调用LLM
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from common.db_utils import bulk_upsert
+from core.models import TranslationCacheEntry
+
+
+# 回放缓存结果时每个 SSE 片段的字符数
+REPLAY_CHUNK_CHARS = 200
+
+
+def normalize_source(text: str) -> str:
+    """标准化原文：合并空白（选中文本的换行和缩进不影响翻译结果）"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def source_hash(text: str) -> str:
+    """标准化原文的 SHA-256"""
+    return hashlib.sha256(normalize_source(text).encode('utf-8')).hexdigest()
+
+
+def replay_chunks(text: str, chunk_chars: int = REPLAY_CHUNK_CHARS) -> Iterator[str]:
+    """把缓存的翻译结果切分为流式片段"""
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+
+
+class TranslationCache:
+    """两级翻译缓存（内存 LRU + 数据库），线程安全"""
+
+    def __init__(self, max_entries: int = 2048, persistent: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存层最多保留的翻译数
+            persistent: 是否使用数据库持久层
+        """
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries: 'OrderedDict[Tuple[str, str, str], str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: Tuple[str, str, str], translated: str):
+        with self._lock:
+            self._entries[key] = translated
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, text: str, target_lang: str, model: str) -> Optional[str]:
+        """
+        查找翻译结果
+
+        Args:
+            text: 原文
+            target_lang: 目标语言代码
+            model: 模型标识（提供商/模型名）
+
+        Returns:
+            翻译结果，未命中时返回 None
+        """
+        key = (source_hash(text), target_lang, model)
+        with self._lock:
+            translated = self._entries.get(key)
+            if translated is not None:
+                self._entries.move_to_end(key)
+                return translated
+
+        if not self.persistent:
+            return None
+
+        # 持久层不可用时退化为只用内存层，不影响翻译
+        try:
+            entries = TranslationCacheEntry.objects.filter(source_hash=key[0], target_lang=target_lang, model=model)
+            translated = entries.values_list('translated_text', flat=True).first()
+            if translated is None:
+                return None
+            entries.update(hit_count=F('hit_count') + 1, last_used_at=timezone.now())
+        except DatabaseError as e:
+            print(f"Translation cache read error: {e}")
+            return None
+        self._remember(key, translated)
+        return translated
+
+    def put(self, text: str, target_lang: str, model: str, translated: str):
+        """保存翻译结果（空结果不缓存）"""
+        if not translated or not translated.strip():
+            return
+        key = (source_hash(text), target_lang, model)
+        self._remember(key, translated)
+
+        if not self.persistent:
+            return
+        try:
+            bulk_upsert(
+                TranslationCacheEntry,
+                [TranslationCacheEntry(
+                    source_hash=key[0], target_lang=target_lang, model=model, translated_text=translated
+                )],
+                unique_fields=['source_hash', 'target_lang', 'model'],
+                update_fields=['translated_text', 'last_used_at']
+            )
+        except DatabaseError as e:
+            print(f"Translation cache write error: {e}")
+
+    def clear(self):
+        """清空内存层"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享的翻译缓存
+translation_cache = TranslationCache()
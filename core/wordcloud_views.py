@@ -9,10 +9,10 @@ from pathlib import Path
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-import requests
-import fitz  # PyMuPDF
 from loguru import logger
 
+from core.paper_index import load_document
+
 
 # 英文停用词列表
 ENGLISH_STOPWORDS = {
@@ -41,35 +41,42 @@ ENGLISH_STOPWORDS = {
 }
 
 
+_text_extractor = None
+
+
+def get_text_extractor():
+    """获取共享的PDF文本提取器（带文本层缓存，延迟初始化）"""
+    global _text_extractor
+    if _text_extractor is None:
+        from core.arxiv_reference_extractor import ArxivReferenceExtractor
+        _text_extractor = ArxivReferenceExtractor()
+    return _text_extractor
+
+
 def extract_text_from_pdf(pdf_path_or_url):
     """
     从PDF文件或URL提取文本
     
+    优先读取PDF文本层缓存（与参考文献提取共用），未命中时才下载/解析PDF
+    
     Args:
         pdf_path_or_url: PDF文件路径或URL
         
     Returns:
         str: 提取的文本内容
     """
+    extractor = get_text_extractor()
     try:
         # 判断是URL还是本地文件
         if pdf_path_or_url.startswith('http://') or pdf_path_or_url.startswith('https://'):
-            # 下载PDF
-            response = requests.get(pdf_path_or_url, timeout=30)
-            response.raise_for_status()
-            pdf_data = response.content
-            doc = fitz.open(stream=pdf_data, filetype="pdf")
-        else:
-            # 本地文件
-            doc = fitz.open(pdf_path_or_url)
-        
-        text = ""
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text += page.get_text()
+            # 文本层缓存未命中时下载PDF
+            return load_document(extractor, pdf_path_or_url).text
         
-        doc.close()
-        return text
+        # 本地文件
+        success, document, error = extractor.extract_document(pdf_path_or_url)
+        if not success:
+            raise ValueError(error)
+        return document.text
     except Exception as e:
         logger.error(f"PDF文本提取失败: {e}")
         raise
@@ -4,11 +4,20 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from django.db.models import Q
+from django.db.models import F, Q
 
 from .arxiv_models import ArxivPaper
 
 
+# 搜索排序方式 -> 排序字段（None 表示只按发布时间）
+SEARCH_SORT_FIELDS = {
+    'recent': None,
+    'citations': 'score__citation_count',
+    'pagerank': 'score__pagerank',
+    'trending': 'score__decayed_score',
+}
+
+
 def workspace(request):
     """
     工作区页面
@@ -26,19 +35,27 @@ def search_papers(request):
     """
     搜索论文
     
-    GET /api/search/?q=关键词
+    GET /api/search/?q=关键词&sort=recent
+    sort: recent（按发布时间，默认）/ citations（被引次数）/ pagerank / trending（时间衰减引用分）
     返回: {"results": [{"title": "...", "authors": "...", ...}]}
+    
+    排序分数由 compute_paper_scores 命令离线计算，尚未计算的论文分数为 null 并排在最后
     """
     query = request.GET.get('q', '')
+    sort = request.GET.get('sort', 'recent')
     
     if not query:
         return JsonResponse({'error': '请提供搜索关键词'}, status=400)
+    if sort not in SEARCH_SORT_FIELDS:
+        return JsonResponse({'error': f'不支持的排序方式: {sort}'}, status=400)
     
     # 在本地数据库中按标题模糊匹配
+    ordering = [F(SEARCH_SORT_FIELDS[sort]).desc(nulls_last=True)] if SEARCH_SORT_FIELDS[sort] else []
     qs = (
         ArxivPaper.objects
         .filter(Q(title__icontains=query))
-        .order_by('-published')[:100]
+        .select_related('score')
+        .order_by(*ordering, '-published')[:100]
     )
 
     results = []
@@ -53,12 +70,15 @@ def search_papers(request):
                     authors.append(a)
         authors_str = ', '.join([x for x in authors if x])
 
+        score = getattr(p, 'score', None)
         results.append({
             'title': p.title,
             'authors': authors_str,
             'abstract': p.summary,
             'year': p.published.year if p.published else None,
-            'citations': None,
+            'citations': score.citation_count if score else None,
+            'pagerank': score.pagerank if score else None,
+            'trending_score': score.decayed_score if score else None,
             'url': p.arxiv_url,
             'pdf_url': p.pdf_url,
             'arxiv_id': p.arxiv_id,
@@ -173,6 +173,53 @@ REST_FRAMEWORK = {
     ],
 }
 
+# 论文问答LLM响应缓存（精确匹配 + 同一上下文中的近似问题），默认关闭
+CHAT_RESPONSE_CACHE = {
+    'enabled': os.getenv('CHAT_RESPONSE_CACHE', 'False') == 'True',
+    'max_entries': int(os.getenv('CHAT_RESPONSE_CACHE_SIZE', '1024')),
+    'ttl': float(os.getenv('CHAT_RESPONSE_CACHE_TTL', '3600')),
+    'similarity_threshold': float(os.getenv('CHAT_RESPONSE_CACHE_THRESHOLD', '0.92')),
+}
+
+# 论文问答每轮提示词的 token 预算（最近消息原样保留，更早的消息压缩为摘要，过长的选中原文截断）
+CHAT_CONTEXT_WINDOW = {
+    'max_prompt_tokens': int(os.getenv('CHAT_MAX_PROMPT_TOKENS', '12000')),
+    'context_tokens': int(os.getenv('CHAT_CONTEXT_TOKENS', '4000')),
+    'keep_recent_messages': int(os.getenv('CHAT_KEEP_RECENT_MESSAGES', '6')),
+    'summary_tokens': int(os.getenv('CHAT_SUMMARY_TOKENS', '400')),
+}
+
+# 论文问答检索：按论文缓存分段向量索引，每个问题附加最相关的 top_k 段原文
+# 只检索已收录论文的 PDF（ArxivPaper.pdf_url）或 allowed_hosts 上的 PDF；索引在后台构建，
+# 构建完成前的问题不附加片段
+CHAT_RETRIEVAL = {
+    'enabled': os.getenv('CHAT_RETRIEVAL', 'True') == 'True',
+    'top_k': int(os.getenv('CHAT_RETRIEVAL_TOP_K', '4')),
+    'chunk_tokens': int(os.getenv('CHAT_RETRIEVAL_CHUNK_TOKENS', '300')),
+    'min_score': float(os.getenv('CHAT_RETRIEVAL_MIN_SCORE', '0.05')),
+    'allowed_hosts': [
+        host.strip().lower() for host in os.getenv('CHAT_RETRIEVAL_ALLOWED_HOSTS', 'arxiv.org,export.arxiv.org').split(',')
+        if host.strip()
+    ],
+    'max_pdf_bytes': int(os.getenv('CHAT_RETRIEVAL_MAX_PDF_MB', '50')) * 1024 * 1024,
+}
+
+# 论文问答备用提供商（逗号分隔的 provider[:model]，API密钥读取 <PROVIDER>_API_KEY）：
+# 用户选择的模型出错或熔断时自动转移；hedge 为 True 时首个 token 超过近期 p95 延迟仍未到达，并发请求备用提供商
+CHAT_FAILOVER = {
+    'fallbacks': [spec for spec in os.getenv('CHAT_FALLBACK_PROVIDERS', '').split(',') if spec.strip()],
+    'hedge': os.getenv('CHAT_HEDGE', 'False') == 'True',
+    'hedge_delay': float(os.getenv('CHAT_HEDGE_DELAY', '10.0')),
+    'min_hedge_delay': float(os.getenv('CHAT_MIN_HEDGE_DELAY', '1.0')),
+}
+
+# LLM 调用指标（/metrics，Prometheus 文本格式），默认关闭；抓取时需携带 Bearer LLM_METRICS_TOKEN，
+# 未设置 token 时只在 DEBUG 模式下可访问
+LLM_METRICS = {
+    'enabled': os.getenv('LLM_METRICS', 'False') == 'True',
+    'token': os.getenv('LLM_METRICS_TOKEN', ''),
+}
+
 # Media files (用户上传的文件)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -38,6 +38,7 @@ from core.chat_views import (
     translate_text, chat_with_text, translate_stream, 
     chat_stream, session_manage
 )
+from core.metrics_views import metrics
 from core.file_views import (
     upload_file, preview_file, download_file, delete_file
 )
@@ -76,6 +77,9 @@ urlpatterns = [
     path('api/files/preview/<str:file_id>/', preview_file, name='preview_file'),
     path('api/files/download/<str:file_id>/', download_file, name='download_file'),
     path('api/files/<str:file_id>/', delete_file, name='delete_file'),
+    
+    # 监控指标（Prometheus）
+    path('metrics', metrics, name='metrics'),
 ]
 
 # 开发环境下提供media和assets文件访问